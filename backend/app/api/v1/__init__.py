@@ -3,5 +3,6 @@
 
 from .audits import router as audits_router
 from .health import router as health_router
+from .uploads import router as uploads_router
 
-__all__ = ["audits_router", "health_router"]
+__all__ = ["audits_router", "health_router", "uploads_router"]
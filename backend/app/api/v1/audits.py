@@ -16,6 +16,7 @@ from fastapi import (
     Header,
     HTTPException,
     Query,
+    Request,
     Response,
     UploadFile,
     status,
@@ -23,26 +24,60 @@ from fastapi import (
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...db.models.audit_job import AuditJobStatus
 from ...db.session import AsyncSessionFactory, get_async_session
-from ...schemas import AuditJobListResponse, AuditJobResponse
+from ...schemas import AuditCorrections, AuditJobListResponse, AuditJobResponse
 from ...services import (
+    EmptyUpload,
+    MultipartUpload,
+    UploadTooLarge,
+    attach_bank_statements,
+    cancel_audit_job,
     create_or_get_audit_job,
     enqueue_audit_job,
+    enqueue_reaudit,
+    enqueue_reconciliation,
     get_audit_job,
     list_audit_jobs,
+    request_reaudit,
 )
 
 router = APIRouter(prefix="/audits", tags=["audits"])
 
 
+# The body is parsed by the handler itself (see services/uploads), so the
+# multipart schema FastAPI would derive from `File(...)` is declared here.
+_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {
+                        "files": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "Upload files to be audited.",
+                        }
+                    },
+                }
+            }
+        },
+    }
+}
+
+
 @router.post(
     "",
     response_model=AuditJobResponse,
     summary="Create a new fiscal audit",
+    openapi_extra=_UPLOAD_REQUEST_BODY,
 )
 async def create_audit_job(
+    request: Request,
     response: Response,
-    files: list[UploadFile] = File(..., description="Upload files to be audited."),
     idempotency_key: Annotated[str | None, Header(alias="Idempotency-Key")] = None,
     session: AsyncSession = Depends(get_async_session),
 ) -> AuditJobResponse:
@@ -54,19 +89,38 @@ async def create_audit_job(
             detail="Header 'Idempotency-Key' is required.",
         )
 
-    if not files:
+    content_type = request.headers.get("content-type", "")
+    content_length = request.headers.get("content-length")
+    if not content_type.lower().startswith("multipart/form-data"):
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="Send at least one file for audit.",
         )
 
     normalized_key = idempotency_key.strip()
     try:
+        # Files are written to storage while the request body streams in.
+        body = MultipartUpload(
+            request.stream(),
+            content_type,
+            field="files",
+            content_length=int(content_length) if content_length and content_length.isdigit() else None,
+        )
         job, created = await create_or_get_audit_job(
             session,
             idempotency_key=normalized_key,
-            files=files,
+            files=body,
         )
+    except UploadTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(exc),
+        ) from exc
+    except EmptyUpload as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Send at least one file for audit.",
+        ) from exc
     except ValueError as exc:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -74,7 +128,7 @@ async def create_audit_job(
         ) from exc
 
     if created:
-        enqueue_audit_job(job.id)
+        enqueue_audit_job(job)
         response.status_code = status.HTTP_202_ACCEPTED
     else:
         response.status_code = status.HTTP_200_OK
@@ -119,6 +173,103 @@ async def list_audits(
     )
 
 
+@router.post(
+    "/{job_id}/reconciliation",
+    response_model=AuditJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Reconcile an audit job against bank statements",
+)
+async def reconcile_audit_job(
+    job_id: UUID,
+    files: list[UploadFile] = File(..., description="Bank statement CSV files."),
+    session: AsyncSession = Depends(get_async_session),
+) -> AuditJobResponse:
+    """Attach bank statements to a completed audit and enqueue the reconciliation."""
+    job = await get_audit_job(session, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Audit job '{job_id}' not found.",
+        )
+    if job.status != AuditJobStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Audit job '{job_id}' must be completed before reconciliation.",
+        )
+
+    try:
+        job = await attach_bank_statements(session, job, files)
+    except UploadTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(exc),
+        ) from exc
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+
+    enqueue_reconciliation(job.id)
+    return AuditJobResponse.model_validate(job)
+
+
+@router.post(
+    "/{job_id}/reaudit",
+    response_model=AuditJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Re-audit a job with new corrections",
+)
+async def reaudit_audit_job(
+    job_id: UUID,
+    corrections: AuditCorrections,
+    session: AsyncSession = Depends(get_async_session),
+) -> AuditJobResponse:
+    """Replace the corrections of a completed audit and rebuild its report from the stored stages."""
+    job = await get_audit_job(session, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Audit job '{job_id}' not found.",
+        )
+    if job.status != AuditJobStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Audit job '{job_id}' must be completed before a re-audit.",
+        )
+
+    job = await request_reaudit(session, job, corrections.model_dump(by_alias=True))
+    enqueue_reaudit(job.id)
+    return AuditJobResponse.model_validate(job)
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=AuditJobResponse,
+    summary="Cancel a pending or running audit job",
+)
+async def cancel_audit(
+    job_id: UUID,
+    session: AsyncSession = Depends(get_async_session),
+) -> AuditJobResponse:
+    """Flag the job as cancelled, revoke its queued tasks and stop its running stages."""
+    job = await get_audit_job(session, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Audit job '{job_id}' not found.",
+        )
+
+    try:
+        job = await cancel_audit_job(session, job)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc),
+        ) from exc
+    return AuditJobResponse.model_validate(job)
+
+
 @router.get(
     "/{job_id}/events",
     summary="Stream audit job updates (SSE)",
@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...db.session import get_async_session
-from ...services.health import check_celery, check_database, overall_status
+from ...services.health import check_celery, check_database, check_scheduling, overall_status
 
 router = APIRouter(tags=["health"])
 
@@ -42,3 +42,15 @@ async def readiness_probe(
         "status": overall_status(checks.values()),
         "checks": checks,
     }
+
+
+@router.get(
+    "/scheduling",
+    summary="Audit queue time-to-start",
+    response_model=dict,
+)
+async def scheduling_probe() -> dict:
+    """
+    Seconds between creation and start of the recent jobs of each audit queue.
+    """
+    return check_scheduling()
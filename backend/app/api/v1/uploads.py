@@ -0,0 +1,228 @@
+# SPDX-License-Identifier: MIT
+"""Resumable upload session endpoints."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...core.config import get_settings
+from ...db.session import get_async_session
+from ...schemas import AuditJobResponse, UploadSessionCreate, UploadSessionResponse
+from ...services import (
+    ChunkChecksumMismatch,
+    UploadSessionConflict,
+    UploadTooLarge,
+    complete_upload_session,
+    enqueue_audit_job,
+    get_upload_session_store,
+    open_upload_session,
+)
+from ...services.upload_sessions import UploadSession
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+def _session_response(upload: UploadSession) -> UploadSessionResponse:
+    ttl = timedelta(seconds=get_settings().upload_session_ttl_seconds)
+    return UploadSessionResponse(
+        id=upload.id,
+        filename=upload.filename,
+        content_type=upload.content_type,
+        size=upload.size,
+        offset=upload.offset,
+        complete=upload.complete,
+        expires_at=datetime.fromtimestamp(upload.updated_at, tz=timezone.utc) + ttl,
+        job_id=upload.job_id,
+    )
+
+
+def _get_session_or_404(session_id: str) -> UploadSession:
+    upload = get_upload_session_store().get(session_id)
+    if upload is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Upload session '{session_id}' not found.",
+        )
+    return upload
+
+
+def _conflict(exc: UploadSessionConflict) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=str(exc),
+        headers={"Upload-Offset": str(exc.offset)},
+    )
+
+
+@router.post(
+    "",
+    response_model=UploadSessionResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Start a resumable upload",
+)
+async def create_upload_session(payload: UploadSessionCreate) -> UploadSessionResponse:
+    """Announce a file; its bytes are then sent in chunks with `PUT /uploads/{id}`."""
+    try:
+        upload = await asyncio.to_thread(
+            open_upload_session, payload.filename, payload.size, payload.content_type
+        )
+    except UploadTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(exc),
+        ) from exc
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    return _session_response(upload)
+
+
+@router.get(
+    "/{session_id}",
+    response_model=UploadSessionResponse,
+    summary="Retrieve the offset of an upload",
+)
+async def retrieve_upload_session(session_id: str, response: Response) -> UploadSessionResponse:
+    upload = await asyncio.to_thread(_get_session_or_404, session_id)
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return _session_response(upload)
+
+
+@router.put(
+    "/{session_id}",
+    response_model=UploadSessionResponse,
+    summary="Append a chunk to an upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+        }
+    },
+)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    response: Response,
+    content_range: Annotated[str, Header(alias="Content-Range")],
+    chunk_sha256: Annotated[str, Header(alias="X-Chunk-SHA256")],
+) -> UploadSessionResponse:
+    """
+    Append the bytes ``start-end`` of the file, which must start at the current offset.
+
+    A chunk starting elsewhere is rejected with `409 Conflict` and the
+    current offset in the ``Upload-Offset`` header.
+    """
+    match = _CONTENT_RANGE.fullmatch(content_range.strip())
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Header 'Content-Range' must be 'bytes <start>-<end>/<size>'.",
+        )
+    start, end = int(match.group(1)), int(match.group(2))
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Header 'Content-Range' ends before it starts.",
+        )
+
+    upload = await asyncio.to_thread(_get_session_or_404, session_id)
+    if match.group(3) != "*" and int(match.group(3)) != upload.size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The upload session was created for {upload.size} bytes.",
+        )
+
+    max_chunk = get_settings().upload_session_max_chunk_bytes
+    if end - start + 1 > max_chunk:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Chunks are limited to {max_chunk} bytes.",
+        )
+    chunk = bytearray()
+    async for data in request.stream():
+        chunk += data
+        if len(chunk) > end - start + 1:
+            break
+    if len(chunk) != end - start + 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The body does not match the length of 'Content-Range'.",
+        )
+
+    store = get_upload_session_store()
+    try:
+        upload = await asyncio.to_thread(store.append, upload, start, bytes(chunk), chunk_sha256)
+    except UploadSessionConflict as exc:
+        raise _conflict(exc) from exc
+    except (ChunkChecksumMismatch, ValueError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return _session_response(upload)
+
+
+@router.post(
+    "/{session_id}/complete",
+    response_model=AuditJobResponse,
+    summary="Create the audit of a finished upload",
+)
+async def complete_upload(
+    session_id: str,
+    response: Response,
+    idempotency_key: Annotated[str | None, Header(alias="Idempotency-Key")] = None,
+    session: AsyncSession = Depends(get_async_session),
+) -> AuditJobResponse:
+    """Turn a fully received upload into an audit job, as `POST /audits` would."""
+    if idempotency_key is None or not idempotency_key.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Header 'Idempotency-Key' is required.",
+        )
+
+    upload = await asyncio.to_thread(_get_session_or_404, session_id)
+    try:
+        job, created = await complete_upload_session(
+            session, upload, idempotency_key=idempotency_key.strip()
+        )
+    except UploadSessionConflict as exc:
+        raise _conflict(exc) from exc
+    except UploadTooLarge as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(exc),
+        ) from exc
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+
+    if created:
+        enqueue_audit_job(job)
+        response.status_code = status.HTTP_202_ACCEPTED
+    else:
+        response.status_code = status.HTTP_200_OK
+    return AuditJobResponse.model_validate(job)
+
+
+@router.delete(
+    "/{session_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Abandon an upload",
+)
+async def delete_upload_session(session_id: str) -> Response:
+    await asyncio.to_thread(_get_session_or_404, session_id)
+    await asyncio.to_thread(get_upload_session_store().discard, session_id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
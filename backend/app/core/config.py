@@ -8,7 +8,7 @@ consumed consistently across API handlers, workers and background tasks.
 
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, List
+from typing import Any, Dict, List
 
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -48,7 +48,56 @@ class Settings(BaseSettings):
         "jpg",
         "jpeg",
         "txt",
+        "zip",
     ]
+    # ZIP bundles may exceed the per-file limit; budgets below apply to the inflated members.
+    max_upload_archive_bytes: int = 100 * 1024 * 1024  # 100 MB
+    zip_max_members: int = 50_000
+    zip_max_uncompressed_bytes: int = 2 * 1024 * 1024 * 1024  # 2 GB
+    zip_max_member_bytes: int = 25 * 1024 * 1024  # 25 MB
+    zip_max_compression_ratio: int = 100
+    zip_member_batch_size: int = 500
+
+    # CSVs above this size are analysed in streaming mode under the memory ceiling.
+    csv_streaming_threshold_bytes: int = 8 * 1024 * 1024  # 8 MB
+    csv_stream_memory_limit_bytes: int = 32 * 1024 * 1024  # 32 MB
+
+    # Per-file analysis cache keyed by upload SHA-256 (shared by all workers).
+    analysis_cache_enabled: bool = True
+    analysis_cache_dir: str = "storage/cache/analysis"
+    analysis_cache_max_bytes: int = 512 * 1024 * 1024  # 512 MB
+    analysis_cache_ttl_seconds: int = 7 * 24 * 60 * 60  # 7 days
+
+    # Each `audits.import_file` task analyses its file in a child process (hard time
+    # limit, crash isolation) unless isolation is off; the members of a ZIP are parsed
+    # on a pool of `audit_worker_processes`.
+    audit_file_isolation: bool = True
+    audit_worker_processes: int = 4
+    audit_file_timeout_seconds: int = 300
+
+    # Accepted uploads are converted once into Arrow IPC files next to the originals.
+    upload_staging_enabled: bool = True
+    upload_staging_batch_rows: int = 65_536
+
+    # Jobs above either threshold run on the bulk queue; tenants share each queue by
+    # weighted round robin (tenant = idempotency-key prefix before the separator).
+    audit_bulk_threshold_files: int = 5
+    audit_bulk_threshold_bytes: int = 10 * 1024 * 1024  # 10 MB
+    audit_tenant_separator: str = ":"
+    audit_tenant_weights: Dict[str, int] = {}
+
+    # Uploads are stored once per SHA-256 and linked into each job (see services/blob_store).
+    upload_dedup_enabled: bool = True
+    upload_blob_gc_grace_seconds: int = 60 * 60
+    # Files of one upload request written to disk at the same time (off the event loop).
+    upload_write_concurrency: int = 4
+    # Resumable upload sessions (see services/upload_sessions).
+    upload_session_max_chunk_bytes: int = 8 * 1024 * 1024  # 8 MB
+    upload_session_ttl_seconds: int = 24 * 60 * 60
+
+    # Optional `prefix,label` CSVs extending the built-in CFOP/NCM classification references.
+    classification_cfop_table: str | None = None
+    classification_ncm_table: str | None = None
 
     log_level: str = "INFO"
 
@@ -105,6 +154,17 @@ class Settings(BaseSettings):
         path.mkdir(parents=True, exist_ok=True)
         return path
 
+    @property
+    def analysis_cache_dir_path(self) -> Path:
+        """
+        Resolve and ensure the directory used by the per-file analysis cache.
+        """
+        path = Path(self.analysis_cache_dir).expanduser()
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
 
 @lru_cache
 def get_settings() -> Settings:
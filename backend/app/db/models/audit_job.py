@@ -76,3 +76,6 @@ class AuditJob(Base):
         self.status = AuditJobStatus.FAILED
         if error is not None:
             self.error_payload = error
+
+    def mark_cancelled(self) -> None:
+        self.status = AuditJobStatus.CANCELLED
@@ -8,18 +8,24 @@ configuration is shared across API handlers, workers and scripts.
 
 from collections.abc import AsyncGenerator
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from ..core.config import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(
-    settings.database_url,
-    future=True,
-    echo=settings.environment == "development",
-    pool_pre_ping=True,
-)
+
+def build_engine() -> AsyncEngine:
+    """Create an engine with the application settings (one per process and event loop)."""
+    return create_async_engine(
+        settings.database_url,
+        future=True,
+        echo=settings.environment == "development",
+        pool_pre_ping=True,
+    )
+
+
+engine = build_engine()
 
 AsyncSessionFactory = async_sessionmaker(
     bind=engine,
@@ -34,4 +40,4 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """
     async with AsyncSessionFactory() as session:
         yield session
-__all__ = ["engine", "get_async_session", "AsyncSessionFactory"]
+__all__ = ["engine", "build_engine", "get_async_session", "AsyncSessionFactory"]
@@ -1,6 +1,13 @@
 # SPDX-License-Identifier: MIT
 """Pydantic schemas exports."""
 
-from .audit import AuditJobListResponse, AuditJobResponse
+from .audit import AuditCorrections, AuditJobListResponse, AuditJobResponse
+from .upload import UploadSessionCreate, UploadSessionResponse
 
-__all__ = ["AuditJobResponse", "AuditJobListResponse"]
+__all__ = [
+    "AuditCorrections",
+    "AuditJobResponse",
+    "AuditJobListResponse",
+    "UploadSessionCreate",
+    "UploadSessionResponse",
+]
@@ -7,10 +7,11 @@ from datetime import datetime
 from typing import Any, List
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from pydantic.config import ConfigDict
 
 from ..db.models.audit_job import AuditJobStatus
+from ..services.classification import OPERATION_TYPES
 
 
 class AuditJobResponse(BaseModel):
@@ -37,3 +38,27 @@ class AuditJobListResponse(BaseModel):
     total: int
     limit: int
     offset: int
+
+
+class AuditCorrections(BaseModel):
+    """User corrections of an audit, keyed by document name."""
+
+    classification: dict[str, str] = Field(
+        default_factory=dict,
+        description="Corrected operation type per document.",
+    )
+    cost_center: dict[str, str] = Field(
+        default_factory=dict,
+        alias="costCenter",
+        description="Cost center per document.",
+    )
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    @field_validator("classification")
+    @classmethod
+    def _known_operation_types(cls, value: dict[str, str]) -> dict[str, str]:
+        unknown = set(value.values()) - set(OPERATION_TYPES.values())
+        if unknown:
+            raise ValueError(f"Unknown operation types: {', '.join(sorted(unknown))}.")
+        return value
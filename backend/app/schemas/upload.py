@@ -0,0 +1,29 @@
+# SPDX-License-Identifier: MIT
+"""Pydantic schemas for resumable upload sessions."""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class UploadSessionCreate(BaseModel):
+    """File announced when an upload session starts."""
+
+    filename: str = Field(min_length=1, max_length=255)
+    size: int = Field(gt=0, description="Total size of the file in bytes.")
+    content_type: str | None = Field(default=None, max_length=255)
+
+
+class UploadSessionResponse(BaseModel):
+    """State of an upload session."""
+
+    id: str
+    filename: str
+    content_type: str | None = None
+    size: int
+    offset: int = Field(description="Bytes received so far; the next chunk starts here.")
+    complete: bool
+    expires_at: datetime
+    job_id: str | None = None
@@ -2,15 +2,41 @@
 """Domain services exports."""
 
 from .audit import (
+    attach_bank_statements,
+    cancel_audit_job,
+    complete_upload_session,
     create_or_get_audit_job,
     enqueue_audit_job,
+    enqueue_reaudit,
+    enqueue_reconciliation,
     get_audit_job,
     list_audit_jobs,
+    request_reaudit,
 )
+from .upload_sessions import (
+    ChunkChecksumMismatch,
+    UploadSessionConflict,
+    get_upload_session_store,
+    open_upload_session,
+)
+from .uploads import EmptyUpload, MultipartUpload, UploadTooLarge
 
 __all__ = [
+    "ChunkChecksumMismatch",
+    "EmptyUpload",
+    "MultipartUpload",
+    "UploadSessionConflict",
+    "UploadTooLarge",
+    "attach_bank_statements",
+    "cancel_audit_job",
+    "complete_upload_session",
     "create_or_get_audit_job",
     "enqueue_audit_job",
+    "enqueue_reaudit",
+    "enqueue_reconciliation",
     "get_audit_job",
+    "get_upload_session_store",
     "list_audit_jobs",
+    "open_upload_session",
+    "request_reaudit",
 ]
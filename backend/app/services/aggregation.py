@@ -0,0 +1,247 @@
+# SPDX-License-Identifier: MIT
+"""
+Exact accountant metrics over a job's items.
+
+Port of `runAccountantAnalysis` (agents/accountantAgent.ts). The frontend
+sums JS floats and finds the total of every NFe with ``allItems.find``
+inside a reduce over the distinct ``nfe_id``s. Here money is converted once
+to integer centavos, so totals are exact and do not depend on item order.
+Each grouping column is hash-encoded once and the codes combined into one
+integer per (emitter, CFOP, NCM, month) cell, so the items go through a
+single sort and ``reduceat``; the per-dimension breakdowns and the job
+totals are roll-ups of those cells. NFe totals are counted once per ``nfe_id`` from its first
+item, like the frontend.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable
+from typing import TypedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .archive import ARCHIVE_MEMBER_COLUMN
+from .cross_validation import drop_error_documents
+from .fiscal_rules import RULE_COLUMNS
+from .rule_compiler import numeric_values, text_values
+
+# Columns read from each item table; the rule columns decide which
+# documents are audited as ERRO and left out, as in the frontend.
+AGGREGATION_COLUMNS = tuple(
+    dict.fromkeys(
+        (
+            "nfe_id",
+            "data_emissao",
+            "valor_total_nfe",
+            "emitente_cnpj",
+            "emitente_nome",
+            "produto_cfop",
+            "produto_ncm",
+            "produto_valor_total",
+            "produto_valor_icms",
+            "produto_valor_pis",
+            "produto_valor_cofins",
+            ARCHIVE_MEMBER_COLUMN,
+        )
+        + RULE_COLUMNS
+    )
+)
+# Grouping columns of the aggregated table, one breakdown each.
+DIMENSIONS = ("emitente", "cfop", "ncm", "mes")
+
+# Item money columns -> centavo columns of the aggregated table.
+_AMOUNTS = {
+    "produto_valor_total": "produtos",
+    "produto_valor_icms": "icms",
+    "produto_valor_pis": "pis",
+    "produto_valor_cofins": "cofins",
+}
+# Dimensions fixed per NFe, which can also carry the NFe totals.
+_HEADER_DIMENSIONS = ("emitente", "mes")
+
+
+class AggregateRow(TypedDict):
+    key: str
+    items: int
+    nfes: int | None
+    nfeCents: int | None
+    productCents: int
+    icmsCents: int
+    pisCents: int
+    cofinsCents: int
+
+
+class AggregationResult(TypedDict):
+    nfes: int
+    items: int
+    nfeCents: int
+    productCents: int
+    icmsCents: int
+    pisCents: int
+    cofinsCents: int
+    breakdown: dict[str, list[AggregateRow]]
+    seconds: float
+
+
+def _centavos(values: np.ndarray) -> np.ndarray:
+    return np.rint(values * 100).astype(np.int64)
+
+
+def _months(values: pa.Array) -> pa.Array:
+    """``YYYY-MM`` of ISO (``2024-01-15...``) or ``15/01/2024`` dates; ``""`` when unknown."""
+    dates = pc.utf8_slice_codeunits(pc.utf8_trim_whitespace(values), 0, 10)
+    parsed = pc.coalesce(
+        pc.strptime(dates, format="%Y-%m-%d", unit="s", error_is_null=True),
+        pc.strptime(dates, format="%d/%m/%Y", unit="s", error_is_null=True),
+    )
+    return pc.strftime(parsed, format="%Y-%m").cast(pa.large_string()).fill_null("")
+
+
+def collect_aggregation_items(sources: Iterable[tuple[str, pa.Table]]) -> pa.Table:
+    """
+    One table of the job's valid items with money in centavos.
+
+    Documents the auditor marks as ERRO are left out. The emitter is its
+    CNPJ, or its name when the CNPJ is missing.
+    """
+    parts: list[pa.Table] = []
+    for _, table in sources:
+        table = drop_error_documents(table)
+        if table is None or not table.num_rows:
+            continue
+        cnpj = text_values(table, "emitente_cnpj")
+        columns = {
+            "nfe_id": text_values(table, "nfe_id"),
+            "emitente": pc.if_else(pc.equal(cnpj, ""), text_values(table, "emitente_nome"), cnpj),
+            "cfop": text_values(table, "produto_cfop"),
+            "ncm": text_values(table, "produto_ncm"),
+            "mes": _months(text_values(table, "data_emissao")),
+            "nfe": pa.array(_centavos(numeric_values(table, "valor_total_nfe"))),
+        }
+        for source, column in _AMOUNTS.items():
+            columns[column] = pa.array(_centavos(numeric_values(table, source)))
+        parts.append(pa.table(columns))
+
+    if not parts:
+        empty = {column: pa.array([], type=pa.large_string()) for column in ("nfe_id", *DIMENSIONS)}
+        empty.update({column: pa.array([], type=pa.int64()) for column in ["nfe", *_AMOUNTS.values()]})
+        return pa.table(empty)
+    return pa.concat_tables(parts)
+
+
+def _encode(values: pa.ChunkedArray) -> tuple[np.ndarray, list[str]]:
+    encoded = pc.dictionary_encode(values.combine_chunks())
+    return encoded.indices.cast(pa.int64()).to_numpy(zero_copy_only=False), encoded.dictionary.to_pylist()
+
+
+def _first_of_each_nfe(items: pa.Table) -> np.ndarray:
+    """Row of the first item of every non-empty ``nfe_id``, in table order."""
+    ids, values = _encode(items.column("nfe_id"))
+    first = np.full(len(values), items.num_rows, dtype=np.int64)
+    np.minimum.at(first, ids, np.arange(items.num_rows))
+    return np.sort(first[np.array([value != "" for value in values], dtype=bool)])
+
+
+def _sums(groups: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    """Exact int64 sums of ``values`` per group (``np.bincount`` would go through float64)."""
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, groups, values)
+    return totals
+
+
+def _rows(
+    keys: list[str],
+    items: np.ndarray,
+    amounts: dict[str, np.ndarray],
+    nfes: tuple[np.ndarray, np.ndarray] | None,
+) -> list[AggregateRow]:
+    """Breakdown rows of one dimension, largest product total first."""
+    order = sorted(range(len(keys)), key=lambda index: (-int(amounts["produtos"][index]), keys[index]))
+    return [
+        {
+            "key": keys[index],
+            "items": int(items[index]),
+            "nfes": int(nfes[0][index]) if nfes is not None else None,
+            "nfeCents": int(nfes[1][index]) if nfes is not None else None,
+            "productCents": int(amounts["produtos"][index]),
+            "icmsCents": int(amounts["icms"][index]),
+            "pisCents": int(amounts["pis"][index]),
+            "cofinsCents": int(amounts["cofins"][index]),
+        }
+        for index in order
+    ]
+
+
+def aggregate_items(items: pa.Table) -> AggregationResult:
+    """
+    NFe, product and ICMS/PIS/COFINS totals, overall and per emitter, CFOP, NCM and month.
+
+    ``items`` comes from `collect_aggregation_items`. All money is integer
+    centavos; NFe totals are only broken down by the dimensions fixed per NFe
+    (emitter and month).
+    """
+    started = time.perf_counter()
+    rows = items.num_rows
+    encoded = {key: _encode(items.column(key)) for key in DIMENSIONS}
+    # One mixed-radix code per (emitter, CFOP, NCM, month) cell, then one sorted pass.
+    code = np.zeros(rows, dtype=np.int64)
+    for indices, values in encoded.values():
+        code = code * max(len(values), 1) + indices
+    order = np.argsort(code, kind="stable")
+    code = code[order]
+    starts = np.flatnonzero(np.concatenate(([True], code[1:] != code[:-1]))) if rows else np.zeros(0, np.int64)
+    cell_items = np.diff(np.append(starts, rows))
+    cell_amounts = {
+        column: np.add.reduceat(items.column(column).to_numpy()[order], starts)
+        if rows
+        else np.zeros(0, np.int64)
+        for column in _AMOUNTS.values()
+    }
+    # Cell -> index of each dimension, decoding the radix from the last dimension.
+    cell_code = code[starts]
+    cell_index: dict[str, np.ndarray] = {}
+    for key in reversed(DIMENSIONS):
+        size = max(len(encoded[key][1]), 1)
+        cell_index[key] = cell_code % size
+        cell_code = cell_code // size
+
+    first = _first_of_each_nfe(items)
+    nfe_cents = items.column("nfe").to_numpy()[first] if rows else np.zeros(0, np.int64)
+    breakdown: dict[str, list[AggregateRow]] = {}
+    for key in DIMENSIONS:
+        keys = encoded[key][1]
+        nfes = None
+        if key in _HEADER_DIMENSIONS:
+            header = encoded[key][0][first]
+            nfes = (np.bincount(header, minlength=len(keys)), _sums(header, nfe_cents, len(keys)))
+        breakdown[key] = _rows(
+            keys,
+            _sums(cell_index[key], cell_items, len(keys)),
+            {column: _sums(cell_index[key], values, len(keys)) for column, values in cell_amounts.items()},
+            nfes,
+        )
+
+    return {
+        "nfes": len(first),
+        "items": rows,
+        "nfeCents": int(nfe_cents.sum()),
+        "productCents": int(cell_amounts["produtos"].sum()),
+        "icmsCents": int(cell_amounts["icms"].sum()),
+        "pisCents": int(cell_amounts["pis"].sum()),
+        "cofinsCents": int(cell_amounts["cofins"].sum()),
+        "breakdown": breakdown,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+__all__ = [
+    "AGGREGATION_COLUMNS",
+    "AggregateRow",
+    "AggregationResult",
+    "DIMENSIONS",
+    "aggregate_items",
+    "collect_aggregation_items",
+]
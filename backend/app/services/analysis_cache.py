@@ -0,0 +1,176 @@
+# SPDX-License-Identifier: MIT
+"""
+Content-addressed cache for per-file analysis results.
+
+Entries are keyed by the upload SHA-256 computed in `_persist_files` plus the
+analyzer version, so re-uploading the same bundle under a new idempotency key
+skips parsing and analysis. The cache lives on disk next to the uploads so
+every worker process shares it; recency is tracked through the file mtime
+(LRU eviction once the size budget is exceeded) and entries expire after a TTL
+counted from when they were written.
+
+Eviction scans the whole cache, so it is amortised: each process keeps a
+running estimate of the cache size per root, grown by every store, and only
+scans on its first store, when the estimate exceeds the budget, or every
+``_EVICT_EVERY_STORES`` stores to catch up with the other processes and
+expire old entries. The cache is an optimisation: a store that fails on the
+filesystem (full disk, permissions) is logged and skipped, never raised.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from ..core.config import get_settings
+
+logger = structlog.get_logger(__name__)
+
+_ENTRY_SUFFIX = ".json"
+_EVICT_EVERY_STORES = 64
+
+
+@dataclass(slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+@dataclass(slots=True)
+class _Usage:
+    """What this process knows of the size of one cache root."""
+
+    estimated_bytes: int | None = None
+    stores_since_scan: int = 0
+
+
+# Per cache root, shared by the short-lived caches of every task of the process.
+_usage: dict[Path, _Usage] = {}
+
+
+class AnalysisCache:
+    """Size-bounded LRU cache with TTL, keyed by ``(sha256, version)``."""
+
+    def __init__(self, root: Path, *, max_bytes: int, ttl_seconds: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _entry_path(self, sha256: str, version: str) -> Path:
+        safe_version = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in version)
+        # Two-level fan-out keeps directories small with many cached uploads.
+        return self.root / sha256[:2] / f"{sha256}-{safe_version}{_ENTRY_SUFFIX}"
+
+    def get(self, sha256: str | None, version: str) -> dict[str, Any] | None:
+        """Return the cached payload or ``None``; refreshes recency on a hit."""
+        if not sha256:
+            self.stats.misses += 1
+            return None
+        path = self._entry_path(sha256, version)
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                envelope = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.stats.misses += 1
+            return None
+
+        if time.time() - envelope.get("created_at", 0) > self.ttl_seconds:
+            path.unlink(missing_ok=True)
+            self.stats.misses += 1
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # pragma: no cover - evicted concurrently
+            pass
+        self.stats.hits += 1
+        return envelope.get("payload")
+
+    def put(self, sha256: str | None, version: str, payload: dict[str, Any]) -> None:
+        """Store ``payload`` atomically and evict least recently used entries."""
+        if not sha256:
+            return
+        path = self._entry_path(sha256, version)
+        tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+        envelope = {"created_at": time.time(), "version": version, "payload": payload}
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump(envelope, handle, allow_nan=False)
+                size = handle.tell()
+            os.replace(tmp_path, path)
+        except (TypeError, ValueError, OSError) as exc:
+            try:
+                tmp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+            logger.warning("analysis_cache_store_skipped", sha256=sha256, error=str(exc))
+            return
+        self.stats.stores += 1
+
+        usage = _usage.setdefault(self.root, _Usage())
+        usage.stores_since_scan += 1
+        if usage.estimated_bytes is not None:
+            usage.estimated_bytes += size
+            if usage.estimated_bytes <= self.max_bytes and usage.stores_since_scan < _EVICT_EVERY_STORES:
+                return
+        try:
+            usage.estimated_bytes = self._evict()
+        except OSError as exc:
+            logger.warning("analysis_cache_eviction_failed", error=str(exc))
+        usage.stores_since_scan = 0
+
+    def _evict(self) -> int:
+        """Remove expired and least recently used entries; returns the size left."""
+        entries: list[tuple[float, int, Path]] = []
+        total = 0
+        now = time.time()
+        for path in self.root.glob(f"*/*{_ENTRY_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        for mtime, size, path in entries:
+            expired = now - mtime > self.ttl_seconds
+            if total <= self.max_bytes and not expired:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.stats.evictions += 1
+        return total
+
+
+def get_analysis_cache() -> AnalysisCache:
+    """Build a cache bound to the configured directory and limits."""
+    settings = get_settings()
+    return AnalysisCache(
+        settings.analysis_cache_dir_path,
+        max_bytes=settings.analysis_cache_max_bytes,
+        ttl_seconds=settings.analysis_cache_ttl_seconds,
+    )
+
+
+__all__ = ["AnalysisCache", "CacheStats", "get_analysis_cache"]
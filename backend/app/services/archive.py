@@ -0,0 +1,224 @@
+# SPDX-License-Identifier: MIT
+"""
+Streaming ingestion of ZIP bundles of NFe XMLs.
+
+Members are decompressed straight from the stored archive into the parser;
+nothing is extracted to disk. A first pass (`scan_archive`) reads every
+member once to enforce the zip-bomb budgets on the bytes actually inflated
+(declared sizes in the central directory are not trusted) and to hash it, so
+members repeated inside the archive, or already uploaded on their own in the
+same job, are parsed only once. The unique members are then parsed in chunks
+(`parse_archive_members`) that the worker fans out to its process pool.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import zipfile
+import zlib
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+
+import pyarrow as pa
+import structlog
+
+from .nfe_parser import NFE_ITEM_SCHEMA, NFeParseError, parse_nfe_stream
+
+logger = structlog.get_logger(__name__)
+
+ARCHIVE_MEMBER_COLUMN = "arquivo"
+ARCHIVE_ITEM_SCHEMA = pa.schema([pa.field(ARCHIVE_MEMBER_COLUMN, pa.large_string())] + list(NFE_ITEM_SCHEMA))
+SUPPORTED_MEMBER_SUFFIXES = (".xml",)
+
+_READ_BLOCK_BYTES = 64 * 1024
+# Members smaller than this are never rejected for their compression ratio.
+_RATIO_MIN_BYTES = 1024 * 1024
+# Cap the member names echoed back in summaries; counts stay exact.
+_SUMMARY_LIST_LIMIT = 50
+
+
+class ArchiveError(RuntimeError):
+    """Raised when an archive is unreadable or exceeds the configured budgets."""
+
+
+@dataclass(slots=True, frozen=True)
+class ArchiveLimits:
+    max_members: int
+    max_total_bytes: int
+    max_member_bytes: int
+    max_compression_ratio: int
+
+
+@dataclass(slots=True)
+class ArchiveManifest:
+    members: list[str] = field(default_factory=list)
+    duplicates: list[dict[str, str]] = field(default_factory=list)
+    skipped: list[str] = field(default_factory=list)
+    errors: list[dict[str, str]] = field(default_factory=list)
+    hashes: dict[str, str] = field(default_factory=dict)
+    uncompressed_bytes: int = 0
+    compressed_bytes: int = 0
+
+    def summary(self) -> dict[str, object]:
+        return {
+            "members": len(self.members),
+            "duplicates": len(self.duplicates),
+            "skipped": len(self.skipped),
+            "errors": len(self.errors),
+            "uncompressed_bytes": self.uncompressed_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "duplicate_members": self.duplicates[:_SUMMARY_LIST_LIMIT],
+            "skipped_members": self.skipped[:_SUMMARY_LIST_LIMIT],
+            "member_errors": self.errors[:_SUMMARY_LIST_LIMIT],
+        }
+
+
+def _open_archive(path: Path) -> zipfile.ZipFile:
+    try:
+        return zipfile.ZipFile(path)
+    except (zipfile.BadZipFile, OSError) as exc:
+        raise ArchiveError(f"Arquivo ZIP inválido ou corrompido: {exc}") from exc
+
+
+def _is_supported(info: zipfile.ZipInfo) -> bool:
+    name = PurePosixPath(info.filename)
+    if info.is_dir() or name.name.startswith(".") or "__MACOSX" in name.parts:
+        return False
+    return name.suffix.lower() in SUPPORTED_MEMBER_SUFFIXES
+
+
+def _read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int) -> bytes:
+    """Inflate one member, stopping as soon as it exceeds ``max_bytes``."""
+    buffer = bytearray()
+    with archive.open(info) as member:
+        while True:
+            block = member.read(_READ_BLOCK_BYTES)
+            if not block:
+                break
+            buffer += block
+            if len(buffer) > max_bytes:
+                raise ArchiveError(
+                    f"O item '{info.filename}' excede o limite de {max_bytes} bytes descompactados."
+                )
+    return bytes(buffer)
+
+
+def scan_archive(
+    path: Path,
+    limits: ArchiveLimits,
+    *,
+    known_hashes: Iterable[str] = (),
+) -> ArchiveManifest:
+    """
+    Validate budgets, hash every supported member and drop duplicates.
+
+    ``known_hashes`` are SHA-256 digests of files already in the job; members
+    with the same bytes are reported as duplicates instead of parsed again.
+    Raises ``ArchiveError`` as soon as a budget is exceeded.
+    """
+    manifest = ArchiveManifest()
+    seen: dict[str, str] = {digest: "(upload)" for digest in known_hashes}
+    with _open_archive(path) as archive:
+        infos = archive.infolist()
+        if len(infos) > limits.max_members:
+            raise ArchiveError(
+                f"O arquivo ZIP contém {len(infos)} itens; o limite é {limits.max_members}."
+            )
+        for info in infos:
+            if not _is_supported(info):
+                if not info.is_dir():
+                    manifest.skipped.append(info.filename)
+                continue
+            if info.flag_bits & 0x1:
+                manifest.errors.append({"member": info.filename, "error": "Item criptografado."})
+                continue
+
+            remaining = limits.max_total_bytes - manifest.uncompressed_bytes
+            try:
+                data = _read_member(archive, info, min(limits.max_member_bytes, remaining))
+            except ArchiveError:
+                if remaining < limits.max_member_bytes:
+                    raise ArchiveError(
+                        "O conteúdo descompactado do arquivo ZIP excede o limite de "
+                        f"{limits.max_total_bytes} bytes."
+                    ) from None
+                raise
+            except (zipfile.BadZipFile, zlib.error, OSError, EOFError, NotImplementedError) as exc:
+                manifest.errors.append({"member": info.filename, "error": str(exc)})
+                continue
+
+            size = len(data)
+            if size > _RATIO_MIN_BYTES and size > limits.max_compression_ratio * max(info.compress_size, 1):
+                raise ArchiveError(
+                    f"O item '{info.filename}' tem taxa de compressão suspeita "
+                    f"({size // max(info.compress_size, 1)}:1)."
+                )
+            manifest.uncompressed_bytes += size
+            manifest.compressed_bytes += info.compress_size
+
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in seen:
+                manifest.duplicates.append({"member": info.filename, "duplicate_of": seen[digest]})
+                continue
+            seen[digest] = info.filename
+            manifest.hashes[info.filename] = digest
+            manifest.members.append(info.filename)
+
+    logger.info(
+        "archive_scanned",
+        archive=path.name,
+        members=len(manifest.members),
+        duplicates=len(manifest.duplicates),
+        skipped=len(manifest.skipped),
+        uncompressed_bytes=manifest.uncompressed_bytes,
+    )
+    return manifest
+
+
+def parse_archive_members(
+    path: Path,
+    names: Sequence[str],
+    *,
+    max_member_bytes: int,
+) -> tuple[pa.Table, list[dict[str, str]]]:
+    """
+    Parse the given members into one item table tagged with the member name.
+
+    A member that is malformed or not an NFe is reported in the returned
+    errors and does not affect the others.
+    """
+    tables: list[pa.Table] = []
+    errors: list[dict[str, str]] = []
+    with _open_archive(path) as archive:
+        for name in names:
+            try:
+                data = _read_member(archive, archive.getinfo(name), max_member_bytes)
+                result = parse_nfe_stream(io.BytesIO(data), filename=name)
+            except (
+                ArchiveError, NFeParseError, KeyError, zipfile.BadZipFile, zlib.error, OSError, EOFError
+            ) as exc:
+                errors.append({"member": name, "error": str(exc)})
+                continue
+            if not result.is_nfe:
+                errors.append({"member": name, "error": "XML não é uma NFe."})
+                continue
+            member = pa.array([name] * result.table.num_rows, type=pa.large_string())
+            tables.append(result.table.add_column(0, ARCHIVE_MEMBER_COLUMN, member))
+
+    if not tables:
+        return ARCHIVE_ITEM_SCHEMA.empty_table(), errors
+    return pa.concat_tables(tables), errors
+
+
+__all__ = [
+    "ARCHIVE_ITEM_SCHEMA",
+    "ARCHIVE_MEMBER_COLUMN",
+    "ArchiveError",
+    "ArchiveLimits",
+    "ArchiveManifest",
+    "SUPPORTED_MEMBER_SUFFIXES",
+    "parse_archive_members",
+    "scan_archive",
+]
@@ -3,10 +3,8 @@
 
 from __future__ import annotations
 
-import hashlib
+import asyncio
 import secrets
-import shutil
-from pathlib import Path
 from typing import Sequence, Tuple
 from uuid import UUID
 
@@ -18,12 +16,19 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..core.config import get_settings
 from ..db.models import AuditJob
+from ..db.models.audit_job import AuditJobStatus
 from ..workers import celery_app
+from ..workers.cancellation import request_cancellation
+from ..workers.scheduling import INTERACTIVE_QUEUE, admit, queue_for_job, tenant_of
+from .upload_sessions import UploadSession, get_upload_session_store
+from .uploads import MultipartUpload, UploadBatch
 
 logger = structlog.get_logger(__name__)
 
 _AUDIT_PROCESS_TASK = "audits.process"
-_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+_AUDIT_RECONCILE_TASK = "audits.reconcile"
+_AUDIT_REAUDIT_TASK = "audits.reaudit"
+_STATEMENTS_DIR = "statements"
 
 
 async def _get_by_idempotency_key(
@@ -74,78 +79,34 @@ def _humanize_bytes(size: int) -> str:
     return f"{size:.1f} PB"
 
 
-async def _persist_files(job_id: UUID, files: Sequence[UploadFile]) -> tuple[list[dict], str, str]:
+async def _persist_files(
+    job_id: UUID,
+    files: Sequence[UploadFile] | MultipartUpload | UploadSession,
+    *,
+    subdir: str | None = None,
+    allowed_extensions: Sequence[str] | None = None,
+) -> tuple[list[dict], str, str]:
     settings = get_settings()
     base_dir = settings.uploads_dir_path
     job_dir = base_dir / str(job_id)
-    job_dir.mkdir(parents=True, exist_ok=True)
-
-    stored: list[dict] = []
-    total_size = 0
-    max_files = settings.max_upload_files
-    max_file_bytes = settings.max_upload_file_bytes
-    max_job_bytes = settings.max_upload_job_bytes
-    allowed_extensions = settings.allowed_upload_extensions or []
-
-    if max_files and len(files) > max_files:
-        raise ValueError(f"Limite máximo de {max_files} arquivos por auditoria excedido.")
-
-    try:
-        for upload in files:
-            original_name = upload.filename or "arquivo-sem-nome"
-            extension = Path(original_name).suffix.lower().lstrip(".")
-
-            if allowed_extensions and extension not in allowed_extensions:
-                raise ValueError(
-                    f"O arquivo '{original_name}' possui extensão não suportada. "
-                    f"Permitidos: {', '.join(allowed_extensions)}."
-                )
-
-            suffix = Path(upload.filename or "").suffix
-            stored_name = f"{secrets.token_hex(16)}{suffix}"
-            destination = job_dir / stored_name
-
-            sha256 = hashlib.sha256()
-            size = 0
-
-            with destination.open("wb") as buffer:
-                while True:
-                    chunk = await upload.read(_CHUNK_SIZE)
-                    if not chunk:
-                        break
-                    buffer.write(chunk)
-                    size += len(chunk)
-                    sha256.update(chunk)
-
-                    if max_file_bytes and size > max_file_bytes:
-                        raise ValueError(
-                            f"O arquivo '{original_name}' excede o limite de {max_file_bytes / (1024 * 1024):.0f} MB."
-                        )
-
-                total_after_file = total_size + size
-                if max_job_bytes and total_after_file > max_job_bytes:
-                    raise ValueError(
-                        f"O volume total da auditoria excede o limite de {max_job_bytes / (1024 * 1024):.0f} MB."
-                    )
-
-            await upload.seek(0)
-            total_size += size
-
-            stored.append(
-                {
-                    "original_name": upload.filename,
-                    "stored_name": stored_name,
-                    "content_type": upload.content_type,
-                    "size": size,
-                    "sha256": sha256.hexdigest(),
-                    "stored_path": str(destination.relative_to(base_dir)),
-                }
-            )
-    except Exception:
-        shutil.rmtree(job_dir, ignore_errors=True)
-        raise
-
+    if subdir is not None:
+        # Files added to an existing job: a failure only removes this batch.
+        job_dir = job_dir / subdir
+
+    batch = UploadBatch(settings, job_dir, allowed_extensions=allowed_extensions)
+    if isinstance(files, MultipartUpload):
+        stored = await batch.receive(files)
+    elif isinstance(files, UploadSession):
+        stored = await batch.adopt(files.path, files.filename, files.content_type, files.size, files.sha256)
+    else:
+        stored = await batch.store_uploads(files)
+
+    total_size = sum(entry["size"] for entry in stored)
     summary = f"{len(stored)} file(s) • {_humanize_bytes(total_size)}"
+    deduplicated_files = sum(entry["deduplicated"] for entry in stored)
+    if deduplicated_files:
+        summary += f" • {deduplicated_files} deduplicated"
+        logger.info("audit_upload_deduplicated", job_id=str(job_id), files=deduplicated_files)
     storage_path = str(job_dir.relative_to(base_dir))
     return stored, summary, storage_path
 
@@ -154,9 +115,15 @@ async def create_or_get_audit_job(
     session: AsyncSession,
     *,
     idempotency_key: str,
-    files: Sequence[UploadFile],
+    files: Sequence[UploadFile] | MultipartUpload | UploadSession,
 ) -> Tuple[AuditJob, bool]:
-    """Create a new audit job or return the existing one for the idempotency key."""
+    """
+    Create a new audit job or return the existing one for the idempotency key.
+
+    A `MultipartUpload` is only read when the job is new, straight into its
+    storage; an existing job returns before any of the body is received. A
+    sealed `UploadSession` is linked into the job as it is.
+    """
 
     existing = await _get_by_idempotency_key(session, idempotency_key)
     if existing:
@@ -204,7 +171,111 @@ async def create_or_get_audit_job(
     return job, True
 
 
-def enqueue_audit_job(job_id: UUID) -> None:
-    """Send the audit job to the Celery queue for processing."""
-    celery_app.send_task(_AUDIT_PROCESS_TASK, args=[str(job_id)])
-    logger.info("audit_job_enqueued", job_id=str(job_id))
+async def complete_upload_session(
+    session: AsyncSession, upload: UploadSession, *, idempotency_key: str
+) -> Tuple[AuditJob, bool]:
+    """
+    Create the audit job of a fully received upload session.
+
+    The file hash was computed while the chunks arrived, so the data is only
+    linked into the job. The session stays locked until the job is committed
+    and recorded in it: a concurrent or retried completion, whatever its
+    idempotency key, returns the job created the first time.
+    """
+    store = get_upload_session_store()
+    async with store.completing(upload.id) as current:
+        if current is None:
+            raise ValueError("A sessão de upload não existe mais.")
+        if current.job_id is not None:
+            job = await get_audit_job(session, UUID(current.job_id))
+            if job is not None:
+                return job, False
+            raise ValueError("A auditoria criada por esta sessão de upload não existe mais.")
+
+        current = await asyncio.to_thread(store.seal, current)
+        job, created = await create_or_get_audit_job(session, idempotency_key=idempotency_key, files=current)
+        if created:
+            await asyncio.to_thread(store.mark_completed, current, str(job.id))
+    return job, created
+
+
+def enqueue_audit_job(job: AuditJob) -> None:
+    """Queue the job for fair admission on the queue matching its size."""
+    queue = queue_for_job(job.input_payload or [])
+    tenant = tenant_of(job.idempotency_key)
+    # Without the admission lists (Redis unavailable) the message starts this very job.
+    options = {"kwargs": {"fair": True}} if admit(queue, tenant, str(job.id)) else {}
+    celery_app.send_task(_AUDIT_PROCESS_TASK, args=[str(job.id)], queue=queue, **options)
+    logger.info("audit_job_enqueued", job_id=str(job.id), queue=queue, tenant=tenant)
+
+
+async def attach_bank_statements(
+    session: AsyncSession, job: AuditJob, files: Sequence[UploadFile]
+) -> AuditJob:
+    """Store CSV bank statements for a completed job and mark its reconciliation as pending."""
+    statements, _, _ = await _persist_files(
+        job.id,
+        files,
+        subdir=f"{_STATEMENTS_DIR}/{secrets.token_hex(8)}",
+        allowed_extensions=["csv"],
+    )
+    job.result_payload = {
+        **(job.result_payload or {}),
+        "reconciliation": {"status": "PENDING", "statements": statements},
+    }
+    await session.commit()
+    await session.refresh(job)
+    logger.info("audit_job_statements_attached", job_id=str(job.id), statements=len(statements))
+    return job
+
+
+def enqueue_reconciliation(job_id: UUID) -> None:
+    """Send the bank reconciliation of a job to the Celery queue."""
+    celery_app.send_task(_AUDIT_RECONCILE_TASK, args=[str(job_id)])
+    logger.info("audit_job_reconciliation_enqueued", job_id=str(job_id))
+
+
+async def request_reaudit(
+    session: AsyncSession, job: AuditJob, corrections: dict[str, dict[str, str]]
+) -> AuditJob:
+    """Store the corrections of a completed job and mark it as pending re-audit."""
+    job.result_payload = {**(job.result_payload or {}), "corrections": corrections}
+    # Pending until the worker picks it up, so concurrent edits are rejected meanwhile.
+    job.status = AuditJobStatus.PENDING
+    await session.commit()
+    await session.refresh(job)
+    logger.info("audit_job_reaudit_requested", job_id=str(job.id))
+    return job
+
+
+_FINISHED_STATUSES = {AuditJobStatus.COMPLETED, AuditJobStatus.FAILED}
+
+
+async def cancel_audit_job(session: AsyncSession, job: AuditJob) -> AuditJob:
+    """
+    Cancel a pending or running job.
+
+    The job is flagged in the database and through its Redis token, which the
+    running stages check between files and stages; its queued tasks are
+    revoked. Cancelling a cancelled job is a no-op.
+    """
+    if job.status in _FINISHED_STATUSES:
+        raise ValueError(f"Audit job '{job.id}' already finished with status {job.status.value}.")
+    if job.status == AuditJobStatus.CANCELLED:
+        return job
+    job.mark_cancelled()
+    await session.commit()
+    await session.refresh(job)
+
+    task_ids = request_cancellation(str(job.id))
+    if task_ids:
+        # Without terminate: running tasks stop at their next cancellation check.
+        celery_app.control.revoke(task_ids)
+    logger.info("audit_job_cancelled", job_id=str(job.id), revoked=len(task_ids))
+    return job
+
+
+def enqueue_reaudit(job_id: UUID) -> None:
+    """Send the re-audit of a job to the Celery queue."""
+    celery_app.send_task(_AUDIT_REAUDIT_TASK, args=[str(job_id)], queue=INTERACTIVE_QUEUE)
+    logger.info("audit_job_reaudit_enqueued", job_id=str(job_id))
@@ -0,0 +1,128 @@
+# SPDX-License-Identifier: MIT
+"""
+Content-addressed storage of uploaded bytes.
+
+Every upload is written once to ``<uploads>/blobs/<sha[:2]>/<sha>``, keyed by
+the SHA-256 computed while it streams in, and the job file
+(``<uploads>/<job_id>/<stored_name>``) is a hard link to that blob. Uploading
+the same bytes again, in any job, only adds a link. The link count of the
+blob is its reference count: every job file holding the content is one
+reference, so deleting a job directory releases its references without any
+bookkeeping, and blobs left with no job link are garbage-collected.
+
+Blobs are read-only; nothing in the pipeline writes to a stored upload, and
+the shared inode must never be modified through one of its links.
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+import re
+import secrets
+import time
+from pathlib import Path
+
+import structlog
+
+from ..core.config import get_settings
+
+logger = structlog.get_logger(__name__)
+
+BLOBS_DIR = "blobs"
+_TMP_DIR = "tmp"
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+class BlobStore:
+    """Upload blobs of one storage root, shared by every job and worker."""
+
+    def __init__(self, uploads_root: Path) -> None:
+        self.root = uploads_root / BLOBS_DIR
+
+    def path_for(self, sha256: str) -> Path:
+        if not _SHA256.fullmatch(sha256):
+            raise ValueError(f"Invalid SHA-256: {sha256!r}.")
+        return self.root / sha256[:2] / sha256
+
+    def temporary_path(self) -> Path:
+        """Fresh path on the blob filesystem where an upload can be streamed before hashing completes."""
+        tmp_dir = self.root / _TMP_DIR
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tmp_dir / secrets.token_hex(16)
+
+    def reference_count(self, sha256: str) -> int:
+        """Number of job files linked to the blob (0 when it is not stored)."""
+        try:
+            return self.path_for(sha256).stat().st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def link(self, source: Path, sha256: str, destination: Path) -> bool:
+        """
+        Move the streamed ``source`` to ``destination`` through the blob of ``sha256``.
+
+        Returns whether the content was already stored, in which case
+        ``destination`` links the existing blob and ``source`` is discarded.
+        """
+        blob = self.path_for(sha256)
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                os.link(blob, destination)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                if exc.errno != errno.EMLINK:
+                    raise
+                # The filesystem link limit was reached: this job keeps its own copy.
+                logger.warning("upload_blob_link_limit", sha256=sha256)
+                os.replace(source, destination)
+                return False
+            else:
+                source.unlink(missing_ok=True)
+                return True
+            try:
+                os.link(source, blob)
+            except FileExistsError:
+                # Stored concurrently by another upload of the same content.
+                continue
+            os.chmod(blob, 0o444)
+            os.replace(source, destination)
+            return False
+
+    def collect_garbage(self, *, grace_seconds: int) -> int:
+        """
+        Remove blobs no job links to any more, and abandoned temporary files.
+
+        Entries created or linked in the last ``grace_seconds`` (inode change
+        time) are kept, so an upload that is being linked is not collected. A
+        blob removed while a new link is being made stays readable through
+        that link and is stored again by the next upload of the content.
+        """
+        if not self.root.exists():
+            return 0
+        deadline = time.time() - grace_seconds
+        removed = 0
+        for shard in self.root.iterdir():
+            if not shard.is_dir():
+                continue
+            for path in shard.iterdir():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_ctime > deadline:
+                    continue
+                if shard.name == _TMP_DIR or stat.st_nlink <= 1:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+        logger.info("upload_blobs_collected", removed=removed)
+        return removed
+
+
+def get_blob_store() -> BlobStore:
+    return BlobStore(get_settings().uploads_dir_path)
+
+
+__all__ = ["BLOBS_DIR", "BlobStore", "get_blob_store"]
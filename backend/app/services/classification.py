@@ -0,0 +1,304 @@
+# SPDX-License-Identifier: MIT
+"""
+Batch classification of documents by CFOP and NCM.
+
+Port of `runClassification` (agents/classifierAgent.ts). The frontend walks
+every item with an if-chain over CFOP prefixes and two `NCM_SECTOR_MAP`
+lookups (4 and 2 digits), and applies user corrections inside the same
+loop. Here both references are prefix tables loaded once per worker (the
+built-in maps plus optional CSV reference files). Items of all documents
+are one table; their CFOPs and NCMs are hash-encoded, the distinct values
+go through a longest-prefix match (one set lookup per prefix length,
+longest first), and the per-document winners come from a single
+``bincount`` over (document, label) codes. Corrections are applied
+afterwards as an overlay keyed by document name.
+"""
+
+from __future__ import annotations
+
+import csv
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import TypedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from ..core.config import get_settings
+from .rule_compiler import text_values
+
+CLASSIFICATION_COLUMNS = ("produto_cfop", "produto_ncm")
+DEFAULT_SECTOR = "Comércio Varejista/Atacadista"
+UNCLASSIFIED_SECTOR = "Não Classificado"
+DEFAULT_COST_CENTER = "Não Alocado"
+# Operation keys in the frontend's `cfopCounts` order, which breaks ties.
+OPERATION_TYPES = {
+    "compra": "Compra",
+    "venda": "Venda",
+    "devolucao": "Devolução",
+    "servico": "Serviço",
+    "transferencia": "Transferência",
+    "outros": "Outros",
+}
+# The CFOP if-chain of `runClassification` as prefixes; anything else is "outros".
+CFOP_OPERATIONS = {
+    "1": "compra",
+    "2": "compra",
+    "12": "devolucao",
+    "22": "devolucao",
+    "13": "servico",
+    "23": "servico",
+    "14": "compra",
+    "24": "compra",
+    "155": "transferencia",
+    "255": "transferencia",
+    "5": "venda",
+    "6": "venda",
+    "52": "devolucao",
+    "62": "devolucao",
+    "555": "transferencia",
+    "655": "transferencia",
+    "5933": "servico",
+    "6933": "servico",
+}
+# `NCM_SECTOR_MAP`; extended by ``classification_ncm_table``.
+NCM_SECTORS = {
+    "84": "Máquinas e Equipamentos",
+    "85": "Material Elétrico",
+    "8471": "Tecnologia da Informação",
+    "22": "Bebidas",
+    "10": "Produtos de Moagem",
+    "2106": "Preparações Alimentícias Diversas",
+}
+
+
+class ClassificationResult(TypedDict):
+    operationType: str
+    businessSector: str
+    confidence: float
+    costCenter: str
+
+
+@dataclass(frozen=True)
+class PrefixTable:
+    """Prefix -> label reference with one key set per prefix length, longest first."""
+
+    labels: tuple[str, ...]
+    levels: tuple[tuple[int, pa.Array, np.ndarray], ...]
+
+    @classmethod
+    def from_mapping(cls, mapping: Mapping[str, str]) -> PrefixTable:
+        labels = tuple(dict.fromkeys(mapping.values()))
+        label_ids = {label: index for index, label in enumerate(labels)}
+        levels = []
+        for length in sorted({len(prefix) for prefix in mapping}, reverse=True):
+            prefixes = sorted(prefix for prefix in mapping if len(prefix) == length)
+            levels.append(
+                (
+                    length,
+                    pa.array(prefixes, type=pa.large_string()),
+                    np.array([label_ids[mapping[prefix]] for prefix in prefixes], dtype=np.int64),
+                )
+            )
+        return cls(labels, tuple(levels))
+
+    def lookup(self, values: pa.Array) -> np.ndarray:
+        """Label index of the longest matching prefix of every value; -1 without a match."""
+        result = np.full(len(values), -1, dtype=np.int64)
+        lengths = pc.utf8_length(values).to_numpy(zero_copy_only=False)
+        for length, prefixes, label_ids in self.levels:
+            pending = (result < 0) & (lengths >= length)
+            if not pending.any():
+                continue
+            heads = pc.utf8_slice_codeunits(values, 0, length)
+            found = pc.index_in(heads, value_set=prefixes).fill_null(-1).to_numpy(zero_copy_only=False)
+            hit = pending & (found >= 0)
+            result[hit] = label_ids[found[hit]]
+        return result
+
+
+@dataclass(frozen=True)
+class ReferenceTables:
+    cfop: PrefixTable
+    ncm: PrefixTable
+
+
+def _read_prefix_file(path: Path) -> dict[str, str]:
+    """``prefix,label`` rows (header optional) of a reference CSV."""
+    with path.open(newline="", encoding="utf-8-sig") as stream:
+        rows = [row for row in csv.reader(stream) if len(row) >= 2 and row[0].strip()]
+    if rows and not rows[0][0].strip().isdigit():
+        rows = rows[1:]
+    return {row[0].strip(): row[1].strip() for row in rows}
+
+
+@lru_cache
+def get_reference_tables() -> ReferenceTables:
+    """Built-in CFOP/NCM references merged with the configured files, built once per process."""
+    settings = get_settings()
+    cfop = dict(CFOP_OPERATIONS)
+    ncm = dict(NCM_SECTORS)
+    if settings.classification_cfop_table:
+        extra = _read_prefix_file(Path(settings.classification_cfop_table))
+        unknown = set(extra.values()) - set(OPERATION_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown operation types in CFOP table: {', '.join(sorted(unknown))}.")
+        cfop.update(extra)
+    if settings.classification_ncm_table:
+        ncm.update(_read_prefix_file(Path(settings.classification_ncm_table)))
+    return ReferenceTables(PrefixTable.from_mapping(cfop), PrefixTable.from_mapping(ncm))
+
+
+def _encoded(values: pa.Array) -> tuple[np.ndarray, pa.Array]:
+    encoded = pc.dictionary_encode(pc.utf8_trim_whitespace(values))
+    return encoded.indices.cast(pa.int64()).to_numpy(zero_copy_only=False), encoded.dictionary
+
+
+def _winners(document: np.ndarray, label: np.ndarray, documents: int, labels: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Most frequent label per document and its count.
+
+    Ties go to the highest label index, like the frontend's
+    ``reduce((a, b) => a[1] > b[1] ? a : b)`` keeps the later entry.
+    """
+    counts = np.bincount(document * labels + label, minlength=documents * labels).reshape(documents, labels)
+    winner = labels - 1 - np.argmax(counts[:, ::-1], axis=1)
+    return winner, counts[np.arange(documents), winner]
+
+
+def classify_documents(
+    tables: Iterable[pa.Table],
+    *,
+    references: ReferenceTables | None = None,
+) -> list[ClassificationResult | None]:
+    """
+    Operation type, business sector and confidence of each document's items.
+
+    Operation type is the most frequent CFOP operation and confidence its
+    share of the items with a CFOP; the sector is the most frequent NCM
+    sector. Documents without any CFOP get ``None``, like the frontend
+    leaves them unclassified.
+    """
+    references = references or get_reference_tables()
+    parts: list[pa.Table] = []
+    for table in tables:
+        parts.append(
+            pa.table(
+                {
+                    "document": pa.array(np.full(table.num_rows, len(parts), dtype=np.int64)),
+                    "cfop": text_values(table, "produto_cfop"),
+                    "ncm": text_values(table, "produto_ncm"),
+                }
+            )
+        )
+    if not parts:
+        return []
+    documents = len(parts)
+    items = pa.concat_tables(parts)
+    document = items.column("document").to_numpy()
+
+    # CFOP operation per item: longest prefix of every distinct CFOP.
+    cfop_ids, cfops = _encoded(items.column("cfop").combine_chunks())
+    operations = list(OPERATION_TYPES)
+    operation_of = references.cfop.lookup(cfops)
+    operation_index = np.array([operations.index(label) for label in references.cfop.labels], dtype=np.int64)
+    operation_of = np.where(operation_of >= 0, operation_index[np.maximum(operation_of, 0)], operations.index("outros"))
+    has_cfop = np.asarray(pc.not_equal(cfops, "")).astype(bool)[cfop_ids]
+    operation, operation_count = _winners(
+        document[has_cfop], operation_of[cfop_ids[has_cfop]], documents, len(operations)
+    )
+    totals = np.bincount(document[has_cfop], minlength=documents)
+
+    # NCM sector per item; sectors are ranked by first appearance like `sectorScores`.
+    ncm_ids, ncms = _encoded(items.column("ncm").combine_chunks())
+    sectors = [*references.ncm.labels, DEFAULT_SECTOR, UNCLASSIFIED_SECTOR]
+    sector_of = references.ncm.lookup(ncms)
+    short = pc.utf8_length(ncms).to_numpy(zero_copy_only=False) < 2
+    sector_of = np.where(sector_of >= 0, sector_of, len(sectors) - 2)
+    sector_of[short] = len(sectors) - 1
+    has_ncm = np.asarray(pc.not_equal(ncms, "")).astype(bool)[ncm_ids]
+    item_sector = sector_of[ncm_ids[has_ncm]]
+    sector_document = document[has_ncm]
+    # Re-number sectors per document by first appearance so ties keep the later one.
+    pair = sector_document * len(sectors) + item_sector
+    first_seen = np.full(documents * len(sectors), len(pair), dtype=np.int64)
+    np.minimum.at(first_seen, pair, np.arange(len(pair)))
+    counts = np.bincount(pair, minlength=documents * len(sectors)).reshape(documents, len(sectors))
+    order = np.argsort(first_seen.reshape(documents, len(sectors)), axis=1, kind="stable")
+    ranked = np.take_along_axis(counts, order, axis=1)
+    sector = order[np.arange(documents), len(sectors) - 1 - np.argmax(ranked[:, ::-1], axis=1)]
+    has_sector = counts.sum(axis=1) > 0
+
+    return [
+        {
+            "operationType": OPERATION_TYPES[operations[int(operation[index])]],
+            "businessSector": sectors[int(sector[index])] if has_sector[index] else UNCLASSIFIED_SECTOR,
+            "confidence": float(operation_count[index] / totals[index]),
+            "costCenter": DEFAULT_COST_CENTER,
+        }
+        if totals[index]
+        else None
+        for index in range(documents)
+    ]
+
+
+def apply_corrections(
+    names: Sequence[str],
+    classifications: Sequence[ClassificationResult | None],
+    *,
+    operation_types: Mapping[str, str] | None = None,
+    cost_centers: Mapping[str, str] | None = None,
+) -> list[ClassificationResult | None]:
+    """
+    Overlay user corrections keyed by document name.
+
+    A corrected operation type has confidence 1.0; documents without a
+    classification (errors, no CFOP) are not corrected, like the frontend.
+    """
+    operation_types = operation_types or {}
+    cost_centers = cost_centers or {}
+    if not operation_types and not cost_centers:
+        return list(classifications)
+    keys = pa.array(list(names), type=pa.large_string())
+
+    def overlay(corrections: Mapping[str, str]) -> list[str | None]:
+        if not corrections:
+            return [None] * len(names)
+        index = pc.index_in(keys, value_set=pa.array(list(corrections), type=pa.large_string()))
+        return pc.take(pa.array(list(corrections.values()), type=pa.large_string()), index).to_pylist()
+
+    corrected: list[ClassificationResult | None] = []
+    for classification, operation_type, cost_center in zip(
+        classifications, overlay(operation_types), overlay(cost_centers)
+    ):
+        if classification is None or (operation_type is None and cost_center is None):
+            corrected.append(classification)
+            continue
+        classification = dict(classification)
+        if operation_type is not None:
+            classification["operationType"] = operation_type
+            classification["confidence"] = 1.0
+        if cost_center is not None:
+            classification["costCenter"] = cost_center
+        corrected.append(classification)
+    return corrected
+
+
+__all__ = [
+    "CFOP_OPERATIONS",
+    "CLASSIFICATION_COLUMNS",
+    "ClassificationResult",
+    "DEFAULT_COST_CENTER",
+    "DEFAULT_SECTOR",
+    "NCM_SECTORS",
+    "OPERATION_TYPES",
+    "PrefixTable",
+    "ReferenceTables",
+    "UNCLASSIFIED_SECTOR",
+    "apply_corrections",
+    "classify_documents",
+    "get_reference_tables",
+]
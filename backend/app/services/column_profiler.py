@@ -0,0 +1,324 @@
+# SPDX-License-Identifier: MIT
+"""
+Semantic column profiling for uploaded tables.
+
+Server-side port of `calculateColumnProfiles` (utils/importPipeline.ts). Each
+column is classified with regex masks and Arrow kernels over the whole column
+instead of value-by-value checks, and the output keeps the frontend's
+`ColumnSemanticProfile` field names so the UI can render it as is.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from collections.abc import Mapping
+from typing import Literal, TypedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+SemanticType = Literal[
+    "date", "datetime", "currency", "numeric", "categorical", "text", "identifier"
+]
+IdentifierKind = Literal["cnpj", "cpf", "chave_nfe"]
+
+# Same thresholds as calculateColumnProfiles.
+_CURRENCY_RATIO = 0.6
+_NUMERIC_RATIO = 0.7
+_DATE_RATIO = 0.6
+_DOCUMENT_RATIO = 0.6
+_IDENTIFIER_UNIQUE_RATIO = 0.7
+_CATEGORICAL_UNIQUE_RATIO = 0.1
+_OUTLIER_Z = 3.0
+_OUTLIER_NOTE_RATE = 0.05
+_NULL_NOTE_RATE = 0.3
+_TEXT_CONFIDENCE = 0.2
+_SAMPLE_VALUES = 5
+
+_CURRENCY_PATTERN = r"\p{Sc}|R\$|USD|EUR"
+_DAY = r"(?:0[1-9]|[12]\d|3[01])"
+_MONTH = r"(?:0[1-9]|1[0-2])"
+# Mirrors DATE_FORMATS in utils/importPipeline.ts.
+_DATE_PATTERN = "|".join(
+    [
+        rf"^\d{{4}}-{_MONTH}-{_DAY}$",
+        rf"^{_DAY}/{_MONTH}/\d{{4}}$",
+        rf"^{_MONTH}/{_DAY}/\d{{4}}$",
+        rf"^\d{{4}}/{_MONTH}/{_DAY}$",
+        rf"^\d{{4}}-{_MONTH}-{_DAY}T\d{{2}}:\d{{2}}:\d{{2}}(?:\.\d+)?(?:Z|[+-]\d{{2}}:?\d{{2}})$",
+        rf"^{_DAY}-{_MONTH}-\d{{4}}$",
+        rf"^{_DAY}\.{_MONTH}\.\d{{4}}$",
+    ]
+)
+_TIME_COMPONENT = r"T\d{2}:\d{2}"
+_DOCUMENT_SEPARATORS = r"[.\-/\s]"
+_DOCUMENT_SHAPES: dict[IdentifierKind, tuple[str, int]] = {
+    "cnpj": (r"^\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}$", 14),
+    "cpf": (r"^\d{3}\.?\d{3}\.?\d{3}-?\d{2}$", 11),
+    "chave_nfe": (r"^(?:\d{4}\s?){10}\d{4}$", 44),
+}
+_IDENTIFIER_NAME_HINTS = ("id", "numero", "nf", "cnpj", "cpf", "chave")
+
+_CNPJ_WEIGHTS_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+_CNPJ_WEIGHTS_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+_CPF_WEIGHTS_1 = np.arange(10, 1, -1)
+_CPF_WEIGHTS_2 = np.arange(11, 1, -1)
+_CHAVE_WEIGHTS = np.array([2, 3, 4, 5, 6, 7, 8, 9] * 6)[:43][::-1]
+
+
+class ColumnNumericStats(TypedDict, total=False):
+    min: float
+    max: float
+    mean: float
+    median: float
+    stdDev: float
+
+
+class ColumnProfile(TypedDict, total=False):
+    name: str
+    semanticType: SemanticType
+    confidence: float
+    nullPercentage: float
+    uniqueValues: int
+    sampleValues: list[object]
+    outlierRate: float
+    duplicatesDetected: bool
+    identifierKind: IdentifierKind
+    stats: ColumnNumericStats
+    notes: list[str]
+    # Set when the profile was inferred from the first rows only (streaming).
+    sampledRows: int
+
+
+def _as_trimmed_strings(series: pd.Series) -> pa.Array:
+    values = series.array
+    if hasattr(values, "__arrow_array__"):
+        array = pa.array(values)
+    else:
+        array = pa.array(series, from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if not pa.types.is_large_string(array.type):
+        array = pc.cast(array, pa.large_string())
+    return pc.utf8_trim_whitespace(array)
+
+
+def _arrow_type(series: pd.Series) -> pa.DataType | None:
+    dtype = series.dtype
+    if isinstance(dtype, pd.ArrowDtype):
+        return dtype.pyarrow_dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pa.timestamp("ns")
+    return None
+
+
+def _ratio(mask: pa.Array, total: int) -> float:
+    if total == 0:
+        return 0.0
+    return int(pc.sum(mask.cast(pa.int64())).as_py() or 0) / total
+
+
+def _digit_matrix(digits: pa.Array, width: int) -> np.ndarray:
+    """
+    View a null-free array of ``width``-character digit strings as an (n, width) int matrix.
+    """
+    digits = pa.concat_arrays([digits]) if digits.offset else digits
+    offsets = np.frombuffer(digits.buffers()[1], dtype=np.int64)[: len(digits) + 1]
+    data = np.frombuffer(digits.buffers()[2], dtype=np.uint8)[offsets[0] : offsets[-1]]
+    return data.reshape(len(digits), width).astype(np.int64) - ord("0")
+
+
+def _mod11_digit(matrix: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    remainder = (matrix[:, : len(weights)] * weights).sum(axis=1) % 11
+    return np.where(remainder < 2, 0, 11 - remainder)
+
+
+def _valid_check_digits(kind: IdentifierKind, matrix: np.ndarray) -> np.ndarray:
+    if kind == "cnpj":
+        valid = (_mod11_digit(matrix, _CNPJ_WEIGHTS_1) == matrix[:, 12]) & (
+            _mod11_digit(matrix, _CNPJ_WEIGHTS_2) == matrix[:, 13]
+        )
+    elif kind == "cpf":
+        first = (matrix[:, :9] * _CPF_WEIGHTS_1).sum(axis=1) * 10 % 11 % 10
+        second = (matrix[:, :10] * _CPF_WEIGHTS_2).sum(axis=1) * 10 % 11 % 10
+        valid = (first == matrix[:, 9]) & (second == matrix[:, 10])
+    else:
+        remainder = (matrix[:, :43] * _CHAVE_WEIGHTS).sum(axis=1) % 11
+        digit = np.where(remainder < 2, 0, 11 - remainder)
+        valid = digit == matrix[:, 43]
+    # Repeated digits (00000000000000, 11111111111...) pass the checksum but are placeholders.
+    return valid & (matrix != matrix[:, :1]).any(axis=1)
+
+
+def _document_ratio(values: pa.Array, kind: IdentifierKind) -> float:
+    pattern, width = _DOCUMENT_SHAPES[kind]
+    shaped = pc.filter(values, pc.match_substring_regex(values, pattern))
+    if len(shaped) == 0:
+        return 0.0
+    digits = pc.replace_substring_regex(shaped, _DOCUMENT_SEPARATORS, "")
+    valid = _valid_check_digits(kind, _digit_matrix(digits, width))
+    return int(valid.sum()) / len(values)
+
+
+def _numeric_stats(values: np.ndarray) -> tuple[ColumnNumericStats, float]:
+    mean = float(values.mean())
+    # Population standard deviation, as in calculateColumnProfiles.
+    std = float(values.std())
+    outliers = np.abs(values - mean) > _OUTLIER_Z * std if std > 0 else np.zeros(len(values), bool)
+    stats: ColumnNumericStats = {
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": mean,
+        "median": float(np.median(values)),
+        "stdDev": std,
+    }
+    return stats, float(outliers.mean())
+
+
+def _sample_values(series: pd.Series, present: np.ndarray) -> list[object]:
+    sample = []
+    for value in series[present].head(_SAMPLE_VALUES).tolist():
+        if hasattr(value, "as_py"):
+            value = value.as_py()
+        if isinstance(value, (dt.date, dt.time)):
+            value = value.isoformat()
+        sample.append(value)
+    return sample
+
+
+def _is_identifier_like(name: str) -> bool:
+    return any(hint in name.lower() for hint in _IDENTIFIER_NAME_HINTS)
+
+
+def _duplicates_note(name: str) -> str:
+    return f'Coluna identificadora "{name}" possui valores duplicados.'
+
+
+def _profile_column(
+    name: str,
+    series: pd.Series,
+    numeric: pd.Series | None,
+    total_rows: int,
+) -> ColumnProfile:
+    strings = _as_trimmed_strings(series)
+    present_mask = pc.and_(pc.is_valid(strings), pc.not_equal(pc.fill_null(strings, ""), ""))
+    present_mask = pc.fill_null(present_mask, False)
+    values = pc.filter(strings, present_mask)
+    non_null = len(values)
+    null_percentage = (total_rows - non_null) / total_rows if total_rows else 0.0
+    unique_values = int(pc.count_distinct(values).as_py() or 0)
+    identifier_like = _is_identifier_like(name)
+
+    numeric_values = np.empty(0)
+    if numeric is not None:
+        numeric_values = numeric.dropna().to_numpy(dtype=np.float64, na_value=np.nan)
+        numeric_values = numeric_values[~np.isnan(numeric_values)]
+
+    currency_ratio = _ratio(pc.match_substring_regex(values, _CURRENCY_PATTERN), non_null)
+    numeric_ratio = len(numeric_values) / non_null if non_null else 0.0
+    date_ratio = _ratio(pc.match_substring_regex(values, _DATE_PATTERN), non_null)
+    has_time = _ratio(pc.match_substring_regex(values, _TIME_COMPONENT), non_null) > 0
+    arrow_type = _arrow_type(series)
+    if arrow_type is not None and pa.types.is_temporal(arrow_type):
+        # The Arrow CSV engine already parsed these as dates/timestamps.
+        date_ratio = 1.0
+        has_time = pa.types.is_timestamp(arrow_type)
+
+    document_kind: IdentifierKind | None = None
+    document_ratio = 0.0
+    if non_null:
+        for kind in _DOCUMENT_SHAPES:
+            ratio = _document_ratio(values, kind)
+            if ratio > document_ratio:
+                document_kind, document_ratio = kind, ratio
+
+    semantic_type: SemanticType = "text"
+    confidence = _TEXT_CONFIDENCE
+    if document_kind is not None and document_ratio > _DOCUMENT_RATIO:
+        semantic_type, confidence = "identifier", document_ratio
+    elif currency_ratio > _CURRENCY_RATIO:
+        semantic_type, confidence = "currency", currency_ratio
+    elif numeric_ratio > _NUMERIC_RATIO:
+        semantic_type, confidence = "numeric", numeric_ratio
+    elif date_ratio > _DATE_RATIO:
+        semantic_type = "datetime" if has_time else "date"
+        confidence = date_ratio
+    elif identifier_like and unique_values > total_rows * _IDENTIFIER_UNIQUE_RATIO:
+        semantic_type = "identifier"
+        confidence = unique_values / non_null if non_null else 0.0
+    elif unique_values <= total_rows * _CATEGORICAL_UNIQUE_RATIO:
+        semantic_type = "categorical"
+        confidence = 1 - (unique_values / total_rows if total_rows else 0.0)
+
+    present = np.asarray(present_mask.to_numpy(zero_copy_only=False), dtype=bool)
+    profile: ColumnProfile = {
+        "name": name,
+        "semanticType": semantic_type,
+        "confidence": round(float(confidence), 4),
+        "nullPercentage": null_percentage,
+        "uniqueValues": unique_values,
+        "sampleValues": _sample_values(series, present),
+        "duplicatesDetected": False,
+    }
+    notes: list[str] = []
+
+    if semantic_type in ("numeric", "currency") and len(numeric_values):
+        stats, outlier_rate = _numeric_stats(numeric_values)
+        profile["stats"] = stats
+        profile["outlierRate"] = outlier_rate
+        if outlier_rate > _OUTLIER_NOTE_RATE:
+            notes.append(f'Coluna "{name}" apresenta {round(outlier_rate * 100)}% de outliers.')
+
+    if semantic_type == "identifier" and document_kind is not None:
+        profile["identifierKind"] = document_kind
+
+    if (identifier_like or semantic_type == "identifier") and unique_values < non_null:
+        profile["duplicatesDetected"] = True
+        notes.append(_duplicates_note(name))
+
+    if null_percentage > _NULL_NOTE_RATE:
+        notes.append(f'Coluna "{name}" possui {round(null_percentage * 100)}% de valores vazios.')
+
+    if notes:
+        profile["notes"] = notes
+    return profile
+
+
+def profile_columns(
+    raw: pd.DataFrame,
+    numeric: Mapping[str, pd.Series] | None = None,
+) -> list[ColumnProfile]:
+    """
+    Profile every column of ``raw``.
+
+    ``raw`` holds the values as parsed (before numeric coercion) so currency
+    symbols, dates and document masks are still visible; ``numeric`` maps the
+    columns that the CSV analyzer turned numeric to their float values.
+    """
+    numeric = numeric or {}
+    total_rows = len(raw)
+    return [
+        _profile_column(str(column), raw[column], numeric.get(str(column)), total_rows)
+        for column in raw.columns
+    ]
+
+
+def update_distinct_values(profile: ColumnProfile, unique_values: int, non_null: int) -> None:
+    """
+    Replace ``uniqueValues`` with a count over more rows than the profile saw.
+
+    ``duplicatesDetected`` (and its note) is re-checked against ``non_null``
+    with the same rule as `profile_columns`; duplicates already found stay flagged.
+    """
+    profile["uniqueValues"] = unique_values
+    name = profile["name"]
+    eligible = _is_identifier_like(name) or profile["semanticType"] == "identifier"
+    if profile.get("duplicatesDetected") or not eligible or unique_values >= non_null:
+        return
+    profile["duplicatesDetected"] = True
+    profile.setdefault("notes", []).append(_duplicates_note(name))
+
+
+__all__ = ["ColumnNumericStats", "ColumnProfile", "profile_columns", "update_distinct_values"]
@@ -0,0 +1,290 @@
+# SPDX-License-Identifier: MIT
+"""
+Deterministic cross-validation of items across documents.
+
+Port of `runDeterministicCrossValidation` (utils/fiscalCompare.ts). Instead of
+a map of product name to copied item dicts, the job's items are one table
+with a document index column; products are grouped with a single hash
+encoding of a normalised key (case, accents, whitespace and trailing unit
+words removed), and the distinct NCMs and the min/max unit price of every
+group come from vectorised reductions. Findings point at documents by
+index into the returned ``documents`` list.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable, Sequence
+from pathlib import PurePosixPath
+from typing import NotRequired, TypedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .archive import ARCHIVE_MEMBER_COLUMN
+from .fiscal_rules import RULE_COLUMNS, validate_items
+from .rule_compiler import numeric_values, text_values
+
+PRICE_VARIATION_THRESHOLD = 0.15  # 15% variation to trigger an alert
+DOCUMENT_COLUMN = "documento"
+# Columns read from each item table; staged tables are projected onto these.
+# The rule columns decide which documents are audited as ERRO and left out.
+CROSS_VALIDATION_COLUMNS = tuple(
+    dict.fromkeys(("produto_nome", "produto_ncm", "produto_valor_unit", ARCHIVE_MEMBER_COLUMN) + RULE_COLUMNS)
+)
+
+# Trailing packaging/unit words ("CANETA AZUL UN", "PAPEL A4 - CX") do not
+# change the product; sizes such as "500ML" do and are kept.
+_UNIT_SUFFIX = (
+    r"^(.*?\S)(?:\s*[-/.,]?\s*\b(?:un|und|unid|unidade|unidades|pc|pcs|pca|peca|pecas|pct|pacote|"
+    r"cx|caixa|fd|fardo|kit)\.?)+$"
+)
+_NO_NCM = "N/A"
+
+
+class DocumentRef(TypedDict):
+    name: str
+    internal_path: NotRequired[str]
+
+
+class Discrepancy(TypedDict):
+    valueA: str
+    docA: int
+    valueB: str
+    docB: int
+
+
+class CrossValidationFinding(TypedDict):
+    comparisonKey: str
+    normalizedKey: str
+    attribute: str
+    description: str
+    discrepancies: list[Discrepancy]
+    severity: str
+
+
+class CrossValidationResult(TypedDict):
+    findings: list[CrossValidationFinding]
+    documents: list[DocumentRef]
+    items: int
+    products: int
+    seconds: float
+
+
+def normalise_product_keys(names: pa.Array) -> pa.Array:
+    """Comparison keys: lowercase, no accents, single spaces, no trailing unit words."""
+    keys = pc.utf8_normalize(pc.utf8_lower(names), "NFKD")
+    keys = pc.replace_substring_regex(keys, r"\p{Mn}+", "")
+    keys = pc.utf8_trim_whitespace(pc.replace_substring_regex(keys, r"\s+", " "))
+    # The first word is never stripped, so "UN" alone stays a product.
+    return pc.replace_substring_regex(keys, _UNIT_SUFFIX, r"\1")
+
+
+def drop_error_documents(table: pa.Table) -> pa.Table | None:
+    """
+    Items of ``table`` without the documents the auditor marks as ERRO.
+
+    A document is the whole file, or one archive member when the table has
+    a member column; ``None`` when the whole file is an ERRO document.
+    """
+    error_rows = validate_items(table).rows_with_severity("ERRO")
+    if not len(error_rows):
+        return table
+    if ARCHIVE_MEMBER_COLUMN not in table.column_names:
+        return None
+    member = table.column(ARCHIVE_MEMBER_COLUMN)
+    failed = pc.unique(member.take(pa.array(error_rows)))
+    return table.filter(pc.invert(pc.is_in(member, value_set=failed)))
+
+
+def collect_item_sources(
+    sources: Iterable[tuple[str, pa.Table]],
+) -> tuple[pa.Table, list[DocumentRef]]:
+    """
+    Concatenate per-file item tables into one table with a document index.
+
+    Tables with an archive member column contribute one document per member,
+    like the frontend, which imports every file of a ZIP as its own document.
+    As in `runDeterministicCrossValidation`, documents the auditor marks as
+    ERRO (any item with an ERRO-severity rule finding) are left out.
+    """
+    documents: list[DocumentRef] = []
+    parts: list[pa.Table] = []
+    for name, table in sources:
+        table = drop_error_documents(table)
+        if table is None:
+            continue
+        columns = {
+            "produto_nome": text_values(table, "produto_nome"),
+            "produto_ncm": text_values(table, "produto_ncm"),
+            "produto_valor_unit": pa.array(numeric_values(table, "produto_valor_unit")),
+        }
+        if ARCHIVE_MEMBER_COLUMN in table.column_names:
+            members = pc.dictionary_encode(table.column(ARCHIVE_MEMBER_COLUMN).combine_chunks())
+            offset = len(documents)
+            documents.extend(
+                {"name": PurePosixPath(member).name, "internal_path": member}
+                for member in members.dictionary.to_pylist()
+            )
+            index = members.indices.cast(pa.int64()).to_numpy(zero_copy_only=False) + offset
+        else:
+            index = np.full(table.num_rows, len(documents), dtype=np.int64)
+            documents.append({"name": name})
+        columns[DOCUMENT_COLUMN] = pa.array(index, type=pa.int64())
+        parts.append(pa.table(columns))
+
+    if not parts:
+        empty = {column: pa.array([], type=pa.large_string()) for column in ("produto_nome", "produto_ncm")}
+        empty["produto_valor_unit"] = pa.array([], type=pa.float64())
+        empty[DOCUMENT_COLUMN] = pa.array([], type=pa.int64())
+        return pa.table(empty), documents
+    return pa.concat_tables(parts), documents
+
+
+def _brl(value: float) -> str:
+    """`toLocaleString('pt-BR', {style: 'currency', currency: 'BRL'})`."""
+    formatted = f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+    return f"R$\xa0{formatted}"
+
+
+def _first_rows(group: np.ndarray, rows: np.ndarray, groups: int, empty: int) -> np.ndarray:
+    """Lowest row of each group among ``rows``; ``empty`` for groups without one."""
+    first = np.full(groups, empty, dtype=np.int64)
+    np.minimum.at(first, group[rows], rows)
+    return first
+
+
+def cross_validate_items(
+    table: pa.Table,
+    documents: Sequence[DocumentRef],
+    *,
+    threshold: float = PRICE_VARIATION_THRESHOLD,
+) -> CrossValidationResult:
+    """
+    Find products sold with different NCMs or unit prices varying above ``threshold``.
+
+    ``table`` comes from `collect_item_sources`. Findings are ordered like the
+    frontend: by first appearance of the product, NCM before price.
+    """
+    started = time.perf_counter()
+    names = pc.utf8_trim_whitespace(text_values(table, "produto_nome"))
+    named = pc.not_equal(names, "")
+    table = table.filter(named)
+    names = names.filter(named)
+    items = table.num_rows
+    findings: list[CrossValidationFinding] = []
+    if not items:
+        return {"findings": findings, "documents": list(documents), "items": 0, "products": 0, "seconds": 0.0}
+
+    rows = np.arange(items, dtype=np.int64)
+    # Hash the raw names once and normalise only their distinct values.
+    raw = pc.dictionary_encode(names)
+    encoded = pc.dictionary_encode(normalise_product_keys(raw.dictionary))
+    raw_group = encoded.indices.cast(pa.int64()).to_numpy(zero_copy_only=False)
+    group = raw_group[raw.indices.cast(pa.int64()).to_numpy(zero_copy_only=False)]
+    groups = len(encoded.dictionary)
+    sizes = np.bincount(group, minlength=groups)
+    first_row = _first_rows(group, rows, groups, items)
+    document = table.column(DOCUMENT_COLUMN).to_numpy()
+
+    # Distinct NCMs per product, in order of first appearance.
+    ncm = text_values(table, "produto_ncm")
+    ncm = pc.if_else(pc.equal(ncm, ""), pa.scalar(_NO_NCM, type=ncm.type), ncm)
+    ncm_encoded = pc.dictionary_encode(ncm)
+    ncm_ids = ncm_encoded.indices.cast(pa.int64()).to_numpy(zero_copy_only=False)
+    pairs, pair_first = np.unique(group * len(ncm_encoded.dictionary) + ncm_ids, return_index=True)
+    pair_group = pairs // len(ncm_encoded.dictionary)
+    distinct_ncms = np.bincount(pair_group, minlength=groups)
+
+    # Min/max positive unit price per product and the first item holding each.
+    price = table.column("produto_valor_unit").to_numpy()
+    priced = rows[price > 0]
+    low = np.full(groups, np.inf)
+    high = np.full(groups, -np.inf)
+    np.minimum.at(low, group[priced], price[priced])
+    np.maximum.at(high, group[priced], price[priced])
+    low_row = _first_rows(group, priced[price[priced] == low[group[priced]]], groups, items)
+    high_row = _first_rows(group, priced[price[priced] == high[group[priced]]], groups, items)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variation = np.where(np.isfinite(low) & (high > low), (high - low) / low, 0.0)
+
+    candidates = np.flatnonzero((sizes >= 2) & ((distinct_ncms > 1) | (variation > threshold)))
+    ncm_values = ncm_encoded.dictionary.to_pylist()
+    by_group = np.lexsort((pair_first, pair_group))
+    starts = np.searchsorted(pair_group[by_group], candidates)
+    stops = np.searchsorted(pair_group[by_group], candidates + 1)
+    order = np.argsort(first_row[candidates], kind="stable")
+    displays = names.take(pa.array(first_row[candidates][order])).to_pylist()
+    keys = encoded.dictionary.take(pa.array(candidates[order])).to_pylist()
+    for position, display, key in zip(order.tolist(), displays, keys):
+        product = int(candidates[position])
+        if distinct_ncms[product] > 1:
+            start, stop = starts[position], stops[position]
+            seen = [int(pair_first[index]) for index in by_group[start:stop]]
+            values = [ncm_values[int(ncm_ids[row])] for row in seen]
+            findings.append(
+                {
+                    "comparisonKey": display,
+                    "normalizedKey": key,
+                    "attribute": "NCM",
+                    "description": (
+                        f'O produto "{display}" foi encontrado com múltiplos códigos NCM '
+                        f"({', '.join(values)}), o que pode levar a tributação inconsistente."
+                    ),
+                    "discrepancies": [
+                        {
+                            "valueA": values[0],
+                            "docA": int(document[seen[0]]),
+                            "valueB": value,
+                            "docB": int(document[row]),
+                        }
+                        for value, row in zip(values[1:], seen[1:])
+                    ],
+                    "severity": "ALERTA",
+                }
+            )
+        if variation[product] > threshold:
+            findings.append(
+                {
+                    "comparisonKey": display,
+                    "normalizedKey": key,
+                    "attribute": "Preço Unitário",
+                    "description": (
+                        f"Variação de preço de {variation[product] * 100:.0f}% detectada para o "
+                        f'produto "{display}".'
+                    ),
+                    "discrepancies": [
+                        {
+                            "valueA": _brl(float(low[product])),
+                            "docA": int(document[low_row[product]]),
+                            "valueB": _brl(float(high[product])),
+                            "docB": int(document[high_row[product]]),
+                        }
+                    ],
+                    "severity": "ALERTA",
+                }
+            )
+
+    return {
+        "findings": findings,
+        "documents": list(documents),
+        "items": items,
+        "products": groups,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+__all__ = [
+    "CROSS_VALIDATION_COLUMNS",
+    "CrossValidationFinding",
+    "CrossValidationResult",
+    "DOCUMENT_COLUMN",
+    "Discrepancy",
+    "DocumentRef",
+    "PRICE_VARIATION_THRESHOLD",
+    "collect_item_sources",
+    "cross_validate_items",
+    "drop_error_documents",
+    "normalise_product_keys",
+]
@@ -2,18 +2,63 @@
 
 from __future__ import annotations
 
+import codecs
 import csv
+import datetime as dt
 import io
 import logging
-from dataclasses import dataclass
+import math
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import BinaryIO, TypedDict
+from typing import BinaryIO, Iterable, Iterator, TypedDict
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .column_profiler import ColumnProfile, profile_columns, update_distinct_values
+from .sketches import HLL_PRECISION, ColumnSketch, HyperLogLog, TopValue, hash_values
 
 # Use standard logging for compatibility with FastAPI/Uvicorn
 logger = logging.getLogger(__name__)
 
+# Bump whenever the analysis output changes so cached results are not reused.
+ANALYZER_VERSION = "7"
+
+# Memory ceiling used by the streaming mode when the caller does not provide one.
+DEFAULT_STREAM_MEMORY_BYTES = 32 * 1024 * 1024  # 32 MiB
+# Rough ratio between raw CSV bytes and the in-memory size of a parsed row.
+_STREAM_ROW_OVERHEAD = 8
+_STREAM_MIN_CHUNK_ROWS = 256
+# Never converted to numbers, even when every value looks like one (product codes).
+_TEXT_ONLY_COLUMNS = frozenset({"product"})
+# Three standard errors of the distinct-count estimate.
+_HLL_TOLERANCE = 3 * 1.04 / math.sqrt(1 << HLL_PRECISION)
+_SKETCH_MIN_CAPACITY = 256
+
+# Dialect detection mirrors `determineDelimiter` in utils/importPipeline.ts.
+_SNIFF_SAMPLE_BYTES = 64 * 1024
+_DELIMITER_CANDIDATES = (",", ";", "\t", "|", "^", "~")
+_QUOTE_CANDIDATES = ('"', "'")
+# Parsers tried in order; the python engine only runs when the fast ones fail.
+_EAGER_ENGINES = ("pyarrow", "c", "python")
+CHUNKED_ENGINES = ("c", "python")
+_TEXT_DTYPE = pd.ArrowDtype(pa.large_string())
+
+# Locale-aware numeric detection for string columns (e.g. `R$ 1.234,56`, `(10,00)`).
+_LOCALE_SAMPLE_SIZE = 200
+_NUMERIC_MIN_RATIO = 0.5
+_NUMBER_WRAPPER = r"^\(?\s*-?\s*(?:R\$|US\$|\$|€)?\s*-?\s*(?:{body})\s*-?\s*\)?$"
+_NUMBER_PATTERNS = {
+    "pt-BR": _NUMBER_WRAPPER.format(body=r"(?:\d{1,3}(?:\.\d{3})+|\d+)(?:,\d+)?"),
+    "en-US": _NUMBER_WRAPPER.format(body=r"(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?|\.\d+"),
+}
+_STRIP_PATTERNS = {"pt-BR": r"[^0-9,]", "en-US": r"[^0-9.]"}
+_PLAIN_NUMBER = r"^-?\d+(?:\.\d+)?$"
+_NEGATIVE_MARKERS = r"^\(.*\)$|-"
+
 
 class CSVAnalysisError(RuntimeError):
     """Raised when a CSV file cannot be analysed."""
@@ -25,6 +70,9 @@ class ColumnStats(TypedDict, total=False):
     std: float | None
     nulls_pct: float | None
     non_nulls: int | None
+    median_approximate: bool
+    distinct_approx: int
+    top_values: list[TopValue]
 
 
 class CSVAnalysis(TypedDict, total=False):
@@ -32,6 +80,8 @@ class CSVAnalysis(TypedDict, total=False):
     row_count: int
     stats: dict[str, ColumnStats]
     diagnostics: dict[str, object]
+    profiles: list[ColumnProfile]
+    sketches: dict[str, dict[str, object]]
 
 
 @dataclass(slots=True)
@@ -39,19 +89,98 @@ class _CSVLoadResult:
     dataframe: pd.DataFrame
     encoding: str
     delimiter: str | None
+    quotechar: str = '"'
+    engine: str = "python"
+    parse_seconds: float = 0.0
+    engine_failures: dict[str, str] = field(default_factory=dict)
 
 
-def _load_robust_csv(stream: BinaryIO, *, filename: str | None = None) -> _CSVLoadResult:
+@dataclass(slots=True)
+class _NumericConversion:
+    """Per-column report of the locale-aware numeric conversion."""
+
+    locale: str
+    converted: int = 0
+    coerced: int = 0
+    failed: int = 0
+
+    def merge(self, other: _NumericConversion) -> None:
+        self.converted += other.converted
+        self.coerced += other.coerced
+        self.failed += other.failed
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "locale": self.locale,
+            "converted": self.converted,
+            "coerced": self.coerced,
+            "failed": self.failed,
+        }
+
+
+@dataclass(slots=True)
+class CSVFormat:
+    """Encoding and dialect sniffed from the head of a CSV stream."""
+
+    encoding: str
+    delimiter: str | None
+    sample_bytes: bytes
+    quotechar: str = '"'
+
+
+def _score_dialect(sample_text: str, delimiter: str, quotechar: str) -> tuple[int, int]:
     """
-    Loads a CSV from a binary stream with automatic dialect and encoding detection.
+    Scores a dialect like the frontend does: more header fields is better,
+    ragged rows and blank header names are penalised.
+
+    Every record of the sample counts (quoted fields may span lines); blank
+    lines are ignored.
+    """
+    reader = csv.reader(io.StringIO(sample_text), delimiter=delimiter, quotechar=quotechar)
+    try:
+        rows = [row for row in reader if any(field.strip() for field in row)]
+    except csv.Error:
+        return -(10**9), 0
+    if not rows:
+        return -(10**9), 0
+    header = [name.strip() for name in rows[0]]
+    unique_fields = len({name for name in header if name})
+    ragged_rows = sum(1 for row in rows[1:] if len(row) != len(header))
+    score = len(header) * 2 - ragged_rows * 5 - (3 if "" in header else 0)
+    return score, unique_fields
+
+
+def _detect_delimiter(sample_text: str) -> tuple[str | None, str]:
+    best: tuple[str | None, str] = (None, '"')
+    best_score = -(10**9)
+    for delimiter in _DELIMITER_CANDIDATES:
+        for quotechar in _QUOTE_CANDIDATES:
+            score, unique_fields = _score_dialect(sample_text, delimiter, quotechar)
+            # Strict comparison keeps the earlier candidate (and the double quote) on ties.
+            if score > best_score and unique_fields > 0:
+                best_score = score
+                best = (delimiter, quotechar)
+    return best
+
+
+def detect_csv_format(stream: BinaryIO, *, filename: str | None = None) -> CSVFormat:
+    """
+    Detects encoding, delimiter and quote character from the head of the stream and rewinds it.
+
+    The head is the first 64 KB cut back to the last complete line; all of its
+    records are scored, so a dialect that only breaks further down still loses.
     """
     # 1. Detect Encoding
     encoding = "utf-8"  # Default
+    sample_bytes = stream.read(_SNIFF_SAMPLE_BYTES)
+    stream.seek(0)
+    truncated = len(sample_bytes) == _SNIFF_SAMPLE_BYTES
+    if truncated:
+        # Drop the partial last line so it does not count as a ragged row.
+        sample_bytes = sample_bytes[: sample_bytes.rfind(b"\n") + 1] or sample_bytes
     try:
-        sample_bytes = stream.read(2048)
-        stream.seek(0)
-        # Simple encoding detection, can be expanded
-        sample_bytes.decode('utf-8-sig')
+        # Incremental decoding tolerates a multi-byte character cut at the sample edge.
+        codecs.getincrementaldecoder('utf-8-sig')().decode(sample_bytes, final=not truncated)
         encoding = 'utf-8-sig'
     except UnicodeDecodeError:
         try:
@@ -61,73 +190,712 @@ def _load_robust_csv(stream: BinaryIO, *, filename: str | None = None) -> _CSVLo
             logger.warning("Could not detect encoding, falling back to utf-8 with errors ignored.", extra={"csv_filename": filename})
             encoding = 'utf-8'  # Fallback
 
-    # 2. Detect Dialect (Delimiter)
-    delimiter = None
-    try:
-        sample_text = sample_bytes.decode(encoding, errors='ignore')
-        dialect = csv.Sniffer().sniff(sample_text)
-        delimiter = dialect.delimiter
-        logger.info(f"Detected CSV dialect: delimiter='{delimiter}'", extra={"csv_filename": filename})
-    except (csv.Error, UnicodeDecodeError):
+    # 2. Detect Dialect (Delimiter and quote character)
+    sample_text = sample_bytes.decode(encoding, errors='ignore')
+    delimiter, quotechar = _detect_delimiter(sample_text)
+    if delimiter is None:
         logger.warning("Could not detect CSV dialect, pandas will auto-detect.", extra={"csv_filename": filename})
+    else:
+        logger.info(f"Detected CSV dialect: delimiter='{delimiter}' quotechar='{quotechar}'", extra={"csv_filename": filename})
+
+    return CSVFormat(
+        encoding=encoding,
+        delimiter=delimiter,
+        sample_bytes=sample_bytes,
+        quotechar=quotechar,
+    )
 
-    stream.seek(0)
+
+def _read_csv_options(fmt: CSVFormat, engine: str, *, as_text: bool = False) -> dict[str, object]:
+    options: dict[str, object] = {
+        "sep": fmt.delimiter,
+        "encoding": fmt.encoding,
+        "engine": engine,
+        "dtype_backend": 'pyarrow',
+        "on_bad_lines": 'warn',
+    }
+    if fmt.delimiter is not None:
+        options["quotechar"] = fmt.quotechar
+    if as_text:
+        options["dtype"] = _TEXT_DTYPE
+    return options
+
+
+def _load_robust_csv(stream: BinaryIO, *, filename: str | None = None) -> _CSVLoadResult:
+    """
+    Loads a CSV from a binary stream with automatic dialect and encoding detection.
+    """
+    fmt = detect_csv_format(stream, filename=filename)
+    # 'python' engine is needed for sep=None, so skip the fast parsers without a delimiter.
+    engines = _EAGER_ENGINES if fmt.delimiter is not None else ("python",)
+    failures: dict[str, str] = {}
+    df: pd.DataFrame | None = None
+    for engine in engines:
+        stream.seek(0)
+        started = time.perf_counter()
+        try:
+            df = pd.read_csv(stream, **_read_csv_options(fmt, engine))
+        except Exception as exc:
+            failures[engine] = str(exc)
+            logger.warning(
+                "csv_engine_failed",
+                extra={"csv_filename": filename, "engine": engine, "error": str(exc)},
+            )
+            continue
+        parse_seconds = time.perf_counter() - started
+        break
+
+    if df is None:
+        message = f"Pandas failed to read CSV '{filename or ''}': {failures.get('python') or failures}"
+        logger.error("csv_load_failed", extra={"csv_filename": filename, "error": str(failures)})
+        raise CSVAnalysisError(message)
+
+    if df.empty:
+        raise CSVAnalysisError(f"CSV '{filename or ''}' is empty or could not be parsed.")
+
+    return _CSVLoadResult(
+        dataframe=df,
+        encoding=fmt.encoding,
+        delimiter=fmt.delimiter,
+        quotechar=fmt.quotechar,
+        engine=engine,
+        parse_seconds=parse_seconds,
+        engine_failures=failures,
+    )
+
+
+def iter_csv_chunks(
+    stream: BinaryIO,
+    fmt: CSVFormat,
+    *,
+    chunk_rows: int,
+    engine: str,
+    filename: str | None = None,
+    as_text: bool = False,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields bounded DataFrame chunks parsed with the same options as the eager loader.
+
+    ``as_text=True`` keeps every column as Arrow strings, so chunks share one
+    schema regardless of what type inference would make of each of them.
+    """
+    options = _read_csv_options(fmt, engine, as_text=as_text)
     try:
-        df = pd.read_csv(
-            stream,
-            sep=delimiter,
-            encoding=encoding,
-            engine='python',  # 'python' engine is needed for sep=None
-            dtype_backend='pyarrow',
-            on_bad_lines='warn',
-        )
+        with pd.read_csv(stream, chunksize=chunk_rows, **options) as reader:
+            yield from reader
     except Exception as exc:
         message = f"Pandas failed to read CSV '{filename or ''}': {exc}"
         logger.error("csv_load_failed", extra={"csv_filename": filename, "error": str(exc)})
         raise CSVAnalysisError(message) from exc
 
-    if df.empty:
+
+def _as_arrow_strings(series: pd.Series) -> pa.Array:
+    values = series.array
+    if hasattr(values, "__arrow_array__"):
+        array = pa.array(values)
+    else:
+        array = pa.array(series, type=pa.large_string(), from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    return pc.utf8_trim_whitespace(array.cast(pa.large_string()))
+
+
+def _count_true(mask: pa.Array) -> int:
+    return int(pc.sum(mask.cast(pa.int64())).as_py() or 0)
+
+
+def _detect_numeric_locale(values: pa.Array) -> str | None:
+    """
+    Picks the numeric locale of a string column from a sample of its values.
+
+    Comma decimals, dotted thousands groups and `R$` prefixes vote for pt-BR,
+    dot decimals and comma thousands vote for en-US; ambiguous samples keep
+    en-US, which is what a plain `to_numeric` would assume. Returns ``None``
+    when too few values look numeric at all.
+    """
+    sample = pc.drop_null(values).slice(0, _LOCALE_SAMPLE_SIZE)
+    sample = pc.filter(sample, pc.not_equal(sample, ""))
+    if len(sample) == 0:
+        return None
+
+    pt_match = pc.match_substring_regex(sample, _NUMBER_PATTERNS["pt-BR"])
+    en_match = pc.match_substring_regex(sample, _NUMBER_PATTERNS["en-US"])
+    pt_votes = _count_true(pc.and_not(pt_match, en_match))
+    pt_votes += _count_true(pc.match_substring_regex(sample, r"R\$"))
+    en_votes = _count_true(pc.and_not(en_match, pt_match))
+
+    locale = "pt-BR" if pt_votes > en_votes else "en-US"
+    matches = pt_match if locale == "pt-BR" else en_match
+    if _count_true(matches) / len(sample) < _NUMERIC_MIN_RATIO:
+        return None
+    return locale
+
+
+def _convert_numeric_strings(
+    values: pa.Array, locale: str
+) -> tuple[pa.Array, _NumericConversion]:
+    """
+    Converts a whole string column to float64 with Arrow kernels only.
+
+    Values that do not match the locale's number shape become null.
+    """
+    valid = pc.fill_null(pc.match_substring_regex(values, _NUMBER_PATTERNS[locale]), False)
+    cleaned = pc.replace_substring_regex(values, _STRIP_PATTERNS[locale], "")
+    if locale == "pt-BR":
+        cleaned = pc.replace_substring(cleaned, ",", ".")
+    cleaned = pc.if_else(valid, cleaned, pa.scalar(None, type=cleaned.type))
+    numbers = pc.cast(cleaned, pa.float64())
+
+    negative = pc.fill_null(pc.match_substring_regex(values, _NEGATIVE_MARKERS), False)
+    numbers = pc.if_else(negative, pc.negate(numbers), numbers)
+
+    plain = pc.fill_null(pc.match_substring_regex(values, _PLAIN_NUMBER), False)
+    non_blank = len(values) - values.null_count - _count_true(pc.fill_null(pc.equal(values, ""), False))
+    converted = _count_true(valid)
+    report = _NumericConversion(
+        locale=locale,
+        converted=converted,
+        coerced=_count_true(pc.and_not(valid, plain)),
+        failed=non_blank - converted,
+    )
+    return numbers, report
+
+
+def _coerce_numeric_column(
+    column: str,
+    series: pd.Series,
+    *,
+    locale: str | None = None,
+) -> tuple[pd.Series | None, _NumericConversion | None]:
+    """
+    Converts a string column to floats, returning ``(None, None)`` when it should stay as is.
+
+    ``locale`` pins the number format (streaming mode reuses the first chunk's);
+    otherwise it is detected from the column itself.
+    """
+    if not pd.api.types.is_string_dtype(series):
+        return None, None
+    if column.lower() in _TEXT_ONLY_COLUMNS:
+        return None, None
+
+    values = _as_arrow_strings(series)
+    locale = locale or _detect_numeric_locale(values)
+    if locale is None:
+        return None, None
+
+    numbers, report = _convert_numeric_strings(values, locale)
+    # Only update the column if it contains at least one valid number
+    if report.converted == 0:
+        return None, None
+    converted_series = pd.Series(
+        numbers.to_numpy(zero_copy_only=False),
+        index=series.index,
+        name=series.name,
+        dtype=float,
+    )
+    return converted_series, report
+
+
+def _json_safe_preview(df: pd.DataFrame) -> list[dict]:
+    preview = df.head(3).to_dict(orient="records")
+    # Convert pyarrow types in preview to standard python types for JSON serialization
+    for row in preview:
+        for key, value in row.items():
+            if hasattr(value, 'as_py'):  # Check if it's a pyarrow scalar
+                value = value.as_py()
+            if pd.isna(value):
+                row[key] = None
+            elif isinstance(value, (dt.date, dt.time)):  # the Arrow engine parses ISO dates
+                row[key] = value.isoformat()
+            else:
+                row[key] = value
+    return preview
+
+
+class _QuantileSketch:
+    """
+    Mergeable KLL-style quantile sketch that retains at most ``capacity`` values.
+
+    Values stay exact until the first compaction; after that each retained value
+    at level ``h`` stands for ``2**h`` observations.
+    """
+
+    __slots__ = ("capacity", "levels", "compacted", "_offset")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(int(capacity), _SKETCH_MIN_CAPACITY)
+        self.levels: list[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self.compacted = False
+        self._offset = 0
+
+    @property
+    def size(self) -> int:
+        return sum(len(level) for level in self.levels)
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values.astype(np.float64, copy=False)])
+        self._shrink()
+
+    def merge(self, other: _QuantileSketch) -> None:
+        for height, level in enumerate(other.levels):
+            if height >= len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            self.levels[height] = np.concatenate([self.levels[height], level])
+        self.compacted = self.compacted or other.compacted
+        self._shrink()
+
+    def _shrink(self) -> None:
+        while self.size > self.capacity:
+            self._compact(self._pick_level())
+
+    def _pick_level(self) -> int:
+        # Lower levels get geometrically smaller budgets, as in KLL.
+        top_capacity = self.capacity / 3
+        depth = len(self.levels)
+        for height, level in enumerate(self.levels):
+            level_capacity = max(2, int(top_capacity * (2 / 3) ** (depth - 1 - height)))
+            if len(level) >= level_capacity:
+                return height
+        return max(range(depth), key=lambda height: len(self.levels[height]))
+
+    def _compact(self, height: int) -> None:
+        level = np.sort(self.levels[height])
+        keep = level[-1:] if len(level) % 2 else level[:0]
+        paired = level[: len(level) - len(keep)]
+        promoted = paired[self._offset :: 2]
+        # Alternate the offset so compaction errors cancel out instead of drifting.
+        self._offset ^= 1
+        if height + 1 >= len(self.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        self.levels[height + 1] = np.concatenate([self.levels[height + 1], promoted])
+        self.levels[height] = keep
+        self.compacted = True
+
+    def median(self) -> float:
+        if not self.compacted:
+            return float(np.median(self.levels[0])) if len(self.levels[0]) else math.nan
+        values = np.concatenate(self.levels)
+        if len(values) == 0:
+            return math.nan
+        weights = np.concatenate(
+            [np.full(len(level), 2.0**height) for height, level in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        index = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        return float(values[order][index])
+
+
+@dataclass(slots=True)
+class _ColumnAccumulator:
+    """Per-column running state for the streaming analysis."""
+
+    sketch: _QuantileSketch
+    rows: int = 0
+    raw_nulls: int = 0
+    numeric_nulls: int = 0
+    is_numeric: bool = False
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    minimum: float = math.inf
+    maximum: float = -math.inf
+    dtype: str | None = None
+    conversion: _NumericConversion | None = None
+    frequencies: ColumnSketch | None = None
+    # Whole-file distinct count of the trimmed, non-blank values the profiles use.
+    distinct: HyperLogLog | None = None
+    present: int = 0
+
+    def record_conversion(self, report: _NumericConversion | None) -> None:
+        if report is None:
+            return
+        if self.conversion is None:
+            self.conversion = report
+        else:
+            self.conversion.merge(report)
+
+    def update(self, raw: pd.Series, numeric: pd.Series | None) -> None:
+        rows = len(raw)
+        self.rows += rows
+        self.raw_nulls += int(raw.isnull().sum())
+        if self.frequencies is not None or self.distinct is not None:
+            strings = _as_arrow_strings(raw)
+            if self.frequencies is not None:
+                self.frequencies.update(strings)
+            if self.distinct is not None:
+                present = pc.filter(strings, pc.fill_null(pc.not_equal(strings, ""), False))
+                self.present += len(present)
+                self.distinct.add_hashes(hash_values(pc.unique(present)))
+        if numeric is None:
+            # The eager path coerces these rows to NaN once the column turns numeric.
+            self.numeric_nulls += rows
+            return
+
+        values = numeric.dropna().to_numpy(dtype=np.float64, na_value=np.nan)
+        self.numeric_nulls += rows - len(values)
+        if len(values) == 0:
+            return
+        self.is_numeric = True
+
+        # Chan et al. parallel update of Welford's running mean and M2.
+        chunk_count = len(values)
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        self.mean += delta * chunk_count / total
+        self.m2 += chunk_m2 + delta * delta * self.count * chunk_count / total
+        self.count = total
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.sketch.update(values)
+
+    def to_stats(self) -> ColumnStats:
+        nulls = self.numeric_nulls if self.is_numeric else self.raw_nulls
+        stats: ColumnStats = {
+            "nulls_pct": (nulls / self.rows * 100) if self.rows else 0.0,
+            "non_nulls": self.rows - nulls,
+        }
+        if self.is_numeric:
+            stats["mean"] = self.mean
+            stats["median"] = self.sketch.median()
+            stats["std"] = math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+            stats["median_approximate"] = self.sketch.compacted
+        else:
+            stats["mean"] = None
+            stats["median"] = None
+            stats["std"] = None
+            stats["median_approximate"] = False
+        if self.frequencies is not None:
+            stats["distinct_approx"] = self.frequencies.distinct_count()
+            stats["top_values"] = self.frequencies.top()
+        return stats
+
+
+@dataclass(slots=True)
+class _StreamingState:
+    columns: list[str] = field(default_factory=list)
+    accumulators: dict[str, _ColumnAccumulator] = field(default_factory=dict)
+    preview: list[dict] = field(default_factory=list)
+    profiles: list[ColumnProfile] | None = None
+    row_count: int = 0
+    chunks: int = 0
+
+
+def _stream_chunk_rows(sample_bytes: bytes, chunk_budget: int) -> int:
+    lines = max(sample_bytes.count(b"\n"), 1)
+    bytes_per_row = max(len(sample_bytes) / lines, 1.0) * _STREAM_ROW_OVERHEAD
+    return max(_STREAM_MIN_CHUNK_ROWS, int(chunk_budget // bytes_per_row))
+
+
+def _numeric_columns(df: pd.DataFrame) -> dict[str, pd.Series]:
+    return {
+        str(column): df[column]
+        for column in df.columns
+        if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])
+    }
+
+
+def _apply_stream_totals(
+    profiles: list[ColumnProfile], accumulators: dict[str, _ColumnAccumulator]
+) -> None:
+    """
+    Replace first-chunk figures with whole-file ones where the accumulators have them.
+
+    Null share, numeric stats and distinct counts (hence duplicate detection)
+    cover the whole file. The semantic type, sample values and outlier rate
+    are inferred from the first chunk, which ``sampledRows`` records.
+    """
+    for profile in profiles:
+        accumulator = accumulators[profile["name"]]
+        if accumulator.distinct is not None:
+            unique = accumulator.distinct.estimate()
+            if unique >= accumulator.present * (1 - _HLL_TOLERANCE):
+                # Within the estimate's error of "all distinct": do not report duplicates.
+                unique = accumulator.present
+            # The first chunk's exact count is a lower bound.
+            update_distinct_values(
+                profile, max(unique, profile["uniqueValues"]), accumulator.present
+            )
+        nulls = accumulator.numeric_nulls if accumulator.is_numeric else accumulator.raw_nulls
+        if accumulator.rows:
+            profile["nullPercentage"] = nulls / accumulator.rows
+        if "stats" in profile and accumulator.count:
+            profile["stats"] = {
+                "min": accumulator.minimum,
+                "max": accumulator.maximum,
+                "mean": accumulator.mean,
+                "median": accumulator.sketch.median(),
+                "stdDev": math.sqrt(accumulator.m2 / accumulator.count),
+            }
+
+
+def _analyse_csv_streaming(
+    stream: BinaryIO,
+    *,
+    filename: str | None,
+    memory_limit_bytes: int,
+    profile: bool,
+    sketches: bool,
+) -> CSVAnalysis:
+    """
+    Single pass over bounded chunks, updating per-column accumulators as it goes.
+
+    Half of the memory ceiling is reserved for the parsed chunk and the other
+    half is shared by the per-column quantile sketches. If the C parser chokes on
+    a malformed file the pass restarts from scratch with the python engine.
+    """
+    fmt = detect_csv_format(stream, filename=filename)
+    chunk_budget = memory_limit_bytes // 2
+    chunk_rows = _stream_chunk_rows(fmt.sample_bytes, chunk_budget)
+
+    engines = CHUNKED_ENGINES if fmt.delimiter is not None else ("python",)
+    failures: dict[str, str] = {}
+    for engine in engines:
+        stream.seek(0)
+        started = time.perf_counter()
+        try:
+            state = _consume_chunks(
+                iter_csv_chunks(
+                    stream, fmt, chunk_rows=chunk_rows, engine=engine, filename=filename
+                ),
+                sketch_budget=memory_limit_bytes - chunk_budget,
+                profile=profile,
+                sketches=sketches,
+            )
+        except CSVAnalysisError as exc:
+            failures[engine] = str(exc)
+            if engine == engines[-1]:
+                raise
+            logger.warning(
+                "csv_engine_failed",
+                extra={"csv_filename": filename, "engine": engine, "error": str(exc)},
+            )
+            continue
+        parse_seconds = time.perf_counter() - started
+        break
+
+    return _streaming_result(
+        state,
+        filename=filename,
+        diagnostics={
+            "encoding": fmt.encoding,
+            "delimiter": fmt.delimiter or "auto",
+            "quotechar": fmt.quotechar,
+            "engine": engine,
+            "parse_seconds": parse_seconds,
+            "engine_failures": failures,
+            "chunk_rows": chunk_rows,
+            "memory_limit_bytes": memory_limit_bytes,
+        },
+    )
+
+
+def _streaming_result(
+    state: _StreamingState, *, filename: str | None, diagnostics: dict[str, object]
+) -> CSVAnalysis:
+    if state.row_count == 0:
         raise CSVAnalysisError(f"CSV '{filename or ''}' is empty or could not be parsed.")
 
-    return _CSVLoadResult(dataframe=df, encoding=encoding, delimiter=delimiter)
+    analysis: CSVAnalysis = {
+        "columns": state.columns,
+        "row_count": state.row_count,
+        "stats": {column: acc.to_stats() for column, acc in state.accumulators.items()},
+        "diagnostics": {
+            **diagnostics,
+            "dtypes": {column: acc.dtype for column, acc in state.accumulators.items()},
+            "preview": state.preview,
+            "numeric_conversion": {
+                column: acc.conversion.as_dict()
+                for column, acc in state.accumulators.items()
+                if acc.conversion is not None
+            },
+            "mode": "streaming",
+            "chunks": state.chunks,
+        },
+    }
+    if state.profiles is not None:
+        _apply_stream_totals(state.profiles, state.accumulators)
+        analysis["profiles"] = state.profiles
+    frequencies = {
+        column: acc.frequencies.to_dict()
+        for column, acc in state.accumulators.items()
+        if acc.frequencies is not None
+    }
+    if frequencies:
+        analysis["sketches"] = frequencies
+
+    logger.info(
+        "csv_analysis_completed",
+        extra={
+            "csv_filename": filename,
+            "columns": len(analysis["columns"]),
+            "rows": analysis["row_count"],
+            "chunks": state.chunks,
+            "engine": diagnostics.get("engine"),
+        }
+    )
+
+    return analysis
+
+
+def _consume_chunks(
+    chunks: Iterable[pd.DataFrame],
+    *,
+    sketch_budget: int,
+    profile: bool,
+    sketches: bool = False,
+) -> _StreamingState:
+    state = _StreamingState()
+    for chunk in chunks:
+        if not state.columns:
+            state.columns = chunk.columns.astype(str).tolist()
+            capacity = sketch_budget // (np.dtype(np.float64).itemsize * max(len(state.columns), 1))
+            state.accumulators = {
+                column: _ColumnAccumulator(
+                    sketch=_QuantileSketch(capacity),
+                    frequencies=ColumnSketch() if sketches else None,
+                    distinct=HyperLogLog() if profile else None,
+                )
+                for column in state.columns
+            }
+
+        chunk.columns = state.columns
+        raw_chunk = chunk.copy(deep=False) if profile and state.profiles is None else None
+        for column in state.columns:
+            raw = chunk[column]
+            accumulator = state.accumulators[column]
+            locale = accumulator.conversion.locale if accumulator.conversion else None
+            numeric, report = _coerce_numeric_column(column, raw, locale=locale)
+            if numeric is not None:
+                chunk[column] = numeric
+            elif pd.api.types.is_numeric_dtype(raw):
+                numeric = raw
+            accumulator.record_conversion(report)
+            accumulator.update(raw, numeric)
+            if accumulator.dtype is None or numeric is not None:
+                accumulator.dtype = str(chunk[column].dtype)
+
+        if raw_chunk is not None:
+            # Semantic profiles come from the first chunk; totals are patched in at the end.
+            state.profiles = profile_columns(raw_chunk, _numeric_columns(chunk))
+            for column_profile in state.profiles:
+                column_profile["sampledRows"] = len(raw_chunk)
+        if not state.preview:
+            state.preview = _json_safe_preview(chunk)
+        state.row_count += len(chunk)
+        state.chunks += 1
+    return state
+
+
+def analyse_frame_chunks(
+    chunks: Iterable[pd.DataFrame],
+    *,
+    filename: str | None = None,
+    memory_limit_bytes: int | None = None,
+    diagnostics: dict[str, object] | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+) -> CSVAnalysis:
+    """
+    Streaming analysis over already parsed chunks (e.g. a staged Arrow file).
+
+    Chunks must share their column names; ``diagnostics`` is merged into the
+    result so callers can describe where the chunks came from.
+    """
+    memory_limit_bytes = memory_limit_bytes or DEFAULT_STREAM_MEMORY_BYTES
+    state = _consume_chunks(
+        chunks, sketch_budget=memory_limit_bytes // 2, profile=profile, sketches=sketches
+    )
+    return _streaming_result(
+        state,
+        filename=filename,
+        diagnostics={**(diagnostics or {}), "memory_limit_bytes": memory_limit_bytes},
+    )
 
 
-def analyse_csv_stream(stream: BinaryIO, *, filename: str | None = None) -> CSVAnalysis:
+def analyse_csv_stream(
+    stream: BinaryIO,
+    *,
+    filename: str | None = None,
+    streaming: bool = False,
+    memory_limit_bytes: int | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+) -> CSVAnalysis:
     """
     Read a CSV-like stream and compute descriptive statistics using a robust pipeline.
+
+    ``profile=True`` adds semantic column profiles (see ``column_profiler``).
+    ``sketches=True`` adds approximate distinct counts and top values to each
+    column's stats, plus the serialized sketches under ``sketches`` so several
+    analyses can be merged later (see ``sketches.merge_analysis_sketches``).
+
+    With ``streaming=True`` the file is read in bounded chunks and statistics are
+    updated online, keeping memory under ``memory_limit_bytes``. Medians then come
+    from a quantile sketch; ``median_approximate`` tells whether it had to compact.
     """
+    if streaming:
+        return _analyse_csv_streaming(
+            stream,
+            filename=filename,
+            memory_limit_bytes=memory_limit_bytes or DEFAULT_STREAM_MEMORY_BYTES,
+            profile=profile,
+            sketches=sketches,
+        )
+
     load_result = _load_robust_csv(stream, filename=filename)
-    df = load_result.dataframe
+    return analyse_dataframe(
+        load_result.dataframe,
+        filename=filename,
+        diagnostics={
+            "encoding": load_result.encoding,
+            "delimiter": load_result.delimiter or "auto",
+            "quotechar": load_result.quotechar,
+            "engine": load_result.engine,
+            "parse_seconds": load_result.parse_seconds,
+            "engine_failures": load_result.engine_failures,
+        },
+        profile=profile,
+        sketches=sketches,
+    )
+
 
+def analyse_dataframe(
+    df: pd.DataFrame,
+    *,
+    filename: str | None = None,
+    diagnostics: dict[str, object] | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+) -> CSVAnalysis:
+    """
+    Eager analysis of an already parsed table; ``df`` is converted in place.
+
+    ``diagnostics`` describes how the table was loaded and is merged into the result.
+    """
+    diagnostics = diagnostics or {}
     logger.info(f"CSV loaded. Columns: {df.columns.tolist()}", extra={"csv_filename": filename})
     logger.info(f"Initial dtypes: {df.dtypes.to_dict()}", extra={"csv_filename": filename})
     logger.info(f"Data preview (head):\n{df.head(3)}", extra={"csv_filename": filename})
 
-    # --- Corrected Numeric Conversion ---
-    for col in df.columns:
-        if col.lower() == "product": # Explicitly skip 'product' column from numeric conversion
-            continue
-
-        if pd.api.types.is_string_dtype(df[col]):
-            series = df[col]
-            converted_series = pd.Series(dtype=float) # Initialize an empty float series
-
-            if col.lower() in ["valor", "price"]:
-                # Apply cleaning to the entire series for known currency columns
-                cleaned_series = (
-                    series
-                    .str.replace(r"[^0-9,.]", "", regex=True)  # Remove non-numeric chars
-                    .str.replace(".", "", regex=False)
-                    .str.replace(",", ".", regex=False)
-                )
-                converted_series = pd.to_numeric(cleaned_series, errors="coerce")
-            else:
-                # For other string columns, try direct numeric conversion
-                converted_series = pd.to_numeric(series, errors="coerce")
+    raw_df = df.copy(deep=False) if profile else None
+    frequencies: dict[str, ColumnSketch] = {}
+    if sketches:
+        for column in df.columns:
+            frequencies[str(column)] = ColumnSketch()
+            frequencies[str(column)].update(_as_arrow_strings(df[column]))
 
-            # Only update the column if it contains at least one valid number
-            if not converted_series.isnull().all():
-                df[col] = converted_series.astype(float)
+    # --- Locale-aware Numeric Conversion ---
+    conversions: dict[str, dict[str, object]] = {}
+    for col in df.columns:
+        converted_series, report = _coerce_numeric_column(str(col), df[col])
+        if converted_series is not None:
+            df[col] = converted_series
+            conversions[str(col)] = report.as_dict()
 
     logger.info(f"Dtypes after numeric conversion: {df.dtypes.to_dict()}", extra={"csv_filename": filename})
 
@@ -149,29 +917,31 @@ def analyse_csv_stream(stream: BinaryIO, *, filename: str | None = None) -> CSVA
             stats_for_column["mean"] = None
             stats_for_column["median"] = None
             stats_for_column["std"] = None
+        stats_for_column["median_approximate"] = False
+        if column in frequencies:
+            stats_for_column["distinct_approx"] = frequencies[column].distinct_count()
+            stats_for_column["top_values"] = frequencies[column].top()
 
         column_stats[column] = stats_for_column
 
-    preview = df.head(3).to_dict(orient="records")
-    # Convert pyarrow types in preview to standard python types for JSON serialization
-    for row in preview:
-        for key, value in row.items():
-            if pd.isna(value):
-                row[key] = None
-            elif hasattr(value, 'as_py'):  # Check if it's a pyarrow scalar
-                row[key] = value.as_py()
+    preview = _json_safe_preview(df)
 
     analysis: CSVAnalysis = {
         "columns": df.columns.astype(str).tolist(),
         "row_count": len(df),
         "stats": column_stats,
         "diagnostics": {
-            "encoding": load_result.encoding,
-            "delimiter": load_result.delimiter or "auto",
+            **diagnostics,
             "dtypes": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
             "preview": preview,
+            "numeric_conversion": conversions,
+            "mode": "eager",
         },
     }
+    if raw_df is not None:
+        analysis["profiles"] = profile_columns(raw_df, _numeric_columns(df))
+    if frequencies:
+        analysis["sketches"] = {column: sketch.to_dict() for column, sketch in frequencies.items()}
 
     logger.info(
         "csv_analysis_completed",
@@ -179,13 +949,23 @@ def analyse_csv_stream(stream: BinaryIO, *, filename: str | None = None) -> CSVA
             "csv_filename": filename,
             "columns": len(analysis["columns"]),
             "rows": analysis["row_count"],
+            "engine": diagnostics.get("engine"),
+            "parse_seconds": diagnostics.get("parse_seconds"),
         }
     )
 
     return analysis
 
 
-def analyse_csv_file(path: Path, *, original_name: str | None = None) -> CSVAnalysis:
+def analyse_csv_file(
+    path: Path,
+    *,
+    original_name: str | None = None,
+    streaming: bool = False,
+    memory_limit_bytes: int | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+) -> CSVAnalysis:
     """
     Analyse a CSV file located on disk.
     """
@@ -193,12 +973,28 @@ def analyse_csv_file(path: Path, *, original_name: str | None = None) -> CSVAnal
         raise CSVAnalysisError(f"File '{path}' not found for CSV analysis.")
 
     with path.open("rb") as buffer:
-        return analyse_csv_stream(buffer, filename=original_name or path.name)
+        return analyse_csv_stream(
+            buffer,
+            filename=original_name or path.name,
+            streaming=streaming,
+            memory_limit_bytes=memory_limit_bytes,
+            profile=profile,
+            sketches=sketches,
+        )
 
 
 __all__ = [
+    "ANALYZER_VERSION",
+    "CHUNKED_ENGINES",
     "CSVAnalysis",
     "CSVAnalysisError",
+    "CSVFormat",
+    "ColumnStats",
+    "DEFAULT_STREAM_MEMORY_BYTES",
     "analyse_csv_file",
     "analyse_csv_stream",
+    "analyse_dataframe",
+    "analyse_frame_chunks",
+    "detect_csv_format",
+    "iter_csv_chunks",
 ]
@@ -0,0 +1,338 @@
+# SPDX-License-Identifier: MIT
+"""
+Vectorised port of `runFiscalValidation` (utils/rulesEngine.ts).
+
+The frontend checks one item dict at a time; here the rules are declared as
+expressions next to the `INCONSISTENCIES` of utils/rulesDictionary.ts and
+compiled once (see `rule_compiler`) into boolean masks over a whole item table
+(the NFe parser's columns, or a CSV export with the same names), so a million
+items cost a handful of Arrow/numpy kernels per rule. Adding a rule means
+adding its dictionary entry and one `RuleDefinition`. Findings are kept as two
+parallel arrays, item row and rule index, ordered like the frontend produces
+them (by item, then by rule).
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, NotRequired, TypedDict
+
+import numpy as np
+import pyarrow as pa
+
+from .rule_compiler import (
+    CompiledRules,
+    RuleDefinition,
+    absolute,
+    compile_rules,
+    contains,
+    is_in,
+    length,
+    lower,
+    number,
+    starts_with,
+    text,
+    upper_trimmed,
+)
+
+# Bump whenever a rule changes so cached validations are not reused.
+RULES_VERSION = "2"
+
+
+class Inconsistency(TypedDict):
+    code: str
+    message: str
+    explanation: str
+    normativeBase: NotRequired[str]
+    severity: str
+
+
+INCONSISTENCIES: dict[str, Inconsistency] = {
+    "CFOP_SAIDA_EM_COMPRA": {
+        "code": "CFOP-INV-01",
+        "message": "CFOP de saída (5xxx/6xxx) em operação de compra.",
+        "explanation": (
+            "O CFOP indica uma Venda/Remessa, mas a empresa é a destinatária. Para compras, o CFOP "
+            "deveria ser de entrada (1xxx/2xxx). Isso pode indicar erro de digitação ou fraude fiscal."
+        ),
+        "normativeBase": "Anexo II do Convênio S/Nº, de 15 de dezembro de 1970.",
+        "severity": "ERRO",
+    },
+    "NCM_SERVICO_PARA_PRODUTO": {
+        "code": "NCM-INV-01",
+        "message": 'NCM "00000000" usado para um item que parece ser um produto.',
+        "explanation": (
+            'O NCM "00000000" é reservado para serviços ou itens sem classificação. Se o item é um '
+            "bem físico, ele deve ter um código NCM específico da tabela TIPI. A classificação "
+            "incorreta afeta a tributação de IPI e ICMS."
+        ),
+        "normativeBase": "Tabela de Incidência do IPI (TIPI), aprovada pelo Decreto nº 11.158/2022.",
+        "severity": "ALERTA",
+    },
+    "NCM_INVALIDO": {
+        "code": "NCM-INV-02",
+        "message": "Código NCM possui formato inválido.",
+        "explanation": (
+            "O NCM deve ser um código de 8 dígitos. Um formato incorreto pode indicar erro de "
+            "cadastro e levar à rejeição da NFe ou a uma tributação errada."
+        ),
+        "normativeBase": "Sistema Harmonizado de Designação e de Codificação de Mercadorias.",
+        "severity": "ERRO",
+    },
+    "VALOR_CALCULO_DIVERGENTE": {
+        "code": "VAL-ERR-01",
+        "message": "Valor total do item (vProd) não corresponde a Qtd x Vlr. Unit.",
+        "explanation": (
+            "A multiplicação da quantidade pelo valor unitário diverge do valor total do produto. "
+            "Isso pode indicar erros de arredondamento, descontos não informados ou manipulação de valores."
+        ),
+        "normativeBase": "Princípios contábeis e Art. 476 do Código Civil.",
+        "severity": "ERRO",
+    },
+    "VALOR_PROD_ZERO": {
+        "code": "VAL-WARN-01",
+        "message": "Produto com valor total zerado.",
+        "explanation": (
+            "O valor total do produto é zero. Isso pode ser uma bonificação, doação ou amostra, que "
+            "exige um CFOP específico (e.g., 5910/6910) e pode ter tratamento tributário diferenciado."
+        ),
+        "normativeBase": "RICMS (Regulamento do ICMS) do respectivo estado para operações de bonificação.",
+        "severity": "ALERTA",
+    },
+    "CFOP_INTERESTADUAL_UF_INCOMPATIVEL": {
+        "code": "CFOP-GEO-01",
+        "message": "CFOP interestadual (6xxx) usado em operação com mesma UF de origem e destino.",
+        "explanation": (
+            "Um CFOP iniciado com 6 indica uma operação interestadual (entre estados diferentes). No "
+            "entanto, a UF do emitente e do destinatário são as mesmas. Isso pode indicar um erro de "
+            "digitação no CFOP ou nos endereços."
+        ),
+        "normativeBase": "Anexo II do Convênio S/Nº, de 15 de dezembro de 1970.",
+        "severity": "ERRO",
+    },
+    "CFOP_ESTADUAL_UF_INCOMPATIVEL": {
+        "code": "CFOP-GEO-02",
+        "message": "CFOP estadual (5xxx) usado em operação com UFs de origem e destino diferentes.",
+        "explanation": (
+            "Um CFOP iniciado com 5 indica uma operação estadual (dentro do mesmo estado). No entanto, "
+            "a UF do emitente e do destinatário são diferentes. O CFOP correto para esta operação "
+            "provavelmente deveria começar com 6."
+        ),
+        "normativeBase": "Anexo II do Convênio S/Nº, de 15 de dezembro de 1970.",
+        "severity": "ERRO",
+    },
+    "PIS_COFINS_CST_INVALIDO_PARA_DEVOLUCAO": {
+        "code": "PIS-COFINS-CST-INV-01",
+        "message": "CST de PIS/COFINS (tributado) em CFOP de devolução.",
+        "explanation": (
+            "Operações de devolução (CFOPs 12xx, 22xx, 52xx, 62xx) geralmente devem ter um CST de "
+            'PIS/COFINS específico, como "98 - Outras Operações de Saída". Um CST de tributação '
+            "normal (ex: 01) está provavelmente incorreto."
+        ),
+        "normativeBase": "Lei 10.833/03 (COFINS) e Lei 10.637/02 (PIS).",
+        "severity": "ALERTA",
+    },
+    "ICMS_CST_INVALIDO_PARA_CFOP": {
+        "code": "ICMS-CST-INV-01",
+        "message": "CST de ICMS incompatível com o CFOP da operação.",
+        "explanation": (
+            'O CST do ICMS indica um tipo de tributação (ex: "00 - Tributada integralmente") que não '
+            "é compatível com o CFOP de devolução (1.202), que deveria ter um CST não-tributado ou de "
+            "substituição tributária, por exemplo."
+        ),
+        "normativeBase": "Anexo I (Códigos de Situação Tributária) do Convênio S/Nº, de 1970.",
+        "severity": "ALERTA",
+    },
+    "ICMS_CALCULO_DIVERGENTE": {
+        "code": "ICMS-CALC-01",
+        "message": "Valor do ICMS (vICMS) não corresponde ao cálculo (vBC x pICMS).",
+        "explanation": (
+            "O valor do ICMS informado no item diverge do cálculo da Base de Cálculo (vBC) pela "
+            "Alíquota (pICMS). Isso pode indicar erros de cálculo, arredondamento incorreto ou "
+            "manipulação fiscal."
+        ),
+        "normativeBase": "Lei Complementar nº 87/1996 (Lei Kandir).",
+        "severity": "ERRO",
+    },
+}
+
+# Shared subexpressions: the compiler evaluates each of these once per table.
+_cfop = text("produto_cfop")
+_ncm = text("produto_ncm")
+_product = lower(text("produto_nome"))
+_quantity = number("produto_qtd")
+_unit_value = number("produto_valor_unit")
+_total = number("produto_valor_total")
+_emitter_uf = upper_trimmed(text("emitente_uf"))
+_recipient_uf = upper_trimmed(text("destinatario_uf"))
+_both_ufs = _emitter_uf.ne("") & _recipient_uf.ne("")
+_state_cfop = starts_with(_cfop, "5")
+_interstate_cfop = starts_with(_cfop, "6")
+_return_cfop = starts_with(_cfop, "12", "22", "52", "62")
+_service_ncm = _ncm.eq("00000000")
+_calculated_total = _quantity * _unit_value
+_total_difference = absolute(_calculated_total - _total)
+_icms_base = number("produto_base_calculo_icms")
+_icms_rate = number("produto_aliquota_icms")
+_icms_value = number("produto_valor_icms")
+
+# Same rules and order as `runFiscalValidation`; findings store an index into `RULES`.
+RULE_DEFINITIONS: tuple[RuleDefinition, ...] = (
+    RuleDefinition(
+        "CFOP_SAIDA_EM_COMPRA",
+        (_state_cfop | _interstate_cfop) & contains(lower(text("destinatario_nome")), "quantum innovations"),
+    ),
+    RuleDefinition(
+        "NCM_SERVICO_PARA_PRODUTO",
+        _service_ncm & ~contains(_product, "serviço") & ~contains(_product, "consultoria"),
+    ),
+    RuleDefinition("NCM_INVALIDO", _ncm.ne("") & ~_service_ncm & length(_ncm).ne(8)),
+    RuleDefinition(
+        "VALOR_CALCULO_DIVERGENTE",
+        (_quantity > 0)
+        & (_unit_value > 0)
+        & (_total > 0)
+        & (_total_difference > _calculated_total * 0.001)
+        & (_total_difference > 0.01),
+    ),
+    RuleDefinition("VALOR_PROD_ZERO", _total.eq(0) & (_quantity > 0)),
+    RuleDefinition(
+        "CFOP_INTERESTADUAL_UF_INCOMPATIVEL", _both_ufs & _interstate_cfop & _emitter_uf.eq(_recipient_uf)
+    ),
+    RuleDefinition(
+        "CFOP_ESTADUAL_UF_INCOMPATIVEL", _both_ufs & _state_cfop & _emitter_uf.ne(_recipient_uf)
+    ),
+    RuleDefinition(
+        "PIS_COFINS_CST_INVALIDO_PARA_DEVOLUCAO",
+        _return_cfop
+        & (is_in(text("produto_cst_pis"), "01", "02") | is_in(text("produto_cst_cofins"), "01", "02")),
+    ),
+    RuleDefinition("ICMS_CST_INVALIDO_PARA_CFOP", _return_cfop & is_in(text("produto_cst_icms"), "00", "20")),
+    RuleDefinition(
+        "ICMS_CALCULO_DIVERGENTE",
+        (_icms_base > 0)
+        & (_icms_rate > 0)
+        & (_icms_value > 0)
+        & (absolute(_icms_base * (_icms_rate / 100) - _icms_value) > 0.015),
+    ),
+)
+
+# Compiled once per process, when the worker imports this module.
+DEFAULT_RULES: CompiledRules = compile_rules(RULE_DEFINITIONS, known_names=INCONSISTENCIES)
+RULES: tuple[str, ...] = DEFAULT_RULES.names
+# Columns read by the rules; staged tables are projected onto these.
+RULE_COLUMNS: tuple[str, ...] = DEFAULT_RULES.columns
+# Report payloads list at most this many item rows per rule; counts stay exact.
+_SAMPLE_ROWS = 20
+
+
+@dataclass(slots=True)
+class FiscalFindings:
+    """Findings as parallel arrays: item row and index into ``names`` (``RULES`` by default)."""
+
+    rows: np.ndarray
+    rules: np.ndarray
+    items: int
+    seconds: float
+    names: tuple[str, ...] = RULES
+    # Per-rule rows evaluated / flagged and seconds spent on its own plan steps.
+    profile: list[dict[str, Any]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def codes(self) -> list[str]:
+        """`INCONSISTENCIES` codes of each finding, e.g. ``"CFOP-GEO-02"``."""
+        return [INCONSISTENCIES[self.names[rule]]["code"] for rule in self.rules.tolist()]
+
+    def counts(self) -> dict[str, int]:
+        """Findings per rule name, in order of first occurrence."""
+        rules, first, counts = np.unique(self.rules, return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return {self.names[int(rules[i])]: int(counts[i]) for i in order}
+
+    def rows_with_severity(self, severity: str) -> np.ndarray:
+        """Distinct item rows with at least one finding of ``severity`` (e.g. ``"ERRO"``)."""
+        matching = np.array([INCONSISTENCIES[name]["severity"] == severity for name in self.names], dtype=bool)
+        return np.unique(self.rows[matching[self.rules]]) if len(self) else self.rows
+
+    def inconsistencies(self) -> list[Inconsistency]:
+        """One entry per rule that fired, like the auditor's per-document dedup by code."""
+        return [INCONSISTENCIES[rule] for rule in self.counts()]
+
+    def to_table(self) -> pa.Table:
+        codes = pa.array([INCONSISTENCIES[rule]["code"] for rule in self.names], type=pa.string())
+        return pa.table(
+            {
+                "row": pa.array(self.rows, type=pa.int64()),
+                "code": pa.DictionaryArray.from_arrays(pa.array(self.rules, type=pa.int8()), codes),
+            }
+        )
+
+    def summary(self, *, sample_rows: int = _SAMPLE_ROWS) -> dict[str, Any]:
+        """JSON-friendly digest: counts per code and the first item rows of each."""
+        rules: dict[str, Any] = {}
+        for rule, count in self.counts().items():
+            rows = self.rows[self.rules == self.names.index(rule)][:sample_rows]
+            rules[rule] = {
+                "code": INCONSISTENCIES[rule]["code"],
+                "severity": INCONSISTENCIES[rule]["severity"],
+                "count": count,
+                "rows": rows.tolist(),
+            }
+        return {
+            "version": RULES_VERSION,
+            "items": self.items,
+            "findings": len(self),
+            "seconds": self.seconds,
+            "rules": rules,
+            "profile": self.profile,
+        }
+
+
+def validate_items(table: pa.Table, rules: CompiledRules | None = None) -> FiscalFindings:
+    """
+    Run every rule over ``table`` and return its findings ordered by row, then rule.
+
+    Missing columns behave like empty fields in the frontend, so tables from
+    CSVs with only some of the item columns can be validated too. ``rules``
+    defaults to `DEFAULT_RULES`; its names must come from ``INCONSISTENCIES``.
+    """
+    compiled = rules or DEFAULT_RULES
+    started = time.perf_counter()
+    row_parts: list[np.ndarray] = []
+    rule_parts: list[np.ndarray] = []
+    profile: list[dict[str, Any]] = []
+    if table.num_rows:
+        run = compiled.evaluate(table)
+        profile = run.profile
+        for index, mask in enumerate(run.masks):
+            rows = np.flatnonzero(mask)
+            row_parts.append(rows)
+            rule_parts.append(np.full(len(rows), index, dtype=np.int8))
+
+    rows = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int64)
+    indices = np.concatenate(rule_parts) if rule_parts else np.zeros(0, dtype=np.int8)
+    order = np.lexsort((indices, rows))
+    return FiscalFindings(
+        rows=rows[order].astype(np.int64, copy=False),
+        rules=indices[order],
+        items=table.num_rows,
+        seconds=time.perf_counter() - started,
+        names=compiled.names,
+        profile=profile,
+    )
+
+
+__all__ = [
+    "DEFAULT_RULES",
+    "FiscalFindings",
+    "INCONSISTENCIES",
+    "Inconsistency",
+    "RULE_DEFINITIONS",
+    "RULES",
+    "RULES_VERSION",
+    "RULE_COLUMNS",
+    "validate_items",
+]
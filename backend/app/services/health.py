@@ -10,6 +10,7 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..workers import celery_app
+from ..workers.scheduling import time_to_start
 
 
 async def check_database(session: AsyncSession) -> Dict[str, Any]:
@@ -35,6 +36,16 @@ def check_celery() -> Dict[str, Any]:
         return {"status": "degraded", "detail": str(exc)}
 
 
+def check_scheduling() -> Dict[str, Any]:
+    """
+    Report the recent time-to-start (p50/p95 seconds) of each audit queue.
+    """
+    try:
+        return {"status": "ok", "queues": time_to_start()}
+    except Exception as exc:  # pragma: no cover - defensive
+        return {"status": "degraded", "detail": str(exc)}
+
+
 def overall_status(checks: Iterable[Dict[str, Any]]) -> str:
     """
     Compute an aggregated status from all checks.
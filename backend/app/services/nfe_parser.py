@@ -0,0 +1,323 @@
+# SPDX-License-Identifier: MIT
+"""
+Streaming NFe XML parser producing a columnar item table.
+
+Mirrors `mapNFeItems` in utils/importPipeline.ts: one row per ``det`` with the
+document header repeated, using the ``ExtractionResult``/``ExtractedItem``
+field names plus UF, CST/CSOSN and tax bases. The XML is read with
+expat callbacks and no element tree is ever built, so memory stays flat per
+document instead of holding a full DOM; only the rows of the current
+document are buffered until its header totals (which come after the items)
+have been seen.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+from xml.parsers import expat
+
+import pandas as pd
+import pyarrow as pa
+import structlog
+
+from .csv_analyzer import CSVAnalysis, analyse_dataframe
+
+logger = structlog.get_logger(__name__)
+
+# Bump whenever the item table changes so cached analyses are not reused.
+NFE_PARSER_VERSION = "1"
+NO_ITEMS_LABEL = "Itens não detalhados na NFe."
+
+HEADER_COLUMNS: dict[str, pa.DataType] = {
+    "nfe_id": pa.large_string(),
+    "data_emissao": pa.large_string(),
+    "valor_total_nfe": pa.float64(),
+    "emitente_nome": pa.large_string(),
+    "emitente_cnpj": pa.large_string(),
+    "emitente_uf": pa.large_string(),
+    "destinatario_nome": pa.large_string(),
+    "destinatario_cnpj": pa.large_string(),
+    "destinatario_uf": pa.large_string(),
+}
+ITEM_COLUMNS: dict[str, pa.DataType] = {
+    "item_numero": pa.int32(),
+    "produto_nome": pa.large_string(),
+    "produto_ncm": pa.large_string(),
+    "produto_cfop": pa.large_string(),
+    "produto_unidade": pa.large_string(),
+    "produto_qtd": pa.float64(),
+    "produto_valor_unit": pa.float64(),
+    "produto_valor_total": pa.float64(),
+    "produto_cst_icms": pa.large_string(),
+    "produto_base_calculo_icms": pa.float64(),
+    "produto_aliquota_icms": pa.float64(),
+    "produto_valor_icms": pa.float64(),
+    "produto_cst_pis": pa.large_string(),
+    "produto_base_calculo_pis": pa.float64(),
+    "produto_valor_pis": pa.float64(),
+    "produto_cst_cofins": pa.large_string(),
+    "produto_base_calculo_cofins": pa.float64(),
+    "produto_valor_cofins": pa.float64(),
+    "produto_valor_iss": pa.float64(),
+}
+NFE_ITEM_SCHEMA = pa.schema(list(HEADER_COLUMNS.items()) + list(ITEM_COLUMNS.items()))
+
+# (parent group, leaf) -> column, resolved against the innermost known group.
+_HEADER_FIELDS = {
+    ("ide", "dhEmi"): "data_emissao",
+    ("ide", "dEmi"): "data_emissao",  # layout 2.00
+    ("ICMSTot", "vNF"): "valor_total_nfe",
+    ("emit", "xNome"): "emitente_nome",
+    ("emit", "CNPJ"): "emitente_cnpj",
+    ("emit", "CPF"): "emitente_cnpj",
+    ("enderEmit", "UF"): "emitente_uf",
+    ("dest", "xNome"): "destinatario_nome",
+    ("dest", "CNPJ"): "destinatario_cnpj",
+    ("dest", "CPF"): "destinatario_cnpj",
+    ("enderDest", "UF"): "destinatario_uf",
+}
+_ITEM_FIELDS = {
+    ("prod", "xProd"): "produto_nome",
+    ("prod", "NCM"): "produto_ncm",
+    ("prod", "CFOP"): "produto_cfop",
+    ("prod", "uCom"): "produto_unidade",
+    ("prod", "qCom"): "produto_qtd",
+    ("prod", "vUnCom"): "produto_valor_unit",
+    ("prod", "vProd"): "produto_valor_total",
+    ("ICMS", "CST"): "produto_cst_icms",
+    ("ICMS", "CSOSN"): "produto_cst_icms",
+    ("ICMS", "vBC"): "produto_base_calculo_icms",
+    ("ICMS", "pICMS"): "produto_aliquota_icms",
+    ("ICMS", "vICMS"): "produto_valor_icms",
+    ("PIS", "CST"): "produto_cst_pis",
+    ("PIS", "vBC"): "produto_base_calculo_pis",
+    ("PIS", "vPIS"): "produto_valor_pis",
+    ("COFINS", "CST"): "produto_cst_cofins",
+    ("COFINS", "vBC"): "produto_base_calculo_cofins",
+    ("COFINS", "vCOFINS"): "produto_valor_cofins",
+    ("ISSQN", "vISSQN"): "produto_valor_iss",
+}
+# Groups that scope the leaves above; ICMS00, PISAliq, ... are transparent wrappers.
+_SCOPES = frozenset(
+    {"ide", "emit", "enderEmit", "dest", "enderDest", "ICMSTot", "prod", "ICMS", "PIS", "COFINS", "ISSQN"}
+)
+_NUMERIC_COLUMNS = frozenset(
+    field.name for field in NFE_ITEM_SCHEMA if pa.types.is_floating(field.type)
+)
+
+
+class NFeParseError(RuntimeError):
+    """Raised when an XML upload is malformed."""
+
+
+@dataclass(slots=True)
+class NFeParseResult:
+    table: pa.Table
+    documents: int
+    seconds: float
+
+    @property
+    def is_nfe(self) -> bool:
+        return self.documents > 0
+
+
+def _number(text: str) -> float | None:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class _TableBuilder:
+    """Column lists for the whole file plus the open document's header."""
+
+    def __init__(self) -> None:
+        self.columns: dict[str, list] = {field.name: [] for field in NFE_ITEM_SCHEMA}
+        self.rows = 0
+        self.documents = 0
+        self.header: dict[str, object] = {}
+        self.document_start = 0
+        self.item: dict[str, object] | None = None
+
+    def start_document(self, nfe_id: str | None) -> None:
+        self.header = {"nfe_id": nfe_id}
+        self.document_start = self.rows
+
+    def start_item(self, number: str | None) -> None:
+        self.item = {"item_numero": int(number) if number and number.isdigit() else None}
+
+    def end_item(self) -> None:
+        item = self.item or {}
+        for name in ITEM_COLUMNS:
+            self.columns[name].append(item.get(name))
+        self.rows += 1
+        self.item = None
+
+    def end_document(self) -> None:
+        if self.rows == self.document_start:
+            self.start_item(None)
+            self.item["produto_nome"] = NO_ITEMS_LABEL
+            self.end_item()
+        count = self.rows - self.document_start
+        for name in HEADER_COLUMNS:
+            self.columns[name].extend([self.header.get(name)] * count)
+        self.documents += 1
+        self.header = {}
+
+    def set(self, column: str, text: str) -> None:
+        value: object = _number(text) if column in _NUMERIC_COLUMNS else text
+        target = self.item if column in ITEM_COLUMNS else self.header
+        if target is not None:
+            target.setdefault(column, value)
+
+    def to_table(self) -> pa.Table:
+        return pa.table(
+            {field.name: pa.array(self.columns[field.name], type=field.type) for field in NFE_ITEM_SCHEMA},
+            schema=NFE_ITEM_SCHEMA,
+        )
+
+
+class _NFeHandler:
+    """expat callbacks: no tree is built, only the open scopes and the current text."""
+
+    def __init__(self, builder: _TableBuilder) -> None:
+        self.builder = builder
+        self.scopes: list[str] = []
+        self.text: list[str] = []
+        self.in_document = False
+        # Namespaced tag -> local name; NFe files only use a handful of tags.
+        self.names: dict[str, str] = {}
+
+    def _local_name(self, tag: str) -> str:
+        name = self.names.get(tag)
+        if name is None:
+            name = self.names[tag] = tag.rsplit("}", 1)[-1]
+        return name
+
+    def start(self, tag: str, attributes: dict[str, str]) -> None:
+        name = self._local_name(tag)
+        self.text.clear()
+        if name == "infNFe":
+            self.in_document = True
+            self.builder.start_document(attributes.get("Id"))
+        elif self.in_document and name == "det":
+            self.builder.start_item(attributes.get("nItem"))
+        elif name in _SCOPES:
+            self.scopes.append(name)
+
+    def end(self, tag: str) -> None:
+        name = self._local_name(tag)
+        if name in _SCOPES and self.scopes and self.scopes[-1] == name:
+            self.scopes.pop()
+        elif not self.in_document:
+            pass
+        elif name == "det":
+            self.builder.end_item()
+        elif name == "infNFe":
+            self.builder.end_document()
+            self.in_document = False
+        elif self.scopes and self.text:
+            fields = _ITEM_FIELDS if self.builder.item is not None else _HEADER_FIELDS
+            column = fields.get((self.scopes[-1], name))
+            if column is not None:
+                self.builder.set(column, "".join(self.text).strip())
+        self.text.clear()
+
+    def characters(self, data: str) -> None:
+        self.text.append(data)
+
+
+def parse_nfe_stream(stream: BinaryIO, *, filename: str | None = None) -> NFeParseResult:
+    """
+    Parse every ``infNFe`` in an XML stream (``nfeProc``, bare ``NFe`` or batches).
+
+    A well-formed XML without ``infNFe`` yields an empty table and ``is_nfe`` False.
+    """
+    started = time.perf_counter()
+    builder = _TableBuilder()
+    handler = _NFeHandler(builder)
+    parser = expat.ParserCreate(namespace_separator="}")
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.characters
+    try:
+        parser.ParseFile(stream)
+    except expat.ExpatError as exc:
+        logger.warning("nfe_parse_failed", file=filename, error=str(exc))
+        raise NFeParseError(f"Arquivo XML inválido ou malformado: {exc}") from exc
+
+    result = NFeParseResult(
+        table=builder.to_table(),
+        documents=builder.documents,
+        seconds=time.perf_counter() - started,
+    )
+    logger.info(
+        "nfe_parsed",
+        file=filename,
+        documents=result.documents,
+        items=result.table.num_rows,
+        seconds=result.seconds,
+    )
+    return result
+
+
+def parse_nfe_file(path: Path, *, original_name: str | None = None) -> NFeParseResult:
+    with path.open("rb") as stream:
+        return parse_nfe_stream(stream, filename=original_name or path.name)
+
+
+def analyse_nfe_file(
+    path: Path,
+    *,
+    original_name: str | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+) -> CSVAnalysis | None:
+    """Tabular analysis of the NFe item table; ``None`` for XML that is not an NFe."""
+    result = parse_nfe_file(path, original_name=original_name)
+    if not result.is_nfe:
+        return None
+    return analyse_item_table(
+        result.table,
+        filename=original_name or path.name,
+        diagnostics={"source": "nfe_xml", "documents": result.documents, "parse_seconds": result.seconds},
+        profile=profile,
+        sketches=sketches,
+    )
+
+
+def analyse_item_table(
+    table: pa.Table,
+    *,
+    filename: str | None = None,
+    diagnostics: dict[str, object] | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+) -> CSVAnalysis:
+    """Run the tabular analysis on an item table that is already in memory."""
+    return analyse_dataframe(
+        table.to_pandas(types_mapper=pd.ArrowDtype),
+        filename=filename,
+        diagnostics=diagnostics,
+        profile=profile,
+        sketches=sketches,
+    )
+
+
+__all__ = [
+    "HEADER_COLUMNS",
+    "ITEM_COLUMNS",
+    "NFE_ITEM_SCHEMA",
+    "NFE_PARSER_VERSION",
+    "NO_ITEMS_LABEL",
+    "NFeParseError",
+    "NFeParseResult",
+    "analyse_item_table",
+    "analyse_nfe_file",
+    "parse_nfe_file",
+    "parse_nfe_stream",
+]
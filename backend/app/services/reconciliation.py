@@ -0,0 +1,478 @@
+# SPDX-License-Identifier: MIT
+"""
+Bank reconciliation of a job's NFes against imported bank statements.
+
+Port of `runReconciliation` (agents/reconciliationAgent.ts). The frontend
+scans every transaction for every document and keeps the first one within
+``AMOUNT_TOLERANCE`` and ``DATE_WINDOW_DAYS``. Here amounts are integer
+centavos and dates day numbers. Transactions are sorted once by
+(amount, day), so the candidates of all documents come from a few
+vectorised ``searchsorted`` calls: one day-window range per amount within
+the tolerance.
+
+Each candidate pair costs its amount distance first and its day distance
+second. Candidate pairs are split into connected components (vectorised,
+no Python union-find). Components with a single document or transaction
+take their cheapest pair; the others get a minimum-cost assignment that
+matches as many documents as possible. Components above
+``MAX_EXACT_COMPONENT`` nodes per side fall back to rounds of mutual
+cheapest choices.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable, Sequence
+from pathlib import PurePosixPath
+from typing import NotRequired, TypedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .archive import ARCHIVE_MEMBER_COLUMN
+from .fiscal_rules import RULE_COLUMNS, validate_items
+from .rule_compiler import numeric_values, text_values
+
+AMOUNT_TOLERANCE = 0.02  # 2 centavos, as in the frontend
+DATE_WINDOW_DAYS = 30
+# Candidates kept per document and amount, nearest dates first.
+MAX_CANDIDATES = 64
+# Largest side of a contested component solved exactly.
+MAX_EXACT_COMPONENT = 256
+# Columns read from each item table to build the documents.
+RECONCILIATION_COLUMNS = tuple(
+    dict.fromkeys(("nfe_id", "data_emissao", "valor_total_nfe", ARCHIVE_MEMBER_COLUMN) + RULE_COLUMNS)
+)
+
+_AMOUNT_COLUMNS = ("amount", "valor")
+_DATE_COLUMNS = ("date", "data")
+_DESCRIPTION_COLUMNS = ("description", "descrição", "descricao", "histórico", "historico")
+_INVALID_DAY = np.iinfo(np.int64).min
+# Sort key = centavos * _DAY_SPAN + day offset; fits int64 up to R$ 21 bilhões.
+_DAY_SPAN = 1 << 22
+_DAY_OFFSET = 1 << 21
+
+
+class ReconciliationDocument(TypedDict):
+    name: str
+    nfe_id: str
+    total: float
+    date: str
+    internal_path: NotRequired[str]
+
+
+class BankTransaction(TypedDict):
+    id: str
+    date: str
+    amount: float
+    description: str
+    type: str
+    sourceFile: str
+
+
+class MatchedPair(TypedDict):
+    document: int
+    transaction: BankTransaction
+    amountDifference: float
+    dayDifference: int
+
+
+class ReconciliationResult(TypedDict):
+    documents: list[ReconciliationDocument]
+    matchedPairs: list[MatchedPair]
+    unmatchedDocuments: list[int]
+    unmatchedTransactions: list[BankTransaction]
+    transactions: int
+    candidates: int
+    seconds: float
+
+
+def _column(table: pa.Table, names: Sequence[str]) -> str | None:
+    by_lower = {name.strip().lower(): name for name in table.column_names}
+    return next((by_lower[name] for name in names if name in by_lower), None)
+
+
+def _day_numbers(values: pa.Array) -> np.ndarray:
+    """Days since 1970-01-01 of ISO (``2024-01-15...``) or ``15/01/2024`` dates."""
+    values = pc.utf8_trim_whitespace(values)
+    iso = pc.strptime(pc.utf8_slice_codeunits(values, 0, 10), format="%Y-%m-%d", unit="s", error_is_null=True)
+    brazilian = pc.strptime(
+        pc.utf8_slice_codeunits(values, 0, 10), format="%d/%m/%Y", unit="s", error_is_null=True
+    )
+    days = pc.cast(pc.cast(pc.coalesce(iso, brazilian), pa.date32()), pa.int32()).cast(pa.int64())
+    return days.fill_null(_INVALID_DAY).to_numpy(zero_copy_only=False)
+
+
+def _centavos(values: np.ndarray) -> np.ndarray:
+    """Absolute amounts in centavos; -1 for missing or non-numeric amounts."""
+    finite = np.isfinite(values)
+    return np.where(finite, np.rint(np.abs(np.where(finite, values, 0.0)) * 100), -1).astype(np.int64)
+
+
+def bank_transactions(table: pa.Table, source_file: str) -> pa.Table:
+    """
+    Bank statement rows as transactions, like the frontend's statement import.
+
+    Amount, date and description come from ``Amount``/``Valor``,
+    ``Date``/``Data`` and ``Description``/``Descrição`` (any case). Rows
+    without an amount are skipped, and ids are ``<file>-<row>``.
+    """
+    amount_column = _column(table, _AMOUNT_COLUMNS)
+    if amount_column is None:
+        return _transaction_table([], [], [], [], source_file)
+    amount_text = text_values(table, amount_column)
+    keep = np.flatnonzero(np.asarray(pc.not_equal(pc.utf8_trim_whitespace(amount_text), "")))
+    table = table.take(pa.array(keep, type=pa.int64()))
+    date_column = _column(table, _DATE_COLUMNS)
+    description_column = _column(table, _DESCRIPTION_COLUMNS)
+    return _transaction_table(
+        [f"{source_file}-{row}" for row in keep.tolist()],
+        text_values(table, date_column) if date_column else pa.array([""] * len(keep), pa.large_string()),
+        numeric_values(table, amount_column),
+        text_values(table, description_column) if description_column else pa.array([""] * len(keep), pa.large_string()),
+        source_file,
+    )
+
+
+def _transaction_table(ids, dates, amounts, descriptions, source_file: str) -> pa.Table:
+    amounts = np.asarray(amounts, dtype=np.float64)
+    return pa.table(
+        {
+            "id": pa.array(ids, type=pa.large_string()),
+            "date": pa.array(dates, type=pa.large_string()),
+            "amount": pa.array(amounts, type=pa.float64()),
+            "description": pa.array(descriptions, type=pa.large_string()),
+            "sourceFile": pa.array([source_file] * len(amounts), type=pa.large_string()),
+        }
+    )
+
+
+def collect_documents(
+    sources: Iterable[tuple[str, pa.Table]],
+) -> tuple[pa.Table, list[ReconciliationDocument]]:
+    """
+    One row per NFe of the job: total, emission day and index into the refs.
+
+    As in `runReconciliation`, NFes the auditor marks as ERRO are left out;
+    NFes without a total or a valid date stay in as unmatched documents.
+    """
+    refs: list[ReconciliationDocument] = []
+    totals: list[np.ndarray] = []
+    days: list[np.ndarray] = []
+    for name, table in sources:
+        if "nfe_id" not in table.column_names:
+            continue
+        keys = text_values(table, "nfe_id")
+        members = (
+            text_values(table, ARCHIVE_MEMBER_COLUMN)
+            if ARCHIVE_MEMBER_COLUMN in table.column_names
+            else None
+        )
+        if members is not None:
+            keys = pc.binary_join_element_wise(members, keys, pa.scalar("\x00", type=pa.large_string()))
+        error_rows = validate_items(table).rows_with_severity("ERRO")
+        failed = pc.unique(keys.take(pa.array(error_rows, type=pa.int64())))
+        # First row of every NFe, in file order.
+        encoded = pc.dictionary_encode(keys)
+        first = np.full(len(encoded.dictionary), table.num_rows, dtype=np.int64)
+        np.minimum.at(first, encoded.indices.to_numpy(zero_copy_only=False), np.arange(table.num_rows))
+        first = first[np.asarray(pc.invert(pc.is_in(encoded.dictionary, value_set=failed)))]
+        first = np.sort(first)
+        rows = table.take(pa.array(first, type=pa.int64()))
+        ids = text_values(rows, "nfe_id").to_pylist()
+        dates = text_values(rows, "data_emissao")
+        totals.append(numeric_values(rows, "valor_total_nfe"))
+        days.append(_day_numbers(dates))
+        paths = members.take(pa.array(first, type=pa.int64())).to_pylist() if members is not None else None
+        for position, (nfe_id, date, total) in enumerate(zip(ids, dates.to_pylist(), totals[-1].tolist())):
+            ref: ReconciliationDocument = {"name": name, "nfe_id": nfe_id, "total": total, "date": date}
+            if paths is not None:
+                ref["name"] = PurePosixPath(paths[position]).name
+                ref["internal_path"] = paths[position]
+            refs.append(ref)
+
+    table = pa.table(
+        {
+            "total": pa.array(np.concatenate(totals) if totals else np.zeros(0), type=pa.float64()),
+            "day": pa.array(np.concatenate(days) if days else np.zeros(0, np.int64), type=pa.int64()),
+        }
+    )
+    return table, refs
+
+
+def _candidate_edges(
+    doc_cents: np.ndarray,
+    doc_days: np.ndarray,
+    keys: np.ndarray,
+    tolerance_cents: int,
+    window_days: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """(document, sorted transaction position) pairs within the tolerance and window."""
+    doc_index = np.arange(len(doc_cents), dtype=np.int64)
+    edge_docs: list[np.ndarray] = []
+    edge_positions: list[np.ndarray] = []
+    for delta in range(-tolerance_cents, tolerance_cents + 1):
+        base = (doc_cents + delta) * _DAY_SPAN + doc_days + _DAY_OFFSET
+        low = np.searchsorted(keys, base - window_days, side="left")
+        high = np.searchsorted(keys, base + window_days, side="right")
+        # Long runs of equal amounts: keep the MAX_CANDIDATES nearest dates.
+        centre = np.searchsorted(keys, base, side="left")
+        start = np.clip(centre - MAX_CANDIDATES // 2, low, high)
+        stop = np.minimum(high, start + MAX_CANDIDATES)
+        start = np.maximum(low, stop - MAX_CANDIDATES)
+        counts = stop - start
+        total = int(counts.sum())
+        if not total:
+            continue
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        edge_docs.append(np.repeat(doc_index, counts))
+        edge_positions.append(np.repeat(start, counts) + offsets)
+    if not edge_docs:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(edge_docs), np.concatenate(edge_positions)
+
+
+def _assign(cost: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Minimum-cost assignment of a dense rows x columns matrix (rows <= columns).
+
+    Hungarian method with potentials (Jonker-Volgenant style, vectorised over
+    columns); returns ``(row, column)`` pairs.
+    """
+    rows, columns = cost.shape
+    u = np.zeros(rows + 1)
+    v = np.zeros(columns + 1)
+    owner = np.zeros(columns + 1, dtype=np.int64)  # 1-based row per column, 0 = free
+    way = np.zeros(columns + 1, dtype=np.int64)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        minimum = np.full(columns + 1, np.inf)
+        used = np.zeros(columns + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = owner[column]
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+            free = ~used[1:]
+            better = free & (reduced < minimum[1:])
+            minimum[1:][better] = reduced[better]
+            way[1:][better] = column
+            candidates = np.where(free, minimum[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minimum[1:][free] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+    return [(int(owner[column]) - 1, column - 1) for column in range(1, columns + 1) if owner[column]]
+
+
+def _components(left: np.ndarray, right: np.ndarray, nodes: int) -> np.ndarray:
+    """
+    Connected component label of every edge (node ids in ``[0, nodes)``).
+
+    Vectorised hook-and-jump: each round hooks the larger root of every edge
+    onto the smaller one, then shortcuts the parent pointers.
+    """
+    parent = np.arange(nodes, dtype=np.int64)
+    while True:
+        left_root, right_root = parent[left], parent[right]
+        pending = left_root != right_root
+        if not pending.any():
+            return left_root
+        low = np.minimum(left_root[pending], right_root[pending])
+        high = np.maximum(left_root[pending], right_root[pending])
+        np.minimum.at(parent, high, low)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+
+def _cheapest_per_group(groups: np.ndarray, costs: np.ndarray) -> np.ndarray:
+    """Index of the lowest-cost edge of every group (ties: first edge)."""
+    order = np.lexsort((costs, groups))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = groups[order][1:] != groups[order][:-1]
+    return order[first]
+
+
+def _distinct_per_group(groups: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Number of distinct ``values`` within each group, indexed by group id."""
+    span = int(values.max()) + 1
+    pairs = np.unique(groups * span + values)
+    return np.bincount(pairs // span, minlength=int(groups.max()) + 1)
+
+
+def _greedy(docs: np.ndarray, positions: np.ndarray, costs: np.ndarray) -> np.ndarray:
+    """
+    Edges picked by repeatedly matching mutual cheapest choices.
+
+    Each round every free document proposes its cheapest free transaction and
+    every transaction keeps its cheapest proposal, so matches are found in
+    bulk instead of one sorted edge at a time.
+    """
+    chosen: list[np.ndarray] = []
+    live = np.arange(len(docs))
+    while len(live):
+        proposals = live[_cheapest_per_group(docs[live], costs[live])]
+        accepted = proposals[_cheapest_per_group(positions[proposals], costs[proposals])]
+        chosen.append(accepted)
+        taken_docs = np.isin(docs[live], docs[accepted])
+        taken_positions = np.isin(positions[live], positions[accepted])
+        live = live[~(taken_docs | taken_positions)]
+    return np.concatenate(chosen) if chosen else live
+
+
+def _assign_component(docs: np.ndarray, positions: np.ndarray, costs: np.ndarray) -> np.ndarray:
+    """Edges of an exact maximum matching with minimum cost for one component."""
+    doc_ids, doc_local = np.unique(docs, return_inverse=True)
+    position_ids, position_local = np.unique(positions, return_inverse=True)
+    # Missing edges cost more than any full set of real ones, so cardinality comes first.
+    missing = float(costs.max() + 1) * (min(len(doc_ids), len(position_ids)) + 1)
+    matrix = np.full((len(doc_ids), len(position_ids)), missing)
+    edge_of = np.full(matrix.shape, -1, dtype=np.int64)
+    matrix[doc_local, position_local] = costs
+    edge_of[doc_local, position_local] = np.arange(len(costs))
+    if matrix.shape[0] > matrix.shape[1]:
+        pairs = [(doc, position) for position, doc in _assign(matrix.T)]
+    else:
+        pairs = _assign(matrix)
+    return np.array(
+        [edge_of[doc, position] for doc, position in pairs if matrix[doc, position] < missing],
+        dtype=np.int64,
+    )
+
+
+def _resolve(
+    docs: np.ndarray, positions: np.ndarray, costs: np.ndarray, documents: int
+) -> np.ndarray:
+    """Indices of the edges of a maximum matching with minimum total cost."""
+    if not len(docs):
+        return np.zeros(0, dtype=np.int64)
+    component = _components(docs, positions + documents, documents + int(positions.max()) + 1)
+    # Components with a single document or a single transaction: take their cheapest edge.
+    doc_counts = _distinct_per_group(component, docs)
+    position_counts = _distinct_per_group(component, positions)
+    simple = (doc_counts[component] == 1) | (position_counts[component] == 1)
+    simple_edges = np.flatnonzero(simple)
+    chosen = [simple_edges[_cheapest_per_group(component[simple_edges], costs[simple_edges])]]
+
+    contested = np.flatnonzero(~simple)
+    order = contested[np.argsort(component[contested], kind="stable")]
+    boundaries = np.flatnonzero(np.diff(component[order])) + 1
+    for edges in np.split(order, boundaries) if len(order) else []:
+        sides = max(len(np.unique(docs[edges])), len(np.unique(positions[edges])))
+        if sides <= MAX_EXACT_COMPONENT:
+            chosen.append(edges[_assign_component(docs[edges], positions[edges], costs[edges])])
+        else:
+            chosen.append(edges[_greedy(docs[edges], positions[edges], costs[edges])])
+    return np.concatenate(chosen)
+
+
+def _transaction_records(transactions: pa.Table, rows: np.ndarray) -> list[BankTransaction]:
+    selected = transactions.take(pa.array(rows, type=pa.int64()))
+    columns = [selected.column(name).to_pylist() for name in ("id", "date", "amount", "description", "sourceFile")]
+    return [
+        {
+            "id": identifier,
+            "date": date,
+            "amount": amount,
+            "description": description,
+            "type": "CREDIT" if amount >= 0 else "DEBIT",
+            "sourceFile": source,
+        }
+        for identifier, date, amount, description, source in zip(*columns)
+    ]
+
+
+def reconcile(
+    documents: pa.Table,
+    refs: Sequence[ReconciliationDocument],
+    transactions: pa.Table,
+    *,
+    tolerance: float = AMOUNT_TOLERANCE,
+    window_days: int = DATE_WINDOW_DAYS,
+) -> ReconciliationResult:
+    """
+    Match documents from `collect_documents` with transactions from `bank_transactions`.
+
+    A transaction matches when its absolute amount is within ``tolerance`` of
+    the NFe total and its date within ``window_days`` of the emission date.
+    Every document and transaction is used at most once.
+    """
+    started = time.perf_counter()
+    tolerance_cents = int(round(tolerance * 100))
+    doc_cents = _centavos(documents.column("total").to_numpy())
+    doc_days = documents.column("day").to_numpy()
+    eligible = np.flatnonzero((doc_cents > 0) & (doc_days != _INVALID_DAY))
+
+    tx_amounts = transactions.column("amount").to_numpy()
+    tx_cents = _centavos(tx_amounts)
+    tx_days = _day_numbers(transactions.column("date").combine_chunks())
+    valid = np.flatnonzero((tx_cents >= 0) & (tx_days != _INVALID_DAY))
+    keys = tx_cents[valid] * _DAY_SPAN + tx_days[valid] + _DAY_OFFSET
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    sorted_rows = valid[order]
+
+    docs, positions = _candidate_edges(
+        doc_cents[eligible], doc_days[eligible], keys, tolerance_cents, window_days
+    )
+    docs = eligible[docs]
+    tx_rows = sorted_rows[positions]
+    amount_gap = np.abs(doc_cents[docs] - tx_cents[tx_rows])
+    day_gap = np.abs(doc_days[docs] - tx_days[tx_rows])
+    costs = amount_gap * (window_days + 1) + day_gap
+    matched = _resolve(docs, positions, costs, len(doc_cents))
+    matched = matched[np.argsort(docs[matched], kind="stable")]
+    matched_docs = docs[matched]
+    matched_rows = tx_rows[matched]
+
+    matched_amount_gap = np.abs(doc_cents[matched_docs] - tx_cents[matched_rows]) / 100
+    matched_day_gap = np.abs(doc_days[matched_docs] - tx_days[matched_rows])
+    pairs: list[MatchedPair] = [
+        {"document": doc, "transaction": transaction, "amountDifference": amount, "dayDifference": days}
+        for doc, transaction, amount, days in zip(
+            matched_docs.tolist(),
+            _transaction_records(transactions, matched_rows),
+            matched_amount_gap.tolist(),
+            matched_day_gap.tolist(),
+        )
+    ]
+    unmatched_docs = np.setdiff1d(np.arange(len(doc_cents)), matched_docs)
+    unmatched_rows = np.setdiff1d(np.arange(transactions.num_rows), matched_rows)
+    return {
+        "documents": list(refs),
+        "matchedPairs": pairs,
+        "unmatchedDocuments": unmatched_docs.tolist(),
+        "unmatchedTransactions": _transaction_records(transactions, unmatched_rows),
+        "transactions": transactions.num_rows,
+        "candidates": len(costs),
+        "seconds": time.perf_counter() - started,
+    }
+
+
+__all__ = [
+    "AMOUNT_TOLERANCE",
+    "BankTransaction",
+    "DATE_WINDOW_DAYS",
+    "MAX_CANDIDATES",
+    "MAX_EXACT_COMPONENT",
+    "MatchedPair",
+    "RECONCILIATION_COLUMNS",
+    "ReconciliationDocument",
+    "ReconciliationResult",
+    "bank_transactions",
+    "collect_documents",
+    "reconcile",
+]
@@ -0,0 +1,417 @@
+# SPDX-License-Identifier: MIT
+"""
+Declarative item rules compiled to vectorised predicates.
+
+A rule is data: a name from the inconsistency dictionary plus an expression
+built from `text`, `number`, `starts_with`, comparisons and boolean
+operators. `compile_rules` flattens every expression into one plan of unique
+nodes, so a subexpression used by several rules (a parsed numeric column,
+the return-CFOP prefix check...) is evaluated once per table. Each step of the
+plan runs a single Arrow or numpy kernel over the whole column, and every
+rule records how many rows it evaluated and flagged and how long its own
+steps took.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+class RuleCompileError(ValueError):
+    """Raised when a rule definition is malformed."""
+
+
+@dataclass(frozen=True, slots=True)
+class Expr:
+    """
+    Node of a rule expression; structurally equal nodes are the same subexpression.
+
+    Build nodes with the helpers below and the ``&``, ``|``, ``~``, ``>``,
+    ``>=``, ``<``, ``<=``, ``+``, ``-``, ``*`` and ``/`` operators; equality
+    uses `eq`/`ne` because ``==`` compares expressions themselves.
+    """
+
+    op: str
+    args: tuple[Expr, ...] = ()
+    params: tuple[Any, ...] = ()
+
+    def __and__(self, other: Expr) -> Expr:
+        return Expr("and", (self, _expr(other)))
+
+    def __or__(self, other: Expr) -> Expr:
+        return Expr("or", (self, _expr(other)))
+
+    def __invert__(self) -> Expr:
+        return Expr("not", (self,))
+
+    def __gt__(self, other: Any) -> Expr:
+        return Expr("gt", (self, _expr(other)))
+
+    def __ge__(self, other: Any) -> Expr:
+        return Expr("ge", (self, _expr(other)))
+
+    def __lt__(self, other: Any) -> Expr:
+        return Expr("lt", (self, _expr(other)))
+
+    def __le__(self, other: Any) -> Expr:
+        return Expr("le", (self, _expr(other)))
+
+    def __add__(self, other: Any) -> Expr:
+        return Expr("add", (self, _expr(other)))
+
+    def __sub__(self, other: Any) -> Expr:
+        return Expr("sub", (self, _expr(other)))
+
+    def __mul__(self, other: Any) -> Expr:
+        return Expr("mul", (self, _expr(other)))
+
+    def __truediv__(self, other: Any) -> Expr:
+        return Expr("div", (self, _expr(other)))
+
+    def eq(self, other: Any) -> Expr:
+        return Expr("eq", (self, _expr(other)))
+
+    def ne(self, other: Any) -> Expr:
+        return Expr("ne", (self, _expr(other)))
+
+
+def _expr(value: Any) -> Expr:
+    return value if isinstance(value, Expr) else literal(value)
+
+
+def literal(value: Any) -> Expr:
+    return Expr("literal", params=(value,))
+
+
+def text(column: str) -> Expr:
+    """String column with nulls as ``""``; a missing column is all blanks."""
+    return Expr("text", params=(column,))
+
+
+def number(column: str) -> Expr:
+    """Float column; nulls, missing columns and unparsable strings become 0."""
+    return Expr("number", params=(column,))
+
+
+def upper_trimmed(value: Expr) -> Expr:
+    return Expr("upper_trimmed", (value,))
+
+
+def lower(value: Expr) -> Expr:
+    return Expr("lower", (value,))
+
+
+def length(value: Expr) -> Expr:
+    return Expr("length", (value,))
+
+
+def absolute(value: Expr) -> Expr:
+    return Expr("abs", (value,))
+
+
+def starts_with(value: Expr, *prefixes: str) -> Expr:
+    return Expr("starts_with", (value,), tuple(prefixes))
+
+
+def contains(value: Expr, substring: str) -> Expr:
+    return Expr("contains", (value,), (substring,))
+
+
+def is_in(value: Expr, *options: str) -> Expr:
+    return Expr("is_in", (value,), tuple(options))
+
+
+@dataclass(frozen=True, slots=True)
+class RuleDefinition:
+    name: str
+    when: Expr
+
+
+# Keeps the leading number `parseFloat` would read once separators are normalised.
+_LEADING_NUMBER = r"^(?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+
+
+def text_values(table: pa.Table, column: str) -> pa.Array:
+    """String view of a column with nulls as ``""`` (``value?.toString() || ''``)."""
+    if column not in table.column_names:
+        return pa.nulls(table.num_rows, pa.large_string()).fill_null("")
+    values = table.column(column).combine_chunks()
+    if not pa.types.is_large_string(values.type):
+        values = values.cast(pa.large_string())
+    return values.fill_null("")
+
+
+def _parse_safe_floats(values: pa.Array) -> pa.Array:
+    """`parseSafeFloat` over a string column: the last separator is the decimal one."""
+    cleaned = pc.replace_substring_regex(pc.utf8_trim_whitespace(values), r"[^\d.,-]", "")
+    comma_decimal = pc.match_substring_regex(cleaned, r",[^.]*$")
+    pt_br = pc.replace_substring(pc.replace_substring(cleaned, ".", ""), ",", ".", max_replacements=1)
+    en_us = pc.replace_substring(cleaned, ",", "")
+    normalised = pc.if_else(comma_decimal, pt_br, en_us)
+    parsable = pc.match_substring_regex(normalised, _LEADING_NUMBER)
+    parsed = pc.extract_regex(normalised, _LEADING_NUMBER).field("number")
+    return pc.if_else(parsable, parsed, pa.scalar(None, type=parsed.type)).cast(pa.float64())
+
+
+def numeric_values(table: pa.Table, column: str) -> np.ndarray:
+    """Column as float64 numpy with missing or unparsable values as 0, like `parseSafeFloat`."""
+    if column not in table.column_names:
+        return np.zeros(table.num_rows, dtype=np.float64)
+    values = table.column(column).combine_chunks()
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        values = _parse_safe_floats(values)
+    elif not pa.types.is_floating(values.type):
+        values = values.cast(pa.float64())
+    numbers = values.fill_null(0.0).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+    return np.nan_to_num(numbers, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def _mask(array: pa.Array | pa.ChunkedArray) -> np.ndarray:
+    return np.asarray(array.to_numpy(zero_copy_only=False), dtype=bool)
+
+
+def _starts_with(values: pa.Array, *prefixes: str) -> np.ndarray:
+    mask = np.zeros(len(values), dtype=bool)
+    for prefix in prefixes:
+        mask |= _mask(pc.starts_with(values, prefix))
+    return mask
+
+
+def _compare(name: str, numpy_op: Callable) -> Callable:
+    def kernel(_: pa.Table, left: Any, right: Any) -> np.ndarray:
+        if isinstance(left, pa.Array) or isinstance(right, pa.Array):
+            return _mask(getattr(pc, name)(left, right))
+        return np.asarray(numpy_op(left, right), dtype=bool)
+
+    return kernel
+
+
+# op -> kernel(table, *argument values, *params); text values are Arrow arrays,
+# numbers and masks are numpy arrays.
+_KERNELS: dict[str, Callable[..., Any]] = {
+    "literal": lambda _, value: value,
+    "text": text_values,
+    "number": numeric_values,
+    "upper_trimmed": lambda _, values: pc.utf8_upper(pc.utf8_trim_whitespace(values)),
+    "lower": lambda _, values: pc.utf8_lower(values),
+    "length": lambda _, values: pc.utf8_length(values).to_numpy(zero_copy_only=False),
+    "abs": lambda _, values: np.abs(values),
+    "starts_with": lambda _, values, *prefixes: _starts_with(values, *prefixes),
+    "contains": lambda _, values, substring: _mask(pc.match_substring(values, substring)),
+    "is_in": lambda _, values, *options: _mask(
+        pc.is_in(values, value_set=pa.array(options, type=values.type))
+    ),
+    "and": lambda _, left, right: left & right,
+    "or": lambda _, left, right: left | right,
+    "not": lambda _, value: ~value,
+    "add": lambda _, left, right: left + right,
+    "sub": lambda _, left, right: left - right,
+    "mul": lambda _, left, right: left * right,
+    "div": lambda _, left, right: left / right,
+    "eq": _compare("equal", np.equal),
+    "ne": _compare("not_equal", np.not_equal),
+    "gt": _compare("greater", np.greater),
+    "ge": _compare("greater_equal", np.greater_equal),
+    "lt": _compare("less", np.less),
+    "le": _compare("less_equal", np.less_equal),
+}
+
+
+@dataclass(slots=True)
+class RuleProfile:
+    """Cumulative cost of one compiled rule in this process."""
+
+    rule: str
+    steps: int
+    calls: int = 0
+    evaluated: int = 0
+    flagged: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "rule": self.rule,
+            "steps": self.steps,
+            "calls": self.calls,
+            "evaluated": self.evaluated,
+            "flagged": self.flagged,
+            "seconds": self.seconds,
+        }
+
+
+@dataclass(slots=True)
+class RuleRun:
+    """Result of one `CompiledRules.evaluate` call."""
+
+    masks: list[np.ndarray]
+    profile: list[dict[str, Any]]
+
+
+@dataclass(slots=True)
+class CompiledRules:
+    """
+    Evaluation plan of a rule set.
+
+    ``nodes`` holds every distinct subexpression once; ``steps[i]`` lists the
+    nodes rule ``i`` computes itself, i.e. those no earlier rule needed.
+    """
+
+    names: tuple[str, ...]
+    columns: tuple[str, ...]
+    nodes: tuple[Expr, ...]
+    children: tuple[tuple[int, ...], ...]
+    roots: tuple[int, ...]
+    steps: tuple[tuple[int, ...], ...]
+    shared: int
+    profiles: dict[str, RuleProfile] = field(default_factory=dict)
+
+    def evaluate(self, table: pa.Table) -> RuleRun:
+        """Run every rule over ``table``; one boolean mask per rule, in order."""
+        values: list[Any] = [None] * len(self.nodes)
+        masks: list[np.ndarray] = []
+        run_profile: list[dict[str, Any]] = []
+        for name, root, steps in zip(self.names, self.roots, self.steps):
+            started = time.perf_counter()
+            for node_id in steps:
+                node = self.nodes[node_id]
+                arguments = [values[child] for child in self.children[node_id]]
+                values[node_id] = _KERNELS[node.op](table, *arguments, *node.params)
+            mask = np.broadcast_to(np.asarray(values[root], dtype=bool), (table.num_rows,))
+            flagged = int(np.count_nonzero(mask))
+            seconds = time.perf_counter() - started
+            masks.append(mask)
+
+            profile = self.profiles[name]
+            profile.calls += 1
+            profile.evaluated += table.num_rows
+            profile.flagged += flagged
+            profile.seconds += seconds
+            run_profile.append(
+                {"rule": name, "evaluated": table.num_rows, "flagged": flagged, "seconds": seconds}
+            )
+        return RuleRun(masks=masks, profile=run_profile)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Cumulative profile of every rule, most expensive first."""
+        profiles = sorted(self.profiles.values(), key=lambda profile: -profile.seconds)
+        return [profile.as_dict() for profile in profiles]
+
+
+def _columns(node: Expr, found: dict[str, None]) -> None:
+    if node.op in ("text", "number"):
+        found.setdefault(node.params[0])
+    for child in node.args:
+        _columns(child, found)
+
+
+def compile_rules(
+    definitions: Sequence[RuleDefinition],
+    *,
+    known_names: Iterable[str] | None = None,
+) -> CompiledRules:
+    """
+    Validate ``definitions`` and flatten them into a shared evaluation plan.
+
+    ``known_names`` (e.g. the inconsistency dictionary) restricts rule names.
+    """
+    allowed = set(known_names) if known_names is not None else None
+    index: dict[Expr, int] = {}
+    nodes: list[Expr] = []
+    children: list[tuple[int, ...]] = []
+    users: dict[int, set[str]] = {}
+
+    def visit(node: Expr, rule: str, steps: list[int]) -> int:
+        if not isinstance(node, Expr):
+            raise RuleCompileError(f"Regra '{rule}': expressão inválida {node!r}.")
+        if node.op not in _KERNELS:
+            raise RuleCompileError(f"Regra '{rule}': operação desconhecida '{node.op}'.")
+        node_id = index.get(node)
+        if node_id is None:
+            child_ids = tuple(visit(child, rule, steps) for child in node.args)
+            node_id = index[node] = len(nodes)
+            nodes.append(node)
+            children.append(child_ids)
+            steps.append(node_id)
+        else:
+            # Already planned; still mark its subtree as used by this rule.
+            for child in node.args:
+                visit(child, rule, steps)
+        users.setdefault(node_id, set()).add(rule)
+        return node_id
+
+    names: list[str] = []
+    roots: list[int] = []
+    plan: list[tuple[int, ...]] = []
+    columns: dict[str, None] = {}
+    for definition in definitions:
+        if definition.name in names:
+            raise RuleCompileError(f"Regra '{definition.name}' definida mais de uma vez.")
+        if allowed is not None and definition.name not in allowed:
+            raise RuleCompileError(f"Regra '{definition.name}' não existe no dicionário de inconsistências.")
+        steps: list[int] = []
+        roots.append(visit(definition.when, definition.name, steps))
+        names.append(definition.name)
+        plan.append(tuple(steps))
+        _columns(definition.when, columns)
+
+    return CompiledRules(
+        names=tuple(names),
+        columns=tuple(columns),
+        nodes=tuple(nodes),
+        children=tuple(children),
+        roots=tuple(roots),
+        steps=tuple(plan),
+        shared=sum(1 for rules in users.values() if len(rules) > 1),
+        profiles={name: RuleProfile(rule=name, steps=len(steps)) for name, steps in zip(names, plan)},
+    )
+
+
+def definitions_from_mapping(payload: Mapping[str, Any]) -> list[RuleDefinition]:
+    """
+    Build definitions from JSON-style data: ``{"rules": [{"name": ..., "when": node}]}``.
+
+    A node is ``{"op": ..., "args": [...], "params": [...]}``; bare strings and
+    numbers in ``args`` are literals.
+    """
+
+    def build(node: Any) -> Expr:
+        if not isinstance(node, Mapping):
+            return literal(node)
+        return Expr(
+            str(node["op"]),
+            tuple(build(child) for child in node.get("args", ())),
+            tuple(node.get("params", ())),
+        )
+
+    return [RuleDefinition(str(rule["name"]), build(rule["when"])) for rule in payload["rules"]]
+
+
+__all__ = [
+    "CompiledRules",
+    "Expr",
+    "RuleCompileError",
+    "RuleDefinition",
+    "RuleProfile",
+    "RuleRun",
+    "absolute",
+    "compile_rules",
+    "contains",
+    "definitions_from_mapping",
+    "is_in",
+    "length",
+    "literal",
+    "lower",
+    "number",
+    "numeric_values",
+    "starts_with",
+    "text",
+    "text_values",
+    "upper_trimmed",
+]
@@ -0,0 +1,247 @@
+# SPDX-License-Identifier: MIT
+"""
+Fixed-memory frequency sketches for large tables.
+
+`ColumnSketch` combines a HyperLogLog distinct counter with a Count-Min
+sketch and a bounded set of heavy-hitter candidates, so the number of
+distinct values and the most frequent ones (top NCMs, CFOPs, emitters...) can
+be tracked chunk by chunk without exact ``nunique``/``value_counts``. Every
+chunk is reduced to its distinct values with Arrow's ``value_counts`` first,
+so each value is hashed once per chunk. Sketches with the same parameters
+merge losslessly, which lets the worker combine the columns of several files
+without re-reading rows.
+"""
+
+from __future__ import annotations
+
+import base64
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping, TypedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+HLL_PRECISION = 12  # 4096 one-byte registers, ~1.6% standard error
+CMS_WIDTH = 1024
+CMS_DEPTH = 4
+TOP_K = 10
+# Heavy-hitter candidates kept between chunks; more than TOP_K so late risers survive.
+CANDIDATE_CAPACITY = 64
+
+_MASK_32 = np.uint64(0xFFFFFFFF)
+
+
+class TopValue(TypedDict):
+    value: str
+    count: int
+
+
+def hash_values(values: pa.Array) -> np.ndarray:
+    """Stable 64-bit hashes of string values (same key in every process)."""
+    return pd.util.hash_array(np.asarray(values.to_numpy(zero_copy_only=False), dtype=object))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Vectorised ``int.bit_length`` for uint64, exact via two 32-bit halves."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & _MASK_32).astype(np.float64)
+    high_bits = np.frexp(high)[1]
+    low_bits = np.frexp(low)[1]
+    return np.where(high > 0, 32 + high_bits, low_bits).astype(np.int64)
+
+
+def _encode(array: np.ndarray) -> str:
+    return base64.b64encode(zlib.compress(array.tobytes())).decode("ascii")
+
+
+def _decode(payload: str, dtype: np.dtype, shape: tuple[int, ...]) -> np.ndarray:
+    raw = zlib.decompress(base64.b64decode(payload))
+    return np.frombuffer(raw, dtype=dtype).reshape(shape).copy()
+
+
+@dataclass(slots=True)
+class HyperLogLog:
+    precision: int = HLL_PRECISION
+    registers: np.ndarray = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        suffix_bits = 64 - self.precision
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << suffix_bits) - 1)
+        rank = (suffix_bits - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: HyperLogLog) -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.power(2.0, -self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is far more accurate while many registers are empty.
+            raw = m * np.log(m / zeros)
+        return int(round(raw))
+
+
+@dataclass(slots=True)
+class CountMinSketch:
+    width: int = CMS_WIDTH
+    depth: int = CMS_DEPTH
+    table: np.ndarray = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+
+    def _columns(self, hashes: np.ndarray) -> np.ndarray:
+        # Kirsch-Mitzenmacher: row i uses h1 + i * h2 from the two halves of the hash.
+        h1 = hashes & _MASK_32
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def add_hashes(self, hashes: np.ndarray, counts: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        columns = self._columns(hashes)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+
+    def query_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def merge(self, other: CountMinSketch) -> None:
+        self.table += other.table
+
+
+@dataclass(slots=True)
+class ColumnSketch:
+    """Distinct count and top-k frequencies of one column, in fixed memory."""
+
+    distinct: HyperLogLog = field(default_factory=HyperLogLog)
+    frequencies: CountMinSketch = field(default_factory=CountMinSketch)
+    candidates: list[str] = field(default_factory=list)
+    capacity: int = CANDIDATE_CAPACITY
+
+    def update(self, values: pa.Array) -> None:
+        """Add a chunk of string values; nulls and blanks are ignored."""
+        values = pc.drop_null(values)
+        values = pc.filter(values, pc.not_equal(values, ""))
+        if len(values) == 0:
+            return
+        counted = pc.value_counts(values)
+        uniques = counted.field("values")
+        counts = counted.field("counts").to_numpy().astype(np.int64)
+        hashes = hash_values(uniques)
+        self.distinct.add_hashes(hashes)
+        self.frequencies.add_hashes(hashes, counts)
+
+        heaviest = np.argsort(-counts, kind="stable")[: self.capacity]
+        self._keep_heaviest(self.candidates + uniques.take(pa.array(heaviest)).to_pylist())
+
+    def _estimates(self, values: list[str]) -> np.ndarray:
+        if not values:
+            return np.zeros(0, dtype=np.int64)
+        return self.frequencies.query_hashes(hash_values(pa.array(values, type=pa.large_string())))
+
+    def _keep_heaviest(self, values: Iterable[str]) -> None:
+        unique = list(dict.fromkeys(values))
+        estimates = self._estimates(unique)
+        order = sorted(range(len(unique)), key=lambda i: (-int(estimates[i]), unique[i]))
+        self.candidates = [unique[i] for i in order[: self.capacity]]
+
+    def merge(self, other: ColumnSketch) -> None:
+        self.distinct.merge(other.distinct)
+        self.frequencies.merge(other.frequencies)
+        self._keep_heaviest(self.candidates + other.candidates)
+
+    def distinct_count(self) -> int:
+        return self.distinct.estimate()
+
+    def top(self, k: int = TOP_K) -> list[TopValue]:
+        """Most frequent values with Count-Min counts (upper bounds)."""
+        estimates = self._estimates(self.candidates)
+        return [
+            {"value": value, "count": int(count)}
+            for value, count in list(zip(self.candidates, estimates))[:k]
+        ]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "hll_precision": self.distinct.precision,
+            "hll": _encode(self.distinct.registers),
+            "cms_width": self.frequencies.width,
+            "cms_depth": self.frequencies.depth,
+            "cms": _encode(self.frequencies.table),
+            "candidates": list(self.candidates),
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Mapping[str, Any]) -> ColumnSketch:
+        sketch = cls(
+            distinct=HyperLogLog(int(payload["hll_precision"])),
+            frequencies=CountMinSketch(int(payload["cms_width"]), int(payload["cms_depth"])),
+            candidates=list(payload.get("candidates") or []),
+        )
+        sketch.distinct.registers = _decode(
+            payload["hll"], np.dtype(np.uint8), sketch.distinct.registers.shape
+        )
+        sketch.frequencies.table = _decode(
+            payload["cms"], np.dtype(np.int64), sketch.frequencies.table.shape
+        )
+        return sketch
+
+
+def merge_analysis_sketches(
+    analyses: Iterable[Mapping[str, Any]], *, k: int = TOP_K
+) -> dict[str, dict[str, Any]]:
+    """
+    Combine the per-column sketches of several analyses by column name.
+
+    Returns ``{column: {"distinct_approx": ..., "top_values": [...], "files": n}}``.
+    """
+    merged: dict[str, ColumnSketch] = {}
+    files: dict[str, int] = {}
+    for analysis in analyses:
+        for column, payload in (analysis.get("sketches") or {}).items():
+            sketch = ColumnSketch.from_dict(payload)
+            if column in merged:
+                merged[column].merge(sketch)
+            else:
+                merged[column] = sketch
+            files[column] = files.get(column, 0) + 1
+    return {
+        column: {
+            "distinct_approx": sketch.distinct_count(),
+            "top_values": sketch.top(k),
+            "files": files[column],
+        }
+        for column, sketch in merged.items()
+    }
+
+
+__all__ = [
+    "CANDIDATE_CAPACITY",
+    "CMS_DEPTH",
+    "CMS_WIDTH",
+    "ColumnSketch",
+    "CountMinSketch",
+    "HLL_PRECISION",
+    "HyperLogLog",
+    "TOP_K",
+    "TopValue",
+    "hash_values",
+    "merge_analysis_sketches",
+]
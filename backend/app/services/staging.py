@@ -0,0 +1,513 @@
+# SPDX-License-Identifier: MIT
+"""
+Columnar staging of accepted uploads.
+
+Every accepted CSV is parsed once into an Arrow IPC file and recorded in the
+job's ``input_payload``. Artifacts are keyed by the upload SHA-256
+(``<uploads>/staged/<sha[:2]>/<sha>-v<version>.arrow``), so any later job that
+receives the same bytes reuses them; uploads without a hash are staged next
+to the original (``<stored_name>.arrow``). Columns are kept as raw Arrow strings so the artifact is a
+faithful, schema-stable copy of the upload; numeric conversion stays in the
+analyzers. The file is uncompressed so later stages (statistics, profiling,
+rules) can memory-map it and project only the columns they need instead of
+re-parsing the text.
+
+NFe XML uploads are staged as the typed item table produced by
+``nfe_parser`` (one row per ``det``), so the fiscal stages never touch the
+XML again.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import secrets
+import time
+from collections.abc import Iterator, Mapping, Sequence
+from pathlib import Path
+from typing import BinaryIO, TypedDict
+
+import pandas as pd
+import pyarrow as pa
+import structlog
+
+from .blob_store import BlobStore
+from .csv_analyzer import (
+    CHUNKED_ENGINES,
+    CSVAnalysis,
+    CSVAnalysisError,
+    CSVFormat,
+    DEFAULT_STREAM_MEMORY_BYTES,
+    analyse_dataframe,
+    analyse_frame_chunks,
+    detect_csv_format,
+    iter_csv_chunks,
+)
+from .nfe_parser import NFeParseError, parse_nfe_file
+
+logger = structlog.get_logger(__name__)
+
+# Bump whenever the staged layout changes so older artifacts are rebuilt.
+STAGING_VERSION = "1"
+STAGED_FORMAT = "arrow_ipc"
+STAGED_SUFFIX = ".arrow"
+DEFAULT_BATCH_ROWS = 65_536
+STAGED_DIR = "staged"
+
+_METADATA_PREFIX = "nexus."
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+_SHARED_ARTIFACT = re.compile(rf"(?P<sha256>[0-9a-f]{{64}})-v(?P<version>[^.]+){re.escape(STAGED_SUFFIX)}")
+# In-memory size of a pandas frame built from an Arrow batch, relative to the batch.
+_FRAME_OVERHEAD = 2
+
+
+class StagingError(RuntimeError):
+    """Raised when an upload cannot be staged or a staged file cannot be read."""
+
+
+class StagedArtifact(TypedDict):
+    format: str
+    version: str
+    path: str
+    rows: int
+    columns: list[str]
+    bytes: int
+    seconds: float
+
+
+def staged_path_for(path: Path, *, sha256: object = None, uploads_root: Path | None = None) -> Path:
+    """
+    Location of the staged artifact for an upload stored at ``path``.
+
+    With a SHA-256 and ``uploads_root`` the location is shared by every upload
+    of the same content; otherwise the artifact sits next to the upload.
+    """
+    if uploads_root is not None and isinstance(sha256, str) and _SHA256.fullmatch(sha256):
+        return uploads_root / STAGED_DIR / sha256[:2] / f"{sha256}-v{STAGING_VERSION}{STAGED_SUFFIX}"
+    return path.with_name(f"{path.name}{STAGED_SUFFIX}")
+
+
+def _write_csv_batches(
+    stream: BinaryIO,
+    fmt: CSVFormat,
+    destination: Path,
+    *,
+    engine: str,
+    batch_rows: int,
+    metadata: dict[str, str],
+    filename: str | None,
+) -> tuple[list[str], int]:
+    columns: list[str] = []
+    rows = 0
+    sink: pa.OSFile | None = None
+    writer: pa.ipc.RecordBatchFileWriter | None = None
+    try:
+        chunks = iter_csv_chunks(
+            stream, fmt, chunk_rows=batch_rows, engine=engine, filename=filename, as_text=True
+        )
+        for chunk in chunks:
+            if writer is None:
+                columns = chunk.columns.astype(str).tolist()
+                schema = pa.schema(
+                    [(column, pa.large_string()) for column in columns],
+                    metadata={f"{_METADATA_PREFIX}{key}": value for key, value in metadata.items()},
+                )
+                sink = pa.OSFile(str(destination), "wb")
+                writer = pa.ipc.new_file(sink, schema)
+            chunk.columns = columns
+            writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+    return columns, rows
+
+
+def stage_csv(
+    path: Path,
+    destination: Path,
+    *,
+    original_name: str | None = None,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+) -> tuple[list[str], int]:
+    """
+    Convert a CSV upload into an Arrow IPC file of string columns.
+
+    Parses with the same dialect detection as the analyzer, chunk by chunk, so
+    memory stays bounded by ``batch_rows``. The destination is replaced
+    atomically; returns the column names and the row count.
+    """
+    filename = original_name or path.name
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{secrets.token_hex(4)}.tmp")
+    with path.open("rb") as stream:
+        fmt = detect_csv_format(stream, filename=filename)
+        engines = CHUNKED_ENGINES if fmt.delimiter is not None else ("python",)
+        for engine in engines:
+            stream.seek(0)
+            started = time.perf_counter()
+            metadata = {
+                "original_name": filename,
+                "encoding": fmt.encoding,
+                "delimiter": fmt.delimiter or "auto",
+                "quotechar": fmt.quotechar,
+                "engine": engine,
+            }
+            try:
+                columns, rows = _write_csv_batches(
+                    stream,
+                    fmt,
+                    tmp_path,
+                    engine=engine,
+                    batch_rows=batch_rows,
+                    metadata=metadata,
+                    filename=filename,
+                )
+            except CSVAnalysisError as exc:
+                tmp_path.unlink(missing_ok=True)
+                if engine == engines[-1]:
+                    raise StagingError(str(exc)) from exc
+                logger.warning("upload_staging_engine_failed", file=filename, engine=engine, error=str(exc))
+                continue
+            break
+
+    if not columns:
+        tmp_path.unlink(missing_ok=True)
+        raise StagingError(f"CSV '{filename}' is empty or could not be parsed.")
+    os.replace(tmp_path, destination)
+    logger.info(
+        "upload_staged",
+        file=filename,
+        rows=rows,
+        columns=len(columns),
+        engine=engine,
+        seconds=time.perf_counter() - started,
+    )
+    return columns, rows
+
+
+def stage_nfe(
+    path: Path,
+    destination: Path,
+    *,
+    original_name: str | None = None,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+) -> tuple[list[str], int] | None:
+    """
+    Convert an NFe XML upload into an Arrow IPC item table.
+
+    Returns ``None`` (and writes nothing) for well-formed XML that is not an NFe.
+    """
+    filename = original_name or path.name
+    try:
+        result = parse_nfe_file(path, original_name=filename)
+    except NFeParseError as exc:
+        raise StagingError(str(exc)) from exc
+    if not result.is_nfe:
+        return None
+
+    write_staged_table(
+        result.table,
+        destination,
+        metadata={
+            "original_name": filename,
+            "engine": "nfe_xml",
+            "documents": str(result.documents),
+            "parse_seconds": str(result.seconds),
+        },
+        batch_rows=batch_rows,
+    )
+    logger.info(
+        "upload_staged",
+        file=filename,
+        rows=result.table.num_rows,
+        documents=result.documents,
+        engine="nfe_xml",
+        seconds=result.seconds,
+    )
+    return result.table.column_names, result.table.num_rows
+
+
+def write_staged_table(
+    table: pa.Table,
+    destination: Path,
+    *,
+    metadata: Mapping[str, str],
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+) -> None:
+    """Atomically write an already built table (e.g. a ZIP's items) as a staged file."""
+    table = table.replace_schema_metadata(
+        {f"{_METADATA_PREFIX}{key}": value for key, value in metadata.items()}
+    )
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=batch_rows)
+        os.replace(tmp_path, destination)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def staged_artifact(
+    destination: Path, *, uploads_root: Path, columns: list[str], rows: int, seconds: float
+) -> StagedArtifact:
+    """The ``input_payload`` record describing a staged file."""
+    return {
+        "format": STAGED_FORMAT,
+        "version": STAGING_VERSION,
+        "path": destination.relative_to(uploads_root).as_posix(),
+        "rows": rows,
+        "columns": columns,
+        "bytes": destination.stat().st_size,
+        "seconds": seconds,
+    }
+
+
+_STAGERS = {".csv": stage_csv, ".xml": stage_nfe}
+
+
+def stage_upload(
+    path: Path,
+    file_entry: Mapping[str, object],
+    *,
+    uploads_root: Path,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+) -> StagedArtifact | None:
+    """
+    Stage one ``input_payload`` entry, reusing an up-to-date artifact if present.
+
+    Returns ``None`` for formats that have no tabular staging yet.
+    """
+    original_name = str(file_entry.get("original_name") or path.name)
+    stager = _STAGERS.get(Path(original_name).suffix.lower())
+    if stager is None:
+        return None
+
+    existing = current_artifact(file_entry, uploads_root=uploads_root)
+    if existing is not None:
+        return existing
+
+    destination = staged_path_for(path, sha256=file_entry.get("sha256"), uploads_root=uploads_root)
+    started = time.perf_counter()
+    staged = stager(path, destination, original_name=original_name, batch_rows=batch_rows)
+    if staged is None:
+        return None
+    columns, rows = staged
+    return staged_artifact(
+        destination,
+        uploads_root=uploads_root,
+        columns=columns,
+        rows=rows,
+        seconds=time.perf_counter() - started,
+    )
+
+
+def current_artifact(file_entry: Mapping[str, object], *, uploads_root: Path) -> StagedArtifact | None:
+    """
+    The entry's staged artifact if it is still on disk and of the current version.
+
+    Entries of a new job have no ``staged`` record yet; for those, an artifact
+    staged by an earlier job from the same SHA-256 is looked up and described.
+    """
+    existing = file_entry.get("staged")
+    if (
+        isinstance(existing, Mapping)
+        and existing.get("version") == STAGING_VERSION
+        and (uploads_root / str(existing.get("path"))).exists()
+    ):
+        return existing  # type: ignore[return-value]
+    stored_path = file_entry.get("stored_path")
+    if not stored_path:
+        return None
+    shared = staged_path_for(
+        uploads_root / str(stored_path), sha256=file_entry.get("sha256"), uploads_root=uploads_root
+    )
+    if not shared.is_relative_to(uploads_root / STAGED_DIR):
+        return None
+    try:
+        reader = _open_reader(shared)
+        rows = sum(reader.get_batch(index).num_rows for index in range(reader.num_record_batches))
+    except StagingError:
+        return None
+    return staged_artifact(
+        shared, uploads_root=uploads_root, columns=list(reader.schema.names), rows=rows, seconds=0.0
+    )
+
+
+def collect_staged_garbage(uploads_root: Path, *, grace_seconds: int, blobs: BlobStore | None = None) -> int:
+    """
+    Remove shared artifacts that no upload can use any more.
+
+    An artifact goes once it is of another `STAGING_VERSION`, or, with
+    ``blobs``, once no job links the upload blob of its SHA-256. Abandoned
+    temporary files go too. Entries changed in the last ``grace_seconds``
+    (inode change time) are kept, as in the blob store, and an artifact
+    removed too early is only staged again.
+    """
+    root = uploads_root / STAGED_DIR
+    if not root.exists():
+        return 0
+    deadline = time.time() - grace_seconds
+    removed = 0
+    for shard in root.iterdir():
+        if not shard.is_dir():
+            continue
+        for path in shard.iterdir():
+            try:
+                if path.stat().st_ctime > deadline:
+                    continue
+            except FileNotFoundError:
+                continue
+            match = _SHARED_ARTIFACT.fullmatch(path.name)
+            if match is not None:
+                if match["version"] == STAGING_VERSION and (
+                    blobs is None or blobs.reference_count(match["sha256"]) > 0
+                ):
+                    continue
+            elif not path.name.endswith(".tmp"):
+                continue
+            path.unlink(missing_ok=True)
+            removed += 1
+    logger.info("staged_artifacts_collected", removed=removed)
+    return removed
+
+
+def _open_reader(path: Path) -> pa.ipc.RecordBatchFileReader:
+    try:
+        return pa.ipc.open_file(pa.memory_map(str(path), "r"))
+    except (OSError, pa.ArrowInvalid) as exc:
+        raise StagingError(f"Staged file '{path}' could not be opened: {exc}") from exc
+
+
+def _projection(schema: pa.Schema, columns: Sequence[str] | None) -> list[str]:
+    if columns is None:
+        return list(schema.names)
+    return [column for column in columns if column in schema.names]
+
+
+def staged_metadata(path: Path) -> dict[str, str]:
+    """Parsing details recorded in the staged schema (encoding, delimiter, ...)."""
+    metadata = _open_reader(path).schema.metadata or {}
+    prefix = _METADATA_PREFIX.encode()
+    return {
+        key[len(prefix):].decode(): value.decode()
+        for key, value in metadata.items()
+        if key.startswith(prefix)
+    }
+
+
+def open_staged_table(path: Path, columns: Sequence[str] | None = None) -> pa.Table:
+    """
+    Memory-map a staged file and return a zero-copy table.
+
+    Only the projected ``columns`` are touched; names missing from the file are skipped.
+    """
+    reader = _open_reader(path)
+    return reader.read_all().select(_projection(reader.schema, columns))
+
+
+def iter_staged_frames(
+    path: Path,
+    *,
+    columns: Sequence[str] | None = None,
+    max_rows: int | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield Arrow-backed DataFrames batch by batch, split to at most ``max_rows`` rows."""
+    reader = _open_reader(path)
+    projection = _projection(reader.schema, columns)
+    for index in range(reader.num_record_batches):
+        batch = reader.get_batch(index).select(projection)
+        step = max_rows or batch.num_rows or 1
+        for offset in range(0, batch.num_rows, step):
+            yield batch.slice(offset, step).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _stream_max_rows(path: Path, memory_limit_bytes: int) -> int:
+    reader = _open_reader(path)
+    if reader.num_record_batches == 0:
+        return DEFAULT_BATCH_ROWS
+    first = reader.get_batch(0)
+    bytes_per_row = max(first.nbytes / max(first.num_rows, 1), 1.0) * _FRAME_OVERHEAD
+    return max(1, int((memory_limit_bytes // 2) // bytes_per_row))
+
+
+def analyse_staged_file(
+    path: Path,
+    *,
+    original_name: str | None = None,
+    streaming: bool = False,
+    memory_limit_bytes: int | None = None,
+    profile: bool = False,
+    sketches: bool = False,
+    columns: Sequence[str] | None = None,
+) -> CSVAnalysis:
+    """
+    Run the CSV analysis on a staged artifact instead of the original text.
+
+    Results match ``analyse_csv_file`` except that every CSV column starts out
+    as a string, so integer-looking columns come back as floats. NFe item
+    tables keep their typed columns.
+    """
+    filename = original_name or path.name
+    metadata = staged_metadata(path)
+    diagnostics: dict[str, object] = {
+        "encoding": metadata.get("encoding"),
+        "delimiter": metadata.get("delimiter"),
+        "quotechar": metadata.get("quotechar"),
+        "engine": metadata.get("engine"),
+        "engine_failures": {},
+        "source": STAGED_FORMAT,
+    }
+    if "documents" in metadata:
+        diagnostics["documents"] = int(metadata["documents"])
+    started = time.perf_counter()
+    try:
+        if streaming:
+            memory_limit_bytes = memory_limit_bytes or DEFAULT_STREAM_MEMORY_BYTES
+            frames = iter_staged_frames(
+                path, columns=columns, max_rows=_stream_max_rows(path, memory_limit_bytes)
+            )
+            return analyse_frame_chunks(
+                frames,
+                filename=filename,
+                memory_limit_bytes=memory_limit_bytes,
+                diagnostics=diagnostics,
+                profile=profile,
+                sketches=sketches,
+            )
+
+        df = open_staged_table(path, columns).to_pandas(types_mapper=pd.ArrowDtype)
+        if df.empty:
+            raise CSVAnalysisError(f"CSV '{filename}' is empty or could not be parsed.")
+        diagnostics["parse_seconds"] = time.perf_counter() - started
+        return analyse_dataframe(
+            df, filename=filename, diagnostics=diagnostics, profile=profile, sketches=sketches
+        )
+    except StagingError as exc:
+        raise CSVAnalysisError(str(exc)) from exc
+
+
+__all__ = [
+    "DEFAULT_BATCH_ROWS",
+    "STAGED_DIR",
+    "STAGED_FORMAT",
+    "STAGED_SUFFIX",
+    "STAGING_VERSION",
+    "StagedArtifact",
+    "StagingError",
+    "analyse_staged_file",
+    "collect_staged_garbage",
+    "current_artifact",
+    "iter_staged_frames",
+    "open_staged_table",
+    "stage_csv",
+    "stage_nfe",
+    "stage_upload",
+    "staged_artifact",
+    "staged_metadata",
+    "staged_path_for",
+    "write_staged_table",
+]
@@ -0,0 +1,319 @@
+# SPDX-License-Identifier: MIT
+"""
+Resumable upload sessions for large audit bundles.
+
+A session is announced with the name and size of one file and lives under
+``<uploads>/sessions/<session_id>/``: ``session.json`` holds its metadata
+and ``data`` the bytes received so far. The size of ``data`` is the session
+offset. Every chunk carries the offset it starts at and its own SHA-256, and
+is appended in place under an exclusive ``flock`` only when it starts
+exactly at the current offset, so a client that lost a response asks for
+the offset and resumes from there.
+
+The SHA-256 of the whole file is updated chunk by chunk, so completing the
+session costs no rehash. ``hashlib`` state cannot be stored, so it is kept
+by the process that appended the last chunk; a chunk reaching another API
+process (or one restarted) hashes the data received so far once and goes
+on from there. Only the last ``_HASHERS_MAX`` sessions are remembered, so
+an API process does not accumulate the hashes of sessions that another
+process completed or the worker collected.
+
+A session is completed under an exclusive ``flock`` on its directory, held
+until the job is committed, so concurrent completions create a single job.
+The data file is hard-linked into the job like any other upload, without a
+copy, and removed from the session only after the job exists; the session
+then keeps the job id to answer a retried completion. Sessions without
+activity for ``upload_session_ttl_seconds`` are removed with the
+unreferenced blobs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from ..core.config import get_settings
+from .uploads import UploadBatch
+
+logger = structlog.get_logger(__name__)
+
+SESSIONS_DIR = "sessions"
+_METADATA = "session.json"
+_DATA = "data"
+_SESSION_ID = re.compile(r"[0-9a-f]{32}")
+_REHASH_CHUNK = 1024 * 1024
+_HASHERS_MAX = 64
+_LOCK_POLL_SECONDS = 0.05
+
+# Running SHA-256 of the sessions last appended by this process, least
+# recently used first: session id -> (offset, hash).
+_hashers: OrderedDict[str, tuple[int, Any]] = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def _remember_hasher(session_id: str, offset: int, hasher: Any) -> None:
+    with _hashers_lock:
+        _hashers[session_id] = (offset, hasher)
+        _hashers.move_to_end(session_id)
+        while len(_hashers) > _HASHERS_MAX:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(session_id: str) -> None:
+    with _hashers_lock:
+        _hashers.pop(session_id, None)
+
+
+class UploadSessionConflict(ValueError):
+    """A chunk does not start at the current offset of its session."""
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(message)
+        self.offset = offset
+
+
+class ChunkChecksumMismatch(ValueError):
+    """A chunk does not match the SHA-256 sent with it."""
+
+
+@dataclass(frozen=True, slots=True)
+class UploadSession:
+    id: str
+    filename: str
+    content_type: str | None
+    size: int
+    offset: int
+    updated_at: float
+    path: Path
+    job_id: str | None = None
+    sha256: str | None = None
+
+    @property
+    def complete(self) -> bool:
+        return self.offset == self.size
+
+
+class UploadSessionStore:
+    """Upload sessions of one storage root, shared by every API process."""
+
+    def __init__(self, uploads_root: Path) -> None:
+        self.root = uploads_root / SESSIONS_DIR
+
+    def _dir(self, session_id: str) -> Path | None:
+        if not _SESSION_ID.fullmatch(session_id):
+            return None
+        return self.root / session_id
+
+    def _write_metadata(self, directory: Path, metadata: dict) -> None:
+        tmp_path = directory / f".{_METADATA}.{secrets.token_hex(4)}.tmp"
+        try:
+            tmp_path.write_text(json.dumps(metadata), encoding="utf-8")
+            os.replace(tmp_path, directory / _METADATA)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def create(self, filename: str, size: int, content_type: str | None = None) -> UploadSession:
+        session_id = secrets.token_hex(16)
+        directory = self.root / session_id
+        directory.mkdir(parents=True)
+        (directory / _DATA).touch()
+        self._write_metadata(
+            directory, {"filename": filename, "content_type": content_type, "size": size}
+        )
+        logger.info("upload_session_created", session_id=session_id, size=size)
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> UploadSession | None:
+        directory = self._dir(session_id)
+        if directory is None:
+            return None
+        try:
+            metadata = json.loads((directory / _METADATA).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        data = directory / _DATA
+        job_id = metadata.get("job_id")
+        try:
+            stat = data.stat()
+            offset, updated_at = stat.st_size, stat.st_mtime
+        except FileNotFoundError:
+            if job_id is None:
+                return None
+            # Completed: the data now belongs to the job.
+            offset, updated_at = metadata["size"], (directory / _METADATA).stat().st_mtime
+        return UploadSession(
+            id=session_id,
+            filename=metadata["filename"],
+            content_type=metadata.get("content_type"),
+            size=metadata["size"],
+            offset=offset,
+            updated_at=updated_at,
+            path=data,
+            job_id=job_id,
+            sha256=metadata.get("sha256"),
+        )
+
+    def append(self, session: UploadSession, offset: int, chunk: bytes, sha256: str) -> UploadSession:
+        """Append ``chunk`` at ``offset`` and return the session with its new offset."""
+        if session.job_id is not None:
+            raise UploadSessionConflict("A sessão de upload já foi concluída.", session.size)
+        if hashlib.sha256(chunk).hexdigest() != sha256.lower():
+            raise ChunkChecksumMismatch("O SHA-256 do trecho não confere com o conteúdo recebido.")
+        if offset + len(chunk) > session.size:
+            raise ValueError("O trecho ultrapassa o tamanho declarado do arquivo.")
+
+        with session.path.open("r+b") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            current = os.fstat(handle.fileno()).st_size
+            if current != offset:
+                raise UploadSessionConflict(
+                    f"O trecho deve começar no byte {current}, não em {offset}.", current
+                )
+            hasher = self._hasher(session.id, handle, current)
+            handle.seek(current)
+            handle.write(chunk)
+            handle.flush()
+            hasher.update(chunk)
+            _remember_hasher(session.id, current + len(chunk), hasher)
+        return replace(session, offset=current + len(chunk), updated_at=time.time())
+
+    def _hasher(self, session_id: str, handle: Any, offset: int) -> Any:
+        with _hashers_lock:
+            known = _hashers.get(session_id)
+        if known is not None and known[0] == offset:
+            return known[1]
+        # Chunks received by another process: catch up once from the data.
+        hasher = hashlib.sha256()
+        handle.seek(0)
+        remaining = offset
+        while remaining:
+            block = handle.read(min(_REHASH_CHUNK, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+        if offset:
+            logger.info("upload_session_rehashed", session_id=session_id, offset=offset)
+        return hasher
+
+    def seal(self, session: UploadSession) -> UploadSession:
+        """The complete session with the SHA-256 of its file."""
+        if not session.complete:
+            raise UploadSessionConflict(
+                f"Upload incompleto: {session.offset} de {session.size} bytes recebidos.", session.offset
+            )
+        if session.sha256 is not None:
+            return session
+        with session.path.open("rb") as handle:
+            fcntl.flock(handle, fcntl.LOCK_SH)
+            hasher = self._hasher(session.id, handle, session.offset)
+        return replace(session, sha256=hasher.hexdigest())
+
+    @asynccontextmanager
+    async def completing(self, session_id: str) -> AsyncIterator[UploadSession | None]:
+        """
+        Hold the completion lock of a session and yield its current state.
+
+        The lock is taken without blocking a thread, so a cancelled request
+        never leaves it held; ``None`` is yielded when the session is gone.
+        """
+        directory = self._dir(session_id)
+        try:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY) if directory is not None else None
+        except FileNotFoundError:
+            fd = None
+        if fd is None:
+            yield None
+            return
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(_LOCK_POLL_SECONDS)
+            yield await asyncio.to_thread(self.get, session_id)
+        finally:
+            os.close(fd)
+
+    def mark_completed(self, session: UploadSession, job_id: str) -> None:
+        """Record the job created from the session, which now holds its data."""
+        directory = self._dir(session.id)
+        self._write_metadata(
+            directory,
+            {
+                "filename": session.filename,
+                "content_type": session.content_type,
+                "size": session.size,
+                "sha256": session.sha256,
+                "job_id": job_id,
+            },
+        )
+        session.path.unlink(missing_ok=True)
+        _forget_hasher(session.id)
+        logger.info("upload_session_completed", session_id=session.id, job_id=job_id)
+
+    def discard(self, session_id: str) -> None:
+        directory = self._dir(session_id)
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+        _forget_hasher(session_id)
+
+    def collect_expired(self, *, ttl_seconds: int) -> int:
+        """Remove sessions without activity in the last ``ttl_seconds``."""
+        if not self.root.exists():
+            return 0
+        deadline = time.time() - ttl_seconds
+        removed = 0
+        for directory in self.root.iterdir():
+            session = self.get(directory.name)
+            try:
+                updated_at = session.updated_at if session is not None else directory.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if updated_at < deadline:
+                self.discard(directory.name)
+                removed += 1
+        logger.info("upload_sessions_collected", removed=removed)
+        return removed
+
+
+def get_upload_session_store() -> UploadSessionStore:
+    return UploadSessionStore(get_settings().uploads_dir_path)
+
+
+def open_upload_session(filename: str, size: int, content_type: str | None = None) -> UploadSession:
+    """Start a session for a file the audit upload limits accept."""
+    settings = get_settings()
+    limits = UploadBatch(settings, settings.uploads_dir_path)
+    limits.check_name(filename)
+    limits.check_size(filename, size)
+    return UploadSessionStore(settings.uploads_dir_path).create(filename, size, content_type)
+
+
+__all__ = [
+    "ChunkChecksumMismatch",
+    "SESSIONS_DIR",
+    "UploadSession",
+    "UploadSessionConflict",
+    "UploadSessionStore",
+    "get_upload_session_store",
+    "open_upload_session",
+]
@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: MIT
+"""
+Off-loop writing and hashing of uploaded bytes.
+
+An `UploadWriter` sits between the coroutine reading an upload and the file
+it is stored in: chunks go through a bounded ``asyncio.Queue`` to a drain
+task that writes and hashes each one on the default thread pool, so the
+event loop only moves buffers around while the disk and SHA-256 work run
+in threads (both release the GIL). The queue holds at most
+`QUEUE_CHUNKS` chunks, so a fast reader waits for a slow disk instead of
+buffering the whole upload in memory, and reading the next chunk overlaps
+with writing the previous one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+from pathlib import Path
+from typing import BinaryIO
+
+QUEUE_CHUNKS = 4
+
+
+class UploadWriter:
+    """Streams one upload to ``path``, computing its size and SHA-256."""
+
+    def __init__(self, path: Path, *, queue_chunks: int = QUEUE_CHUNKS) -> None:
+        self.path = path
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max(queue_chunks, 1))
+        self._drain: asyncio.Task | None = None
+        self._error: BaseException | None = None
+
+    async def open(self) -> None:
+        handle = await asyncio.to_thread(self.path.open, "wb")
+        self._drain = asyncio.create_task(self._drain_queue(handle))
+
+    async def write(self, chunk: bytes) -> None:
+        """Queue ``chunk``; waits while the queue is full."""
+        if self._error is not None:
+            raise self._error
+        self.size += len(chunk)
+        await self._queue.put(chunk)
+
+    async def finish(self) -> tuple[int, str]:
+        """Flush the queued chunks and close the file; returns ``(size, sha256)``."""
+        await self._queue.put(None)
+        await self._drain
+        if self._error is not None:
+            raise self._error
+        return self.size, self._sha256.hexdigest()
+
+    async def abort(self) -> None:
+        """Stop writing and close the file, leaving its removal to the caller."""
+        if self._drain is None or self._drain.done():
+            return
+        self._drain.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._drain
+
+    async def _drain_queue(self, handle: BinaryIO) -> None:
+        try:
+            while (chunk := await self._queue.get()) is not None:
+                if self._error is None:
+                    try:
+                        await asyncio.to_thread(self._write, handle, chunk)
+                    except Exception as exc:
+                        # Keep consuming so a writer waiting on a full queue is
+                        # released; its next write raises the error.
+                        self._error = exc
+        finally:
+            await asyncio.to_thread(handle.close)
+
+    def _write(self, handle: BinaryIO, chunk: bytes) -> None:
+        handle.write(chunk)
+        self._sha256.update(chunk)
+
+
+__all__ = ["QUEUE_CHUNKS", "UploadWriter"]
@@ -0,0 +1,381 @@
+# SPDX-License-Identifier: MIT
+"""
+Storage of the files of one upload request under the upload limits.
+
+An `UploadBatch` stores files into a job directory, through the blob store
+when deduplication is enabled, and enforces the extension, per-file and
+per-job limits chunk by chunk. Files come either from Starlette
+``UploadFile`` objects (written concurrently) or from a `MultipartUpload`,
+the ``multipart/form-data`` body of a request parsed as it is received: each
+file part is written to storage while it streams in, with no spooled copy,
+and a part over a limit aborts the request before the rest is read.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import secrets
+import shutil
+from collections import deque
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import structlog
+from fastapi import UploadFile
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+from ..core.config import Settings
+from .blob_store import BlobStore
+from .upload_writer import UploadWriter
+
+logger = structlog.get_logger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+# Boundaries and part headers on top of the file bytes of a request.
+_MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """An upload exceeds the per-file or per-job byte limit."""
+
+
+class EmptyUpload(ValueError):
+    """An upload request carries no file."""
+
+
+@dataclass(slots=True)
+class UploadPart:
+    name: str
+    filename: str | None
+    content_type: str | None
+    chunks: AsyncIterator[bytes]
+
+
+class MultipartUpload:
+    """A ``multipart/form-data`` request body, parsed while it is received."""
+
+    def __init__(
+        self,
+        stream: AsyncIterator[bytes],
+        content_type: str,
+        *,
+        field: str = "files",
+        content_length: int | None = None,
+    ) -> None:
+        _, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if not boundary:
+            raise EmptyUpload("Corpo multipart sem boundary.")
+        self.field = field
+        self.content_length = content_length
+        self._stream = stream.__aiter__()
+        self._events: deque[tuple[str, object]] = deque()
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._finished = False
+        self._parser = MultipartParser(
+            boundary,
+            {
+                "on_part_begin": self._on_part_begin,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_end": self._on_end,
+            },
+        )
+
+    async def parts(self) -> AsyncIterator[UploadPart]:
+        """Parts in request order; a part's chunks must be consumed before the next part."""
+        while True:
+            kind, payload = await self._next_event()
+            if kind == "end":
+                return
+            if kind != "headers":
+                continue
+            _, disposition = parse_options_header(payload.get(b"content-disposition", b""))
+            filename = disposition.get(b"filename")
+            content_type = payload.get(b"content-type")
+            part = UploadPart(
+                name=disposition.get(b"name", b"").decode("latin-1"),
+                filename=filename.decode("utf-8", "replace") if filename is not None else None,
+                content_type=content_type.decode("latin-1") if content_type is not None else None,
+                chunks=self._part_chunks(),
+            )
+            yield part
+            # Whatever the consumer left of the part is skipped.
+            async for _ in part.chunks:
+                pass
+
+    async def _part_chunks(self) -> AsyncIterator[bytes]:
+        buffer = bytearray()
+        while True:
+            kind, payload = await self._next_event()
+            if kind == "data":
+                buffer += payload
+                if len(buffer) >= CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+                continue
+            if buffer:
+                yield bytes(buffer)
+            return
+
+    async def _next_event(self) -> tuple[str, object]:
+        while not self._events:
+            if self._finished:
+                raise ValueError("Corpo multipart incompleto.")
+            try:
+                chunk = await anext(self._stream)
+            except StopAsyncIteration:
+                self._finished = True
+                chunk = None
+            try:
+                if chunk:
+                    self._parser.write(chunk)
+                elif chunk is None:
+                    self._parser.finalize()
+            except MultipartParseError as exc:
+                raise ValueError("Corpo multipart inválido.") from exc
+        return self._events.popleft()
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self) -> None:
+        self._events.append(("headers", self._headers))
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        self._events.append(("data", data[start:end]))
+
+    def _on_part_end(self) -> None:
+        self._events.append(("part_end", None))
+
+    def _on_end(self) -> None:
+        self._events.append(("end", None))
+
+
+async def _read_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(CHUNK_SIZE):
+        yield chunk
+
+
+def _megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.0f} MB"
+
+
+class UploadBatch:
+    """Files of one upload request, stored under ``job_dir`` within the upload limits."""
+
+    def __init__(
+        self,
+        settings: Settings,
+        job_dir: Path,
+        *,
+        allowed_extensions: Sequence[str] | None = None,
+    ) -> None:
+        self.base_dir = settings.uploads_dir_path
+        self.job_dir = job_dir
+        self.max_files = settings.max_upload_files
+        self.max_file_bytes = settings.max_upload_file_bytes
+        self.max_archive_bytes = settings.max_upload_archive_bytes
+        self.max_job_bytes = settings.max_upload_job_bytes
+        self.concurrency = max(settings.upload_write_concurrency, 1)
+        if allowed_extensions is None:
+            allowed_extensions = settings.allowed_upload_extensions or []
+        self.allowed_extensions = list(allowed_extensions)
+        self.blobs = BlobStore(self.base_dir) if settings.upload_dedup_enabled else None
+        self.received = 0
+
+    def check_count(self, count: int) -> None:
+        if self.max_files and count > self.max_files:
+            raise ValueError(f"Limite máximo de {self.max_files} arquivos por auditoria excedido.")
+
+    def check_name(self, filename: str | None) -> None:
+        original_name = filename or "arquivo-sem-nome"
+        extension = Path(original_name).suffix.lower().lstrip(".")
+        if self.allowed_extensions and extension not in self.allowed_extensions:
+            raise ValueError(
+                f"O arquivo '{original_name}' possui extensão não suportada. "
+                f"Permitidos: {', '.join(self.allowed_extensions)}."
+            )
+
+    def file_limit(self, filename: str | None) -> int:
+        extension = Path(filename or "").suffix.lower().lstrip(".")
+        return self.max_archive_bytes if extension == "zip" else self.max_file_bytes
+
+    def check_size(self, filename: str | None, size: int) -> None:
+        """Reject a file announced with ``size`` bytes before any of it is received."""
+        file_limit = self.file_limit(filename)
+        if file_limit and size > file_limit:
+            raise UploadTooLarge(
+                f"O arquivo '{filename or 'arquivo-sem-nome'}' excede o limite de {_megabytes(file_limit)}."
+            )
+        if self.max_job_bytes and self.received + size > self.max_job_bytes:
+            raise UploadTooLarge(f"O volume total da auditoria excede o limite de {_megabytes(self.max_job_bytes)}.")
+
+    def _count(self, size: int) -> None:
+        # Files are written concurrently; the job limit counts bytes as they arrive.
+        self.received += size
+        if self.max_job_bytes and self.received > self.max_job_bytes:
+            raise UploadTooLarge(f"O volume total da auditoria excede o limite de {_megabytes(self.max_job_bytes)}.")
+
+    async def store(self, filename: str | None, content_type: str | None, chunks: AsyncIterator[bytes]) -> dict:
+        """Write one file from its chunks and return its ``input_payload`` entry."""
+        original_name = filename or "arquivo-sem-nome"
+        file_limit = self.file_limit(filename)
+        stored_name = f"{secrets.token_hex(16)}{Path(filename or '').suffix}"
+        destination = self.job_dir / stored_name
+
+        # With deduplication the bytes land in the blob store first and are
+        # linked into the job once their hash is known.
+        target = await asyncio.to_thread(self.blobs.temporary_path) if self.blobs is not None else destination
+        deduplicated = False
+        writer = UploadWriter(target)
+        try:
+            await writer.open()
+            async for chunk in chunks:
+                if file_limit and writer.size + len(chunk) > file_limit:
+                    raise UploadTooLarge(f"O arquivo '{original_name}' excede o limite de {_megabytes(file_limit)}.")
+                self._count(len(chunk))
+                await writer.write(chunk)
+            size, sha256 = await writer.finish()
+            if self.blobs is not None:
+                deduplicated = await asyncio.to_thread(self.blobs.link, target, sha256, destination)
+        except BaseException:
+            await writer.abort()
+            raise
+        finally:
+            if self.blobs is not None:
+                await asyncio.to_thread(target.unlink, missing_ok=True)
+
+        return self._entry(filename, stored_name, content_type, size, sha256, deduplicated)
+
+    def _entry(
+        self, filename: str | None, stored_name: str, content_type: str | None, size: int, sha256: str, deduplicated: bool
+    ) -> dict:
+        return {
+            "original_name": filename,
+            "stored_name": stored_name,
+            "content_type": content_type,
+            "size": size,
+            "sha256": sha256,
+            "stored_path": str((self.job_dir / stored_name).relative_to(self.base_dir)),
+            "deduplicated": deduplicated,
+        }
+
+    async def store_uploads(self, uploads: Sequence[UploadFile]) -> list[dict]:
+        """Store already received files, up to ``upload_write_concurrency`` at a time, in request order."""
+        self.check_count(len(uploads))
+        # Rejected before any byte is stored.
+        for upload in uploads:
+            self.check_name(upload.filename)
+        await asyncio.to_thread(self.job_dir.mkdir, parents=True, exist_ok=True)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def persist(upload: UploadFile) -> dict:
+            async with slots:
+                entry = await self.store(upload.filename, upload.content_type, _read_chunks(upload))
+            await upload.seek(0)
+            return entry
+
+        tasks = [asyncio.create_task(persist(upload)) for upload in uploads]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            # The first failure stops the other files before the batch is removed.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.discard()
+            raise
+
+    async def receive(self, body: MultipartUpload) -> list[dict]:
+        """Store the file parts of ``body`` named ``body.field`` while the request streams in."""
+        if (
+            self.max_job_bytes
+            and body.content_length is not None
+            and body.content_length > self.max_job_bytes + _MULTIPART_OVERHEAD_BYTES
+        ):
+            raise UploadTooLarge(f"O volume total da auditoria excede o limite de {_megabytes(self.max_job_bytes)}.")
+        await asyncio.to_thread(self.job_dir.mkdir, parents=True, exist_ok=True)
+        stored: list[dict] = []
+        try:
+            async for part in body.parts():
+                if part.name != body.field or part.filename is None:
+                    # Other form fields are skipped but still count against the job limit.
+                    async for chunk in part.chunks:
+                        self._count(len(chunk))
+                    continue
+                self.check_count(len(stored) + 1)
+                self.check_name(part.filename)
+                stored.append(await self.store(part.filename, part.content_type, part.chunks))
+            if not stored:
+                raise EmptyUpload("Envie ao menos um arquivo para auditoria.")
+        except BaseException:
+            await self.discard()
+            raise
+        return stored
+
+    async def adopt(self, source: Path, filename: str, content_type: str | None, size: int, sha256: str) -> list[dict]:
+        """
+        Link a file already received and hashed elsewhere (an upload session) into the job.
+
+        The job gets a hard link to ``source``, through the blob store or
+        straight into the job without deduplication, so neither its bytes
+        nor its hash are processed again. ``source`` itself is left in place
+        for its owner to remove once the job is committed.
+        """
+        self.check_count(1)
+        self.check_name(filename)
+        self.check_size(filename, size)
+        self.received += size
+        stored_name = f"{secrets.token_hex(16)}{Path(filename).suffix}"
+        destination = self.job_dir / stored_name
+        link = None
+        try:
+            await asyncio.to_thread(self.job_dir.mkdir, parents=True, exist_ok=True)
+            if self.blobs is not None:
+                link = await asyncio.to_thread(self.blobs.temporary_path)
+                await asyncio.to_thread(os.link, source, link)
+                deduplicated = await asyncio.to_thread(self.blobs.link, link, sha256, destination)
+            else:
+                await asyncio.to_thread(os.link, source, destination)
+                deduplicated = False
+        except BaseException:
+            await self.discard()
+            raise
+        finally:
+            if link is not None:
+                await asyncio.to_thread(link.unlink, missing_ok=True)
+        return [self._entry(filename, stored_name, content_type, size, sha256, deduplicated)]
+
+    async def discard(self) -> None:
+        await asyncio.to_thread(shutil.rmtree, self.job_dir, ignore_errors=True)
+
+
+__all__ = [
+    "CHUNK_SIZE",
+    "EmptyUpload",
+    "MultipartUpload",
+    "UploadBatch",
+    "UploadPart",
+    "UploadTooLarge",
+]
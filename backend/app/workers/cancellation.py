@@ -0,0 +1,114 @@
+# SPDX-License-Identifier: MIT
+"""
+Cooperative cancellation of audit jobs.
+
+Cancelling a job sets ``audit:cancel:<job_id>`` in Redis and revokes the
+pipeline tasks that have not started; their ids are recorded under
+``audit:tasks:<job_id>`` when the DAG is dispatched. Running stages check
+the token before every file and stage (one ``EXISTS`` round trip) and stop
+with `AuditJobCancelled`, so a cancelled job releases its worker within the
+work of a single file. An unreachable Redis never fails a job: the check
+then reports the job as not cancelled.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from functools import lru_cache
+
+import redis
+import structlog
+from celery import Signature
+from celery.utils import uuid
+
+from ..core.config import get_settings
+
+logger = structlog.get_logger(__name__)
+
+# Tokens outlive any audit; they only have to reach the job's remaining tasks.
+_KEY_TTL_SECONDS = 24 * 60 * 60
+
+
+class AuditJobCancelled(Exception):
+    """Raised by a pipeline stage of a job that was cancelled."""
+
+
+def _cancel_key(job_id: str) -> str:
+    return f"audit:cancel:{job_id}"
+
+
+def _tasks_key(job_id: str) -> str:
+    return f"audit:tasks:{job_id}"
+
+
+@lru_cache
+def get_redis() -> redis.Redis:
+    return redis.Redis.from_url(get_settings().redis_url, socket_connect_timeout=2, socket_timeout=2)
+
+
+def assign_task_ids(signature: Signature) -> list[str]:
+    """
+    Give every task of a canvas its id before dispatch and return them.
+
+    ``Signature.freeze`` would do the same but needs the result backend for
+    chords.
+    """
+    children = list(getattr(signature, "tasks", ()))
+    if getattr(signature, "body", None) is not None:
+        children.append(signature.body)
+    if not children:
+        signature.set(task_id=signature.options.get("task_id") or uuid())
+        return [signature.options["task_id"]]
+    return [task_id for child in children for task_id in assign_task_ids(child)]
+
+
+def record_tasks(job_id: str, task_ids: Iterable[str]) -> None:
+    """Remember the dispatched tasks of a job so a cancellation can revoke them."""
+    task_ids = list(task_ids)
+    if not task_ids:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        pipe.sadd(_tasks_key(job_id), *task_ids)
+        pipe.expire(_tasks_key(job_id), _KEY_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("audit_job_tasks_not_recorded", job_id=job_id, error=str(exc))
+
+
+def request_cancellation(job_id: str) -> list[str]:
+    """Set the cancellation token of a job and return the ids of its recorded tasks."""
+    try:
+        pipe = get_redis().pipeline()
+        pipe.set(_cancel_key(job_id), 1, ex=_KEY_TTL_SECONDS)
+        pipe.smembers(_tasks_key(job_id))
+        _, task_ids = pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("audit_job_cancel_token_not_set", job_id=job_id, error=str(exc))
+        return []
+    return sorted(task_id.decode() for task_id in task_ids)
+
+
+def is_cancelled(job_id: str) -> bool:
+    try:
+        return bool(get_redis().exists(_cancel_key(job_id)))
+    except redis.RedisError as exc:
+        logger.warning("audit_job_cancel_token_unavailable", job_id=job_id, error=str(exc))
+        return False
+
+
+def raise_if_cancelled(job_id: str) -> None:
+    if is_cancelled(job_id):
+        logger.info("audit_job_cancelled_in_worker", job_id=job_id)
+        raise AuditJobCancelled(f"Auditoria '{job_id}' cancelada.")
+
+
+__all__ = [
+    "AuditJobCancelled",
+    "assign_task_ids",
+    "get_redis",
+    "is_cancelled",
+    "raise_if_cancelled",
+    "record_tasks",
+    "request_cancellation",
+]
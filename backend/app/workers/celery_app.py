@@ -10,6 +10,7 @@ needs to trigger background tasks.
 from celery import Celery
 
 from ..core.config import get_settings
+from .scheduling import AI_QUEUE
 
 
 def create_celery_app() -> Celery:
@@ -27,8 +28,15 @@ def create_celery_app() -> Celery:
         task_default_queue="audit_default",
         worker_hijack_root_logger=False,
         task_track_started=True,
+        # Audit tasks run for seconds to minutes: a worker reserves one task at a
+        # time so queued work stays available to idle workers.
+        worker_prefetch_multiplier=1,
+        task_routes={"ai.*": {"queue": AI_QUEUE}},
         task_time_limit=60 * 10,
         result_expires=60 * 60,
+        beat_schedule={
+            "collect-upload-blobs": {"task": "uploads.collect_garbage", "schedule": 60 * 60},
+        },
     )
 
     return celery
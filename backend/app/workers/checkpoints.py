@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: MIT
+"""
+Per-stage checkpoints of the audit pipeline.
+
+Every stage task of the DAG stores its output as JSON under
+``<uploads>/<job_id>/checkpoints/`` together with a fingerprint of its
+inputs. A retried, redelivered or re-sent stage whose inputs did not change
+loads its checkpoint instead of running again, so a crash resumes the job
+from the last completed stage. Writes are atomic (temporary file plus
+``os.replace``) because stages of the same job run on different workers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import secrets
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+CHECKPOINTS_DIR = "checkpoints"
+_SUFFIX = ".json"
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable SHA-256 of JSON-serialisable stage inputs."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """Stage outputs of one job, keyed by stage name (``files/3``, ``import``, ...)."""
+
+    def __init__(self, uploads_root: Path, job_id: str) -> None:
+        self.root = uploads_root / job_id / CHECKPOINTS_DIR
+
+    def _path(self, stage: str) -> Path:
+        return self.root / f"{stage}{_SUFFIX}"
+
+    def read(self, stage: str) -> tuple[str, Any] | None:
+        """``(input fingerprint, output)`` of the stored stage, whatever its inputs."""
+        try:
+            with self._path(stage).open("r", encoding="utf-8") as handle:
+                envelope = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return envelope.get("fingerprint"), envelope.get("payload")
+
+    def load(self, stage: str, inputs: str) -> Any | None:
+        """The stage output, or ``None`` when missing or computed from other ``inputs``."""
+        stored = self.read(stage)
+        if stored is None or stored[0] != inputs:
+            return None
+        return stored[1]
+
+    def save(self, stage: str, inputs: str, payload: Any) -> None:
+        path = self._path(stage)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump({"fingerprint": inputs, "payload": payload}, handle, allow_nan=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        logger.debug("audit_checkpoint_saved", stage=stage, path=str(path))
+
+
+__all__ = ["CHECKPOINTS_DIR", "CheckpointStore", "fingerprint"]
@@ -1,26 +1,159 @@
 from __future__ import annotations
 
+import math
 from collections import Counter
-from typing import Iterable, Sequence
+from collections.abc import Mapping
+from typing import Any, Iterable, Sequence
+
+import pandas as pd
 
 from ..db.models import AuditJob
 from ..core.config import get_settings
+from ..services.fiscal_rules import INCONSISTENCIES
+
+# Same weights as SEVERITY_WEIGHTS in agents/auditorAgent.ts.
+_SEVERITY_WEIGHTS = {"ERRO": 10, "ALERTA": 2, "INFO": 0}
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert analysis output (numpy scalars, NaN, pd.NA) into JSON-column friendly values."""
+    if isinstance(value, Mapping):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    # Nullable/Arrow-backed reductions return pd.NA (e.g. the std of one item).
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _document_meta(analysis: Mapping[str, Any] | None) -> dict | None:
+    if not analysis:
+        return None
+    return {
+        "rowCount": analysis.get("row_count"),
+        "columns": analysis.get("columns"),
+        "columnProfiles": analysis.get("profiles", []),
+    }
+
+
+def _audited_document(file_entry: Mapping[str, Any], analysis: Mapping[str, Any] | None) -> dict:
+    name = file_entry.get("original_name") or file_entry.get("stored_name")
+    error = analysis.get("error") if analysis else None
+    document = {
+        "doc": {
+            "kind": "DOCUMENT",
+            "name": name,
+            "size": file_entry.get("size") or 0,
+            "data": [],
+            "raw": None,
+            "status": "error" if error else "parsed",
+            "meta": None if error else _document_meta(analysis),
+        },
+        "status": "OK",
+        "score": 0,
+        "inconsistencies": [],
+        "classification": {
+            "operationType": "Outros",
+            "businessSector": "",
+            "confidence": 0,
+            "costCenter": "",
+        },
+    }
+    if error:
+        # Same shape the frontend auditor gives documents that failed to import.
+        document["doc"]["error"] = error
+        document["status"] = "ERRO"
+        document["score"] = 99
+        document["inconsistencies"] = [
+            {
+                "code": "IMPORT-FAIL",
+                "message": error,
+                "explanation": (
+                    f'O arquivo "{name}" não pôde ser lido corretamente. Verifique se o '
+                    "arquivo não está corrompido e se o formato é um dos suportados."
+                ),
+                "severity": "ERRO",
+            }
+        ]
+    elif analysis and analysis.get("fiscal_validation"):
+        # One entry per rule that fired, in order of first occurrence (dedup by code).
+        inconsistencies = [INCONSISTENCIES[rule] for rule in analysis["fiscal_validation"]["rules"]]
+        severities = {inconsistency["severity"] for inconsistency in inconsistencies}
+        document["inconsistencies"] = inconsistencies
+        document["status"] = "ERRO" if "ERRO" in severities else "ALERTA" if "ALERTA" in severities else "OK"
+        document["score"] = sum(_SEVERITY_WEIGHTS.get(item["severity"], 0) for item in inconsistencies)
+    return document
+
+
+def summarise_validation(analyses: Iterable[Mapping[str, Any]]) -> dict:
+    """Job-wide totals of the per-file fiscal rule findings."""
+    items = 0
+    rules: Counter[str] = Counter()
+    for analysis in analyses:
+        validation = analysis.get("fiscal_validation")
+        if not validation:
+            continue
+        items += validation.get("items") or 0
+        for rule, detail in validation["rules"].items():
+            rules[rule] += detail["count"]
+    return {
+        "items": items,
+        "findings": sum(rules.values()),
+        "rules": {
+            rule: {"code": INCONSISTENCIES[rule]["code"], "count": count}
+            for rule, count in rules.most_common()
+        },
+    }
+
+
+def _brl(cents: int) -> str:
+    """Exact `toLocaleString('pt-BR', {style: 'currency', currency: 'BRL'})` of centavos."""
+    reais, centavos = divmod(abs(cents), 100)
+    sign = "-" if cents < 0 else ""
+    return f"{sign}R$\xa0{reais:,}".replace(",", ".") + f",{centavos:02d}"
 
 
-def _fake_key_metrics(total_size_bytes: int, file_count: int) -> list[dict]:
+def accountant_metrics(aggregation: Mapping[str, Any] | None) -> dict[str, str | int]:
+    """The `runAccountantAnalysis` record, from the exact aggregation totals."""
+    aggregation = aggregation or {}
+    metrics: dict[str, str | int] = {
+        "Número de Documentos Válidos": aggregation.get("nfes") or 0,
+        "Valor Total das NFes": _brl(aggregation.get("nfeCents") or 0),
+        "Valor Total dos Produtos": _brl(aggregation.get("productCents") or 0),
+        "Valor Total de ICMS": _brl(aggregation.get("icmsCents") or 0),
+        "Valor Total de PIS": _brl(aggregation.get("pisCents") or 0),
+        "Valor Total de COFINS": _brl(aggregation.get("cofinsCents") or 0),
+    }
+    if aggregation.get("items"):
+        metrics["Itens Processados"] = aggregation["items"]
+    return metrics
+
+
+def _key_metrics(metrics: Mapping[str, str | int], file_count: int) -> list[dict]:
+    explanations = {
+        "Número de Documentos Válidos": "NFes distintas em documentos sem erros de auditoria.",
+        "Valor Total das NFes": "Soma do valor total de cada NFe, contado uma vez por nota.",
+        "Valor Total dos Produtos": "Soma do valor dos itens dos documentos válidos.",
+        "Valor Total de ICMS": "Soma do ICMS destacado nos itens.",
+        "Valor Total de PIS": "Soma do PIS destacado nos itens.",
+        "Valor Total de COFINS": "Soma do COFINS destacado nos itens.",
+    }
+    status = "OK" if metrics["Número de Documentos Válidos"] else "UNAVAILABLE"
     return [
         {
             "metric": "Arquivos processados",
             "value": str(file_count),
             "status": "OK",
             "explanation": "Total de documentos incluídos nesta auditoria.",
-        },
-        {
-            "metric": "Volume ingerido",
-            "value": f"{total_size_bytes / 1024:.2f} KB",
-            "status": "OK",
-            "explanation": "Tamanho agregado dos arquivos processados.",
-        },
+        }
+    ] + [
+        {"metric": metric, "value": str(metrics[metric]), "status": status, "explanation": explanation}
+        for metric, explanation in explanations.items()
     ]
 
 
@@ -40,48 +173,67 @@ def summarise_job(job: AuditJob) -> dict:
     }
 
 
-def create_report_payload(job: AuditJob) -> dict:
+def _deterministic_cross_validation(result: Mapping[str, Any] | None) -> list[dict]:
+    """Findings in the frontend's shape, with document indexes resolved to ``{name, internal_path}``."""
+    if not result:
+        return []
+    documents = result["documents"]
+    return [
+        {
+            "comparisonKey": finding["comparisonKey"],
+            "attribute": finding["attribute"],
+            "description": finding["description"],
+            "discrepancies": [
+                {
+                    "valueA": item["valueA"],
+                    "docA": documents[item["docA"]],
+                    "valueB": item["valueB"],
+                    "docB": documents[item["docB"]],
+                }
+                for item in finding["discrepancies"]
+            ],
+            "severity": finding["severity"],
+        }
+        for finding in result["findings"]
+    ]
+
+
+def create_report_payload(
+    job: AuditJob,
+    analyses: Mapping[str, Mapping[str, Any]] | None = None,
+    cross_validation: Mapping[str, Any] | None = None,
+    aggregation: Mapping[str, Any] | None = None,
+    classifications: Mapping[str, Mapping[str, Any]] | None = None,
+) -> dict:
     files = job.input_payload or []
+    analyses = analyses or {}
+    classifications = classifications or {}
     total_size = sum(f.get("size") or 0 for f in files)
     file_count = len(files)
 
-    documents = [
-        {
-            "doc": {
-                "kind": "DOCUMENT",
-                "name": f.get("original_name") or f.get("stored_name"),
-                "size": f.get("size") or 0,
-                "data": [],
-                "raw": None,
-                "status": "parsed",
-            },
-            "status": "OK",
-            "score": 0,
-            "inconsistencies": [],
-            "classification": {
-                "operationType": "Outros",
-                "businessSector": "",
-                "confidence": 0,
-                "costCenter": "",
-            },
-        }
-        for f in files
-    ]
+    documents = [_audited_document(f, analyses.get(f.get("stored_name"))) for f in files]
+    for file_entry, document in zip(files, documents):
+        classification = classifications.get(file_entry.get("stored_name"))
+        # Like the classifier agent, documents audited as ERRO keep the default.
+        if classification is not None and document["status"] != "ERRO":
+            document["classification"] = dict(classification)
+    metrics = accountant_metrics(aggregation)
 
     report = {
         "summary": {
             "title": "Auditoria Fiscal (MVP)",
             "summary": job.input_summary or "Arquivos processados com sucesso.",
-            "keyMetrics": _fake_key_metrics(total_size, file_count),
+            "keyMetrics": _key_metrics(metrics, file_count),
             "actionableInsights": [],
         },
         "aggregatedMetrics": {
             "total_files": file_count,
             "total_size_bytes": total_size,
+            **metrics,
         },
         "documents": documents,
         "aiDrivenInsights": [],
-        "deterministicCrossValidation": [],
+        "deterministicCrossValidation": _deterministic_cross_validation(cross_validation),
         "crossValidationResults": [],
     }
 
@@ -0,0 +1,136 @@
+# SPDX-License-Identifier: MIT
+"""
+Bounded process pool for the per-file work of an audit job.
+
+Parsing and analysing uploads is CPU bound, so files are fanned out to a
+billiard pool (Celery's multiprocessing fork, which unlike the stdlib allows a
+prefork worker to start children). Each file gets its own hard time limit,
+enforced by the pool killing the worker process that runs it, and a failure
+only affects the outcome of that file. Outcomes always come back in the order
+the items were given, whatever order the workers finish in.
+
+Worker processes are never forked from the caller. Prefork children run
+the loop thread of their `WorkerRuntime` and hold its engine connections,
+and forking a process with a live thread can leave the child deadlocked on
+a lock that thread held. The pool uses the ``forkserver`` start method:
+children are forked from a single-threaded server process, started once per
+caller with this module and the task module preloaded, so a pool still
+starts without re-importing the application.
+
+Once every result is in, the pool is closed and joined so idle workers exit
+on their own; it is only terminated when collecting results fails or the
+workers do not exit within a bounded wait.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+import billiard
+import structlog
+from billiard.exceptions import TimeLimitExceeded, WorkerLostError
+from billiard.pool import Pool
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# How long a closed pool may take to wind down before it is terminated.
+POOL_JOIN_TIMEOUT_SECONDS = 10.0
+
+_CONTEXT = billiard.get_context("forkserver")
+_CONTEXT.set_forkserver_preload(["app.workers.parallel", "app.workers.tasks"])
+
+
+@dataclass(slots=True)
+class FileOutcome(Generic[R]):
+    index: int
+    value: R | None = None
+    error: str | None = None
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _describe(exc: BaseException) -> tuple[str, bool]:
+    # Pool-side failures arrive wrapped together with their remote traceback.
+    exc = getattr(exc, "exc", exc)
+    if isinstance(exc, TimeLimitExceeded):
+        return "Tempo limite de processamento do arquivo excedido.", True
+    if isinstance(exc, WorkerLostError):
+        return "O processo que analisava o arquivo foi encerrado inesperadamente.", False
+    return str(exc) or exc.__class__.__name__, False
+
+
+def _run_inline(func: Callable[[T], R], items: Sequence[T]) -> list[FileOutcome[R]]:
+    outcomes: list[FileOutcome[R]] = []
+    for index, item in enumerate(items):
+        try:
+            outcomes.append(FileOutcome(index=index, value=func(item)))
+        except Exception as exc:
+            outcomes.append(FileOutcome(index=index, error=_describe(exc)[0]))
+    return outcomes
+
+
+def _join(pool: Pool, timeout_seconds: float) -> bool:
+    """`Pool.join` has no timeout, so wait for it on a helper thread."""
+    joiner = threading.Thread(target=pool.join, name="audit-pool-join", daemon=True)
+    joiner.start()
+    joiner.join(timeout_seconds)
+    return not joiner.is_alive()
+
+
+def _shutdown(pool: Pool) -> None:
+    pool.close()
+    if _join(pool, POOL_JOIN_TIMEOUT_SECONDS):
+        return
+    logger.warning("audit_pool_join_timed_out", timeout_seconds=POOL_JOIN_TIMEOUT_SECONDS)
+    pool.terminate()
+
+
+def run_in_process_pool(
+    func: Callable[[T], R],
+    items: Sequence[T],
+    *,
+    processes: int,
+    timeout_seconds: float | None = None,
+) -> list[FileOutcome[R]]:
+    """
+    Apply ``func`` to every item on at most ``processes`` worker processes.
+
+    ``func`` must be a module-level callable so it can be pickled.
+    ``processes <= 0`` runs everything in the calling process (no time limit).
+    """
+    if not items:
+        return []
+    if processes <= 0:
+        return _run_inline(func, items)
+
+    outcomes: list[FileOutcome[R]] = []
+    pool = Pool(processes=min(processes, len(items)), timeout=timeout_seconds or None, context=_CONTEXT)
+    try:
+        pending = [pool.apply_async(func, (item,)) for item in items]
+        for index, result in enumerate(pending):
+            try:
+                outcomes.append(FileOutcome(index=index, value=result.get()))
+            except Exception as exc:
+                message, timed_out = _describe(exc)
+                logger.warning(
+                    "audit_file_worker_failed", index=index, error=message, timed_out=timed_out
+                )
+                outcomes.append(FileOutcome(index=index, error=message, timed_out=timed_out))
+    except BaseException:
+        pool.terminate()
+        pool.join()
+        raise
+    _shutdown(pool)
+    return outcomes
+
+
+__all__ = ["FileOutcome", "run_in_process_pool"]
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: MIT
+"""
+Per-process async runtime of the Celery workers.
+
+Tasks are synchronous but the database layer is async. Running each task
+through ``asyncio.run`` creates and closes an event loop per call, and the
+pooled asyncpg connections of the engine are bound to the loop that opened
+them, so they cannot be reused by the next task. Instead, each worker
+process starts one event loop in a daemon thread and one engine at process
+init (``worker_process_init`` for prefork children, ``worker_init`` for the
+solo and thread pools); tasks submit their coroutines to that loop, and the
+session factory is rebound to the process engine so its pool serves every
+task. The engine is disposed and the loop stopped at shutdown.
+
+Outside a worker (tests, scripts, eager tasks) `run_async` falls back to
+``asyncio.run``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+import structlog
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..db.session import AsyncSessionFactory, build_engine
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+_SHUTDOWN_TIMEOUT_SECONDS = 10
+
+
+class WorkerRuntime:
+    """One event loop thread and one async engine for the current process."""
+
+    def __init__(self) -> None:
+        self._pid: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._engine: AsyncEngine | None = None
+
+    @property
+    def running(self) -> bool:
+        # A runtime inherited through fork has no loop thread in this process.
+        return self._pid == os.getpid() and self._loop is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="worker-event-loop", daemon=True)
+        self._thread.start()
+        self._engine = build_engine()
+        AsyncSessionFactory.configure(bind=self._engine)
+        logger.info("worker_runtime_started", pid=self._pid)
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Run ``coroutine`` on the process loop and wait for its result."""
+        if not self.running:
+            raise RuntimeError("The worker runtime is not running in this process.")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+        loop, thread, engine = self._loop, self._thread, self._engine
+        try:
+            if engine is not None:
+                asyncio.run_coroutine_threadsafe(engine.dispose(), loop).result(_SHUTDOWN_TIMEOUT_SECONDS)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(_SHUTDOWN_TIMEOUT_SECONDS)
+            loop.close()
+            self._pid = self._loop = self._thread = self._engine = None
+            logger.info("worker_runtime_stopped", pid=os.getpid())
+
+
+runtime = WorkerRuntime()
+
+
+def run_async(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run a task's coroutine on the worker loop, or on a fresh one outside a worker."""
+    if runtime.running:
+        return runtime.run(coroutine)
+    return asyncio.run(coroutine)
+
+
+@worker_process_init.connect
+def _start_process_runtime(**_: Any) -> None:
+    runtime.start()
+
+
+@worker_init.connect
+def _start_inline_runtime(sender: Any = None, **_: Any) -> None:
+    # Prefork children start their own runtime after the fork: a thread started
+    # in the parent would not survive it, and forking with it alive is unsafe.
+    # For the same reason the per-file pools of `parallel` start their
+    # processes from a fork server rather than from these children.
+    if sender is not None and "prefork" not in str(getattr(sender, "pool_cls", "")):
+        runtime.start()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _stop_runtime(**_: Any) -> None:
+    runtime.stop()
+
+
+__all__ = ["WorkerRuntime", "run_async", "runtime"]
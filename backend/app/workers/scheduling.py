@@ -0,0 +1,214 @@
+# SPDX-License-Identifier: MIT
+"""
+Size-aware queues and per-tenant fair admission of audit jobs.
+
+Jobs whose uploads exceed ``audit_bulk_threshold_files`` or
+``audit_bulk_threshold_bytes`` run on the ``audit_bulk`` queue, every other
+job on ``audit_interactive``, so a 100 MB batch never sits in front of a
+single-invoice audit. All tasks of a job's DAG follow its queue; AI tasks
+(``ai.*``) are routed to ``audit_ai`` by the Celery configuration.
+
+Celery queues are FIFO, so fairness between tenants is decided at
+admission. Enqueueing a job appends it to its tenant's list in Redis
+(``audit:fair:<queue>:<tenant>``) and sends one ``audits.process`` message;
+the worker that takes a message starts the job picked by smooth weighted
+round robin over the tenants with waiting jobs, not necessarily the one
+named in the message. The tenant is the idempotency-key prefix before
+``audit_tenant_separator``; weights come from ``audit_tenant_weights``.
+
+The wait between a job's creation and its start is kept per queue (the
+last `WAIT_SAMPLES`) to report p50/p95 time-to-start.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Iterable, Mapping, Sequence
+
+import redis
+import structlog
+from celery import Signature
+
+from ..core.config import get_settings
+from .cancellation import get_redis
+
+logger = structlog.get_logger(__name__)
+
+INTERACTIVE_QUEUE = "audit_interactive"
+BULK_QUEUE = "audit_bulk"
+AI_QUEUE = "audit_ai"
+AUDIT_QUEUES = (INTERACTIVE_QUEUE, BULK_QUEUE)
+DEFAULT_TENANT = "default"
+WAIT_SAMPLES = 1000
+_LOCK_TIMEOUT_SECONDS = 5
+
+
+def queue_for_job(files: Sequence[Mapping]) -> str:
+    """Queue of a job from the number and total size of its uploads."""
+    settings = get_settings()
+    total = sum(int(entry.get("size") or 0) for entry in files)
+    if len(files) > settings.audit_bulk_threshold_files or total > settings.audit_bulk_threshold_bytes:
+        return BULK_QUEUE
+    return INTERACTIVE_QUEUE
+
+
+def tenant_of(idempotency_key: str | None) -> str:
+    separator = get_settings().audit_tenant_separator
+    if not idempotency_key or not separator or separator not in idempotency_key:
+        return DEFAULT_TENANT
+    return idempotency_key.split(separator, 1)[0] or DEFAULT_TENANT
+
+
+def route_canvas(signature: Signature, queue: str) -> None:
+    """Send every task of a canvas to ``queue``."""
+    children = list(getattr(signature, "tasks", ()))
+    if getattr(signature, "body", None) is not None:
+        children.append(signature.body)
+    if not children:
+        signature.set(queue=queue)
+    for child in children:
+        route_canvas(child, queue)
+
+
+def pick_tenant(backlog: Iterable[str], weights: Mapping[str, int], current: dict[str, int]) -> str | None:
+    """
+    Next tenant by smooth weighted round robin (as in nginx), updating ``current``.
+
+    Every tenant with waiting jobs gains its weight, the richest one is
+    picked and pays the total. Tenants without a backlog drop their credit,
+    so an idle tenant cannot burst ahead when it comes back.
+    """
+    tenants = sorted(set(backlog))
+    if not tenants:
+        current.clear()
+        return None
+    total = 0
+    for tenant in tenants:
+        weight = max(int(weights.get(tenant, 1)), 1)
+        current[tenant] = current.get(tenant, 0) + weight
+        total += weight
+    for tenant in set(current) - set(tenants):
+        del current[tenant]
+    chosen = max(tenants, key=lambda tenant: current[tenant])
+    current[chosen] -= total
+    return chosen
+
+
+class AdmissionQueue:
+    """Waiting jobs of one Celery queue, per tenant, in Redis."""
+
+    def __init__(self, client: redis.Redis, queue: str) -> None:
+        self.client = client
+        self.prefix = f"audit:fair:{queue}"
+
+    def _jobs_key(self, tenant: str) -> str:
+        return f"{self.prefix}:{tenant}"
+
+    def push(self, tenant: str, job_id: str) -> bool:
+        """Queue a job for admission; ``False`` when Redis is unavailable."""
+        try:
+            pipe = self.client.pipeline()
+            pipe.rpush(self._jobs_key(tenant), job_id)
+            pipe.sadd(f"{self.prefix}:tenants", tenant)
+            pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("audit_job_admission_unavailable", tenant=tenant, job_id=job_id, error=str(exc))
+            return False
+        return True
+
+    def pop(self, weights: Mapping[str, int]) -> str | None:
+        """Next job to start across tenants, or ``None`` when nothing waits."""
+        with self.client.lock(f"{self.prefix}:lock", timeout=_LOCK_TIMEOUT_SECONDS):
+            tenants = sorted(member.decode() for member in self.client.smembers(f"{self.prefix}:tenants"))
+            pipe = self.client.pipeline()
+            for tenant in tenants:
+                pipe.llen(self._jobs_key(tenant))
+            pipe.hgetall(f"{self.prefix}:credit")
+            *lengths, credit = pipe.execute()
+            backlog = {tenant: length for tenant, length in zip(tenants, lengths) if length}
+            current = {key.decode(): int(value) for key, value in credit.items()}
+            chosen = pick_tenant(backlog, weights, current)
+
+            pipe = self.client.pipeline()
+            idle = [tenant for tenant in tenants if tenant not in backlog]
+            if chosen is not None:
+                pipe.lpop(self._jobs_key(chosen))
+                if backlog[chosen] == 1:
+                    idle.append(chosen)
+            if idle:
+                pipe.srem(f"{self.prefix}:tenants", *idle)
+            pipe.delete(f"{self.prefix}:credit")
+            if current:
+                pipe.hset(f"{self.prefix}:credit", mapping=current)
+            results = pipe.execute()
+        if chosen is None:
+            return None
+        return results[0].decode() if results[0] is not None else None
+
+
+def admit(queue: str, tenant: str, job_id: str) -> bool:
+    """Queue a job for fair admission on ``queue``."""
+    return AdmissionQueue(get_redis(), queue).push(tenant, job_id)
+
+
+def next_admitted(queue: str) -> str | None:
+    """The job a worker that received an ``audits.process`` message on ``queue`` should start."""
+    try:
+        return AdmissionQueue(get_redis(), queue).pop(get_settings().audit_tenant_weights)
+    except redis.RedisError as exc:
+        logger.warning("audit_job_admission_unavailable", queue=queue, error=str(exc))
+        return None
+
+
+def record_wait(queue: str, seconds: float) -> None:
+    """Keep the time-to-start of a job among the recent samples of its queue."""
+    try:
+        pipe = get_redis().pipeline()
+        pipe.lpush(f"audit:wait:{queue}", f"{seconds:.3f}")
+        pipe.ltrim(f"audit:wait:{queue}", 0, WAIT_SAMPLES - 1)
+        pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning("audit_job_wait_not_recorded", queue=queue, error=str(exc))
+
+
+def percentile(samples: Sequence[float], rank: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def time_to_start() -> dict[str, dict[str, float | int | None]]:
+    """p50/p95 seconds from creation to start of the recent jobs of each audit queue."""
+    pipe = get_redis().pipeline()
+    for queue in AUDIT_QUEUES:
+        pipe.lrange(f"audit:wait:{queue}", 0, -1)
+    report = {}
+    for queue, values in zip(AUDIT_QUEUES, pipe.execute()):
+        samples = [float(value) for value in values]
+        report[queue] = {
+            "samples": len(samples),
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+        }
+    return report
+
+
+__all__ = [
+    "AI_QUEUE",
+    "AUDIT_QUEUES",
+    "AdmissionQueue",
+    "BULK_QUEUE",
+    "DEFAULT_TENANT",
+    "INTERACTIVE_QUEUE",
+    "admit",
+    "next_admitted",
+    "percentile",
+    "pick_tenant",
+    "queue_for_job",
+    "record_wait",
+    "route_canvas",
+    "tenant_of",
+    "time_to_start",
+]
@@ -8,21 +8,116 @@ frontend worker to server-side processing.
 
 from __future__ import annotations
 
-import asyncio
+import time
 import uuid
+from collections import Counter
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
+import pyarrow as pa
+import pyarrow.compute as pc
 import structlog
-from celery import shared_task
+from celery import Signature, chain, chord, shared_task
 
 from ..core.config import get_settings
 from ..db.models import AuditJob
+from ..db.models.audit_job import AuditJobStatus
 from ..db.session import AsyncSessionFactory
-from .outcome import create_report_payload, summarise_job
+from ..services.aggregation import (
+    AGGREGATION_COLUMNS,
+    AggregationResult,
+    aggregate_items,
+    collect_aggregation_items,
+)
+from ..services.analysis_cache import AnalysisCache, get_analysis_cache
+from ..services.archive import (
+    ARCHIVE_MEMBER_COLUMN,
+    ArchiveError,
+    ArchiveLimits,
+    parse_archive_members,
+    scan_archive,
+)
+from ..services.blob_store import BlobStore
+from ..services.classification import (
+    CLASSIFICATION_COLUMNS,
+    ClassificationResult,
+    apply_corrections,
+    classify_documents,
+)
+from ..services.cross_validation import (
+    CROSS_VALIDATION_COLUMNS,
+    CrossValidationResult,
+    collect_item_sources,
+    cross_validate_items,
+)
+from ..services.csv_analyzer import ANALYZER_VERSION, CSVAnalysisError, analyse_csv_file
+from ..services.fiscal_rules import RULE_COLUMNS, RULES_VERSION, validate_items
+from ..services.nfe_parser import (
+    NFE_PARSER_VERSION,
+    NFeParseError,
+    analyse_item_table,
+    analyse_nfe_file,
+    parse_nfe_file,
+)
+from ..services.reconciliation import (
+    RECONCILIATION_COLUMNS,
+    bank_transactions,
+    collect_documents,
+    reconcile,
+)
+from ..services.sketches import merge_analysis_sketches
+from ..services.staging import (
+    STAGING_VERSION,
+    StagingError,
+    analyse_staged_file,
+    collect_staged_garbage,
+    current_artifact,
+    open_staged_table,
+    stage_csv,
+    stage_upload,
+    staged_artifact,
+    staged_path_for,
+    write_staged_table,
+)
+from ..services.upload_sessions import UploadSessionStore
+from .cancellation import AuditJobCancelled, assign_task_ids, raise_if_cancelled, record_tasks
+from .checkpoints import CheckpointStore, fingerprint
+from .outcome import create_report_payload, summarise_job, summarise_validation, to_jsonable
+from .parallel import run_in_process_pool
+from .runtime import run_async
+from .scheduling import (
+    AUDIT_QUEUES,
+    INTERACTIVE_QUEUE,
+    next_admitted,
+    queue_for_job,
+    record_wait,
+    route_canvas,
+)
 
 logger = structlog.get_logger(__name__)
 settings = get_settings()
 
+# Cache key component covering every analyzer whose output is cached per file.
+_ANALYSIS_CACHE_VERSION = f"csv{ANALYZER_VERSION}-nfe{NFE_PARSER_VERSION}-rules{RULES_VERSION}" + (
+    f"-arrow{STAGING_VERSION}" if settings.upload_staging_enabled else ""
+)
+
+
+# Bump when a stage's output changes shape so older checkpoints are recomputed.
+_PIPELINE_VERSION = "1"
+_IMPORT_STAGE = "import"
+# Stages are idempotent thanks to their checkpoints: acknowledge them once done so
+# the task of a lost worker is redelivered, and retry transient I/O errors.
+_STAGE_OPTIONS: dict[str, Any] = {
+    "acks_late": True,
+    "reject_on_worker_lost": True,
+    "autoretry_for": (OSError,),
+    "retry_backoff": True,
+    "max_retries": 3,
+}
+
 
 @shared_task(name="health.ping")
 def ping() -> str:
@@ -30,13 +125,449 @@ def ping() -> str:
     return "pong"
 
 
-@shared_task(name="audits.process")
-def process_audit_job(job_id: str) -> None:
-    """Process an audit job (placeholder)."""
-    asyncio.run(_process_audit_job(job_id))
+@shared_task(name="uploads.collect_garbage")
+def collect_upload_blobs() -> int:
+    """Remove expired upload sessions, then staged artifacts and upload blobs no job uses any more."""
+    blobs = BlobStore(settings.uploads_dir_path)
+    sessions = UploadSessionStore(settings.uploads_dir_path).collect_expired(
+        ttl_seconds=settings.upload_session_ttl_seconds
+    )
+    # Without deduplication there are no blobs to tell whether an upload is still used.
+    staged = collect_staged_garbage(
+        settings.uploads_dir_path,
+        grace_seconds=settings.upload_blob_gc_grace_seconds,
+        blobs=blobs if settings.upload_dedup_enabled else None,
+    )
+    return sessions + staged + blobs.collect_garbage(grace_seconds=settings.upload_blob_gc_grace_seconds)
+
+
+def _stage_file(path: Path, file_entry: dict) -> dict:
+    """Attach the columnar artifact of an upload to its ``input_payload`` entry."""
+    try:
+        staged = stage_upload(
+            path,
+            file_entry,
+            uploads_root=settings.uploads_dir_path,
+            batch_rows=settings.upload_staging_batch_rows,
+        )
+    except (StagingError, OSError) as exc:
+        logger.warning(
+            "audit_job_staging_failed", file=file_entry.get("original_name"), error=str(exc)
+        )
+        staged = None
+    return {**file_entry, "staged": staged}
+
+
+def _analyse_file(path: Path, file_entry: dict) -> dict | None:
+    """Run the tabular analysis (stats + column profiles) for CSV and NFe XML uploads."""
+    original_name = file_entry.get("original_name") or path.name
+    suffix = Path(original_name).suffix.lower()
+    if suffix not in (".csv", ".xml"):
+        return None
+    size = file_entry.get("size") or 0
+    staged = file_entry.get("staged")
+    try:
+        if staged:
+            analysis = analyse_staged_file(
+                settings.uploads_dir_path / Path(staged["path"]),
+                original_name=original_name,
+                streaming=size > settings.csv_streaming_threshold_bytes,
+                memory_limit_bytes=settings.csv_stream_memory_limit_bytes,
+                profile=True,
+                sketches=True,
+            )
+        elif suffix == ".xml":
+            analysis = analyse_nfe_file(
+                path, original_name=original_name, profile=True, sketches=True
+            )
+        else:
+            analysis = analyse_csv_file(
+                path,
+                original_name=original_name,
+                streaming=size > settings.csv_streaming_threshold_bytes,
+                memory_limit_bytes=settings.csv_stream_memory_limit_bytes,
+                profile=True,
+                sketches=True,
+            )
+    except (CSVAnalysisError, NFeParseError) as exc:
+        logger.warning("audit_job_file_analysis_failed", file=original_name, error=str(exc))
+        return {"error": str(exc)}
+    if analysis is None:
+        return None
+    result = to_jsonable(analysis)
+    items = _item_table(path, file_entry, RULE_COLUMNS)
+    if items is not None:
+        result["fiscal_validation"] = _validate_items(items, original_name)
+    return result
+
+
+def _item_table(path: Path, file_entry: dict, columns: Sequence[str]) -> pa.Table | None:
+    """Item ``columns`` of an upload: projected from the staged file, or a parsed NFe."""
+    staged = file_entry.get("staged")
+    if staged:
+        table = open_staged_table(settings.uploads_dir_path / Path(staged["path"]), list(columns))
+    elif path.suffix.lower() == ".xml":
+        table = parse_nfe_file(path, original_name=file_entry.get("original_name")).table
+    else:
+        return None
+    # Tables without any item column (e.g. unrelated CSVs) are skipped.
+    return table if table.num_columns else None
+
+
+def _validate_items(table: pa.Table, original_name: str) -> dict:
+    findings = validate_items(table)
+    logger.info(
+        "audit_job_file_validated",
+        file=original_name,
+        items=findings.items,
+        findings=len(findings),
+        seconds=findings.seconds,
+        slowest_rule=max(findings.profile, key=lambda rule: rule["seconds"])["rule"] if findings.profile else None,
+    )
+    return to_jsonable(findings.summary())
+
+
+def _process_file(work: tuple[dict, bool]) -> tuple[dict, dict | None]:
+    """Pool entry point: stage one upload and analyse it unless the cache had it."""
+    file_entry, analyse = work
+    absolute = settings.uploads_dir_path / Path(file_entry["stored_path"])
+    if settings.upload_staging_enabled:
+        file_entry = _stage_file(absolute, file_entry)
+    analysis = _analyse_file(absolute, file_entry) if analyse else None
+    return file_entry, analysis
+
+
+def _archive_limits() -> ArchiveLimits:
+    return ArchiveLimits(
+        max_members=settings.zip_max_members,
+        max_total_bytes=settings.zip_max_uncompressed_bytes,
+        max_member_bytes=settings.zip_max_member_bytes,
+        max_compression_ratio=settings.zip_max_compression_ratio,
+    )
+
+
+def _parse_archive_chunk(work: tuple[str, list[str]]) -> tuple[pa.Table, list[dict[str, str]]]:
+    """Pool entry point: parse a slice of the members of a stored archive."""
+    path, names = work
+    return parse_archive_members(Path(path), names, max_member_bytes=settings.zip_max_member_bytes)
+
+
+def _process_archive(
+    job_id: str, file_entry: dict, known_hashes: set[str]
+) -> tuple[dict, dict]:
+    """
+    Scan a ZIP upload in this process, then parse its unique members on the pool.
+
+    The members' item tables are merged in archive order into a single staged
+    table and analysed as one document. Since this runs in the task process
+    rather than on the pool, any failure is caught here and only gives this
+    upload an ``error`` analysis.
+    """
+    try:
+        return _analyse_archive(job_id, file_entry, known_hashes)
+    except Exception as exc:
+        logger.exception(
+            "audit_job_archive_failed",
+            job_id=job_id,
+            file=file_entry.get("original_name"),
+            error=str(exc),
+        )
+        return file_entry, {"error": f"Falha ao processar o arquivo ZIP: {exc}"}
+
+
+def _analyse_archive(
+    job_id: str, file_entry: dict, known_hashes: set[str]
+) -> tuple[dict, dict]:
+    absolute = settings.uploads_dir_path / Path(file_entry["stored_path"])
+    original_name = file_entry.get("original_name") or absolute.name
+    started = time.perf_counter()
+    try:
+        manifest = scan_archive(absolute, _archive_limits(), known_hashes=known_hashes)
+    except ArchiveError as exc:
+        logger.warning("audit_job_archive_rejected", job_id=job_id, file=original_name, error=str(exc))
+        return file_entry, {"error": str(exc)}
+
+    batch = max(settings.zip_member_batch_size, 1)
+    chunks = [manifest.members[start : start + batch] for start in range(0, len(manifest.members), batch)]
+    outcomes = run_in_process_pool(
+        _parse_archive_chunk,
+        [(str(absolute), names) for names in chunks],
+        processes=settings.audit_worker_processes,
+        timeout_seconds=settings.audit_file_timeout_seconds,
+    )
+    tables: list[pa.Table] = []
+    for names, outcome in zip(chunks, outcomes):
+        if outcome.ok:
+            table, errors = outcome.value
+            tables.append(table)
+            manifest.errors.extend(errors)
+        else:
+            manifest.errors.extend({"member": name, "error": outcome.error} for name in names)
+
+    table = pa.concat_tables(tables) if tables else None
+    documents = pc.count_distinct(table.column(ARCHIVE_MEMBER_COLUMN)).as_py() if table else 0
+    file_entry = {**file_entry, "archive": {**manifest.summary(), "parsed": documents}}
+    if not documents:
+        return file_entry, {"error": "Nenhuma NFe válida encontrada no arquivo ZIP."}
+
+    if settings.upload_staging_enabled:
+        destination = staged_path_for(
+            absolute, sha256=file_entry.get("sha256"), uploads_root=settings.uploads_dir_path
+        )
+        write_staged_table(
+            table,
+            destination,
+            metadata={"original_name": original_name, "engine": "zip", "documents": str(documents)},
+            batch_rows=settings.upload_staging_batch_rows,
+        )
+        file_entry["staged"] = staged_artifact(
+            destination,
+            uploads_root=settings.uploads_dir_path,
+            columns=table.column_names,
+            rows=table.num_rows,
+            seconds=time.perf_counter() - started,
+        )
+    analysis = analyse_item_table(
+        table,
+        filename=original_name,
+        diagnostics={
+            "source": "zip",
+            "documents": documents,
+            "parse_seconds": time.perf_counter() - started,
+        },
+        profile=True,
+        sketches=True,
+    )
+    result = to_jsonable(analysis)
+    result["fiscal_validation"] = _validate_items(table, original_name)
+    return file_entry, result
+
+
+def _known_hashes(files: Sequence[dict]) -> set[str]:
+    """Hashes of the standalone uploads; identical archive members are not parsed twice."""
+    return {
+        entry["sha256"]
+        for entry in files
+        if entry.get("sha256") and Path(entry.get("stored_path") or "").suffix.lower() != ".zip"
+    }
+
+
+def _import_file(
+    job_id: str, file_entry: dict, known_hashes: set[str], cache: AnalysisCache | None
+) -> tuple[dict, dict | None]:
+    """
+    Stage and analyse one upload of the job, reusing the analysis cache.
 
+    Returns the updated ``input_payload`` entry and the analysis (``None`` for
+    files without one). A file that fails, crashes its pool worker or runs past
+    ``audit_file_timeout_seconds`` only gets an ``error`` analysis.
+    """
+    if not file_entry.get("stored_path"):
+        return file_entry, None
+    logger.info(
+        "audit_job_file_ready",
+        job_id=job_id,
+        file=file_entry["stored_path"],
+        sha256=file_entry.get("sha256"),
+    )
+    hit = cache.get(file_entry.get("sha256"), _ANALYSIS_CACHE_VERSION) if cache else None
+    # Staged artifacts are keyed by SHA-256, so an earlier job's one is reused as is.
+    artifact = (
+        current_artifact(file_entry, uploads_root=settings.uploads_dir_path)
+        if hit is not None and settings.upload_staging_enabled
+        else None
+    )
+    reusable = hit is not None and (artifact is not None or not settings.upload_staging_enabled)
 
-async def _process_audit_job(job_id: str) -> None:
+    if Path(file_entry["stored_path"]).suffix.lower() == ".zip":
+        if reusable:
+            entry = {**file_entry, "archive": hit.get("archive")}
+            if artifact is not None:
+                entry["staged"] = artifact
+            return entry, hit.get("analysis")
+        entry, analysis = _process_archive(job_id, file_entry, known_hashes)
+        if cache is not None and "error" not in analysis:
+            cache.put(
+                file_entry.get("sha256"),
+                _ANALYSIS_CACHE_VERSION,
+                {"analysis": analysis, "archive": entry.get("archive")},
+            )
+        return entry, analysis
+
+    if reusable:
+        return ({**file_entry, "staged": artifact} if artifact else file_entry), hit.get("analysis")
+    # Celery already spreads the files of a job across workers; the child
+    # process only gives this one its hard time limit and crash isolation.
+    [outcome] = run_in_process_pool(
+        _process_file,
+        [(file_entry, hit is None)],
+        processes=1 if settings.audit_file_isolation else 0,
+        timeout_seconds=settings.audit_file_timeout_seconds,
+    )
+    if not outcome.ok:
+        logger.warning(
+            "audit_job_file_failed",
+            job_id=job_id,
+            file=file_entry.get("original_name"),
+            error=outcome.error,
+            timed_out=outcome.timed_out,
+        )
+        return file_entry, {"error": outcome.error}
+    entry, analysis = outcome.value
+    if hit is not None:
+        return entry, hit.get("analysis")
+    if cache is not None and analysis is not None:
+        cache.put(file_entry.get("sha256"), _ANALYSIS_CACHE_VERSION, {"analysis": analysis})
+    return entry, analysis
+
+
+def _item_sources(
+    job_id: str, files: list[dict], analyses: dict[str, dict], columns: Sequence[str], event: str
+) -> list[tuple[dict, pa.Table]]:
+    """Item ``columns`` of every successfully analysed file of the job, with its entry."""
+    sources: list[tuple[dict, pa.Table]] = []
+    for file_entry in files:
+        analysis = analyses.get(file_entry.get("stored_name"))
+        if not analysis or analysis.get("error") or not file_entry.get("stored_path"):
+            continue
+        absolute = settings.uploads_dir_path / Path(file_entry["stored_path"])
+        try:
+            table = _item_table(absolute, file_entry, columns)
+        except (NFeParseError, StagingError, OSError, pa.ArrowException) as exc:
+            logger.warning(event, job_id=job_id, file=file_entry.get("original_name"), error=str(exc))
+            continue
+        if table is not None:
+            sources.append((file_entry, table))
+    return sources
+
+
+def _source_name(file_entry: dict) -> str:
+    return file_entry.get("original_name") or Path(file_entry["stored_path"]).name
+
+
+def _cross_validate(job_id: str, files: list[dict], analyses: dict[str, dict]) -> CrossValidationResult:
+    """Compare the items of every successfully analysed file of the job."""
+    sources = _item_sources(
+        job_id, files, analyses, CROSS_VALIDATION_COLUMNS, "audit_job_cross_validation_skipped"
+    )
+    result = cross_validate_items(
+        *collect_item_sources((_source_name(entry), table) for entry, table in sources)
+    )
+    logger.info(
+        "audit_job_cross_validated",
+        job_id=job_id,
+        items=result["items"],
+        products=result["products"],
+        findings=len(result["findings"]),
+        seconds=result["seconds"],
+    )
+    return result
+
+
+def _classify(job_id: str, files: list[dict], analyses: dict[str, dict]) -> dict[str, ClassificationResult]:
+    """Classification of every file with items by stored name, before user corrections."""
+    started = time.perf_counter()
+    sources = _item_sources(
+        job_id, files, analyses, CLASSIFICATION_COLUMNS, "audit_job_classification_skipped"
+    )
+    classifications = classify_documents(table for _, table in sources)
+    result = {
+        entry["stored_name"]: classification
+        for (entry, _), classification in zip(sources, classifications)
+        if classification is not None
+    }
+    logger.info(
+        "audit_job_classified",
+        job_id=job_id,
+        documents=len(result),
+        seconds=time.perf_counter() - started,
+    )
+    return result
+
+
+def _corrected(
+    files: list[dict], classifications: Mapping[str, ClassificationResult], corrections: Mapping[str, Any]
+) -> dict[str, ClassificationResult]:
+    """Classifications by stored name with the user corrections (keyed by document name) applied."""
+    entries = [entry for entry in files if entry.get("stored_name") in classifications]
+    corrected = apply_corrections(
+        [_source_name(entry) for entry in entries],
+        [classifications[entry["stored_name"]] for entry in entries],
+        operation_types=corrections.get("classification"),
+        cost_centers=corrections.get("costCenter"),
+    )
+    return {entry["stored_name"]: classification for entry, classification in zip(entries, corrected)}
+
+
+def _aggregate(job_id: str, files: list[dict], analyses: dict[str, dict]) -> AggregationResult:
+    """Exact accountant totals and breakdowns over the items of the job."""
+    sources = _item_sources(job_id, files, analyses, AGGREGATION_COLUMNS, "audit_job_aggregation_skipped")
+    result = aggregate_items(
+        collect_aggregation_items((_source_name(entry), table) for entry, table in sources)
+    )
+    logger.info(
+        "audit_job_aggregated",
+        job_id=job_id,
+        items=result["items"],
+        nfes=result["nfes"],
+        seconds=result["seconds"],
+    )
+    return result
+
+
+def _statement_transactions(job_id: str, statements: list[dict]) -> pa.Table:
+    """Transactions of every bank statement, each staged once as Arrow and reused."""
+    tables: list[pa.Table] = []
+    for statement in statements:
+        absolute = settings.uploads_dir_path / Path(statement["stored_path"])
+        original_name = statement.get("original_name") or absolute.name
+        staged = staged_path_for(
+            absolute, sha256=statement.get("sha256"), uploads_root=settings.uploads_dir_path
+        )
+        try:
+            if not staged.exists():
+                stage_csv(
+                    absolute,
+                    staged,
+                    original_name=original_name,
+                    batch_rows=settings.upload_staging_batch_rows,
+                )
+            tables.append(bank_transactions(open_staged_table(staged), original_name))
+        except (StagingError, OSError) as exc:
+            logger.warning(
+                "audit_job_statement_skipped", job_id=job_id, file=original_name, error=str(exc)
+            )
+    if not tables:
+        return bank_transactions(pa.table({}), "")
+    return pa.concat_tables(tables)
+
+
+def _reconcile(job_id: str, files: list[dict], analyses: dict[str, dict], statements: list[dict]) -> dict:
+    """Match the job's NFes against its bank statements."""
+    sources = _item_sources(
+        job_id, files, analyses, RECONCILIATION_COLUMNS, "audit_job_reconciliation_skipped"
+    )
+    documents, refs = collect_documents((_source_name(entry), table) for entry, table in sources)
+    result = reconcile(documents, refs, _statement_transactions(job_id, statements))
+    logger.info(
+        "audit_job_reconciled",
+        job_id=job_id,
+        documents=len(refs),
+        transactions=result["transactions"],
+        candidates=result["candidates"],
+        matched=len(result["matchedPairs"]),
+        seconds=result["seconds"],
+    )
+    return to_jsonable(result)
+
+
+@shared_task(name="audits.reconcile")
+def reconcile_audit_job(job_id: str) -> None:
+    """Reconcile a completed audit job against the bank statements attached to it."""
+    run_async(_reconcile_audit_job(job_id))
+
+
+async def _reconcile_audit_job(job_id: str) -> None:
     try:
         job_uuid = uuid.UUID(job_id)
     except ValueError:
@@ -49,44 +580,345 @@ async def _process_audit_job(job_id: str) -> None:
             logger.warning("audit_job_not_found", job_id=job_id)
             return
 
+        result_payload = dict(job.result_payload or {})
+        request = dict(result_payload.get("reconciliation") or {})
         try:
-            job.mark_running()
-            await session.commit()
-
-            files = job.input_payload or []
-            for file_entry in files:
-                stored_path = file_entry.get("stored_path")
-                if not stored_path:
-                    continue
-                absolute = settings.uploads_dir_path / Path(stored_path)
-                logger.info(
-                    "audit_job_file_ready",
-                    job_id=job_id,
-                    file=str(absolute),
-                    sha256=file_entry.get("sha256"),
-                )
+            outcome = _reconcile(
+                job_id,
+                job.input_payload or [],
+                result_payload.get("analyses") or {},
+                request.get("statements") or [],
+            )
+            request.update(status="COMPLETED", result=outcome)
+            request.pop("error", None)
+        except Exception as exc:
+            logger.exception("audit_job_reconciliation_failed", job_id=job_id, error=str(exc))
+            request.update(status="FAILED", error=str(exc))
+        # Reassign so the JSON column is flagged dirty.
+        job.result_payload = {**result_payload, "reconciliation": request}
+        await session.commit()
 
-            # Placeholder implementation: mark ascompleted imediatamente.
-            summary = summarise_job(job)
-            report_payload = create_report_payload(job)
-            job.mark_completed({
-                "message": "Processamento backend concluído.",
-                "files": job.input_payload or [],
-                "summary": summary,
-                "report": report_payload,
-            })
-            await session.commit()
-            logger.info("audit_job_completed_placeholder", job_id=job_id)
-        except Exception as exc:  # pragma: no cover - defensive branch
-            await session.rollback()
-            job = await session.get(AuditJob, job_uuid)
-            if job is None:
-                logger.exception(
-                    "audit_job_failed_missing_after_rollback",
-                    job_id=job_id,
-                    error=str(exc),
-                )
-                return
-            job.mark_failed({"error": str(exc)})
-            await session.commit()
-            logger.exception("audit_job_failed", job_id=job_id, error=str(exc))
+
+def _checkpoints(job_id: str) -> CheckpointStore:
+    return CheckpointStore(settings.uploads_dir_path, job_id)
+
+
+def _run_stage(job_id: str, stage: str, inputs: str, compute: Callable[[], Any]) -> Any:
+    """Output of ``stage`` from its checkpoint when ``inputs`` match, else computed and saved."""
+    raise_if_cancelled(job_id)
+    checkpoints = _checkpoints(job_id)
+    result = checkpoints.load(stage, inputs)
+    if result is not None:
+        logger.info("audit_job_stage_resumed", job_id=job_id, stage=stage)
+        return result
+    started = time.perf_counter()
+    result = to_jsonable(compute())
+    checkpoints.save(stage, inputs, result)
+    logger.info("audit_job_stage_completed", job_id=job_id, stage=stage, seconds=time.perf_counter() - started)
+    return result
+
+
+def _file_inputs(file_entry: dict, known_hashes: Sequence[str]) -> str:
+    return fingerprint(_PIPELINE_VERSION, _ANALYSIS_CACHE_VERSION, file_entry, sorted(known_hashes))
+
+
+def _imported(job_id: str) -> tuple[str, dict]:
+    """Input fingerprint and output of the job's import stage."""
+    stored = _checkpoints(job_id).read(_IMPORT_STAGE)
+    if stored is None:
+        raise RuntimeError(f"Importação dos arquivos da auditoria '{job_id}' não encontrada.")
+    return stored
+
+
+def analysis_stages(job_id: str, corrections: dict) -> Signature:
+    """Classification, cross-validation and aggregation in parallel, then the report."""
+    return chord(
+        [classify_audit_job.si(job_id), cross_validate_audit_job.si(job_id), aggregate_audit_job.si(job_id)],
+        finalize_audit_job.si(job_id, corrections),
+    )
+
+
+def audit_pipeline(job_id: str, files: list[dict], corrections: dict) -> Signature:
+    """
+    The audit DAG, mirroring `runAnalysisPipeline`.
+
+    Every upload is imported (staged, parsed, analysed and validated) by its
+    own task; a chord collects them. Classification, cross-validation and
+    aggregation then run as parallel tasks, and a second chord builds the
+    report. Stages exchange data through checkpoints, not task results.
+    """
+    known_hashes = sorted(_known_hashes(files))
+    collect = collect_audit_files.si(job_id, files)
+    imports = (
+        chord([import_audit_file.si(job_id, entry, known_hashes) for entry in files], collect)
+        if files
+        else collect
+    )
+    pipeline = chain(imports, analysis_stages(job_id, corrections))
+    pipeline.link_error(fail_audit_job.s(job_id))
+    return pipeline
+
+
+def reaudit_pipeline(job_id: str, files: list[dict], corrections: dict) -> Signature:
+    """
+    The DAG of a re-audit: the import is skipped when it was checkpointed.
+
+    The analysis stages fingerprint their inputs, so each one only runs again
+    when the imported files or its references changed; corrections are
+    applied when the report is built.
+    """
+    if _checkpoints(job_id).read(_IMPORT_STAGE) is None:
+        # Jobs audited before checkpoints existed are imported again.
+        return audit_pipeline(job_id, files, corrections)
+    pipeline = chain(analysis_stages(job_id, corrections))
+    pipeline.link_error(fail_audit_job.s(job_id))
+    return pipeline
+
+
+def _dispatch(job_id: str, pipeline: Signature, queue: str) -> None:
+    """Send the DAG of a job to its queue, recording its task ids so a cancellation can revoke them."""
+    route_canvas(pipeline, queue)
+    record_tasks(job_id, assign_task_ids(pipeline))
+    pipeline.apply_async()
+
+
+def _admission_order(queue: str | None, job_id: str, fair: bool) -> Iterator[str]:
+    """
+    Jobs a ``audits.process`` message may start, in order.
+
+    First the jobs admitted by weighted round robin on the message's queue
+    (entries already started through another message are skipped by
+    `_start_audit_job`), then the job named in the message.
+    """
+    if fair and queue in AUDIT_QUEUES:
+        while (admitted := next_admitted(queue)) is not None:
+            yield admitted
+    yield job_id
+
+
+@shared_task(name="audits.process", bind=True)
+def process_audit_job(self: Any, job_id: str, fair: bool = False) -> None:
+    """Start the next fairly admitted job of the message's queue and dispatch its pipeline DAG."""
+    queue = (self.request.delivery_info or {}).get("routing_key")
+    for candidate in _admission_order(queue, job_id, fair):
+        started = run_async(_start_audit_job(candidate, queue=queue))
+        if started is not None:
+            break
+    else:
+        return
+    files, corrections = started
+    if queue not in AUDIT_QUEUES:
+        queue = queue_for_job(files)
+    _dispatch(candidate, audit_pipeline(candidate, files, corrections), queue)
+    logger.info("audit_job_pipeline_dispatched", job_id=candidate, files=len(files), queue=queue)
+
+
+@shared_task(name="audits.reaudit")
+def reaudit_job(job_id: str) -> None:
+    """Rebuild the report of an audited job with its current corrections."""
+    started = run_async(_start_audit_job(job_id))
+    if started is None:
+        return
+    files, corrections = started
+    # Without an import, a re-audit is interactive work whatever the job size.
+    _dispatch(job_id, reaudit_pipeline(job_id, files, corrections), INTERACTIVE_QUEUE)
+    logger.info("audit_job_reaudit_dispatched", job_id=job_id)
+
+
+@shared_task(name="audits.import_file", **_STAGE_OPTIONS)
+def import_audit_file(job_id: str, file_entry: dict, known_hashes: list[str]) -> None:
+    """Import one upload; its entry and analysis are checkpointed by stored name."""
+
+    def compute() -> dict:
+        cache = get_analysis_cache() if settings.analysis_cache_enabled else None
+        entry, analysis = _import_file(job_id, file_entry, set(known_hashes), cache)
+        return {"entry": entry, "analysis": analysis, "cache": cache.stats.as_dict() if cache else None}
+
+    _run_stage(job_id, f"files/{file_entry['stored_name']}", _file_inputs(file_entry, known_hashes), compute)
+
+
+@shared_task(name="audits.collect_files", **_STAGE_OPTIONS)
+def collect_audit_files(job_id: str, files: list[dict]) -> None:
+    """Merge the per-file checkpoints into the import stage of the job."""
+    known_hashes = sorted(_known_hashes(files))
+    file_inputs = [_file_inputs(entry, known_hashes) for entry in files]
+
+    def compute() -> dict:
+        checkpoints = _checkpoints(job_id)
+        entries: list[dict] = []
+        analyses: dict[str, dict] = {}
+        cache: Counter[str] = Counter()
+        for entry, inputs in zip(files, file_inputs):
+            imported = checkpoints.load(f"files/{entry['stored_name']}", inputs)
+            if imported is None:
+                raise RuntimeError(f"O arquivo '{entry.get('original_name')}' não foi importado.")
+            entries.append(imported["entry"])
+            if imported["analysis"] is not None:
+                analyses[entry["stored_name"]] = imported["analysis"]
+            cache.update(imported["cache"] or {})
+        return {
+            "files": entries,
+            "analyses": analyses,
+            "cache": dict(cache) if settings.analysis_cache_enabled else None,
+        }
+
+    _run_stage(job_id, _IMPORT_STAGE, fingerprint(*file_inputs), compute)
+
+
+@shared_task(name="audits.classify", **_STAGE_OPTIONS)
+def classify_audit_job(job_id: str) -> None:
+    imported_inputs, imported = _imported(job_id)
+    references = (settings.classification_cfop_table, settings.classification_ncm_table)
+    _run_stage(
+        job_id,
+        "classification",
+        fingerprint(_PIPELINE_VERSION, imported_inputs, references),
+        lambda: _classify(job_id, imported["files"], imported["analyses"]),
+    )
+
+
+@shared_task(name="audits.cross_validate", **_STAGE_OPTIONS)
+def cross_validate_audit_job(job_id: str) -> None:
+    imported_inputs, imported = _imported(job_id)
+    _run_stage(
+        job_id,
+        "cross_validation",
+        fingerprint(_PIPELINE_VERSION, imported_inputs),
+        lambda: _cross_validate(job_id, imported["files"], imported["analyses"]),
+    )
+
+
+@shared_task(name="audits.aggregate", **_STAGE_OPTIONS)
+def aggregate_audit_job(job_id: str) -> None:
+    imported_inputs, imported = _imported(job_id)
+    _run_stage(
+        job_id,
+        "aggregation",
+        fingerprint(_PIPELINE_VERSION, imported_inputs),
+        lambda: _aggregate(job_id, imported["files"], imported["analyses"]),
+    )
+
+
+@shared_task(name="audits.finalize", **_STAGE_OPTIONS)
+def finalize_audit_job(job_id: str, corrections: dict) -> None:
+    """Build the report from the stage checkpoints and complete the job."""
+    raise_if_cancelled(job_id)
+    run_async(_finalize_audit_job(job_id, corrections))
+
+
+@shared_task(name="audits.fail")
+def fail_audit_job(request: Any, exc: BaseException, traceback: Any, job_id: str) -> None:
+    """Error callback of the DAG: a stage failed for good (after its retries) or saw a cancellation."""
+    if isinstance(exc, AuditJobCancelled):
+        logger.info("audit_job_pipeline_stopped", job_id=job_id, task=getattr(request, "task", None))
+        return
+    logger.error("audit_job_stage_failed", job_id=job_id, task=getattr(request, "task", None), error=str(exc))
+    run_async(_fail_audit_job(job_id, str(exc)))
+
+
+async def _start_audit_job(job_id: str, *, queue: str | None = None) -> tuple[list[dict], dict] | None:
+    """
+    Mark a pending job as running; ``None`` when it cannot start.
+
+    Only ``PENDING`` jobs start, so a job reached through several admission
+    messages runs once. With ``queue``, its time-to-start is recorded.
+    """
+    try:
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        logger.error("audit_job_invalid_uuid", job_id=job_id)
+        return None
+
+    async with AsyncSessionFactory() as session:
+        job = await session.get(AuditJob, job_uuid)
+        if job is None:
+            logger.warning("audit_job_not_found", job_id=job_id)
+            return None
+        if job.status != AuditJobStatus.PENDING:
+            logger.info("audit_job_not_pending", job_id=job_id, status=job.status.value)
+            return None
+        job.mark_running()
+        await session.commit()
+        if queue is not None:
+            created_at = job.created_at if job.created_at.tzinfo else job.created_at.replace(tzinfo=timezone.utc)
+            wait = (datetime.now(timezone.utc) - created_at).total_seconds()
+            record_wait(queue, wait)
+            logger.info("audit_job_started", job_id=job_id, queue=queue, wait_seconds=wait)
+        return list(job.input_payload or []), dict((job.result_payload or {}).get("corrections") or {})
+
+
+async def _finalize_audit_job(job_id: str, corrections: dict) -> None:
+    checkpoints = _checkpoints(job_id)
+    _, imported = _imported(job_id)
+    stages = {}
+    for stage in ("classification", "cross_validation", "aggregation"):
+        stored = checkpoints.read(stage)
+        if stored is None:
+            raise RuntimeError(f"Etapa '{stage}' da auditoria '{job_id}' não encontrada.")
+        stages[stage] = stored[1]
+    files, analyses = imported["files"], imported["analyses"]
+    cross_validation = stages["cross_validation"]
+    # Serialised sketches are only merge input (kept in the cache for later hits);
+    # they would add kilobytes per column to the stored result and the API response.
+    columns = merge_analysis_sketches(analyses.values())
+    analyses = {
+        name: {key: value for key, value in analysis.items() if key != "sketches"}
+        for name, analysis in analyses.items()
+    }
+
+    async with AsyncSessionFactory() as session:
+        job = await session.get(AuditJob, uuid.UUID(job_id))
+        if job is None:
+            logger.warning("audit_job_not_found", job_id=job_id)
+            return
+        if job.status == AuditJobStatus.CANCELLED:
+            logger.info("audit_job_cancelled_before_report", job_id=job_id)
+            return
+        if settings.upload_staging_enabled:
+            # Reassign so the JSON column is flagged dirty and the artifacts are recorded.
+            job.input_payload = files
+        summary = summarise_job(job)
+        report_payload = create_report_payload(
+            job,
+            analyses,
+            cross_validation,
+            stages["aggregation"],
+            _corrected(files, stages["classification"], corrections),
+        )
+        # A re-audit keeps the reconciliation of the previous run.
+        previous = {
+            key: value for key, value in (job.result_payload or {}).items() if key == "reconciliation"
+        }
+        job.mark_completed({
+            **previous,
+            "message": "Processamento backend concluído.",
+            "files": job.input_payload or [],
+            "summary": summary,
+            "analyses": analyses,
+            "columns": columns,
+            "validation": summarise_validation(analyses.values()),
+            "cross_validation": {
+                "items": cross_validation["items"],
+                "products": cross_validation["products"],
+                "findings": len(cross_validation["findings"]),
+                "seconds": cross_validation["seconds"],
+            },
+            "aggregation": stages["aggregation"],
+            "corrections": corrections,
+            "cache": imported["cache"],
+            "report": report_payload,
+        })
+        await session.commit()
+        logger.info("audit_job_completed", job_id=job_id)
+
+
+async def _fail_audit_job(job_id: str, error: str) -> None:
+    async with AsyncSessionFactory() as session:
+        job = await session.get(AuditJob, uuid.UUID(job_id))
+        if job is None:
+            logger.warning("audit_job_not_found", job_id=job_id)
+            return
+        if job.status == AuditJobStatus.CANCELLED:
+            return
+        job.mark_failed({"error": error})
+        await session.commit()
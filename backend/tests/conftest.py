@@ -67,7 +67,7 @@ async def client() -> AsyncGenerator[AsyncClient, None]:
 def captured_tasks(monkeypatch: pytest.MonkeyPatch) -> list[dict]:
     tasks: list[dict] = []
 
-    def _fake_send(task_name: str, args=None, kwargs=None):
+    def _fake_send(task_name: str, args=None, kwargs=None, **options):
         tasks.append({"task": task_name, "args": args or [], "kwargs": kwargs or {}})
 
     monkeypatch.setattr("app.services.audit.celery_app.send_task", _fake_send)
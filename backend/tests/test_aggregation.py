@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import pyarrow as pa
+
+from app.services.aggregation import aggregate_items, collect_aggregation_items
+from app.workers.outcome import accountant_metrics
+
+
+def _items(rows: list[tuple], members: list | None = None) -> pa.Table:
+    """Rows of (nfe_id, date, NFe total, CNPJ, CFOP, NCM, product total, ICMS)."""
+    names = ("nfe_id", "data_emissao", "valor_total_nfe", "emitente_cnpj", "produto_cfop", "produto_ncm",
+             "produto_valor_total", "produto_valor_icms")
+    columns = {name: [row[index] for row in rows] for index, name in enumerate(names)}
+    columns["produto_qtd"] = [1.0] * len(rows)
+    columns["produto_valor_unit"] = columns["produto_valor_total"]
+    if members is not None:
+        columns["arquivo"] = members
+    return pa.table(columns)
+
+
+def test_money_is_summed_exactly_in_centavos() -> None:
+    rows = [("1", "2024-01-10", 1.0, "A", "5102", "96081000", 0.1, 0.01)] * 10
+
+    result = aggregate_items(collect_aggregation_items([("a.xml", _items(rows))]))
+
+    assert sum([0.1] * 10) != 1.0
+    assert (result["nfes"], result["items"]) == (1, 10)
+    assert (result["nfeCents"], result["productCents"], result["icmsCents"]) == (100, 100, 10)
+
+
+def test_breakdowns_by_emitter_cfop_ncm_and_month() -> None:
+    rows = [
+        ("1", "2024-01-10", 30.0, "A", "5102", "96081000", 10.0, 1.0),
+        ("1", "2024-01-10", 30.0, "A", "6102", "48025610", 20.0, 2.0),
+        ("2", "15/02/2024", 5.5, "B", "5102", "96081000", 5.5, 0.0),
+    ]
+
+    breakdown = aggregate_items(collect_aggregation_items([("a.xml", _items(rows))]))["breakdown"]
+
+    assert [(row["key"], row["nfes"], row["nfeCents"], row["productCents"]) for row in breakdown["emitente"]] == [
+        ("A", 1, 3000, 3000),
+        ("B", 1, 550, 550),
+    ]
+    assert [(row["key"], row["items"], row["productCents"], row["nfes"]) for row in breakdown["cfop"]] == [
+        ("6102", 1, 2000, None),
+        ("5102", 2, 1550, None),
+    ]
+    assert [row["key"] for row in breakdown["ncm"]] == ["48025610", "96081000"]
+    assert [(row["key"], row["icmsCents"]) for row in breakdown["mes"]] == [("2024-01", 300), ("2024-02", 0)]
+
+
+def test_erro_documents_are_left_out() -> None:
+    ok = ("1", "2024-01-10", 10.0, "A", "5102", "96081000", 10.0, 0.0)
+    bad = ("2", "2024-01-10", 99.0, "A", "5102", "123", 99.0, 0.0)
+
+    result = aggregate_items(
+        collect_aggregation_items(
+            [("erro.xml", _items([bad])), ("lote.zip", _items([ok, bad], ["ok.xml", "ruim.xml"]))]
+        )
+    )
+
+    assert (result["nfes"], result["items"], result["nfeCents"]) == (1, 1, 1000)
+
+
+def test_accountant_metrics_format_centavos_as_brl() -> None:
+    rows = [("1", "2024-01-10", 1234567.89, "A", "5102", "96081000", 1234567.89, 0.05)]
+
+    metrics = accountant_metrics(aggregate_items(collect_aggregation_items([("a.xml", _items(rows))])))
+
+    assert metrics["Valor Total das NFes"] == "R$\xa01.234.567,89"
+    assert metrics["Valor Total de ICMS"] == "R$\xa00,05"
+    assert metrics["Itens Processados"] == 1
+    assert accountant_metrics(aggregate_items(collect_aggregation_items([]))) == {
+        "Número de Documentos Válidos": 0,
+        "Valor Total das NFes": "R$\xa00,00",
+        "Valor Total dos Produtos": "R$\xa00,00",
+        "Valor Total de ICMS": "R$\xa00,00",
+        "Valor Total de PIS": "R$\xa00,00",
+        "Valor Total de COFINS": "R$\xa00,00",
+    }
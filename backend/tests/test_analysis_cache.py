@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import errno
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services import analysis_cache
+from app.services.analysis_cache import AnalysisCache
+
+SHA_A = "a" * 64
+SHA_B = "b" * 64
+SHA_C = "c" * 64
+
+
+def test_cache_hit_and_miss_are_counted(tmp_path: Path) -> None:
+    cache = AnalysisCache(tmp_path, max_bytes=1024 * 1024, ttl_seconds=60)
+
+    assert cache.get(SHA_A, "csv4") is None
+    cache.put(SHA_A, "csv4", {"analysis": {"row_count": 3}})
+
+    assert cache.get(SHA_A, "csv4") == {"analysis": {"row_count": 3}}
+    # A different analyzer version must not reuse the entry.
+    assert cache.get(SHA_A, "csv5") is None
+    assert cache.stats.as_dict() == {"hits": 1, "misses": 2, "stores": 1, "evictions": 0}
+
+
+def test_cache_evicts_least_recently_used_entry(tmp_path: Path) -> None:
+    payload = {"analysis": {"blob": "x" * 400}}
+    cache = AnalysisCache(tmp_path, max_bytes=1100, ttl_seconds=60)
+
+    cache.put(SHA_A, "v1", payload)
+    cache.put(SHA_B, "v1", payload)
+    old = time.time() - 30
+    for path in tmp_path.glob("*/*.json"):
+        os.utime(path, (old, old))
+    # Touch A so that B becomes the least recently used entry.
+    assert cache.get(SHA_A, "v1") is not None
+
+    cache.put(SHA_C, "v1", payload)
+
+    assert cache.get(SHA_B, "v1") is None
+    assert cache.get(SHA_A, "v1") is not None
+    assert cache.get(SHA_C, "v1") is not None
+    assert cache.stats.evictions == 1
+
+
+def test_cache_entries_expire_after_ttl(tmp_path: Path) -> None:
+    cache = AnalysisCache(tmp_path, max_bytes=1024 * 1024, ttl_seconds=0)
+    cache.put(SHA_A, "v1", {"analysis": None})
+    time.sleep(0.01)
+
+    assert cache.get(SHA_A, "v1") is None
+
+
+def test_store_failing_on_the_filesystem_is_skipped(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = AnalysisCache(tmp_path, max_bytes=1024 * 1024, ttl_seconds=60)
+
+    def disk_full(*_: object) -> None:
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(analysis_cache.os, "replace", disk_full)
+    cache.put(SHA_A, "v1", {"analysis": {"row_count": 3}})
+
+    assert cache.stats.stores == 0
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_eviction_scans_are_amortised(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(analysis_cache, "_EVICT_EVERY_STORES", 4)
+    scans = []
+    evict = AnalysisCache._evict
+    monkeypatch.setattr(AnalysisCache, "_evict", lambda self: scans.append(1) or evict(self))
+
+    for index in range(9):
+        # Every file task of a process builds its own cache.
+        cache = AnalysisCache(tmp_path, max_bytes=1024 * 1024, ttl_seconds=60)
+        cache.put(f"{index:064x}", "v1", {"analysis": None})
+    assert len(scans) == 3
+
+    # Going over the budget scans right away.
+    AnalysisCache(tmp_path, max_bytes=1024 * 1024, ttl_seconds=60).put(SHA_A, "v1", {"blob": "x" * 2 * 1024 * 1024})
+    assert len(scans) == 4
+    assert not list(tmp_path.glob("aa/*.json"))
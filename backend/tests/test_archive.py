@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import hashlib
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from app.services.archive import (
+    ARCHIVE_MEMBER_COLUMN,
+    ArchiveError,
+    ArchiveLimits,
+    parse_archive_members,
+    scan_archive,
+)
+
+LIMITS = ArchiveLimits(
+    max_members=100,
+    max_total_bytes=10 * 1024 * 1024,
+    max_member_bytes=5 * 1024 * 1024,
+    max_compression_ratio=100,
+)
+
+
+def _nfe(number: int) -> str:
+    return (
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe">'
+        f'<NFe><infNFe Id="NFe{number}">'
+        f"<det nItem=\"1\"><prod><xProd>Item {number}</xProd><CFOP>5102</CFOP>"
+        f"<vProd>{number}.00</vProd></prod></det>"
+        "</infNFe></NFe></nfeProc>"
+    )
+
+
+def _write_zip(path: Path, members: dict[str, str | bytes]) -> Path:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return path
+
+
+def test_scan_drops_duplicates_and_skips_unsupported_members(tmp_path: Path) -> None:
+    upload = _nfe(9)
+    archive = _write_zip(
+        tmp_path / "lote.zip",
+        {
+            "a/nota1.xml": _nfe(1),
+            "b/nota1-copia.xml": _nfe(1),
+            "nota2.xml": _nfe(2),
+            "avulsa.xml": upload,
+            "leiame.txt": "ignorar",
+            "__MACOSX/._nota2.xml": "lixo",
+        },
+    )
+
+    manifest = scan_archive(
+        archive, LIMITS, known_hashes={hashlib.sha256(upload.encode()).hexdigest()}
+    )
+
+    assert manifest.members == ["a/nota1.xml", "nota2.xml"]
+    assert manifest.duplicates == [
+        {"member": "b/nota1-copia.xml", "duplicate_of": "a/nota1.xml"},
+        {"member": "avulsa.xml", "duplicate_of": "(upload)"},
+    ]
+    assert manifest.skipped == ["leiame.txt", "__MACOSX/._nota2.xml"]
+    assert manifest.summary()["members"] == 2
+
+
+@pytest.mark.parametrize(
+    ("limits", "message"),
+    [
+        (ArchiveLimits(2, 10_000_000, 5_000_000, 100), "itens"),
+        (ArchiveLimits(100, 500, 5_000_000, 100), "excede o limite"),
+        (ArchiveLimits(100, 10_000_000, 100, 100), "excede o limite"),
+    ],
+)
+def test_scan_enforces_budgets(tmp_path: Path, limits: ArchiveLimits, message: str) -> None:
+    archive = _write_zip(tmp_path / "lote.zip", {f"nota{i}.xml": _nfe(i) for i in range(3)})
+
+    with pytest.raises(ArchiveError, match=message):
+        scan_archive(archive, limits)
+
+
+def test_scan_rejects_highly_compressed_members(tmp_path: Path) -> None:
+    archive = _write_zip(tmp_path / "bomba.zip", {"bomba.xml": b" " * (4 * 1024 * 1024)})
+
+    with pytest.raises(ArchiveError, match="compressão"):
+        scan_archive(archive, LIMITS)
+
+
+def test_scan_rejects_invalid_archives(tmp_path: Path) -> None:
+    path = tmp_path / "falso.zip"
+    path.write_bytes(b"isto nao e um zip")
+
+    with pytest.raises(ArchiveError):
+        scan_archive(path, LIMITS)
+
+
+def test_parse_members_tags_rows_and_isolates_bad_members(tmp_path: Path) -> None:
+    archive = _write_zip(
+        tmp_path / "lote.zip",
+        {
+            "nota1.xml": _nfe(1),
+            "quebrada.xml": "<nfeProc><NFe>",
+            "outro.xml": "<catalogo><item/></catalogo>",
+            "nota2.xml": _nfe(2),
+        },
+    )
+
+    table, errors = parse_archive_members(
+        archive, ["nota1.xml", "quebrada.xml", "outro.xml", "nota2.xml"], max_member_bytes=1024
+    )
+
+    assert table.column(ARCHIVE_MEMBER_COLUMN).to_pylist() == ["nota1.xml", "nota2.xml"]
+    assert table.column("produto_valor_total").to_pylist() == [1.0, 2.0]
+    assert [error["member"] for error in errors] == ["quebrada.xml", "outro.xml"]
+
+
+def test_parse_members_returns_empty_table_when_nothing_parses(tmp_path: Path) -> None:
+    archive = _write_zip(tmp_path / "lote.zip", {"quebrada.xml": "<x>"})
+
+    table, errors = parse_archive_members(archive, ["quebrada.xml"], max_member_bytes=1024)
+
+    assert table.num_rows == 0
+    assert ARCHIVE_MEMBER_COLUMN in table.column_names
+    assert len(errors) == 1
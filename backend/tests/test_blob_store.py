@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+from app.services.blob_store import BlobStore
+
+CONTENT = b"<nfeProc>mesmo lote</nfeProc>"
+SHA = hashlib.sha256(CONTENT).hexdigest()
+
+
+def _upload(store: BlobStore, destination: Path, content: bytes = CONTENT) -> bool:
+    source = store.temporary_path()
+    source.write_bytes(content)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    return store.link(source, hashlib.sha256(content).hexdigest(), destination)
+
+
+def test_same_content_is_stored_once_and_linked_per_job(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path)
+
+    assert _upload(store, tmp_path / "job-1" / "a.xml") is False
+    assert _upload(store, tmp_path / "job-2" / "b.xml") is True
+
+    assert store.reference_count(SHA) == 2
+    assert (tmp_path / "job-2" / "b.xml").read_bytes() == CONTENT
+    assert (tmp_path / "job-1" / "a.xml").samefile(tmp_path / "job-2" / "b.xml")
+    assert not list((store.root / "tmp").iterdir())
+
+
+def test_garbage_collection_only_removes_unreferenced_blobs(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path)
+    _upload(store, tmp_path / "job-1" / "a.xml")
+    _upload(store, tmp_path / "job-2" / "b.xml", b"outro conteudo")
+    (store.root / "tmp" / "abandonado").write_bytes(b"parcial")
+
+    (tmp_path / "job-2" / "b.xml").unlink()
+    assert store.collect_garbage(grace_seconds=3600) == 0
+
+    assert store.collect_garbage(grace_seconds=-1) == 2
+    assert store.reference_count(SHA) == 1
+    assert store.reference_count(hashlib.sha256(b"outro conteudo").hexdigest()) == 0
+    assert (tmp_path / "job-1" / "a.xml").read_bytes() == CONTENT
+
+
+def test_a_collected_blob_is_stored_again_by_the_next_upload(tmp_path: Path) -> None:
+    store = BlobStore(tmp_path)
+    _upload(store, tmp_path / "job-1" / "a.xml")
+    (tmp_path / "job-1" / "a.xml").unlink()
+    store.collect_garbage(grace_seconds=-1)
+
+    assert _upload(store, tmp_path / "job-2" / "a.xml") is False
+    assert store.reference_count(SHA) == 1
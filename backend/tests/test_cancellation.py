@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+import redis
+
+from app.workers import cancellation, tasks
+
+
+class _Redis:
+    """In-memory stand-in for the few commands the cancellation token uses."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, object] = {}
+
+    def pipeline(self) -> _Pipeline:
+        return _Pipeline(self)
+
+    def exists(self, key: str) -> int:
+        return int(key in self.values)
+
+
+class _Pipeline:
+    def __init__(self, client: _Redis) -> None:
+        self.client = client
+        self.results: list[object] = []
+
+    def set(self, key: str, value: object, ex: int) -> None:
+        self.client.values[key] = value
+        self.results.append(True)
+
+    def sadd(self, key: str, *members: str) -> None:
+        self.client.values.setdefault(key, set()).update(member.encode() for member in members)
+        self.results.append(len(members))
+
+    def smembers(self, key: str) -> None:
+        self.results.append(set(self.client.values.get(key, set())))
+
+    def expire(self, key: str, seconds: int) -> None:
+        self.results.append(True)
+
+    def execute(self) -> list[object]:
+        return self.results
+
+
+@pytest.fixture
+def fake_redis(monkeypatch: pytest.MonkeyPatch) -> _Redis:
+    client = _Redis()
+    monkeypatch.setattr(cancellation, "get_redis", lambda: client)
+    return client
+
+
+def test_every_task_of_the_pipeline_gets_a_recorded_id(fake_redis: _Redis) -> None:
+    pipeline = tasks.audit_pipeline("job", [{"stored_name": "a.xml"}, {"stored_name": "b.xml"}], {})
+
+    task_ids = cancellation.assign_task_ids(pipeline)
+    cancellation.record_tasks("job", task_ids)
+
+    # Two imports, the collect, three analysis stages and the report.
+    assert len(set(task_ids)) == 7
+    assert cancellation.assign_task_ids(pipeline) == task_ids
+    assert cancellation.request_cancellation("job") == sorted(task_ids)
+
+
+def test_stages_stop_once_the_job_is_cancelled(
+    fake_redis: _Redis, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(tasks, "settings", tasks.settings.model_copy(update={"uploads_dir": str(tmp_path)}))
+    cancellation.request_cancellation("job")
+
+    with pytest.raises(cancellation.AuditJobCancelled):
+        tasks.collect_audit_files("job", [])
+    assert not (tmp_path / "job").exists()
+
+
+def test_unreachable_redis_never_cancels(monkeypatch: pytest.MonkeyPatch) -> None:
+    class _Down:
+        def exists(self, key: str) -> int:
+            raise redis.ConnectionError("down")
+
+    monkeypatch.setattr(cancellation, "get_redis", lambda: _Down())
+
+    assert cancellation.is_cancelled("job") is False
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+from app.services import classification
+from app.services.classification import PrefixTable, apply_corrections, classify_documents
+
+
+def _items(cfops: list, ncms: list) -> pa.Table:
+    return pa.table({"produto_cfop": cfops, "produto_ncm": ncms})
+
+
+def test_longest_prefix_wins_and_short_values_do_not_match() -> None:
+    table = PrefixTable.from_mapping({"84": "Máquinas", "8471": "TI", "847130": "Notebooks"})
+
+    labels = table.lookup(pa.array(["84713012", "84715010", "84820000", "847", "8", "", "22030000"]))
+
+    assert [table.labels[i] if i >= 0 else None for i in labels] == [
+        "Notebooks", "TI", "Máquinas", "Máquinas", None, None, None,
+    ]
+
+
+def test_cfop_operations_follow_the_frontend_if_chain() -> None:
+    cfops = ["1102", "1202", "1403", "1351", "1552", "5102", "5202", "5933", "5552", "7101", "3102"]
+
+    results = classify_documents([_items([cfop], ["84713012"]) for cfop in cfops])
+
+    assert [result["operationType"] for result in results] == [
+        "Compra", "Devolução", "Compra", "Serviço", "Transferência",
+        "Venda", "Devolução", "Serviço", "Transferência", "Outros", "Outros",
+    ]
+
+
+def test_documents_get_majority_operation_sector_and_confidence() -> None:
+    venda = _items(["5102", "5102", "1202", None], ["84713012", "22030000", "22021000", "1"])
+    ties = _items(["5102", "1102"], ["22030000", "84820000"])
+    no_cfop = _items([None, ""], ["84713012", "84713012"])
+
+    first, second, third = classify_documents([venda, ties, no_cfop])
+
+    assert first == {
+        "operationType": "Venda",
+        "businessSector": "Bebidas",
+        "confidence": 2 / 3,
+        "costCenter": "Não Alocado",
+    }
+    # Ties keep the later entry, like the frontend's reduce.
+    assert (second["operationType"], second["businessSector"]) == ("Venda", "Máquinas e Equipamentos")
+    assert third is None
+
+
+def test_corrections_overlay_by_document_name() -> None:
+    base = classify_documents([_items(["5102"], ["84713012"])] * 3)
+
+    corrected = apply_corrections(
+        ["a.xml", "b.xml", "c.xml"],
+        base,
+        operation_types={"a.xml": "Compra"},
+        cost_centers={"b.xml": "Filial SP", "a.xml": "Matriz"},
+    )
+
+    assert corrected[0] == {**base[0], "operationType": "Compra", "confidence": 1.0, "costCenter": "Matriz"}
+    assert corrected[1] == {**base[1], "costCenter": "Filial SP"}
+    assert corrected[2] == base[2]
+    assert apply_corrections(["x.xml"], [None], operation_types={"x.xml": "Compra"}) == [None]
+
+
+def test_reference_files_extend_the_built_in_tables(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "ncm.csv").write_text("prefixo,setor\n847130,Notebooks\n2203,Cervejas\n", encoding="utf-8")
+    (tmp_path / "cfop.csv").write_text("7101,venda\n", encoding="utf-8")
+    settings = classification.get_settings().model_copy(
+        update={"classification_ncm_table": str(tmp_path / "ncm.csv"), "classification_cfop_table": str(tmp_path / "cfop.csv")}
+    )
+    monkeypatch.setattr(classification, "get_settings", lambda: settings)
+    classification.get_reference_tables.cache_clear()
+    try:
+        results = classify_documents([_items(["7101"], ["84713012"]), _items(["5102"], ["22030000"])])
+    finally:
+        classification.get_reference_tables.cache_clear()
+
+    assert [(result["operationType"], result["businessSector"]) for result in results] == [
+        ("Venda", "Notebooks"),
+        ("Venda", "Cervejas"),
+    ]
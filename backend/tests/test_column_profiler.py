@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import io
+
+import pandas as pd
+import pytest
+
+from app.services.column_profiler import profile_columns
+from app.services.csv_analyzer import analyse_csv_stream
+
+CSV_NFE_ITEMS = """nNF;CNPJ_emit;dhEmi;vProd;CFOP;xProd
+1001;11.222.333/0001-81;2024-01-05;R$ 1.234,56;5102;Parafuso
+1002;11.222.333/0001-81;2024-01-06;R$ 10,00;5102;Porca
+1003;45.997.418/0001-53;05/01/2024;R$ 2,50;6102;Arruela
+1004;45.997.418/0001-53;2024-01-08;;5102;
+"""
+
+
+def _by_name(profiles):
+    return {profile["name"]: profile for profile in profiles}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_analysis_profiles_semantic_types(streaming):
+    """
+    Profiles carry the frontend's ColumnSemanticProfile fields for each column.
+    """
+    analysis = analyse_csv_stream(
+        io.BytesIO(CSV_NFE_ITEMS.encode("utf-8")),
+        filename="itens.csv",
+        streaming=streaming,
+        profile=True,
+    )
+    profiles = _by_name(analysis["profiles"])
+
+    assert list(profiles) == analysis["columns"]
+
+    cnpj = profiles["CNPJ_emit"]
+    assert cnpj["semanticType"] == "identifier"
+    assert cnpj["identifierKind"] == "cnpj"
+    assert cnpj["confidence"] == 1.0
+    assert cnpj["duplicatesDetected"] is True
+
+    assert profiles["dhEmi"]["semanticType"] == "date"
+
+    vprod = profiles["vProd"]
+    assert vprod["semanticType"] == "currency"
+    assert vprod["nullPercentage"] == pytest.approx(0.25)
+    assert vprod["uniqueValues"] == 3
+    assert vprod["stats"]["min"] == pytest.approx(2.5)
+    assert vprod["stats"]["max"] == pytest.approx(1234.56)
+    assert vprod["stats"]["median"] == pytest.approx(10.0)
+
+    assert profiles["xProd"]["semanticType"] == "text"
+
+
+def test_invalid_cnpj_check_digits_lower_confidence():
+    """
+    Document identifiers are validated by check digit, not only by shape.
+    """
+    raw = pd.DataFrame(
+        {
+            "documento": [
+                "11.222.333/0001-81",
+                "11.222.333/0001-82",
+                "00.000.000/0000-00",
+                "45.997.418/0001-53",
+                "11222333000181",
+                "45997418000153",
+            ]
+        },
+        dtype="string[pyarrow]",
+    )
+    profile = profile_columns(raw)[0]
+
+    assert profile["semanticType"] == "identifier"
+    assert profile["identifierKind"] == "cnpj"
+    assert profile["confidence"] == pytest.approx(4 / 6, abs=1e-4)
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import pyarrow as pa
+
+from app.services.cross_validation import (
+    collect_item_sources,
+    cross_validate_items,
+    normalise_product_keys,
+)
+
+
+def _items(names: list, ncms: list, prices: list, members: list | None = None) -> pa.Table:
+    columns = {"produto_nome": names, "produto_ncm": ncms, "produto_valor_unit": prices}
+    if members is not None:
+        columns["arquivo"] = members
+    return pa.table(columns)
+
+
+def test_product_keys_ignore_case_accents_spacing_and_unit_words() -> None:
+    keys = normalise_product_keys(
+        pa.array(["  Caneta  Azul UN", "CANETA azul - cx", "Água Mineral 500ML", "UN", "Peça PC."])
+    )
+
+    assert keys.to_pylist() == ["caneta azul", "caneta azul", "agua mineral 500ml", "un", "peca"]
+
+
+def test_sources_become_documents_and_archive_members_are_split() -> None:
+    table, documents = collect_item_sources(
+        [
+            ("avulsa.xml", _items(["Caneta"], ["96081000"], [1.0])),
+            ("lote.zip", _items(["Papel", "Papel"], ["48025610", "48025610"], ["20", "21"], ["b/n2.xml", "a/n1.xml"])),
+        ]
+    )
+
+    assert documents == [
+        {"name": "avulsa.xml"},
+        {"name": "n2.xml", "internal_path": "b/n2.xml"},
+        {"name": "n1.xml", "internal_path": "a/n1.xml"},
+    ]
+    assert table.column("documento").to_pylist() == [0, 1, 2]
+    assert table.column("produto_valor_unit").to_pylist() == [1.0, 20.0, 21.0]
+
+
+def test_ncm_and_price_discrepancies_reference_documents_by_index() -> None:
+    table, documents = collect_item_sources(
+        [
+            ("a.xml", _items(["Caneta Azul", "Papel"], ["96081000", "48025610"], [1.0, 20.0])),
+            ("b.xml", _items(["caneta azul un", "Papel", "Grampo"], ["96082000", None, "83051000"], ["1,50", "0", "3"])),
+        ]
+    )
+
+    result = cross_validate_items(table, documents)
+
+    assert [(f["comparisonKey"], f["attribute"]) for f in result["findings"]] == [
+        ("Caneta Azul", "NCM"),
+        ("Caneta Azul", "Preço Unitário"),
+        ("Papel", "NCM"),
+    ]
+    ncm, price, paper = result["findings"]
+    assert ncm["discrepancies"] == [{"valueA": "96081000", "docA": 0, "valueB": "96082000", "docB": 1}]
+    assert "(96081000, 96082000)" in ncm["description"]
+    assert price["discrepancies"] == [
+        {"valueA": "R$\xa01,00", "docA": 0, "valueB": "R$\xa01,50", "docB": 1}
+    ]
+    assert price["description"].startswith("Variação de preço de 50%")
+    assert paper["discrepancies"][0]["valueB"] == "N/A"
+    assert result["items"] == 5
+    assert result["products"] == 3
+
+
+def test_small_variations_and_single_items_are_not_reported() -> None:
+    table, documents = collect_item_sources(
+        [("a.xml", _items(["Caneta", "Caneta", "Lápis", "", None], ["11111111", "11111111", "22222222", "33333333", "44444444"], [10, 11, 1, 1, 1]))]
+    )
+
+    result = cross_validate_items(table, documents)
+
+    assert result["findings"] == []
+    assert result["items"] == 3
+
+
+def test_documents_audited_as_erro_are_left_out() -> None:
+    # NCM "123" is NCM_INVALIDO (ERRO); a zero-value item is only an ALERTA.
+    table, documents = collect_item_sources(
+        [
+            ("erro.xml", _items(["Caneta"], ["123"], [9.0])),
+            ("alerta.xml", _items(["Caneta"], ["96081000"], [1.0])),
+            (
+                "lote.zip",
+                _items(
+                    ["Caneta", "Caneta", "Caneta"],
+                    ["96081000", "12", "96081000"],
+                    [1.1, 5.0, 5.0],
+                    ["ok.xml", "ruim.xml", "ruim.xml"],
+                ),
+            ),
+        ]
+    )
+
+    assert documents == [{"name": "alerta.xml"}, {"name": "ok.xml", "internal_path": "ok.xml"}]
+    assert table.column("produto_valor_unit").to_pylist() == [1.0, 1.1]
+    assert cross_validate_items(table, documents)["findings"] == []
+
+
+def test_no_sources() -> None:
+    result = cross_validate_items(*collect_item_sources([]))
+
+    assert result["findings"] == []
+    assert result["documents"] == []
@@ -4,7 +4,7 @@ import io
 
 import pytest
 
-from app.services.csv_analyzer import analyse_csv_stream
+from app.services.csv_analyzer import analyse_csv_stream, detect_csv_format
 
 # Test data with different delimiters and formats
 CSV_COMMA_SEPARATED = """id,product,price,quantity,active
@@ -101,3 +101,185 @@ def test_analyse_csv_with_tab_delimiter():
     assert cost_stats["mean"] == pytest.approx(18.46, abs=1e-2)
     assert cost_stats["median"] == pytest.approx(19.99, abs=1e-2)
     assert cost_stats["non_nulls"] == 3
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    ("payload", "encoding"),
+    [
+        (CSV_COMMA_SEPARATED, "utf-8"),
+        (CSV_SEMICOLON_CURRENCY, "latin-1"),
+        (CSV_TAB_SEPARATED, "utf-8"),
+    ],
+)
+def test_streaming_mode_matches_eager_analysis(payload, encoding):
+    """
+    Streaming mode must return the same statistics as the eager loader.
+    """
+    eager = analyse_csv_stream(io.BytesIO(payload.encode(encoding)), filename="eager.csv")
+    streamed = analyse_csv_stream(
+        io.BytesIO(payload.encode(encoding)), filename="streamed.csv", streaming=True
+    )
+
+    assert streamed["row_count"] == eager["row_count"]
+    assert streamed["columns"] == eager["columns"]
+    assert streamed["diagnostics"]["mode"] == "streaming"
+    for column, expected in eager["stats"].items():
+        actual = streamed["stats"][column]
+        assert actual["non_nulls"] == expected["non_nulls"]
+        assert actual["nulls_pct"] == pytest.approx(expected["nulls_pct"])
+        assert actual["median_approximate"] is False
+        for key in ("mean", "median", "std"):
+            if expected[key] is None:
+                assert actual[key] is None
+            else:
+                assert actual[key] == pytest.approx(expected[key], nan_ok=True)
+
+@pytest.mark.anyio
+def test_streaming_mode_bounds_memory_and_flags_approximate_median():
+    """
+    A small memory ceiling forces several chunks and a compacted median sketch.
+    """
+    rows = "\n".join(f"{i},{i % 7}" for i in range(1, 20001))
+    stream = io.BytesIO(f"amount,bucket\n{rows}\n".encode("utf-8"))
+    analysis = analyse_csv_stream(
+        stream, filename="large.csv", streaming=True, memory_limit_bytes=64 * 1024
+    )
+
+    assert analysis["row_count"] == 20000
+    assert analysis["diagnostics"]["chunks"] > 1
+    amount_stats = analysis["stats"]["amount"]
+    assert amount_stats["mean"] == pytest.approx(10000.5)
+    assert amount_stats["std"] == pytest.approx(5773.647, rel=1e-4)
+    assert amount_stats["median_approximate"] is True
+    assert amount_stats["median"] == pytest.approx(10000.5, rel=0.05)
+
+@pytest.mark.anyio
+def test_fast_engine_is_used_and_reported():
+    """
+    Well-formed files go through a fast parser with the scored delimiter and quote character.
+    """
+    payload = "id;descricao;valor\n" + "".join(
+        f"{i};'Item {i}; lote';R$ {i},00\n" for i in range(1, 2001)
+    )
+    analysis = analyse_csv_stream(io.BytesIO(payload.encode("utf-8")), filename="quoted.csv")
+
+    diagnostics = analysis["diagnostics"]
+    assert diagnostics["delimiter"] == ";"
+    assert diagnostics["quotechar"] == "'"
+    assert diagnostics["engine"] in {"pyarrow", "c"}
+    assert diagnostics["parse_seconds"] >= 0
+    assert analysis["row_count"] == 2000
+    assert analysis["columns"] == ["id", "descricao", "valor"]
+
+CSV_FISCAL_EXPORT = """nItem;xProd;vProd;vICMS;vFrete;cProd
+1;Parafuso;1.234,56;(12,00);1,250.00;A-10
+2;Porca;R$ 2.000,00;18,50;300.25;A-11
+3;Arruela;10,00;;1,000.00;A-12
+4;Chave;n/d;0,90;2.50;A-13
+"""
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("streaming", [False, True])
+def test_locale_aware_numeric_conversion_for_every_column(streaming):
+    """
+    pt-BR and en-US numbers are detected per column and coerced without relying on column names.
+    """
+    stream = io.BytesIO(CSV_FISCAL_EXPORT.encode("utf-8"))
+    analysis = analyse_csv_stream(stream, filename="nfe_itens.csv", streaming=streaming)
+
+    conversions = analysis["diagnostics"]["numeric_conversion"]
+    assert conversions["vProd"] == {"locale": "pt-BR", "converted": 3, "coerced": 3, "failed": 1}
+    assert conversions["vICMS"]["locale"] == "pt-BR"
+    assert conversions["vFrete"] == {"locale": "en-US", "converted": 4, "coerced": 2, "failed": 0}
+    assert "xProd" not in conversions
+    assert "cProd" not in conversions
+
+    stats = analysis["stats"]
+    assert stats["vProd"]["mean"] == pytest.approx((1234.56 + 2000.0 + 10.0) / 3)
+    assert stats["vProd"]["non_nulls"] == 3
+    assert stats["vICMS"]["mean"] == pytest.approx((-12.0 + 18.5 + 0.9) / 3)
+    assert stats["vFrete"]["median"] == pytest.approx((1000.0 + 300.25) / 2)
+    assert stats["xProd"]["mean"] is None
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("streaming", [False, True])
+def test_sketches_report_distinct_counts_and_top_values(streaming):
+    """
+    Optional sketches add approximate cardinality and heavy hitters per column.
+    """
+    cfops = ["5102"] * 600 + ["6102"] * 300 + ["5405"] * 100
+    rows = "\n".join(f"{i};{cfop}" for i, cfop in enumerate(cfops))
+    stream = io.BytesIO(f"nItem;CFOP\n{rows}\n".encode("utf-8"))
+    analysis = analyse_csv_stream(
+        stream,
+        filename="itens.csv",
+        streaming=streaming,
+        memory_limit_bytes=256 * 1024,
+        sketches=True,
+    )
+
+    cfop_stats = analysis["stats"]["CFOP"]
+    assert cfop_stats["distinct_approx"] == 3
+    assert cfop_stats["top_values"][:2] == [
+        {"value": "5102", "count": 600},
+        {"value": "6102", "count": 300},
+    ]
+    assert analysis["stats"]["nItem"]["distinct_approx"] == pytest.approx(1000, rel=0.05)
+    assert set(analysis["sketches"]) == {"nItem", "CFOP"}
+
+
+@pytest.mark.anyio
+def test_streaming_profiles_count_duplicates_after_the_first_chunk():
+    """
+    Distinct counts and duplicate flags of streamed profiles cover the whole file.
+    """
+    ids = list(range(1, 2001)) + list(range(1, 2001))
+    rows = "\n".join(f"{i},Produto {i % 50}" for i in ids)
+    stream = io.BytesIO(f"id_item,descricao\n{rows}\n".encode("utf-8"))
+    analysis = analyse_csv_stream(
+        stream,
+        filename="itens.csv",
+        streaming=True,
+        memory_limit_bytes=64 * 1024,
+        profile=True,
+    )
+
+    assert analysis["diagnostics"]["chunks"] > 2
+    profiles = {profile["name"]: profile for profile in analysis["profiles"]}
+    first_chunk = profiles["id_item"]["sampledRows"]
+    assert first_chunk < 2000
+    assert profiles["id_item"]["uniqueValues"] == pytest.approx(2000, rel=0.05)
+    assert profiles["id_item"]["duplicatesDetected"] is True
+    assert any("duplicados" in note for note in profiles["id_item"]["notes"])
+    assert profiles["descricao"]["uniqueValues"] == 50
+    assert profiles["descricao"]["duplicatesDetected"] is False
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("streaming", [False, True])
+def test_product_column_is_never_converted_to_numbers(streaming):
+    """
+    The ``product`` column is left as parsed, like the original analyzer.
+    """
+    stream = io.BytesIO(b"product;price\n1.234,5;10,5\n2.345,0;20,0\n")
+    analysis = analyse_csv_stream(stream, filename="produtos.csv", streaming=streaming)
+
+    assert analysis["stats"]["product"]["mean"] is None
+    assert analysis["stats"]["price"]["mean"] == pytest.approx(15.25)
+    assert "product" not in analysis["diagnostics"]["numeric_conversion"]
+    assert analysis["diagnostics"]["preview"][0]["product"] == "1.234,5"
+
+
+def test_dialect_detection_scores_the_whole_sample():
+    """
+    Rows past the first screenful still count when scoring delimiters.
+    """
+    head = "\n".join("Caneta, azul;10" for _ in range(30))
+    tail = "\n".join("Lapis;5" for _ in range(30))
+    stream = io.BytesIO(f"descricao, cor;valor\n{head}\n{tail}\n".encode("utf-8"))
+
+    fmt = detect_csv_format(stream, filename="itens.csv")
+
+    assert fmt.delimiter == ";"
+    assert stream.tell() == 0
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import pyarrow as pa
+import pytest
+
+from app.services.fiscal_rules import INCONSISTENCIES, RULES, validate_items
+
+VALID_ITEM = {
+    "produto_cfop": "5102",
+    "produto_ncm": "84713012",
+    "produto_nome": "Notebook",
+    "produto_qtd": 2.0,
+    "produto_valor_unit": 10.0,
+    "produto_valor_total": 20.0,
+    "produto_cst_icms": "00",
+    "produto_cst_pis": "01",
+    "produto_cst_cofins": "01",
+    "produto_base_calculo_icms": 20.0,
+    "produto_aliquota_icms": 18.0,
+    "produto_valor_icms": 3.6,
+    "emitente_uf": "SP",
+    "destinatario_uf": "SP",
+    "destinatario_nome": "Cliente Ltda",
+}
+
+
+def _table(*items: dict) -> pa.Table:
+    rows = [{**VALID_ITEM, **item} for item in items]
+    return pa.Table.from_pylist(rows)
+
+
+def _codes(*items: dict) -> list[str]:
+    return validate_items(_table(*items)).codes()
+
+
+def test_valid_item_has_no_findings() -> None:
+    assert _codes({}) == []
+
+
+@pytest.mark.parametrize(
+    ("item", "rule"),
+    [
+        ({"destinatario_nome": "QUANTUM INNOVATIONS S.A."}, "CFOP_SAIDA_EM_COMPRA"),
+        ({"produto_ncm": "00000000"}, "NCM_SERVICO_PARA_PRODUTO"),
+        ({"produto_ncm": "8471"}, "NCM_INVALIDO"),
+        ({"produto_valor_total": 25.0, "produto_base_calculo_icms": 0.0}, "VALOR_CALCULO_DIVERGENTE"),
+        ({"produto_valor_total": 0.0}, "VALOR_PROD_ZERO"),
+        ({"produto_cfop": "6102"}, "CFOP_INTERESTADUAL_UF_INCOMPATIVEL"),
+        ({"destinatario_uf": "RJ"}, "CFOP_ESTADUAL_UF_INCOMPATIVEL"),
+        ({"produto_cfop": "1202", "produto_cst_icms": "60"}, "PIS_COFINS_CST_INVALIDO_PARA_DEVOLUCAO"),
+        ({"produto_cfop": "1202", "produto_cst_pis": "98", "produto_cst_cofins": "98"}, "ICMS_CST_INVALIDO_PARA_CFOP"),
+        ({"produto_valor_icms": 3.7}, "ICMS_CALCULO_DIVERGENTE"),
+    ],
+)
+def test_each_rule_matches_the_frontend(item: dict, rule: str) -> None:
+    assert _codes(item) == [INCONSISTENCIES[rule]["code"]]
+
+
+def test_edge_cases_follow_the_frontend_semantics() -> None:
+    codes = _codes(
+        # Services may use NCM 00000000.
+        {"produto_ncm": "00000000", "produto_nome": "Serviço de manutenção"},
+        # 0.1% of 20.00 is below one cent, so a 0.005 gap is tolerated.
+        {"produto_valor_total": 20.005},
+        # UFs are compared trimmed and case-insensitively; blanks skip the check.
+        {"destinatario_uf": " sp "},
+        {"produto_cfop": "6102", "destinatario_uf": None},
+    )
+
+    assert codes == []
+
+
+def test_findings_are_ordered_by_row_then_rule() -> None:
+    findings = validate_items(
+        _table(
+            {},
+            {"produto_ncm": "123", "destinatario_uf": "RJ"},
+            {"produto_valor_total": 0.0},
+        )
+    )
+
+    assert findings.rows.tolist() == [1, 1, 2]
+    assert [RULES[rule] for rule in findings.rules.tolist()] == [
+        "NCM_INVALIDO",
+        "CFOP_ESTADUAL_UF_INCOMPATIVEL",
+        "VALOR_PROD_ZERO",
+    ]
+    assert findings.items == 3
+    table = findings.to_table()
+    assert table.column("code").to_pylist() == ["NCM-INV-02", "CFOP-GEO-02", "VAL-WARN-01"]
+
+
+def test_string_columns_are_parsed_like_parse_safe_float() -> None:
+    table = pa.table(
+        {
+            "produto_cfop": ["5102", "5102", "5102"],
+            "produto_qtd": ["1", "2", "abc"],
+            "produto_valor_unit": ["1.234,56", "R$ 10,00", "5"],
+            "produto_valor_total": ["1234.56", "25,00", None],
+        }
+    )
+
+    findings = validate_items(table)
+
+    # Row 1: 2 x 10,00 != 25,00. Row 2: unparsable quantity counts as 0, so no VALOR_PROD_ZERO.
+    assert findings.rows.tolist() == [1]
+    assert findings.codes() == ["VAL-ERR-01"]
+
+
+def test_summary_counts_and_samples_rows() -> None:
+    findings = validate_items(_table(*({"produto_ncm": "1"} for _ in range(5)), {}))
+
+    summary = findings.summary(sample_rows=2)
+
+    assert summary["items"] == 6
+    assert summary["findings"] == 5
+    assert summary["rules"] == {
+        "NCM_INVALIDO": {"code": "NCM-INV-02", "severity": "ERRO", "count": 5, "rows": [0, 1]}
+    }
+    assert [item["code"] for item in findings.inconsistencies()] == ["NCM-INV-02"]
+
+
+def test_empty_and_partial_tables() -> None:
+    assert len(validate_items(pa.table({"produto_ncm": pa.array([], type=pa.string())}))) == 0
+    assert validate_items(pa.table({"produto_ncm": ["12", "12345678"]})).rows.tolist() == [0]
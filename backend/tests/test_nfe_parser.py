@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import io
+import json
+import re
+from pathlib import Path
+
+import pytest
+
+from app.services.nfe_parser import (
+    NFE_ITEM_SCHEMA,
+    NO_ITEMS_LABEL,
+    NFeParseError,
+    analyse_nfe_file,
+    parse_nfe_stream,
+)
+from app.workers.outcome import to_jsonable
+
+NFE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">
+  <NFe>
+    <infNFe Id="NFe35240112345678000195550010000001231000001234" versao="4.00">
+      <ide><dhEmi>2024-01-15T10:00:00-03:00</dhEmi></ide>
+      <emit>
+        <CNPJ>12345678000195</CNPJ><xNome>Empresa Emitente LTDA</xNome>
+        <enderEmit><xLgr>Rua A</xLgr><UF>SP</UF></enderEmit>
+      </emit>
+      <dest>
+        <CNPJ>98765432000110</CNPJ><xNome>Cliente Destino SA</xNome>
+        <enderDest><UF>RJ</UF></enderDest>
+      </dest>
+      <det nItem="1">
+        <prod>
+          <xProd>Parafuso</xProd><NCM>73181500</NCM><CFOP>6102</CFOP><uCom>UN</uCom>
+          <qCom>10.0000</qCom><vUnCom>2.50</vUnCom><vProd>25.00</vProd>
+        </prod>
+        <imposto>
+          <ICMS><ICMS00><CST>00</CST><vBC>25.00</vBC><pICMS>12.00</pICMS><vICMS>3.00</vICMS></ICMS00></ICMS>
+          <IPI><IPITrib><CST>50</CST><vBC>99.00</vBC></IPITrib></IPI>
+          <PIS><PISAliq><CST>01</CST><vBC>25.00</vBC><vPIS>0.41</vPIS></PISAliq></PIS>
+          <COFINS><COFINSAliq><CST>01</CST><vBC>25.00</vBC><vCOFINS>1.90</vCOFINS></COFINSAliq></COFINS>
+        </imposto>
+      </det>
+      <det nItem="2">
+        <prod><xProd>Porca</xProd><NCM>73181600</NCM><CFOP>6102</CFOP><qCom>4</qCom><vUnCom>1.00</vUnCom><vProd>4.00</vProd></prod>
+        <imposto><ICMS><ICMSSN102><CSOSN>102</CSOSN></ICMSSN102></ICMS></imposto>
+      </det>
+      <total><ICMSTot><vBC>25.00</vBC><vNF>29.00</vNF></ICMSTot></total>
+      <transp><transporta><xNome>Transportadora</xNome><UF>MG</UF></transporta></transp>
+    </infNFe>
+  </NFe>
+</nfeProc>
+"""
+
+
+def _parse(xml: str):
+    return parse_nfe_stream(io.BytesIO(xml.encode("utf-8")), filename="nota.xml")
+
+
+def test_items_carry_header_taxes_and_bases() -> None:
+    result = _parse(NFE_XML)
+
+    assert result.is_nfe
+    assert result.documents == 1
+    assert result.table.schema == NFE_ITEM_SCHEMA
+    first, second = result.table.to_pylist()
+    assert first["nfe_id"] == "NFe35240112345678000195550010000001231000001234"
+    assert first["valor_total_nfe"] == 29.0
+    assert (first["emitente_uf"], first["destinatario_uf"]) == ("SP", "RJ")
+    assert first["destinatario_nome"] == "Cliente Destino SA"
+    assert first["produto_cst_icms"] == "00"
+    assert first["produto_base_calculo_icms"] == 25.0
+    assert first["produto_aliquota_icms"] == 12.0
+    # IPI has its own CST/vBC that must not leak into the ICMS/PIS columns.
+    assert first["produto_cst_pis"] == "01"
+    assert first["produto_base_calculo_pis"] == 25.0
+    assert first["produto_valor_cofins"] == 1.9
+    assert second["item_numero"] == 2
+    assert second["produto_cst_icms"] == "102"
+    assert second["produto_valor_icms"] is None
+    assert second["emitente_cnpj"] == "12345678000195"
+
+
+def test_batches_and_documents_without_items() -> None:
+    without_items = (
+        '<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe Id="NFe2">'
+        "<emit><xNome>Outra</xNome></emit><total><ICMSTot><vNF>0.00</vNF></ICMSTot></total>"
+        "</infNFe></NFe>"
+    )
+    body = NFE_XML.split("<nfeProc", 1)[1].split(">", 1)[1].rsplit("</nfeProc>", 1)[0]
+    batch = f"<enviNFe>{body}{without_items}</enviNFe>"
+
+    result = _parse(batch)
+
+    assert result.documents == 2
+    rows = result.table.to_pylist()
+    assert len(rows) == 3
+    assert rows[2]["produto_nome"] == NO_ITEMS_LABEL
+    assert rows[2]["nfe_id"] == "NFe2"
+    assert rows[2]["emitente_nome"] == "Outra"
+
+
+def test_non_nfe_and_malformed_xml() -> None:
+    assert not _parse("<catalogo><item>1</item></catalogo>").is_nfe
+
+    with pytest.raises(NFeParseError):
+        _parse("<nfeProc><NFe><infNFe>")
+
+
+def test_item_table_feeds_the_tabular_analysis(tmp_path: Path) -> None:
+    path = tmp_path / "nota.xml"
+    path.write_text(NFE_XML, encoding="utf-8")
+
+    analysis = analyse_nfe_file(path, profile=True)
+
+    assert analysis["row_count"] == 2
+    assert analysis["stats"]["produto_valor_total"]["mean"] == pytest.approx(14.5)
+    assert analysis["diagnostics"]["documents"] == 1
+
+
+def test_single_item_analysis_is_json_serialisable(tmp_path: Path) -> None:
+    path = tmp_path / "nota.xml"
+    path.write_text(re.sub(r'<det nItem="2">.*?</det>', "", NFE_XML, flags=re.S), encoding="utf-8")
+
+    analysis = to_jsonable(analyse_nfe_file(path, profile=True))
+
+    json.dumps(analysis, allow_nan=False)
+    assert analysis["stats"]["produto_valor_total"]["std"] is None
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from app.workers.parallel import run_in_process_pool
+
+
+def _square_or_fail(value: int) -> int:
+    if value == 2:
+        raise ValueError("arquivo inválido")
+    if value == 3:
+        time.sleep(30)
+    # Later items finish first so ordering cannot come from completion order.
+    time.sleep(0.05 * (5 - value))
+    return value * value
+
+
+def _worker_pid(_: int) -> int:
+    return os.getpid()
+
+
+def _worker_parent(_: int) -> int:
+    return os.getppid()
+
+
+def test_outcomes_keep_input_order_and_isolate_failures() -> None:
+    outcomes = run_in_process_pool(_square_or_fail, [0, 1, 2, 3, 4], processes=3, timeout_seconds=1)
+
+    assert [outcome.index for outcome in outcomes] == [0, 1, 2, 3, 4]
+    assert [outcome.value for outcome in outcomes] == [0, 1, None, None, 16]
+    assert outcomes[2].error == "arquivo inválido"
+    assert not outcomes[2].timed_out
+    assert outcomes[3].timed_out
+    assert outcomes[3].error
+    assert outcomes[4].ok
+
+
+def test_work_runs_outside_the_calling_process() -> None:
+    outcomes = run_in_process_pool(_worker_pid, [0, 1], processes=2)
+
+    assert all(outcome.value != os.getpid() for outcome in outcomes)
+
+
+def test_zero_processes_runs_inline() -> None:
+    outcomes = run_in_process_pool(_square_or_fail, [1, 2], processes=0)
+
+    assert outcomes[0].value == 1
+    assert outcomes[1].error == "arquivo inválido"
+    assert run_in_process_pool(_square_or_fail, [], processes=2) == []
+
+
+def test_workers_are_not_forked_from_a_threaded_caller() -> None:
+    # Like a prefork child running the loop thread of its runtime.
+    stop = threading.Event()
+    loop_thread = threading.Thread(target=stop.wait, daemon=True)
+    loop_thread.start()
+    try:
+        outcomes = run_in_process_pool(_worker_parent, [0, 1], processes=2)
+    finally:
+        stop.set()
+
+    assert all(outcome.ok and outcome.value != os.getpid() for outcome in outcomes)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import pyarrow as pa
+
+from app.services.reconciliation import bank_transactions, collect_documents, reconcile
+
+
+def _notes(ids: list, dates: list, totals: list, members: list | None = None) -> pa.Table:
+    columns = {
+        "nfe_id": ids,
+        "data_emissao": dates,
+        "valor_total_nfe": totals,
+        "produto_ncm": ["96081000"] * len(ids),
+        "cfop": ["5102"] * len(ids),
+        "produto_qtd": [1.0] * len(ids),
+        "produto_valor_unit": [1.0] * len(ids),
+        "produto_valor_total": [1.0] * len(ids),
+    }
+    if members is not None:
+        columns["arquivo"] = members
+    return pa.table(columns)
+
+
+def _statement(rows: list[tuple[str, str]], name: str = "extrato.csv") -> pa.Table:
+    return bank_transactions(
+        pa.table({"Data": [date for date, _ in rows], "Valor": [amount for _, amount in rows]}), name
+    )
+
+
+def test_conflicts_are_resolved_by_total_cost_not_first_fit() -> None:
+    documents, refs = collect_documents(
+        [
+            (
+                "notas.xml",
+                _notes(["A", "B", "C"], ["2024-01-10T10:00:00-03:00", "2024-01-12", "2024-01-15"], [100.0, 100.0, 50.0]),
+            )
+        ]
+    )
+    # First fit would give A the payment of the 12th, two days away, instead of its own.
+    transactions = _statement(
+        [("12/01/2024", "100,00"), ("10/01/2024", "100,00"), ("15/01/2024", "-50,01"), ("01/06/2024", "100")]
+    )
+
+    result = reconcile(documents, refs, transactions)
+
+    matched = {pair["document"]: pair["transaction"]["id"] for pair in result["matchedPairs"]}
+    assert matched == {0: "extrato.csv-1", 1: "extrato.csv-0", 2: "extrato.csv-2"}
+    assert [pair["dayDifference"] for pair in result["matchedPairs"]] == [0, 0, 0]
+    assert result["matchedPairs"][2]["amountDifference"] == 0.01
+    assert result["matchedPairs"][2]["transaction"]["type"] == "DEBIT"
+    assert [row["id"] for row in result["unmatchedTransactions"]] == ["extrato.csv-3"]
+    assert result["unmatchedDocuments"] == []
+
+
+def test_amount_tolerance_and_date_window() -> None:
+    documents, refs = collect_documents(
+        [("notas.xml", _notes(["A", "B", "C"], ["2024-01-10", "2024-01-10", "sem data"], [50.0, 70.0, 90.0]))]
+    )
+    transactions = _statement([("2024-01-10", "50.03"), ("2024-02-10", "70.00"), ("2024-01-10", "90.00")])
+
+    result = reconcile(documents, refs, transactions)
+
+    assert result["matchedPairs"] == []
+    assert result["unmatchedDocuments"] == [0, 1, 2]
+    assert reconcile(documents, refs, transactions, window_days=31)["matchedPairs"][0]["document"] == 1
+
+
+def test_documents_are_one_per_nfe_and_skip_erro_notes() -> None:
+    items = _notes(
+        ["1", "1", "2", "1"],
+        ["2024-01-10", "2024-01-10", "2024-01-11", "2024-01-12"],
+        [10.0, 10.0, 20.0, 30.0],
+        ["a.xml", "a.xml", "a.xml", "b/c.xml"],
+    )
+    erro = _notes(["9"], ["2024-01-10"], [10.0]).set_column(3, "produto_ncm", pa.array(["123"]))
+
+    documents, refs = collect_documents([("lote.zip", items), ("erro.xml", erro)])
+
+    assert [(ref["name"], ref["nfe_id"], ref["total"]) for ref in refs] == [
+        ("a.xml", "1", 10.0),
+        ("a.xml", "2", 20.0),
+        ("c.xml", "1", 30.0),
+    ]
+    assert refs[2]["internal_path"] == "b/c.xml"
+    assert documents.num_rows == 3
+
+
+def test_statement_columns_and_blank_rows() -> None:
+    table = pa.table({"DATE": ["2024-01-10", ""], " amount ": ["12.5", " "], "Descrição": ["PIX", ""]})
+
+    transactions = bank_transactions(table, "b.csv")
+
+    assert transactions.to_pylist() == [
+        {"id": "b.csv-0", "date": "2024-01-10", "amount": 12.5, "description": "PIX", "sourceFile": "b.csv"}
+    ]
+    assert bank_transactions(pa.table({"Saldo": ["1"]}), "c.csv").num_rows == 0
+
+
+def test_no_documents_or_transactions() -> None:
+    result = reconcile(*collect_documents([]), bank_transactions(pa.table({}), ""))
+
+    assert result["matchedPairs"] == []
+    assert result["candidates"] == 0
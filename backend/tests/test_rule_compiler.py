@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import pyarrow as pa
+import pytest
+
+from app.services.rule_compiler import (
+    RuleCompileError,
+    RuleDefinition,
+    compile_rules,
+    definitions_from_mapping,
+    number,
+    starts_with,
+    text,
+)
+
+TABLE = pa.table(
+    {
+        "cfop": ["5102", "1202", "6102", None],
+        "valor": ["10,50", "0", "3.5", "abc"],
+    }
+)
+
+
+def test_shared_subexpressions_are_planned_once() -> None:
+    value = number("valor")
+    compiled = compile_rules(
+        [
+            RuleDefinition("positivo", value > 0),
+            RuleDefinition("alto", (value > 5) & starts_with(text("cfop"), "5")),
+            RuleDefinition("baixo", (value > 0) & ~(value > 5)),
+        ]
+    )
+
+    # number(valor), 0, value > 0, 5, value > 5, text(cfop), starts_with, and, not, and
+    assert len(compiled.nodes) == 10
+    assert [len(steps) for steps in compiled.steps] == [3, 5, 2]
+    assert compiled.columns == ("valor", "cfop")
+    assert compiled.shared == 5
+
+    run = compiled.evaluate(TABLE)
+    assert [mask.tolist() for mask in run.masks] == [
+        [True, False, True, False],
+        [True, False, False, False],
+        [False, False, True, False],
+    ]
+
+
+def test_each_rule_is_profiled() -> None:
+    compiled = compile_rules([RuleDefinition("positivo", number("valor") > 0)])
+
+    run = compiled.evaluate(TABLE)
+    compiled.evaluate(TABLE.slice(0, 2))
+
+    assert run.profile[0]["evaluated"] == 4
+    assert run.profile[0]["flagged"] == 2
+    stats = compiled.stats()[0]
+    assert (stats["rule"], stats["calls"], stats["evaluated"], stats["flagged"]) == ("positivo", 2, 6, 3)
+    assert stats["seconds"] >= 0
+
+
+def test_definitions_from_mapping_build_the_same_expressions() -> None:
+    payload = {
+        "rules": [
+            {
+                "name": "devolucao",
+                "when": {
+                    "op": "starts_with",
+                    "args": [{"op": "text", "params": ["cfop"]}],
+                    "params": ["12", "22"],
+                },
+            }
+        ]
+    }
+
+    definitions = definitions_from_mapping(payload)
+
+    assert definitions == [RuleDefinition("devolucao", starts_with(text("cfop"), "12", "22"))]
+    assert compile_rules(definitions).evaluate(TABLE).masks[0].tolist() == [False, True, False, False]
+
+
+def test_invalid_definitions_are_rejected() -> None:
+    rule = RuleDefinition("positivo", number("valor") > 0)
+
+    with pytest.raises(RuleCompileError, match="mais de uma vez"):
+        compile_rules([rule, rule])
+    with pytest.raises(RuleCompileError, match="dicionário"):
+        compile_rules([rule], known_names={"OUTRA"})
+    with pytest.raises(RuleCompileError, match="desconhecida"):
+        compile_rules(definitions_from_mapping({"rules": [{"name": "x", "when": {"op": "regex"}}]}))
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.db import session as db_session
+from app.workers import runtime as worker_runtime
+
+
+@pytest.fixture
+def runtime(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[worker_runtime.WorkerRuntime]:
+    engines = []
+
+    def build_engine():
+        # A queue pool like the asyncpg engine (file-backed SQLite defaults to no pooling).
+        engines.append(
+            create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'worker.db'}", poolclass=AsyncAdaptedQueuePool)
+        )
+        return engines[-1]
+
+    monkeypatch.setattr(worker_runtime, "build_engine", build_engine)
+    runtime = worker_runtime.WorkerRuntime()
+    runtime.start()
+    try:
+        yield runtime
+    finally:
+        runtime.stop()
+        db_session.AsyncSessionFactory.configure(bind=db_session.engine)
+
+
+async def _loop_and_connection() -> tuple[int, int]:
+    async with db_session.AsyncSessionFactory() as session:
+        await session.execute(text("SELECT 1"))
+        connection = await session.connection()
+        raw = await connection.get_raw_connection()
+        return id(asyncio.get_running_loop()), id(raw.driver_connection)
+
+
+def test_tasks_share_the_process_loop_and_pooled_connections(runtime: worker_runtime.WorkerRuntime) -> None:
+    first = runtime.run(_loop_and_connection())
+    second = runtime.run(_loop_and_connection())
+
+    assert first == second
+
+
+def test_stop_disposes_the_engine_and_falls_back_to_asyncio_run(runtime: worker_runtime.WorkerRuntime) -> None:
+    runtime.run(_loop_and_connection())
+    engine = db_session.AsyncSessionFactory.kw["bind"]
+
+    runtime.stop()
+
+    assert not runtime.running
+    assert engine.pool.checkedin() == 0
+    pending = asyncio.sleep(0)
+    with pytest.raises(RuntimeError):
+        runtime.run(pending)
+    pending.close()
+    assert worker_runtime.run_async(asyncio.sleep(0, result="ok")) == "ok"
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import pytest
+
+from app.workers import scheduling, tasks
+
+
+@pytest.fixture
+def thresholds(monkeypatch: pytest.MonkeyPatch) -> None:
+    settings = scheduling.get_settings().model_copy(
+        update={"audit_bulk_threshold_files": 2, "audit_bulk_threshold_bytes": 1000}
+    )
+    monkeypatch.setattr(scheduling, "get_settings", lambda: settings)
+
+
+def test_large_jobs_go_to_the_bulk_queue(thresholds: None) -> None:
+    assert scheduling.queue_for_job([{"size": 400}, {"size": 500}]) == scheduling.INTERACTIVE_QUEUE
+    assert scheduling.queue_for_job([{"size": 400}, {"size": 700}]) == scheduling.BULK_QUEUE
+    assert scheduling.queue_for_job([{"size": 1}] * 3) == scheduling.BULK_QUEUE
+
+
+def test_tenant_is_the_idempotency_key_prefix() -> None:
+    assert scheduling.tenant_of("acme:123e4567") == "acme"
+    assert scheduling.tenant_of("123e4567-e89b-12d3-a456-426614174000") == scheduling.DEFAULT_TENANT
+
+
+def test_weighted_round_robin_interleaves_tenants() -> None:
+    current: dict[str, int] = {}
+
+    picks = [scheduling.pick_tenant({"a", "b"}, {"a": 2}, current) for _ in range(6)]
+
+    assert picks == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_small_tenant_starts_ahead_of_a_bulk_backlog() -> None:
+    backlog = {"bulk": 50}
+    current: dict[str, int] = {}
+    for _ in range(10):
+        scheduling.pick_tenant([tenant for tenant, jobs in backlog.items() if jobs], {}, current)
+        backlog["bulk"] -= 1
+    backlog["small"] = 1
+
+    picks = []
+    while backlog["small"]:
+        chosen = scheduling.pick_tenant([tenant for tenant, jobs in backlog.items() if jobs], {}, current)
+        backlog[chosen] -= 1
+        picks.append(chosen)
+
+    # The bulk tenant's credit from its busy period does not delay the newcomer.
+    assert len(picks) <= 2
+
+
+def test_percentile_is_nearest_rank() -> None:
+    samples = [float(value) for value in range(1, 101)]
+
+    assert scheduling.percentile(samples, 95) == 95.0
+    assert scheduling.percentile(samples, 50) == 50.0
+    assert scheduling.percentile([], 95) is None
+
+
+def test_every_task_of_the_dag_follows_the_job_queue() -> None:
+    pipeline = tasks.audit_pipeline("job", [{"stored_name": "a.xml"}], {})
+
+    scheduling.route_canvas(pipeline, scheduling.BULK_QUEUE)
+
+    [imports] = pipeline.tasks
+    collect, stages = imports.body.tasks
+    signatures = [*imports.tasks, collect, *stages.tasks, stages.body]
+    assert {signature.options["queue"] for signature in signatures} == {scheduling.BULK_QUEUE}
+
+
+def test_fair_messages_start_admitted_jobs_first(monkeypatch: pytest.MonkeyPatch) -> None:
+    admitted = ["other-tenant-job"]
+    monkeypatch.setattr(tasks, "next_admitted", lambda queue: admitted.pop(0) if admitted else None)
+
+    order = list(tasks._admission_order(scheduling.INTERACTIVE_QUEUE, "own-job", fair=True))
+
+    assert order == ["other-tenant-job", "own-job"]
+    assert list(tasks._admission_order(scheduling.INTERACTIVE_QUEUE, "own-job", fair=False)) == ["own-job"]
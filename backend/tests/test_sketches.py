@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from collections import Counter
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from app.services.sketches import ColumnSketch, merge_analysis_sketches
+
+
+def _values(count: int, seed: int) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [str(value) for value in rng.zipf(1.6, count) % 20_000]
+
+
+def test_distinct_count_stays_within_hll_error() -> None:
+    values = _values(200_000, seed=1)
+    sketch = ColumnSketch()
+    for start in range(0, len(values), 25_000):
+        sketch.update(pa.array(values[start : start + 25_000], type=pa.large_string()))
+
+    assert sketch.distinct_count() == pytest.approx(len(set(values)), rel=0.05)
+
+
+def test_top_values_match_exact_heavy_hitters() -> None:
+    values = _values(100_000, seed=2)
+    sketch = ColumnSketch()
+    sketch.update(pa.array(values, type=pa.large_string()))
+
+    exact = Counter(values).most_common(5)
+    top = sketch.top(5)
+
+    assert [item["value"] for item in top] == [value for value, _ in exact]
+    for item, (_, count) in zip(top, exact):
+        # Count-Min only ever overestimates.
+        assert count <= item["count"] <= count * 1.01
+
+
+def test_nulls_and_blanks_are_ignored() -> None:
+    sketch = ColumnSketch()
+    sketch.update(pa.array(["a", None, "", "a"], type=pa.large_string()))
+
+    assert sketch.distinct_count() == 1
+    assert sketch.top() == [{"value": "a", "count": 2}]
+
+
+def test_merged_sketches_equal_a_single_pass() -> None:
+    first, second = _values(50_000, seed=3), _values(50_000, seed=4)
+    left, right, combined = ColumnSketch(), ColumnSketch(), ColumnSketch()
+    left.update(pa.array(first, type=pa.large_string()))
+    right.update(pa.array(second, type=pa.large_string()))
+    combined.update(pa.array(first + second, type=pa.large_string()))
+
+    merged = merge_analysis_sketches(
+        [{"sketches": {"NCM": left.to_dict()}}, {"sketches": {"NCM": right.to_dict()}}, {}]
+    )
+
+    assert merged["NCM"]["files"] == 2
+    assert merged["NCM"]["distinct_approx"] == combined.distinct_count()
+    assert merged["NCM"]["top_values"] == combined.top()
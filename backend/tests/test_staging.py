@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+from app.services.blob_store import BlobStore
+from app.services.csv_analyzer import analyse_csv_file
+from app.services.staging import (
+    STAGING_VERSION,
+    StagingError,
+    analyse_staged_file,
+    collect_staged_garbage,
+    current_artifact,
+    iter_staged_frames,
+    open_staged_table,
+    stage_upload,
+    staged_metadata,
+)
+
+CSV_CONTENT = (
+    "numero;valor;produto\n"
+    "1;R$ 1.234,56;Caneta\n"
+    "2;10,00;Papel\n"
+    "3;;Grampo\n"
+    "4;(5,50);Clipe\n"
+)
+NFE_XML = (
+    '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe Id="NFe1">'
+    "<det nItem=\"1\"><prod><xProd>Caneta</xProd><CFOP>5102</CFOP><vProd>10.00</vProd></prod></det>"
+    "<det nItem=\"2\"><prod><xProd>Papel</xProd><CFOP>5102</CFOP><vProd>4.50</vProd></prod></det>"
+    "<total><ICMSTot><vNF>14.50</vNF></ICMSTot></total>"
+    "</infNFe></NFe></nfeProc>"
+)
+
+
+def _write_upload(root: Path, content: str = CSV_CONTENT) -> Path:
+    job_dir = root / "job"
+    job_dir.mkdir(exist_ok=True)
+    path = job_dir / "upload.csv"
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def test_stage_upload_writes_string_columns_next_to_original(tmp_path: Path) -> None:
+    upload = _write_upload(tmp_path)
+
+    artifact = stage_upload(upload, {"original_name": "notas.csv"}, uploads_root=tmp_path)
+
+    assert artifact is not None
+    assert artifact["path"] == "job/upload.csv.arrow"
+    assert artifact["version"] == STAGING_VERSION
+    assert artifact["rows"] == 4
+    assert artifact["columns"] == ["numero", "valor", "produto"]
+
+    table = open_staged_table(tmp_path / artifact["path"])
+    assert table.schema.types == [pa.large_string()] * 3
+    assert table.column("valor").to_pylist() == ["R$ 1.234,56", "10,00", None, "(5,50)"]
+    assert staged_metadata(tmp_path / artifact["path"])["delimiter"] == ";"
+
+
+def test_stage_upload_reuses_current_artifact_and_skips_other_formats(tmp_path: Path) -> None:
+    upload = _write_upload(tmp_path)
+    artifact = stage_upload(upload, {"original_name": "notas.csv"}, uploads_root=tmp_path)
+    staged_file = tmp_path / artifact["path"]
+    staged_file.write_bytes(b"stale")
+
+    reused = stage_upload(
+        upload, {"original_name": "notas.csv", "staged": artifact}, uploads_root=tmp_path
+    )
+
+    assert reused == artifact
+    assert staged_file.read_bytes() == b"stale"
+    assert stage_upload(upload, {"original_name": "nota.pdf"}, uploads_root=tmp_path) is None
+
+
+def test_uploads_with_the_same_sha256_share_one_artifact(tmp_path: Path) -> None:
+    upload = _write_upload(tmp_path)
+    sha256 = hashlib.sha256(upload.read_bytes()).hexdigest()
+    entry = {"original_name": "notas.csv", "sha256": sha256, "stored_path": "job/upload.csv"}
+    artifact = stage_upload(upload, entry, uploads_root=tmp_path)
+    assert artifact["path"] == f"staged/{sha256[:2]}/{sha256}-v{STAGING_VERSION}.arrow"
+
+    other_job = {**entry, "original_name": "copia.csv", "stored_path": "outro/upload.csv"}
+    reused = current_artifact(other_job, uploads_root=tmp_path)
+
+    assert reused is not None
+    assert (reused["path"], reused["rows"], reused["columns"]) == (
+        artifact["path"],
+        artifact["rows"],
+        artifact["columns"],
+    )
+    assert stage_upload(tmp_path / "outro" / "upload.csv", other_job, uploads_root=tmp_path) == reused
+    assert current_artifact({**entry, "sha256": "0" * 64}, uploads_root=tmp_path) is None
+    assert not list((tmp_path / "job").glob("*.arrow"))
+
+
+def test_projection_reads_only_requested_columns(tmp_path: Path) -> None:
+    upload = _write_upload(tmp_path)
+    artifact = stage_upload(upload, {"original_name": "notas.csv"}, uploads_root=tmp_path)
+    staged_file = tmp_path / artifact["path"]
+
+    table = open_staged_table(staged_file, ["produto", "ausente"])
+    frames = list(iter_staged_frames(staged_file, columns=["numero"], max_rows=3))
+
+    assert table.column_names == ["produto"]
+    assert [len(frame) for frame in frames] == [3, 1]
+    assert frames[0].columns.tolist() == ["numero"]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_staged_analysis_matches_text_analysis(tmp_path: Path, streaming: bool) -> None:
+    upload = _write_upload(tmp_path)
+    artifact = stage_upload(upload, {"original_name": "notas.csv"}, uploads_root=tmp_path)
+
+    staged = analyse_staged_file(
+        tmp_path / artifact["path"], streaming=streaming, memory_limit_bytes=4096, profile=True
+    )
+    direct = analyse_csv_file(upload)
+
+    assert staged["row_count"] == direct["row_count"]
+    assert staged["diagnostics"]["source"] == "arrow_ipc"
+    for column in ("numero", "valor"):
+        assert staged["stats"][column]["mean"] == pytest.approx(direct["stats"][column]["mean"])
+        assert staged["stats"][column]["non_nulls"] == direct["stats"][column]["non_nulls"]
+    assert [profile["name"] for profile in staged["profiles"]] == artifact["columns"]
+
+
+def test_stage_upload_rejects_empty_csv(tmp_path: Path) -> None:
+    upload = _write_upload(tmp_path, content="")
+
+    with pytest.raises(StagingError):
+        stage_upload(upload, {"original_name": "vazio.csv"}, uploads_root=tmp_path)
+
+    assert not list((tmp_path / "job").glob("*.arrow*"))
+
+
+def test_nfe_uploads_are_staged_as_typed_item_tables(tmp_path: Path) -> None:
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    upload = job_dir / "upload.xml"
+    upload.write_text(NFE_XML, encoding="utf-8")
+
+    artifact = stage_upload(upload, {"original_name": "nota.xml"}, uploads_root=tmp_path)
+
+    assert artifact is not None
+    assert artifact["rows"] == 2
+    table = open_staged_table(tmp_path / artifact["path"], ["produto_cfop", "produto_valor_total"])
+    assert table.column("produto_valor_total").type == pa.float64()
+    assert staged_metadata(tmp_path / artifact["path"])["documents"] == "1"
+    analysis = analyse_staged_file(tmp_path / artifact["path"])
+    assert analysis["diagnostics"]["documents"] == 1
+
+
+def test_garbage_collection_drops_unused_and_outdated_artifacts(tmp_path: Path) -> None:
+    blobs = BlobStore(tmp_path)
+    upload = _write_upload(tmp_path)
+    sha256 = hashlib.sha256(upload.read_bytes()).hexdigest()
+    source = blobs.temporary_path()
+    source.write_bytes(upload.read_bytes())
+    blobs.link(source, sha256, tmp_path / "job" / "vinculado.csv")
+    entry = {"original_name": "notas.csv", "sha256": sha256, "stored_path": "job/upload.csv"}
+    artifact = tmp_path / stage_upload(upload, entry, uploads_root=tmp_path)["path"]
+    outdated = artifact.with_name(f"{sha256}-v0.arrow")
+    orphan = artifact.with_name(f"{'f' * 64}-v{STAGING_VERSION}.arrow")
+    abandoned = artifact.with_name(f".{artifact.name}.abcd.tmp")
+    for path in (outdated, orphan, abandoned):
+        path.write_bytes(b"arrow")
+
+    assert collect_staged_garbage(tmp_path, grace_seconds=3600, blobs=blobs) == 0
+    assert collect_staged_garbage(tmp_path, grace_seconds=-1, blobs=blobs) == 3
+    assert artifact.exists()
+
+    (tmp_path / "job" / "vinculado.csv").unlink()
+    assert collect_staged_garbage(tmp_path, grace_seconds=-1) == 0
+    assert collect_staged_garbage(tmp_path, grace_seconds=-1, blobs=blobs) == 1
+    assert not artifact.exists()
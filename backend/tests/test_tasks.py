@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from app.workers import tasks
+from app.workers.parallel import FileOutcome
+
+NFE_XML = (
+    '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe"><NFe><infNFe Id="NFe1">'
+    '<det nItem="1"><prod><xProd>Caneta</xProd><NCM>96081000</NCM><CFOP>5102</CFOP>'
+    "<qCom>1</qCom><vUnCom>10.00</vUnCom><vProd>10.00</vProd></prod></det>"
+    "</infNFe></NFe></nfeProc>"
+)
+
+
+@pytest.fixture
+def uploads(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    settings = tasks.settings.model_copy(
+        update={"uploads_dir": str(tmp_path), "audit_worker_processes": 0, "audit_file_isolation": False}
+    )
+    monkeypatch.setattr(tasks, "settings", settings)
+    return tmp_path
+
+
+def _zip_entry(uploads: Path, content: bytes) -> dict:
+    (uploads / "job").mkdir(exist_ok=True)
+    (uploads / "job" / "lote.zip").write_bytes(content)
+    return {"original_name": "lote.zip", "stored_name": "lote.zip", "stored_path": "job/lote.zip"}
+
+
+def _zip_bytes(tmp_path: Path) -> bytes:
+    path = tmp_path / "origem.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a/n1.xml", NFE_XML)
+    return path.read_bytes()
+
+
+def test_archive_is_analysed_as_one_document(uploads: Path) -> None:
+    entry, analysis = tasks._process_archive("job", _zip_entry(uploads, _zip_bytes(uploads)), set())
+
+    assert "error" not in analysis
+    assert entry["archive"]["parsed"] == 1
+    assert analysis["fiscal_validation"]["items"] == 1
+
+
+def test_truncated_archive_only_fails_its_upload(uploads: Path) -> None:
+    content = _zip_bytes(uploads)
+
+    entry, analysis = tasks._process_archive("job", _zip_entry(uploads, content[: len(content) // 2]), set())
+
+    assert entry["original_name"] == "lote.zip"
+    assert analysis["error"].startswith("Arquivo ZIP inválido")
+
+
+def test_unexpected_archive_failures_become_an_error_analysis(
+    uploads: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def broken(*args: object, **kwargs: object) -> None:
+        raise ValueError("tabela inválida")
+
+    monkeypatch.setattr(tasks, "analyse_item_table", broken)
+
+    file_entry = _zip_entry(uploads, _zip_bytes(uploads))
+    entry, analysis = tasks._process_archive("job", file_entry, set())
+
+    assert analysis == {"error": "Falha ao processar o arquivo ZIP: tabela inválida"}
+    assert entry == file_entry
+
+
+@pytest.mark.parametrize("isolation, processes", [(True, 1), (False, 0)])
+def test_file_isolation_decides_on_the_child_process(
+    uploads: Path, monkeypatch: pytest.MonkeyPatch, isolation: bool, processes: int
+) -> None:
+    monkeypatch.setattr(tasks, "settings", tasks.settings.model_copy(update={"audit_file_isolation": isolation}))
+    calls = []
+
+    def fake_pool(func, items, *, processes, timeout_seconds):
+        calls.append(processes)
+        return [FileOutcome(index=0, value=(items[0][0], None))]
+
+    monkeypatch.setattr(tasks, "run_in_process_pool", fake_pool)
+    (uploads / "job").mkdir()
+    (uploads / "job" / "nota.xml").write_text(NFE_XML)
+    entry = {"original_name": "nota.xml", "stored_name": "nota.xml", "stored_path": "job/nota.xml"}
+
+    tasks._import_file("job", entry, set(), None)
+
+    assert calls == [processes]
+
+
+def test_reconciliation_stages_statements_and_matches_notes(uploads: Path) -> None:
+    note = NFE_XML.replace("<det ", "<ide><dhEmi>2024-01-10T09:00:00-03:00</dhEmi></ide><det ").replace(
+        "</infNFe>", "<total><ICMSTot><vNF>10.00</vNF></ICMSTot></total></infNFe>"
+    )
+    (uploads / "job").mkdir()
+    (uploads / "job" / "nota.xml").write_text(note)
+    (uploads / "job" / "extrato.csv").write_text("Data;Valor;Descrição\n11/01/2024;10,00;PIX\n11/01/2024;99,00;TED\n")
+    files = [{"original_name": "nota.xml", "stored_name": "nota.xml", "stored_path": "job/nota.xml"}]
+    statements = [{"original_name": "extrato.csv", "sha256": "ab" * 32, "stored_path": "job/extrato.csv"}]
+
+    result = tasks._reconcile("job", files, {"nota.xml": {"row_count": 1}}, statements)
+
+    assert result["documents"][0]["nfe_id"] == "NFe1"
+    assert result["matchedPairs"][0]["transaction"]["description"] == "PIX"
+    assert result["matchedPairs"][0]["dayDifference"] == 1
+    assert [row["description"] for row in result["unmatchedTransactions"]] == ["TED"]
+    assert list((uploads / "staged" / "ab").iterdir())
+
+
+def _stage_note(uploads: Path) -> list[dict]:
+    (uploads / "job").mkdir(exist_ok=True)
+    (uploads / "job" / "nota.xml").write_text(NFE_XML)
+    return [{"original_name": "nota.xml", "stored_name": "nota.xml", "stored_path": "job/nota.xml", "sha256": "cd" * 32}]
+
+
+def test_pipeline_fans_out_per_file_then_per_stage() -> None:
+    files = [{"stored_name": "a.xml"}, {"stored_name": "b.xml"}]
+
+    pipeline = tasks.audit_pipeline("job", files, {})
+
+    # Celery folds the second chord into the body of the first one.
+    [imports] = pipeline.tasks
+    assert [task.task for task in imports.tasks] == ["audits.import_file", "audits.import_file"]
+    collect, stages = imports.body.tasks
+    assert collect.task == "audits.collect_files"
+    assert {task.task for task in stages.tasks} == {"audits.classify", "audits.cross_validate", "audits.aggregate"}
+    assert stages.body.task == "audits.finalize"
+    assert [errback.task for errback in pipeline.options["link_error"]] == ["audits.fail"]
+
+
+def test_stages_resume_from_their_checkpoints(uploads: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tasks, "settings", tasks.settings.model_copy(update={"analysis_cache_enabled": False}))
+    files = _stage_note(uploads)
+    tasks.import_audit_file("job", files[0], sorted(tasks._known_hashes(files)))
+    tasks.collect_audit_files("job", files)
+    tasks.aggregate_audit_job("job")
+
+    def broken(*args: object, **kwargs: object) -> None:
+        raise AssertionError("stage ran again")
+
+    monkeypatch.setattr(tasks, "_import_file", broken)
+    monkeypatch.setattr(tasks, "_aggregate", broken)
+    tasks.import_audit_file("job", files[0], sorted(tasks._known_hashes(files)))
+    tasks.collect_audit_files("job", files)
+    tasks.aggregate_audit_job("job")
+
+    checkpoints = tasks.CheckpointStore(uploads, "job")
+    _, imported = checkpoints.read("import")
+    assert imported["analyses"]["nota.xml"]["fiscal_validation"]["items"] == 1
+    assert checkpoints.read("aggregation")[1]["items"] == 1
+
+
+def test_changed_files_invalidate_the_checkpoint(uploads: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tasks, "settings", tasks.settings.model_copy(update={"analysis_cache_enabled": False}))
+    files = _stage_note(uploads)
+    tasks.import_audit_file("job", files[0], sorted(tasks._known_hashes(files)))
+    tasks.collect_audit_files("job", files)
+    changed = [{**files[0], "sha256": "ef" * 32}]
+
+    with pytest.raises(RuntimeError, match="não foi importado"):
+        tasks.collect_audit_files("job", changed)
+
+
+def test_reaudit_skips_the_import_once_checkpointed(uploads: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tasks, "settings", tasks.settings.model_copy(update={"analysis_cache_enabled": False}))
+    files = _stage_note(uploads)
+
+    [imports] = tasks.reaudit_pipeline("job", files, {}).tasks
+    assert imports.tasks[0].task == "audits.import_file"
+
+    tasks.import_audit_file("job", files[0], sorted(tasks._known_hashes(files)))
+    tasks.collect_audit_files("job", files)
+    [stages] = tasks.reaudit_pipeline("job", files, {}).tasks
+    assert stages.body.task == "audits.finalize"
+
+
+def test_corrections_are_applied_by_document_name() -> None:
+    files = [{"original_name": "nota.xml", "stored_name": "a1.xml"}, {"original_name": "outra.xml", "stored_name": "b2.xml"}]
+    base = {"operationType": "Venda", "businessSector": "Bebidas", "confidence": 0.5, "costCenter": "Não Alocado"}
+
+    corrected = tasks._corrected(files, {"a1.xml": base, "b2.xml": base}, {"classification": {"nota.xml": "Compra"}})
+
+    assert corrected["a1.xml"]["operationType"] == "Compra"
+    assert corrected["a1.xml"]["confidence"] == 1.0
+    assert corrected["b2.xml"] == base
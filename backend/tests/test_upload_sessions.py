@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from app.services import upload_sessions
+from app.services.upload_sessions import ChunkChecksumMismatch, UploadSessionConflict, UploadSessionStore
+
+CONTENT = b"<nfeProc>lote grande</nfeProc>" * 1000
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _send(store: UploadSessionStore, session_id: str, content: bytes, step: int) -> None:
+    for start in range(0, len(content), step):
+        chunk = content[start : start + step]
+        store.append(store.get(session_id), start, chunk, _sha(chunk))
+
+
+def test_chunks_are_appended_in_place_and_hashed_incrementally(tmp_path: Path) -> None:
+    store = UploadSessionStore(tmp_path)
+    session = store.create("lote.zip", len(CONTENT), "application/zip")
+
+    _send(store, session.id, CONTENT, 4096)
+    assert session.path.read_bytes() == CONTENT
+    # Sealing uses the running hash: bytes changed behind its back go unnoticed.
+    session.path.write_bytes(b"x" * len(CONTENT))
+    sealed = store.seal(store.get(session.id))
+
+    assert sealed.complete
+    assert sealed.sha256 == _sha(CONTENT)
+
+
+def test_a_chunk_off_the_current_offset_is_rejected_with_the_offset(tmp_path: Path) -> None:
+    store = UploadSessionStore(tmp_path)
+    session = store.create("lote.zip", len(CONTENT))
+    store.append(session, 0, CONTENT[:100], _sha(CONTENT[:100]))
+
+    with pytest.raises(UploadSessionConflict) as conflict:
+        store.append(store.get(session.id), 0, CONTENT[:100], _sha(CONTENT[:100]))
+    assert conflict.value.offset == 100
+    with pytest.raises(ChunkChecksumMismatch):
+        store.append(store.get(session.id), 100, CONTENT[100:200], _sha(b"outro"))
+    with pytest.raises(ValueError, match="tamanho declarado"):
+        store.append(store.get(session.id), 100, CONTENT[100:] + b"extra", _sha(CONTENT[100:] + b"extra"))
+
+    assert store.get(session.id).offset == 100
+
+
+def test_another_process_catches_up_on_the_hash(tmp_path: Path) -> None:
+    store = UploadSessionStore(tmp_path)
+    session = store.create("lote.zip", len(CONTENT))
+    _send(store, session.id, CONTENT[:10_000], 4096)
+
+    # Hash state of this process lost (restart or another API worker).
+    upload_sessions._hashers.clear()
+    store.append(store.get(session.id), 10_000, CONTENT[10_000:], _sha(CONTENT[10_000:]))
+
+    assert store.seal(store.get(session.id)).sha256 == _sha(CONTENT)
+
+
+def test_incomplete_sessions_cannot_be_sealed(tmp_path: Path) -> None:
+    store = UploadSessionStore(tmp_path)
+    session = store.create("lote.zip", len(CONTENT))
+
+    with pytest.raises(UploadSessionConflict) as conflict:
+        store.seal(session)
+    assert conflict.value.offset == 0
+
+
+def test_completed_sessions_keep_their_job_and_expire(tmp_path: Path) -> None:
+    store = UploadSessionStore(tmp_path)
+    done = store.create("lote.zip", len(CONTENT))
+    _send(store, done.id, CONTENT, len(CONTENT))
+    store.mark_completed(store.seal(store.get(done.id)), "job-1")
+    idle = store.create("outro.zip", 10)
+
+    completed = store.get(done.id)
+    assert completed.job_id == "job-1" and completed.complete
+    assert not completed.path.exists()
+    with pytest.raises(UploadSessionConflict):
+        store.append(completed, 0, b"x", _sha(b"x"))
+
+    assert store.collect_expired(ttl_seconds=3600) == 0
+    old = time.time() - 7200
+    os.utime(idle.path, (old, old))
+    assert store.collect_expired(ttl_seconds=3600) == 1
+    assert store.get(idle.id) is None
+    assert store.get(done.id) is not None
+    assert store.get("../../etc") is None
+
+
+def test_only_the_latest_running_hashes_are_kept(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(upload_sessions, "_HASHERS_MAX", 2)
+    store = UploadSessionStore(tmp_path)
+    sessions = [store.create(f"lote-{index}.zip", len(CONTENT)) for index in range(3)]
+    for session in sessions:
+        store.append(session, 0, CONTENT[:100], _sha(CONTENT[:100]))
+
+    assert list(upload_sessions._hashers)[-2:] == [sessions[1].id, sessions[2].id]
+    assert sessions[0].id not in upload_sessions._hashers
+    # An evicted session catches up from its data.
+    store.append(store.get(sessions[0].id), 100, CONTENT[100:], _sha(CONTENT[100:]))
+    assert store.seal(store.get(sessions[0].id)).sha256 == _sha(CONTENT)
+
+
+@pytest.mark.anyio
+async def test_completions_of_a_session_are_serialized(tmp_path: Path) -> None:
+    store = UploadSessionStore(tmp_path)
+    session = store.create("lote.zip", len(CONTENT))
+    _send(store, session.id, CONTENT, len(CONTENT))
+    jobs: list[str | None] = []
+
+    async def complete(job_id: str) -> None:
+        async with store.completing(session.id) as current:
+            jobs.append(current.job_id)
+            if current.job_id is None:
+                await asyncio.sleep(0.1)
+                store.mark_completed(store.seal(current), job_id)
+
+    await asyncio.gather(complete("job-1"), complete("job-2"))
+
+    assert jobs == [None, "job-1"]
+    assert store.get(session.id).job_id == "job-1"
+    async with store.completing("f" * 32) as missing:
+        assert missing is None
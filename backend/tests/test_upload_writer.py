@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import uuid
+from pathlib import Path
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from app.services import audit
+from app.services.upload_writer import UploadWriter
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def settings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    settings = audit.get_settings().model_copy(
+        update={
+            "uploads_dir": str(tmp_path),
+            "max_upload_file_bytes": 4 * 1024 * 1024,
+            "max_upload_job_bytes": 6 * 1024 * 1024,
+            "upload_write_concurrency": 2,
+        }
+    )
+    monkeypatch.setattr(audit, "get_settings", lambda: settings)
+    return settings
+
+
+def _upload(name: str, content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=name)
+
+
+@pytest.mark.anyio
+async def test_writer_hashes_and_stores_every_chunk(tmp_path: Path) -> None:
+    chunks = [bytes([index]) * 1000 for index in range(10)]
+    writer = UploadWriter(tmp_path / "upload.bin", queue_chunks=2)
+
+    await writer.open()
+    for chunk in chunks:
+        await writer.write(chunk)
+    size, sha256 = await writer.finish()
+
+    content = b"".join(chunks)
+    assert size == len(content)
+    assert sha256 == hashlib.sha256(content).hexdigest()
+    assert (tmp_path / "upload.bin").read_bytes() == content
+
+
+@pytest.mark.anyio
+async def test_writer_surfaces_disk_errors_without_blocking_the_reader(tmp_path: Path, monkeypatch) -> None:
+    writer = UploadWriter(tmp_path / "upload.bin", queue_chunks=1)
+
+    def failing_write(handle, chunk):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(writer, "_write", failing_write)
+    await writer.open()
+    with pytest.raises(OSError, match="disco cheio"):
+        for _ in range(10):
+            await asyncio.wait_for(writer.write(b"x" * 1000), timeout=5)
+    await writer.abort()
+
+
+@pytest.mark.anyio
+async def test_files_are_written_concurrently_in_request_order(settings) -> None:
+    contents = [bytes([index]) * (1024 * 1024 + index) for index in range(3)]
+    files = [_upload(f"nota-{index}.xml", content) for index, content in enumerate(contents)]
+
+    stored, summary, _ = await audit._persist_files(uuid.uuid4(), files)
+
+    assert [entry["original_name"] for entry in stored] == ["nota-0.xml", "nota-1.xml", "nota-2.xml"]
+    for entry, content in zip(stored, contents):
+        assert entry["size"] == len(content)
+        assert entry["sha256"] == hashlib.sha256(content).hexdigest()
+        assert (settings.uploads_dir_path / entry["stored_path"]).read_bytes() == content
+    assert summary.startswith("3 file(s)")
+    assert [await upload.read(1) for upload in files] == [b"\x00", b"\x01", b"\x02"]
+
+
+@pytest.mark.anyio
+async def test_job_limit_stops_the_batch_and_removes_it(settings) -> None:
+    job_id = uuid.uuid4()
+    files = [_upload(f"nota-{index}.xml", b"x" * (3 * 1024 * 1024)) for index in range(3)]
+
+    with pytest.raises(ValueError, match="volume total"):
+        await audit._persist_files(job_id, files)
+
+    assert not (settings.uploads_dir_path / str(job_id)).exists()
+    assert not list((settings.uploads_dir_path / "blobs" / "tmp").iterdir())
+
+
+@pytest.mark.anyio
+async def test_unsupported_extension_is_rejected_before_writing(settings) -> None:
+    job_id = uuid.uuid4()
+    files = [_upload("nota.xml", b"<nfe/>"), _upload("planilha.exe", b"MZ")]
+
+    with pytest.raises(ValueError, match="extensão não suportada"):
+        await audit._persist_files(job_id, files)
+
+    assert not (settings.uploads_dir_path / str(job_id)).exists()
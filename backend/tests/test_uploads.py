@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.uploads import EmptyUpload, MultipartUpload, UploadBatch, UploadTooLarge
+
+BOUNDARY = "limite-do-lote"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def settings(tmp_path: Path):
+    return get_settings().model_copy(
+        update={
+            "uploads_dir": str(tmp_path),
+            "max_upload_file_bytes": 2 * 1024 * 1024,
+            "max_upload_job_bytes": 3 * 1024 * 1024,
+        }
+    )
+
+
+def _part(name: str, content: bytes, filename: str | None = None) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename is not None:
+        disposition += f'; filename="{filename}"'
+    return f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + content + b"\r\n"
+
+
+def _body(*parts: bytes) -> bytes:
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+class _Stream:
+    """Request body delivered in small chunks, counting what was consumed."""
+
+    def __init__(self, body: bytes, chunk_size: int = 64 * 1024) -> None:
+        self.body = body
+        self.chunk_size = chunk_size
+        self.consumed = 0
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for offset in range(0, len(self.body), self.chunk_size):
+            chunk = self.body[offset : offset + self.chunk_size]
+            self.consumed += len(chunk)
+            yield chunk
+
+
+@pytest.mark.anyio
+async def test_file_parts_are_stored_while_the_body_streams_in(settings) -> None:
+    payload = bytes(range(256)) * 5000
+    stream = _Stream(_body(_part("files", b"<nfe/>", "nota.xml"), _part("origem", b"portal"), _part("files", payload, "extrato.csv")))
+    batch = UploadBatch(settings, settings.uploads_dir_path / "job")
+
+    stored = await batch.receive(MultipartUpload(stream, CONTENT_TYPE))
+
+    assert [entry["original_name"] for entry in stored] == ["nota.xml", "extrato.csv"]
+    assert stored[1]["size"] == len(payload)
+    assert stored[1]["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert (settings.uploads_dir_path / stored[1]["stored_path"]).read_bytes() == payload
+
+
+@pytest.mark.anyio
+async def test_oversized_part_aborts_before_the_rest_of_the_body(settings) -> None:
+    stream = _Stream(_body(_part("files", b"x" * (8 * 1024 * 1024), "grande.csv")))
+    batch = UploadBatch(settings, settings.uploads_dir_path / "job")
+
+    with pytest.raises(UploadTooLarge, match="grande.csv"):
+        await batch.receive(MultipartUpload(stream, CONTENT_TYPE))
+
+    assert stream.consumed < 4 * 1024 * 1024
+    assert not batch.job_dir.exists()
+
+
+@pytest.mark.anyio
+async def test_declared_length_over_the_job_limit_is_rejected_unread(settings) -> None:
+    stream = _Stream(_body(_part("files", b"<nfe/>", "nota.xml")))
+    batch = UploadBatch(settings, settings.uploads_dir_path / "job")
+
+    with pytest.raises(UploadTooLarge):
+        await batch.receive(MultipartUpload(stream, CONTENT_TYPE, content_length=64 * 1024 * 1024))
+
+    assert stream.consumed == 0
+
+
+@pytest.mark.anyio
+async def test_body_without_file_parts_is_empty(settings) -> None:
+    batch = UploadBatch(settings, settings.uploads_dir_path / "job")
+
+    with pytest.raises(EmptyUpload):
+        await batch.receive(MultipartUpload(_Stream(_body(_part("origem", b"portal"))), CONTENT_TYPE))
+    with pytest.raises(EmptyUpload):
+        MultipartUpload(_Stream(b""), "multipart/form-data")
+
+
+@pytest.mark.anyio
+async def test_truncated_body_is_rejected(settings) -> None:
+    body = _body(_part("files", b"<nfe/>", "nota.xml"))
+    batch = UploadBatch(settings, settings.uploads_dir_path / "job")
+
+    with pytest.raises(ValueError, match="incompleto"):
+        await batch.receive(MultipartUpload(_Stream(body[:-20]), CONTENT_TYPE))
+
+    assert not batch.job_dir.exists()
+
+
+@pytest.mark.anyio
+async def test_adopted_file_is_linked_without_copy_or_rehash(settings, tmp_path: Path) -> None:
+    source = tmp_path / "sessao.zip"
+    source.write_bytes(b"PK lote")
+    inode = source.stat().st_ino
+    batch = UploadBatch(settings, settings.uploads_dir_path / "job")
+
+    [entry] = await batch.adopt(source, "lote.zip", "application/zip", 7, "ab" * 32)
+
+    stored = settings.uploads_dir_path / entry["stored_path"]
+    assert stored.stat().st_ino == inode
+    assert entry["sha256"] == "ab" * 32 and entry["size"] == 7
+    # The source stays with its owner until the job is committed.
+    assert source.read_bytes() == b"PK lote"
+    with pytest.raises(UploadTooLarge):
+        await UploadBatch(settings, settings.uploads_dir_path / "outro").adopt(
+            source, "lote.csv", None, 8 * 1024 * 1024, "cd" * 32
+        )